@@ -1,136 +1,441 @@
-from typing import List, Dict, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import hashlib
 import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 
 import boto3
 
+from lamp_py.aws.s3 import download_file, upload_file
 from lamp_py.runtime_utils.process_logger import ProcessLogger
 
+# checkpoint of a closed shard that has been read to its end
+SHARD_END = "SHARD_END"
+
+
+@dataclass
+class KinesisSettings:
+    """
+    Settings for reading a Kinesis Stream
+
+    checkpoint_path: s3 path or local file the sequence number of the last
+        processed record of each shard is saved to, defaults to a file named
+        after the stream under lamp/_kinesis_checkpoints/ in the springboard
+        bucket (KINESIS_CHECKPOINT_PATH)
+    batch_max_records: most records in a batch handed to the consumer, also
+        the most records read from a shard in one request
+        (KINESIS_BATCH_MAX_RECORDS)
+    max_batches_per_loop: most batches read by one call to read_batches,
+        so a stream that is far behind is caught up over several loops
+        (KINESIS_MAX_BATCHES_PER_LOOP)
+    read_threads: shards read concurrently (KINESIS_READ_THREADS)
+    """
+
+    checkpoint_path: Optional[str] = None
+    batch_max_records: int = 1000
+    max_batches_per_loop: int = 100
+    read_threads: int = 8
+
+    @classmethod
+    def from_environment(cls) -> "KinesisSettings":
+        """create settings, overriding defaults with environment variables"""
+        defaults = cls()
+        return cls(
+            checkpoint_path=os.environ.get(
+                "KINESIS_CHECKPOINT_PATH", defaults.checkpoint_path
+            ),
+            batch_max_records=int(
+                os.environ.get(
+                    "KINESIS_BATCH_MAX_RECORDS", defaults.batch_max_records
+                )
+            ),
+            max_batches_per_loop=int(
+                os.environ.get(
+                    "KINESIS_MAX_BATCHES_PER_LOOP",
+                    defaults.max_batches_per_loop,
+                )
+            ),
+            read_threads=int(
+                os.environ.get("KINESIS_READ_THREADS", defaults.read_threads)
+            ),
+        )
+
+
+@dataclass
+class KinesisBatch:
+    """
+    Raw json payloads of records read from a Kinesis Stream, with the sequence
+    number of the last record of each shard in the batch
+    """
+
+    payloads: List[bytes] = field(default_factory=list)
+    sequence_numbers: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def records(self) -> List[Dict]:
+        """payloads decoded one at a time"""
+        return [json.loads(payload) for payload in self.payloads]
+
 
 class KinesisReader:
     """
-    Wrapper class for reading a Kinesis Stream, keeping alive a shard
+    Wrapper class for reading every shard of a Kinesis Stream
+
+    Records are read from all open shards concurrently and handed to the
+    consumer in batches of at most batch_max_records. Once a batch has been
+    processed the consumer checkpoints it, saving the sequence number of the
+    last processed record of each shard to durable storage. Restarted
+    readers continue after their checkpoints, and records of batches that
+    were not checkpointed are read again on the next loop.
+
+    Child shards created by resharding are read once their parents have been
+    read to their end.
     """
 
-    def __init__(self, stream_name: str) -> None:
+    def __init__(
+        self,
+        stream_name: str,
+        settings: Optional[KinesisSettings] = None,
+        kinesis_client: Optional[Any] = None,
+    ) -> None:
         """
-        initialize an instance. shard information and sequence numbers are
-        initially empty, to be filled out when needed.
+        initialize an instance, loading the checkpoints of the stream. shard
+        iterators are initially empty, to be filled out when needed.
+
+        :param kinesis_client: client to read the stream with, like a
+            LocalKinesisStream, defaults to a boto3 kinesis client
         """
         self.stream_name = stream_name
-        self.kinesis_client = boto3.client("kinesis")
-        self.shard_id: Optional[str] = None
-        self.shard_iterator: Optional[str] = None
-        self.last_sequence_number: Optional[str] = None
+        self.settings = settings if settings is not None else KinesisSettings()
+        self.kinesis_client = (
+            kinesis_client
+            if kinesis_client is not None
+            else boto3.client("kinesis")
+        )
+        self.checkpoint_path = (
+            self.settings.checkpoint_path
+            if self.settings.checkpoint_path is not None
+            else f"s3://{os.environ['SPRINGBOARD_BUCKET']}/lamp/_kinesis_checkpoints/{stream_name}.json"
+        )
 
-    def update_shard_id(self) -> None:
-        """
-        Get the stream description and the shard id for the first shard in the
-        Kinesis Stream.  Throws if the stream has more than one shard.
-        """
+        # shard id -> sequence number of the last processed record
+        self.checkpoints: Dict[str, str] = {}
+        # shard id -> sequence number of the last record handed to the
+        # consumer, and the iterator to continue reading the shard from
+        self.read_positions: Dict[str, str] = {}
+        self.shard_iterators: Dict[str, Optional[str]] = {}
+
+        self.load_checkpoints()
+
+    def load_checkpoints(self) -> None:
+        """load shard checkpoints, if they exist and are readable"""
         process_logger = ProcessLogger(
-            process_name="update_shard_id", stream_name=self.stream_name
+            process_name="load_kinesis_checkpoints",
+            stream_name=self.stream_name,
+            checkpoint_path=self.checkpoint_path,
         )
         process_logger.log_start()
 
-        # Describe the stream and pull out the shard IDs
-        stream_description = self.kinesis_client.describe_stream(
-            StreamName=self.stream_name
-        )
-        shards = stream_description["StreamDescription"]["Shards"]
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                local_path = self.checkpoint_path
+                if self.checkpoint_path.startswith("s3://"):
+                    local_path = os.path.join(tmp_dir, "checkpoints.json")
+                    download_file(self.checkpoint_path, local_path)
+
+                with open(local_path, "r", encoding="utf8") as file:
+                    state = json.load(file)
 
-        # Per conversation with Glides, their Kinesis Stream only consists of a
-        # single shard. If we are consuming a stream with multiple shards, build up
-        # logic to distinguish between them.
-        assert len(shards) == 1
+            if state["stream_name"] == self.stream_name:
+                self.checkpoints = state["shards"]
+        except FileNotFoundError:
+            # first read of the stream, starting at the trim horizon
+            pass
+        except Exception as exception:
+            process_logger.log_failure(exception)
 
-        # get the shard id and get a shard iterator that will be used to read
-        self.shard_id = shards[0]["ShardId"]
+        process_logger.add_metadata(shard_count=len(self.checkpoints))
         process_logger.log_complete()
 
-    def update_shard_iterator(self) -> None:
+    def save_checkpoints(self) -> None:
+        """atomically write shard checkpoints to durable storage"""
+        state = {"stream_name": self.stream_name, "shards": self.checkpoints}
+
+        if self.checkpoint_path.startswith("s3://"):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                local_path = os.path.join(tmp_dir, "checkpoints.json")
+                with open(local_path, "w", encoding="utf8") as file:
+                    json.dump(state, file)
+                if not upload_file(local_path, self.checkpoint_path):
+                    raise RuntimeError(
+                        f"Unable to upload {self.checkpoint_path}"
+                    )
+            return
+
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w", encoding="utf8") as file:
+            json.dump(state, file)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def checkpoint(self, batch: KinesisBatch) -> None:
+        """mark the records of a processed batch as read, and save it"""
+        self.checkpoints.update(batch.sequence_numbers)
+        self.save_checkpoints()
+
+    def list_shards(self) -> List[Dict]:
+        """every shard of the stream"""
+        shards: List[Dict] = []
+        response = self.kinesis_client.list_shards(StreamName=self.stream_name)
+        shards += response["Shards"]
+        while response.get("NextToken"):
+            response = self.kinesis_client.list_shards(
+                NextToken=response["NextToken"]
+            )
+            shards += response["Shards"]
+        return shards
+
+    def readable_shards(self) -> List[str]:
         """
-        Access the shard iterator for the first shard. If the last sequence
-        number is empty, it implies this is the first read from the shard. In
-        that case, get the Trim Horizon iterator which is the oldest one in the
-        shard. Otherwise, get the next iterator after the last sequence number.
+        ids of the shards to read, skipping shards read to their end and
+        shards whose parent has not been read to its end. checkpoints of
+        shards that have expired from the stream are dropped.
         """
-        process_logger = ProcessLogger(
-            process_name="update_shard_iterator", stream_name=self.stream_name
-        )
-        process_logger.log_start()
+        shards = self.list_shards()
+        shard_ids = {shard["ShardId"] for shard in shards}
+        self.checkpoints = {
+            shard_id: sequence_number
+            for shard_id, sequence_number in self.checkpoints.items()
+            if shard_id in shard_ids
+        }
 
-        if self.shard_id is None:
-            self.update_shard_id()
+        readable = []
+        for shard in shards:
+            if self.checkpoints.get(shard["ShardId"]) == SHARD_END:
+                continue
+            parents = [
+                shard[key]
+                for key in ("ParentShardId", "AdjacentParentShardId")
+                if shard.get(key) in shard_ids
+            ]
+            if all(self.checkpoints.get(p) == SHARD_END for p in parents):
+                readable.append(shard["ShardId"])
+        return readable
 
-        if self.last_sequence_number is None:
-            # get the oldest iterator at the Trim Horizon if we don't have a sequence number
-            process_logger.add_metadata(iterator_type="trim_horizon")
-            shard_iterator_response = self.kinesis_client.get_shard_iterator(
+    def get_shard_iterator(self, shard_id: str) -> Optional[str]:
+        """
+        iterator after the checkpoint of a shard, or at the trim horizon if
+        the shard has no checkpoint
+        """
+        sequence_number = self.checkpoints.get(shard_id)
+        if sequence_number is None:
+            response = self.kinesis_client.get_shard_iterator(
                 StreamName=self.stream_name,
-                ShardId=self.shard_id,
+                ShardId=shard_id,
                 ShardIteratorType="TRIM_HORIZON",
             )
         else:
-            # get the iterator after the last sequence number if we have one
-            process_logger.add_metadata(iterator_type="after_sequence_number")
-
-            shard_iterator_response = self.kinesis_client.get_shard_iterator(
+            response = self.kinesis_client.get_shard_iterator(
                 StreamName=self.stream_name,
-                ShardId=self.shard_id,
+                ShardId=shard_id,
                 ShardIteratorType="AFTER_SEQUENCE_NUMBER",
-                StartingSequenceNumber=self.last_sequence_number,
+                StartingSequenceNumber=sequence_number,
             )
+        return response["ShardIterator"]
 
-        self.shard_iterator = shard_iterator_response["ShardIterator"]
-        process_logger.log_complete()
+    def read_shard(self, shard_id: str) -> Tuple[List[Dict], bool]:
+        """
+        read the next records of a shard, regenerating its iterator from the
+        checkpoint if it has expired
+
+        :return raw records read, and if the shard is caught up or closed
+        """
+        if shard_id not in self.shard_iterators:
+            self.shard_iterators[shard_id] = self.get_shard_iterator(shard_id)
 
-    def get_records(self) -> List[Dict]:
+        try:
+            response = self.kinesis_client.get_records(
+                ShardIterator=self.shard_iterators[shard_id],
+                Limit=self.settings.batch_max_records,
+            )
+        # thrown if the shard iterator has expired. catch it and regenerate
+        # a new shard iterator.
+        except self.kinesis_client.exceptions.ExpiredIteratorException:
+            self.shard_iterators[shard_id] = self.get_shard_iterator(shard_id)
+            return [], False
+
+        # closed shards have no next iterator once read to their end
+        self.shard_iterators[shard_id] = response.get("NextShardIterator")
+        caught_up = (
+            self.shard_iterators[shard_id] is None
+            or response.get("MillisBehindLatest", 0) == 0
+        )
+        return response["Records"], caught_up
+
+    def read_batches(self) -> Iterator[KinesisBatch]:
         """
-        Use a shard iterator to read records. The response contains both the
-        records that can be processed and the next shard iterator to use for the
-        next read.
+        read batches of raw records from every readable shard, until all
+        shards are caught up or max_batches_per_loop batches have been read.
+        shards that have records handed to the consumer but not checkpointed
+        are read again from their checkpoints.
         """
         process_logger = ProcessLogger(
-            process_name="kinesis.get_records", stream_name=self.stream_name
+            process_name="kinesis.read_batches", stream_name=self.stream_name
         )
         process_logger.log_start()
 
-        all_records = []
+        for shard_id, sequence_number in list(self.read_positions.items()):
+            if self.checkpoints.get(shard_id) != sequence_number:
+                self.shard_iterators.pop(shard_id, None)
+                self.read_positions.pop(shard_id)
 
-        try:
+        shard_ids = self.readable_shards()
+        batch_count = 0
+        record_count = 0
 
-            if self.shard_iterator is None:
-                self.update_shard_iterator()
+        with ThreadPoolExecutor(
+            max_workers=max(min(len(shard_ids), self.settings.read_threads), 1)
+        ) as executor:
+            while (
+                shard_ids and batch_count < self.settings.max_batches_per_loop
+            ):
+                reads = list(
+                    zip(shard_ids, executor.map(self.read_shard, shard_ids))
+                )
 
-            shard_count = 0
+                batches = [KinesisBatch()]
+                for shard_id, (records, _) in reads:
+                    for record in records:
+                        if (
+                            len(batches[-1].payloads)
+                            == self.settings.batch_max_records
+                        ):
+                            batches.append(KinesisBatch())
+                        batches[-1].payloads.append(record["Data"])
+                        batches[-1].sequence_numbers[shard_id] = record[
+                            "SequenceNumber"
+                        ]
+                        self.read_positions[shard_id] = record["SequenceNumber"]
 
-            while True:
-                try:
-                    response = self.kinesis_client.get_records(
-                        ShardIterator=self.shard_iterator
-                    )
-                    shard_count += 1
-                    self.shard_iterator = response["NextShardIterator"]
-                    records = response["Records"]
+                # shards read to their end are finished with the last batch
+                for shard_id, _ in reads:
+                    if self.shard_iterators.get(shard_id, "") is None:
+                        batches[-1].sequence_numbers[shard_id] = SHARD_END
+                        self.read_positions[shard_id] = SHARD_END
 
-                    for record in records:
-                        self.last_sequence_number = record["SequenceNumber"]
-                        all_records.append(json.loads(record["Data"]))
+                for batch in batches:
+                    if not batch.sequence_numbers:
+                        continue
+                    batch_count += 1
+                    record_count += len(batch.payloads)
+                    yield batch
 
-                    if response["MillisBehindLatest"] == 0:
-                        break
+                if all(caught_up for _, (_, caught_up) in reads):
+                    break
+                shard_ids = [
+                    shard_id
+                    for shard_id, _ in reads
+                    if self.shard_iterators.get(shard_id) is not None
+                ]
 
-                # thrown if the shard iterator has expired. catch it and regenerate
-                # a new shard iterator.
-                except self.kinesis_client.exceptions.ExpiredIteratorException:
-                    self.update_shard_iterator()
+        process_logger.add_metadata(
+            batch_count=batch_count, record_count=record_count
+        )
+        process_logger.log_complete()
+
+
+class LocalKinesisStream:
+    """
+    In process stand in for a Kinesis Stream, with the parts of the boto3
+    kinesis client used by the KinesisReader. Records are put to shards by
+    the md5 hash of their partition key.
+    """
+
+    # pylint: disable=C0103
+    # disable invalid names, matching those of a boto3 kinesis client
+    class exceptions:
+        """exceptions raised like those of a boto3 kinesis client"""
+
+        class ExpiredIteratorException(Exception):
+            """raised for iterators of a previous call to expire_iterators"""
+
+    # pylint: enable=C0103
 
-            process_logger.add_metadata(
-                record_count=len(all_records), shard_count=shard_count
+    def __init__(self, shard_count: int = 1) -> None:
+        self.shards: Dict[str, List[Dict]] = {
+            f"shardId-{shard:012d}": [] for shard in range(shard_count)
+        }
+        self.sequence_number = 0
+        self.iterator_generation = 0
+
+    def put_record(self, data: Dict, partition_key: str) -> str:
+        """put a json record to the stream, returning its sequence number"""
+        shard_ids = sorted(self.shards)
+        key_hash = int(hashlib.md5(partition_key.encode()).hexdigest(), 16)
+        shard_id = shard_ids[key_hash % len(shard_ids)]
+
+        self.sequence_number += 1
+        sequence_number = f"{self.sequence_number:056d}"
+        self.shards[shard_id].append(
+            {
+                "SequenceNumber": sequence_number,
+                "Data": json.dumps(data).encode(),
+                "PartitionKey": partition_key,
+            }
+        )
+        return sequence_number
+
+    def expire_iterators(self) -> None:
+        """expire every shard iterator handed out so far"""
+        self.iterator_generation += 1
+
+    # pylint: disable=C0103,W0613
+    # disable boto3 argument names and unused arguments
+    def list_shards(
+        self, StreamName: Optional[str] = None, NextToken: Optional[str] = None
+    ) -> Dict:
+        """shards of the stream, like kinesis ListShards"""
+        return {
+            "Shards": [
+                {"ShardId": shard_id} for shard_id in sorted(self.shards)
+            ]
+        }
+
+    def get_shard_iterator(
+        self,
+        StreamName: str,
+        ShardId: str,
+        ShardIteratorType: str,
+        StartingSequenceNumber: Optional[str] = None,
+    ) -> Dict:
+        """iterator of a shard, like kinesis GetShardIterator"""
+        position = 0
+        if ShardIteratorType == "AFTER_SEQUENCE_NUMBER":
+            assert StartingSequenceNumber is not None
+            position = sum(
+                1
+                for record in self.shards[ShardId]
+                if int(record["SequenceNumber"]) <= int(StartingSequenceNumber)
             )
-        except Exception as e:
-            process_logger.log_failure(e)
+        return {
+            "ShardIterator": f"{self.iterator_generation}/{ShardId}/{position}"
+        }
 
-        process_logger.log_complete()
+    def get_records(self, ShardIterator: str, Limit: int = 10000) -> Dict:
+        """next records of a shard, like kinesis GetRecords"""
+        generation, shard_id, position = ShardIterator.split("/")
+        if int(generation) != self.iterator_generation:
+            raise self.exceptions.ExpiredIteratorException(ShardIterator)
+
+        records = self.shards[shard_id][int(position) : int(position) + Limit]
+        next_position = int(position) + len(records)
+        return {
+            "Records": records,
+            "NextShardIterator": f"{generation}/{shard_id}/{next_position}",
+            "MillisBehindLatest": (
+                0 if next_position == len(self.shards[shard_id]) else 1000
+            ),
+        }
 
-        return all_records
+    # pylint: enable=C0103,W0613
@@ -2,9 +2,8 @@ import datetime
 import os
 import re
 import time
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from io import BytesIO
-from threading import current_thread
 from typing import (
     Callable,
     Dict,
@@ -12,6 +11,7 @@ from typing import (
     Iterator,
     List,
     Optional,
+    Tuple,
     Union,
     cast,
 )
@@ -21,6 +21,7 @@ import pandas
 import pyarrow.compute as pc
 import pyarrow.parquet as pq
 import pyarrow.dataset as pd
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from pyarrow import Table, fs
 from pyarrow.util import guid
@@ -28,9 +29,9 @@ from pyarrow.util import guid
 from lamp_py.runtime_utils.process_logger import ProcessLogger
 
 
-def get_s3_client() -> boto3.client:
+def get_s3_client(config: Optional[Config] = None) -> boto3.client:
     """Thin function needed for stubbing tests"""
-    return boto3.client("s3")
+    return boto3.client("s3", config=config)
 
 
 def upload_file(
@@ -321,150 +322,237 @@ def file_list_from_s3_with_details(
         return []
 
 
-def _move_s3_object(filename: str, to_bucket: str) -> Optional[str]:
-    """
-    move a single s3 file to the to_bucket bucket. break the incoming s3 path
-    into parts that are used for copying. each process will have it's own
-    boto session and resource available, from the _init_process_session function
-    to avoid multi-processing issues
+# max number of keys in a single DeleteObjects request
+DELETE_BATCH_SIZE = 1000
 
-    :param filename - expected as 's3://my_bucket/the/path/to/the/file.json
-    :param to_bucket bucket name
 
-    :return - 'None' if exception occured during move, otherwise 'filename'
+def _split_s3_path(filename: str) -> Tuple[str, str]:
     """
-    try:
-        process_logger = ProcessLogger("move_s3_object", filename=filename)
-        process_logger.log_start()
-
-        s3_resource = current_thread().__dict__["boto_s3_resource"]
+    split an s3 path into its bucket and key
 
-        # trim off leading s3://
-        copy_key = filename.replace("s3://", "")
+    :param filename - expected as 's3://my_bucket/the/path/to/the/file.json'
+        or 'my_bucket/the/path/to/the/file.json'
+    """
+    bucket, key = filename.replace("s3://", "").split("/", 1)
+    return (bucket, key)
 
-        # string before first delimiter is the bucket name
-        from_bucket = copy_key.split("/")[0]
 
-        # trim off bucket name
-        copy_key = copy_key.replace(f"{from_bucket}/", "")
+def _copy_s3_object(
+    s3_client: boto3.client, filename: str, to_bucket: str
+) -> Optional[str]:
+    """
+    copy a single s3 object to the to_bucket bucket, retaining its key. this
+    function is executed inside of a thread, so all exceptions are handled
+    internally.
 
-        # json args for cop
-        destination_bucket = s3_resource.Bucket(to_bucket)
-        destination_object = destination_bucket.Object(copy_key)
-        destination_object.copy(
-            {
-                "Bucket": from_bucket,
-                "Key": copy_key,
-            }
+    :return - 'None' if the object was copied, otherwise an error message
+    """
+    try:
+        from_bucket, key = _split_s3_path(filename)
+        s3_client.copy_object(
+            Bucket=to_bucket,
+            Key=key,
+            CopySource={"Bucket": from_bucket, "Key": key},
         )
-
-        # delete the source object
-        source_bucket = s3_resource.Bucket(from_bucket)
-        source_object = source_bucket.Object(copy_key)
-        response = source_object.delete()
-        process_logger.add_metadata(**response)
-
-    except Exception as error:
-        _init_process_session()
-        process_logger.log_failure(error)
         return None
-
-    process_logger.log_complete()
-    return filename
+    except Exception as error:
+        return repr(error)
 
 
-def _init_process_session() -> None:
+def _delete_s3_objects(
+    s3_client: boto3.client, bucket: str, files: List[str]
+) -> Dict[str, Optional[str]]:
     """
-    initialization function for any process in multi processing pool needing to
-    use a boto session object
-
-    this avoids the expensive operation of creating a new session for every unti of work
-    in the pool
+    delete up to DELETE_BATCH_SIZE objects from a bucket in a single
+    DeleteObjects request. this function is executed inside of a thread, so
+    all exceptions are handled internally.
 
-    not totally sure this is the best way to retain the session on process initialization
-    but it seems to work
+    :return - dictionary of filename to 'None' if the object was deleted,
+        otherwise an error message
     """
-    process_data = current_thread()
-    process_data.__dict__["boto_session"] = boto3.session.Session()
-    process_data.__dict__["boto_s3_resource"] = process_data.__dict__[
-        "boto_session"
-    ].resource("s3")
+    try:
+        files_by_key = {
+            _split_s3_path(filename)[1]: filename for filename in files
+        }
+        response = s3_client.delete_objects(
+            Bucket=bucket,
+            Delete={
+                "Objects": [{"Key": key} for key in files_by_key],
+                "Quiet": True,
+            },
+        )
+        results: Dict[str, Optional[str]] = dict.fromkeys(files)
+        for error in response.get("Errors", []):
+            results[files_by_key[error["Key"]]] = (
+                f"{error.get('Code')}: {error.get('Message')}"
+            )
+        return results
+    except Exception as error:
+        return dict.fromkeys(files, repr(error))
 
 
 # pylint: disable=R0914
 # pylint too many local variables (more than 15)
-def move_s3_objects(files: List[str], to_bucket: str) -> List[str]:
+def bulk_move_s3_objects(
+    files: List[str],
+    to_bucket: str,
+    max_attempts: int = 4,
+    backoff_seconds: float = 1.0,
+) -> Dict[str, Optional[str]]:
     """
     Move list of S3 objects to to_bucket bucket, retaining the object path.
 
+    Objects are copied by a pool of threads sharing one s3 client. As copies
+    complete, the copied source objects are deleted with DeleteObjects
+    requests of up to 1000 keys, while the remaining copies keep running.
+    Objects that fail to copy or delete are retried, with an exponential
+    backoff between attempts. Progress is logged as aggregated counts.
+
     :param files: list of s3 filepath uris
-    :param destination: directory or S3 bucket to move to formatted without
+    :param to_bucket: directory or S3 bucket to move to formatted without
         leading 's3://'
+    :param max_attempts: number of times a failing object is tried
+    :param backoff_seconds: wait before the first retry, doubled for every
+        following retry
 
-    :reutrn - list of 3s objects that failed to move
+    :return - dictionary of filename to 'None' if the object was moved,
+        otherwise the error message of its last attempt
     """
     to_bucket = to_bucket.split("/")[0]
 
-    files_to_move = set(files)
-    found_exception = Exception("No exception reported from s3 move pool.")
+    results: Dict[str, Optional[str]] = {}
+    files_to_move = list(dict.fromkeys(files))
 
     # this is the default pool size for a ThreadPoolExecutor as of py3.8
     cpu_count = cast(int, os.cpu_count() if os.cpu_count() is not None else 1)
-    # make sure each pool will have at least 50 files to move
-    files_per_pool = 50
-    # retry attempts on failed file moves
-    retry_count = 3
+    # make sure each thread will have at least 50 files to move
+    files_per_thread = 50
+    pool_size = min(32, cpu_count + 4, max(1, len(files) // files_per_thread))
+    delete_pool_size = 4
 
     process_logger = ProcessLogger(
         "move_s3_objects",
         to_bucket=to_bucket,
         file_count=len(files),
+        pool_size=pool_size,
     )
     process_logger.log_start()
 
-    for retry_attempt in range(retry_count):
-        max_pool_size = max(1, int(len(files_to_move) / files_per_pool))
-        pool_size = min(32, cpu_count + 4, max_pool_size)
-        process_logger.add_metadata(pool_size=pool_size)
-        results = []
-        try:
-            with ThreadPoolExecutor(
-                max_workers=pool_size, initializer=_init_process_session
-            ) as pool:
-                for filename in files_to_move:
-                    results.append(
-                        pool.submit(_move_s3_object, filename, to_bucket)
+    s3_client = get_s3_client(
+        Config(
+            max_pool_connections=pool_size + delete_pool_size,
+            retries={"mode": "standard"},
+        )
+    )
+
+    copy_error_count = 0
+    delete_error_count = 0
+    delete_batch_count = 0
+    retry_attempt = 0
+    for retry_attempt in range(max_attempts):
+        if retry_attempt > 0:
+            time.sleep(backoff_seconds * 2 ** (retry_attempt - 1))
+
+        deletes = []
+        with (
+            ThreadPoolExecutor(max_workers=delete_pool_size) as delete_pool,
+            ThreadPoolExecutor(max_workers=pool_size) as pool,
+        ):
+            copies = {
+                pool.submit(_copy_s3_object, s3_client, filename, to_bucket): (
+                    filename
+                )
+                for filename in files_to_move
+            }
+
+            # start deleting copied objects in batches as copies complete
+            batches: Dict[str, List[str]] = {}
+            for copy in as_completed(copies):
+                filename = copies[copy]
+                results[filename] = copy.result()
+                if results[filename] is not None:
+                    copy_error_count += 1
+                    continue
+
+                from_bucket, _ = _split_s3_path(filename)
+                batch = batches.setdefault(from_bucket, [])
+                batch.append(filename)
+                if len(batch) == DELETE_BATCH_SIZE:
+                    deletes.append(
+                        delete_pool.submit(
+                            _delete_s3_objects, s3_client, from_bucket, batch
+                        )
+                    )
+                    batches[from_bucket] = []
+
+            for from_bucket, batch in batches.items():
+                if len(batch) > 0:
+                    deletes.append(
+                        delete_pool.submit(
+                            _delete_s3_objects, s3_client, from_bucket, batch
+                        )
                     )
-            for result in results:
-                current_result = result.result()
-                if isinstance(current_result, str):
-                    files_to_move.discard(current_result)
 
-        except Exception as exception:
-            found_exception = exception
+        for delete in deletes:
+            delete_results = delete.result()
+            delete_error_count += sum(
+                error is not None for error in delete_results.values()
+            )
+            results.update(delete_results)
+        delete_batch_count += len(deletes)
+
+        files_to_move = [
+            filename
+            for filename in files_to_move
+            if results[filename] is not None
+        ]
 
         # all files moved, exit retry loop
         if len(files_to_move) == 0:
             break
 
-        # wait for gremlins to disappear
-        time.sleep(15)
-
     process_logger.add_metadata(
-        failed_count=len(files_to_move), retry_attempts=retry_attempt
+        moved_count=len(results) - len(files_to_move),
+        failed_count=len(files_to_move),
+        copy_error_count=copy_error_count,
+        delete_error_count=delete_error_count,
+        delete_batch_count=delete_batch_count,
+        retry_attempts=retry_attempt,
     )
 
     if len(files_to_move) == 0:
         process_logger.log_complete()
     else:
-        process_logger.log_failure(exception=found_exception)
+        process_logger.log_failure(
+            exception=Exception(
+                f"{files_to_move[0]} failed to move: "
+                f"{results[files_to_move[0]]}"
+            )
+        )
 
-    return list(files_to_move)
+    return results
 
 
 # pylint: enable=R0914
 
 
+def move_s3_objects(files: List[str], to_bucket: str) -> List[str]:
+    """
+    Move list of S3 objects to to_bucket bucket, retaining the object path.
+
+    :param files: list of s3 filepath uris
+    :param destination: directory or S3 bucket to move to formatted without
+        leading 's3://'
+
+    :reutrn - list of 3s objects that failed to move
+    """
+    return [
+        filename
+        for filename, error in bulk_move_s3_objects(files, to_bucket).items()
+        if error is not None
+    ]
+
+
 # pylint: disable=R0913
 # pylint too many arguments (more than 5)
 def write_parquet_file(
@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import replace
+from datetime import datetime, timezone
+from queue import Queue
+from typing import Dict, List, Optional, Set
+
+import numpy
+import pyarrow.parquet as pq
+
+from lamp_py.benchmarks.ingestion_throughput import local_buckets
+from lamp_py.benchmarks.synthetic_feeds import (
+    FEED_FILENAMES,
+    FeedSettings,
+    write_synthetic_feeds,
+)
+from lamp_py.ingestion.arrival_source import (
+    ArrivalSettings,
+    ArrivalSource,
+    DirectoryWatchSource,
+    LocalEventQueue,
+    PollingSource,
+    S3EventSource,
+    s3_event_record,
+)
+from lamp_py.ingestion.backfill import fetched_at
+from lamp_py.ingestion.converter import ConfigType
+from lamp_py.ingestion.convert_gtfs_rt import (
+    DELTA_PART_PREFIX,
+    GtfsRtConverter,
+)
+from lamp_py.runtime_utils.process_logger import ProcessLogger
+
+DESCRIPTION = """Benchmark ingestion latency of incoming file arrival sources"""
+
+BACKENDS = ["poll", "events", "watch"]
+
+
+def parse_args(args: List[str]) -> argparse.Namespace:
+    """parse args for running this benchmark"""
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument(
+        "--config-type",
+        default=str(ConfigType.RT_VEHICLE_POSITIONS),
+        choices=[str(config_type) for config_type in FEED_FILENAMES],
+        dest="config_type",
+        help="GTFS-RT config type of the synthetic feeds",
+    )
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        default=BACKENDS,
+        choices=BACKENDS,
+        dest="backends",
+        help="arrival sources to benchmark, defaults to all of them",
+    )
+    parser.add_argument(
+        "--snapshots",
+        default=12,
+        type=int,
+        dest="snapshots",
+        help="feed snapshots arriving during each run",
+    )
+    parser.add_argument(
+        "--cadence-seconds",
+        default=5,
+        type=int,
+        dest="cadence_seconds",
+        help="seconds between arriving snapshots",
+    )
+    parser.add_argument(
+        "--poll-seconds",
+        default=ArrivalSettings.poll_seconds,
+        type=float,
+        dest="poll_seconds",
+        help="seconds between listings of the poll source",
+    )
+    parser.add_argument(
+        "--batch-max-age-seconds",
+        default=ArrivalSettings.batch_max_age_seconds,
+        type=float,
+        dest="batch_max_age_seconds",
+        help="age of the oldest file of a batch before it is converted",
+    )
+
+    return parser.parse_args(args)
+
+
+def release_feeds(
+    staged_files: List[str],
+    staging: str,
+    incoming: str,
+    event_queue: Optional[LocalEventQueue],
+) -> None:
+    """
+    move staged feed files into the incoming folder at the time they were
+    named as fetched at, sending an S3 event for each if event_queue is set
+    """
+    for staged_file in staged_files:
+        release_at = fetched_at(staged_file)
+        assert release_at is not None
+        time.sleep(max(release_at.timestamp() - time.time(), 0))
+
+        key = os.path.relpath(staged_file, staging)
+        os.makedirs(os.path.dirname(os.path.join(incoming, key)), exist_ok=True)
+        os.replace(staged_file, os.path.join(incoming, key))
+        # arrive now, instead of when the feed was staged
+        os.utime(os.path.join(incoming, key))
+        if event_queue is not None:
+            event_queue.send(
+                s3_event_record(
+                    "incoming",
+                    key,
+                    datetime.now(timezone.utc).isoformat(),
+                )
+            )
+
+
+def incoming_files(incoming: str) -> List[str]:
+    """every file waiting in the local incoming folder"""
+    return sorted(
+        os.path.join(root, filename)
+        for root, _, filenames in os.walk(incoming)
+        for filename in filenames
+    )
+
+
+def arrival_source(
+    backend: str,
+    incoming: str,
+    settings: ArrivalSettings,
+    event_queue: LocalEventQueue,
+) -> ArrivalSource:
+    """arrival source of a backend, over the local incoming folder"""
+    if backend == "poll":
+        return PollingSource(lambda: incoming_files(incoming), settings)
+    if backend == "events":
+        return S3EventSource(
+            event_queue,
+            "lamp/",
+            lambda: [
+                os.path.join("s3://incoming", os.path.relpath(path, incoming))
+                for path in incoming_files(incoming)
+            ],
+            settings,
+        )
+    return DirectoryWatchSource(incoming, settings)
+
+
+# pylint: disable=R0914
+# disable too many local variables
+def run_backend(
+    backend: str,
+    config_type: ConfigType,
+    feed_settings: FeedSettings,
+    settings: ArrivalSettings,
+    root: str,
+) -> Dict[str, float]:
+    """
+    release synthetic feeds into a local incoming folder at their feed
+    timestamps, and convert them as the arrival source of a backend hands
+    them over, with local folders standing in for the S3 buckets
+
+    :return dictionary of results, with percentiles of the seconds from
+        each feed timestamp to the first write of its records
+    """
+    staging = os.path.join(root, "staging")
+    incoming = os.path.join(root, "incoming")
+    os.makedirs(incoming)
+
+    # the first snapshot arrives once the converter is set up
+    feed_settings = replace(feed_settings, start_timestamp=int(time.time()) + 2)
+    staged_files = write_synthetic_feeds(config_type, staging, feed_settings)
+
+    event_queue = LocalEventQueue()
+    source = arrival_source(backend, incoming, settings, event_queue)
+    producer = threading.Thread(
+        target=release_feeds,
+        args=(
+            staged_files,
+            staging,
+            incoming,
+            event_queue if backend == "events" else None,
+        ),
+    )
+
+    metadata_queue: Queue[Optional[str]] = Queue()
+    written_at: Dict[int, float] = {}
+    written_parts: Set[str] = set()
+    batch_count = 0
+    with local_buckets(root, incoming):
+        converter = GtfsRtConverter(config_type, metadata_queue)
+        converter.tmp_folder = os.path.join(root, "tmp")
+
+        producer.start()
+        while producer.is_alive() or incoming_files(incoming):
+            files = source.next_batch(timeout=0.5)
+            if not files:
+                continue
+            batch_count += 1
+
+            # event paths are objects of the local incoming bucket
+            converter.files = [
+                filename.replace("s3://incoming", incoming)
+                for filename in files
+            ]
+            converter.convert()
+            source.acknowledge(
+                [
+                    filename.replace(incoming, "s3://incoming")
+                    for filename in converter.moved_files
+                ]
+            )
+
+            # delta parts are written by each convert, and only compacted
+            # once they are minutes old
+            for folder, _, filenames in os.walk(converter.tmp_folder):
+                for filename in filenames:
+                    part_path = os.path.join(folder, filename)
+                    if (
+                        not filename.startswith(DELTA_PART_PREFIX)
+                        or part_path in written_parts
+                    ):
+                        continue
+                    written_parts.add(part_path)
+                    for feed_timestamp in set(
+                        pq.read_table(part_path, columns=["feed_timestamp"])
+                        .column("feed_timestamp")
+                        .to_pylist()
+                    ):
+                        written_at.setdefault(
+                            feed_timestamp, os.path.getmtime(part_path)
+                        )
+
+    latencies = numpy.array(
+        [write_time - ts for ts, write_time in written_at.items()]
+    )
+    results: Dict[str, float] = {
+        "files": len(staged_files),
+        "batches": batch_count,
+        "written_snapshots": len(written_at),
+    }
+    for name, percentile in (("p50", 50), ("p95", 95), ("max", 100)):
+        results[f"{name}_latency_seconds"] = (
+            float(numpy.percentile(latencies, percentile))
+            if len(latencies)
+            else float("nan")
+        )
+    return results
+
+
+# pylint: enable=R0914
+
+
+def run_benchmark(
+    backends: List[str],
+    config_type: ConfigType,
+    feed_settings: FeedSettings,
+    settings: ArrivalSettings,
+) -> Dict[str, Dict[str, float]]:
+    """
+    run each backend on the same synthetic feeds, each in its own local
+    folders
+
+    :return dictionary of results, by backend
+    """
+    results = {}
+    for backend in backends:
+        with tempfile.TemporaryDirectory() as root:
+            results[backend] = run_backend(
+                backend, config_type, feed_settings, settings, root
+            )
+    return results
+
+
+def main(args: argparse.Namespace) -> None:
+    """run the arrival latency benchmark and log the results"""
+    feed_settings = FeedSettings(
+        snapshots=args.snapshots, cadence_seconds=args.cadence_seconds
+    )
+    settings = ArrivalSettings(
+        poll_seconds=args.poll_seconds,
+        batch_max_age_seconds=args.batch_max_age_seconds,
+    )
+
+    results = run_benchmark(
+        args.backends, ConfigType[args.config_type], feed_settings, settings
+    )
+    for backend, result in results.items():
+        process_logger = ProcessLogger(
+            "benchmark_arrival_latency",
+            backend=backend,
+            config_type=args.config_type,
+        )
+        process_logger.log_start()
+        process_logger.add_metadata(**result)
+        process_logger.log_complete()
+
+
+if __name__ == "__main__":
+    main(parse_args(sys.argv[1:]))
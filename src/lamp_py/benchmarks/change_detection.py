@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from queue import Queue
+from typing import Dict, List, Set
+from unittest.mock import patch
+
+import polars as pl
+import pyarrow.parquet as pq
+
+from lamp_py.ingestion.converter import ConfigType
+from lamp_py.ingestion.gtfs_rt_decoder import GZIP_MAGIC
+from lamp_py.ingestion.convert_gtfs_rt import GTFS_RT_DETAILS, GtfsRtConverter
+from lamp_py.ingestion.utils import GTFS_RT_HASH_COL, hash_gtfs_rt_table
+from lamp_py.runtime_utils.process_logger import ProcessLogger
+
+DESCRIPTION = """Benchmark GTFS-RT snapshot change detection"""
+
+
+def parse_args(args: List[str]) -> argparse.Namespace:
+    """parse args for running this benchmark"""
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument(
+        "--path",
+        required=True,
+        dest="path",
+        help="local directory of recorded GTFS-RT feed files",
+    )
+    parser.add_argument(
+        "--snapshots",
+        default=0,
+        type=int,
+        dest="snapshots",
+        help=(
+            "if set, replay each recorded vehicle positions feed as this many "
+            "consecutive 5 second snapshots, moving --change-pct of vehicles "
+            "in each snapshot"
+        ),
+    )
+    parser.add_argument(
+        "--change-pct",
+        default=30.0,
+        type=float,
+        dest="change_pct",
+        help="percent of vehicles that move between replayed snapshots",
+    )
+
+    return parser.parse_args(args)
+
+
+def replay_snapshots(
+    filename: str, snapshots: int, change_pct: float, folder: str
+) -> List[str]:
+    """
+    write consecutive snapshots of a recorded vehicle positions feed, each
+    5 seconds after the last, moving change_pct of its vehicles
+
+    :return list of snapshot file paths
+    """
+    rng = random.Random(1)
+    with open(filename, "rb") as file:
+        raw = file.read()
+    feed = json.loads(gzip.decompress(raw) if raw[:2] == GZIP_MAGIC else raw)
+
+    name = os.path.basename(filename).split("_", maxsplit=1)[1]
+    paths = []
+    for index in range(snapshots):
+        feed["header"]["timestamp"] += 5
+        for entity in feed["entity"]:
+            position = entity.get("vehicle", {}).get("position")
+            if position is not None and rng.random() * 100 < change_pct:
+                position["latitude"] += 0.0001
+                entity["vehicle"]["timestamp"] = feed["header"]["timestamp"]
+
+        path = os.path.join(folder, f"{index:06}_{name}")
+        with gzip.open(path, "wt") as file:
+            json.dump(feed, file)
+        paths.append(path)
+
+    return paths
+
+
+def convert_and_write(converter: GtfsRtConverter, folder: str) -> Set[int]:
+    """
+    convert files of converter, writing each table the way delta parts are
+    written: hashed, de-duplicated, sorted and committed to the change filter
+
+    :return record hashes of every written record
+    """
+    hashes: Set[int] = set()
+    for table in converter.process_files():
+        partition_dt = converter.partition_dt(table)
+        table = hash_gtfs_rt_table(table.drop_columns(["year", "month", "day"]))
+        unique = pl.DataFrame(table.select([GTFS_RT_HASH_COL]))
+        table = table.take(
+            unique.with_row_index()
+            .unique(subset=[GTFS_RT_HASH_COL], keep="first")
+            .get_column("index")
+            .sort()
+            .to_arrow()
+        )
+        if converter.detail.write_profile.sort_order is not None:
+            table = table.sort_by(converter.detail.write_profile.sort_order)
+        pq.write_table(table, os.path.join(folder, "part.parquet"))
+        hashes.update(table.column(GTFS_RT_HASH_COL).to_pylist())
+        if converter.data_parts.change_filter is not None:
+            converter.data_parts.change_filter.commit(partition_dt, table)
+    return hashes
+
+
+def run_benchmark(
+    files: List[str], snapshots: int, change_pct: float
+) -> Dict[str, float]:
+    """
+    convert and write every group of files with change detection switched
+    off and on, verifying that both write the same unique records
+
+    :return dictionary of benchmark results
+    """
+    results: Dict[str, float] = {"decoded_rows": 0, "kept_rows": 0}
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        file_groups: Dict[ConfigType, List[str]] = {}
+        for filename in sorted(files):
+            try:
+                config_type = ConfigType.from_filename(filename)
+            except Exception:
+                continue
+            if config_type not in GTFS_RT_DETAILS:
+                continue
+            if snapshots > 0:
+                if "VehiclePositions" not in filename:
+                    continue
+                file_groups.setdefault(config_type, []).extend(
+                    replay_snapshots(filename, snapshots, change_pct, temp_dir)
+                )
+            else:
+                file_groups.setdefault(config_type, []).append(filename)
+
+        for config_type, file_group in file_groups.items():
+            hashes = []
+            for setting in ("false", "true"):
+                with patch.dict(
+                    os.environ, {"GTFS_RT_CHANGE_DETECTION": setting}
+                ):
+                    converter = GtfsRtConverter(config_type, Queue())
+                converter.add_files(file_group)
+
+                start = time.monotonic()
+                hashes.append(convert_and_write(converter, temp_dir))
+                key = f"change_detection_{setting}_seconds"
+                results[key] = results.get(key, 0.0) + time.monotonic() - start
+
+            assert hashes[0] == hashes[1], f"record mismatch for {config_type}"
+
+            change_filter = converter.data_parts.change_filter
+            assert change_filter is not None
+            results["decoded_rows"] += change_filter.input_rows
+            results["kept_rows"] += (
+                change_filter.input_rows - change_filter.unchanged_rows
+            )
+
+    results["row_reduction_pct"] = 100 * (
+        1 - results["kept_rows"] / max(results["decoded_rows"], 1)
+    )
+
+    return results
+
+
+def main(args: argparse.Namespace) -> None:
+    """run the change detection benchmark and log the results"""
+    process_logger = ProcessLogger("benchmark_change_detection", **vars(args))
+    process_logger.log_start()
+
+    files = [
+        os.path.join(args.path, filename) for filename in os.listdir(args.path)
+    ]
+    process_logger.add_metadata(
+        **run_benchmark(files, args.snapshots, args.change_pct)
+    )
+    process_logger.log_complete()
+
+
+if __name__ == "__main__":
+    main(parse_args(sys.argv[1:]))
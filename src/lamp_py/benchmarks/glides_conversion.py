@@ -0,0 +1,338 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from unittest.mock import patch
+
+import pyarrow
+
+from lamp_py.aws.kinesis import KinesisReader, KinesisSettings
+from lamp_py.ingestion.glides import (
+    EditorChanges,
+    GlidesConverter,
+    OperatorSignIns,
+    TripUpdates,
+    route_payloads,
+)
+from lamp_py.runtime_utils.process_logger import ProcessLogger
+
+DESCRIPTION = """Benchmark columnar Glides event conversion against per record conversion"""
+
+EVENT_TYPES = {
+    "changes": "com.mbta.ctd.glides.editors_changed.v1",
+    "operator": "com.mbta.ctd.glides.operator_signed_in.v1",
+    "tripUpdates": "com.mbta.ctd.glides.trips_updated.v1",
+}
+
+
+def parse_args(args: List[str]) -> argparse.Namespace:
+    """parse args for running this benchmark"""
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument(
+        "--events-file",
+        default=None,
+        dest="events_file",
+        help="file of recorded glides kinesis payloads, one json event per line",
+    )
+    parser.add_argument(
+        "--stream",
+        default=None,
+        dest="stream",
+        help="kinesis stream to replay glides events from, like ctd-glides-prod, read from its trim horizon without touching its checkpoints",
+    )
+    parser.add_argument(
+        "--events",
+        default=20_000,
+        type=int,
+        dest="events",
+        help="synthetic events to generate, or most events to replay from --stream. synthetic events are used if neither --events-file nor --stream are set",
+    )
+    parser.add_argument(
+        "--batch-size",
+        default=1000,
+        type=int,
+        dest="batch_size",
+        help="events in each micro-batch, like KINESIS_BATCH_MAX_RECORDS",
+    )
+
+    return parser.parse_args(args)
+
+
+def synthetic_glides_events(count: int, seed: int = 0) -> List[bytes]:
+    """
+    generate raw kinesis payloads of editor change, operator sign in and trip
+    update events, with trip updates holding the loosely structured "cars",
+    "dropped" and "scheduled" objects
+    """
+    rng = random.Random(seed)
+    start = datetime(2024, 4, 1, tzinfo=timezone.utc)
+
+    def location() -> Dict:
+        stop = rng.choice(["alfcl", "harsq", "pktrm", "jfk", "brntn"])
+        return {"gtfsId": f"place-{stop}", "todsId": str(rng.randint(1, 99))}
+
+    def user() -> Dict:
+        badge = str(rng.randint(1000, 9999))
+        return {"emailAddress": f"{badge}@mbta.com", "badgeNumber": badge}
+
+    def trip_key() -> Dict:
+        return {
+            "serviceDate": "2024-04-01",
+            "startLocation": location(),
+            "endLocation": location(),
+            "startTime": f"{rng.randint(5, 23):02d}:{rng.randint(0, 59):02d}",
+            "endTime": f"{rng.randint(5, 23):02d}:{rng.randint(0, 59):02d}",
+            "revenue": rng.choice(["revenue", "nonrevenue"]),
+            "glidesId": str(rng.randint(0, 10**6)),
+        }
+
+    def trip_update() -> Dict:
+        update: Dict = {
+            "previousTripKey": trip_key(),
+            "type": rng.choice(["changed", "added", "dropped"]),
+            "tripKey": trip_key(),
+            "startTime": rng.choice(["unset", "08:15"]),
+            "endTime": rng.choice(["unset", "08:45"]),
+        }
+        if rng.random() < 0.7:
+            update["cars"] = [
+                {"label": str(rng.randint(3600, 3900)), "operator": user()}
+                for _ in range(rng.randint(1, 3))
+            ]
+        if rng.random() < 0.3:
+            update["dropped"] = {"reason": rng.choice(["crew", "equipment"])}
+        if rng.random() < 0.5:
+            update["scheduled"] = {
+                "trips": [
+                    {"tripId": str(rng.randint(0, 10**8)), "car": index}
+                    for index in range(rng.randint(1, 2))
+                ]
+            }
+        if rng.random() < 0.2:
+            update["comment"] = "late pull out"
+        return update
+
+    payloads = []
+    for index in range(count):
+        time_at = start + timedelta(
+            seconds=index, milliseconds=rng.randint(0, 999)
+        )
+        key = rng.choice(list(EVENT_TYPES))
+        data: Dict = {
+            "metadata": {
+                "location": location(),
+                "author": user(),
+                "inputType": "manual",
+                "inputTimestamp": time_at.isoformat(),
+            }
+        }
+        if key == "changes":
+            data["changes"] = [
+                {
+                    "type": rng.choice(["start", "stop"]),
+                    "location": location(),
+                    "editor": user(),
+                }
+                for _ in range(rng.randint(1, 3))
+            ]
+        elif key == "operator":
+            data["operator"] = {"badgeNumber": str(rng.randint(1000, 9999))}
+            data["signedInAt"] = time_at.isoformat()
+            data["signature"] = {"type": "text", "version": 1}
+        else:
+            data["tripUpdates"] = [
+                trip_update() for _ in range(rng.randint(1, 4))
+            ]
+
+        payloads.append(
+            json.dumps(
+                {
+                    "data": data,
+                    "id": f"{index}",
+                    "type": EVENT_TYPES[key],
+                    "time": time_at.isoformat(timespec="milliseconds").replace(
+                        "+00:00", "Z"
+                    ),
+                    "source": "glides",
+                    "specversion": "1.0",
+                    "dataschema": "https://mbta.github.io/schemas/events/glides",
+                }
+            ).encode()
+        )
+    return payloads
+
+
+def legacy_convert(
+    converter: GlidesConverter, records: List[Dict]
+) -> pyarrow.Table:
+    """
+    legacy conversion, rewriting every record in python with str() on the
+    json string fields, then Table.from_pylist and flattening
+    """
+    for record in records:
+        record["time"] = datetime.fromisoformat(
+            record["time"].replace("Z", "+00:00")
+        )
+        for update in record["data"].get(converter.unique_key) or []:
+            for key in converter.json_string_fields:
+                try:
+                    update[key] = str(update[key])
+                except KeyError:
+                    pass
+
+    return converter.flatten_events(
+        pyarrow.Table.from_pylist(records, schema=converter.event_schema)
+    )
+
+
+# pylint: disable=R0914
+# disable too many local variables
+def run_benchmark(payloads: List[bytes], batch_size: int) -> Dict[str, float]:
+    """
+    convert payloads in micro-batches with the legacy per record conversion,
+    the per record fallback of the converters and the columnar conversion,
+    verifying that the legacy, columnar and fallback tables are identical
+
+    :return dictionary of benchmark results
+    """
+    results: Dict[str, float] = {
+        "events": len(payloads),
+        "rows": 0,
+        "legacy_seconds": 0.0,
+        "per_record_seconds": 0.0,
+        "columnar_seconds": 0.0,
+    }
+
+    # converters only read the bucket name until records are appended
+    with patch.dict(
+        os.environ,
+        {"SPRINGBOARD_BUCKET": os.environ.get("SPRINGBOARD_BUCKET", "local")},
+    ):
+        converters = [EditorChanges(), OperatorSignIns(), TripUpdates()]
+
+    for offset in range(0, len(payloads), batch_size):
+        batch = payloads[offset : offset + batch_size]
+
+        start = time.perf_counter()
+        records = [json.loads(payload) for payload in batch]
+        legacy = [
+            legacy_convert(
+                converter,
+                [
+                    record
+                    for record in records
+                    if record["data"].get(converter.unique_key) is not None
+                ],
+            )
+            for converter in converters
+        ]
+        results["legacy_seconds"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        route_payloads(batch, converters)
+        columnar = [converter.decode_payloads() for converter in converters]
+        results["columnar_seconds"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        per_record = [converter.decode_records() for converter in converters]
+        results["per_record_seconds"] += time.perf_counter() - start
+
+        for converter, legacy_table, columnar_table, per_record_table in zip(
+            converters, legacy, columnar, per_record
+        ):
+            flat_schema = converter.flat_schema
+            legacy_table, columnar_table, per_record_table = (
+                table.select(flat_schema.names).cast(flat_schema)
+                for table in (legacy_table, columnar_table, per_record_table)
+            )
+            assert columnar_table.equals(
+                per_record_table
+            ), f"{converter.type} tables do not match"
+            assert columnar_table.equals(
+                legacy_table
+            ), f"{converter.type} tables do not match the legacy conversion"
+            results["rows"] += columnar_table.num_rows
+            converter.payloads = []
+
+    for stage in ("legacy", "per_record", "columnar"):
+        seconds = results[f"{stage}_seconds"]
+        results[f"{stage}_events_per_second"] = (
+            len(payloads) / seconds if seconds else 0.0
+        )
+    if results["columnar_seconds"]:
+        results["speedup"] = (
+            results["legacy_seconds"] / results["columnar_seconds"]
+        )
+    return results
+
+
+# pylint: enable=R0914
+
+
+def read_events_file(events_file: str) -> List[bytes]:
+    """recorded kinesis payloads, one json event per line"""
+    with open(events_file, "rb") as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+def replay_stream(
+    stream_name: str, max_events: int, kinesis_client: Optional[Any] = None
+) -> List[bytes]:
+    """
+    raw payloads of up to max_events events of a kinesis stream, read from
+    its trim horizon. checkpoints are kept in a temporary file, so the
+    checkpoints of the ingestion pipeline are not read or changed.
+    """
+    payloads: List[bytes] = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        reader = KinesisReader(
+            stream_name,
+            KinesisSettings(
+                checkpoint_path=os.path.join(temp_dir, "checkpoints.json")
+            ),
+            kinesis_client,
+        )
+        while len(payloads) < max_events:
+            batch_count = 0
+            for batch in reader.read_batches():
+                batch_count += 1
+                payloads += batch.payloads
+                reader.checkpoint(batch)
+                if len(payloads) >= max_events:
+                    break
+            if batch_count == 0:
+                break
+    return payloads[:max_events]
+
+
+def main(args: argparse.Namespace) -> None:
+    """run the glides conversion benchmark and log the results"""
+    process_logger = ProcessLogger(
+        "benchmark_glides_conversion",
+        events_file=args.events_file,
+        stream=args.stream,
+        batch_size=args.batch_size,
+    )
+    process_logger.log_start()
+
+    payloads: Optional[List[bytes]] = None
+    if args.events_file is not None:
+        payloads = read_events_file(args.events_file)
+    elif args.stream is not None:
+        payloads = replay_stream(args.stream, args.events)
+    else:
+        payloads = synthetic_glides_events(args.events)
+
+    process_logger.add_metadata(**run_benchmark(payloads, args.batch_size))
+    process_logger.log_complete()
+
+
+if __name__ == "__main__":
+    main(parse_args(sys.argv[1:]))
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import os
+import sys
+import time
+from queue import Queue
+from typing import Dict, List
+
+import pyarrow
+from pyarrow import fs
+
+from lamp_py.ingestion.converter import ConfigType
+from lamp_py.ingestion.convert_gtfs_rt import GtfsRtConverter
+from lamp_py.ingestion.gtfs_rt_decoder import append_timestamp_columns
+from lamp_py.runtime_utils.process_logger import ProcessLogger
+
+DESCRIPTION = """Benchmark GTFS-RT JSON feed decoding implementations"""
+
+
+def parse_args(args: List[str]) -> argparse.Namespace:
+    """parse args for running this benchmark"""
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument(
+        "--path",
+        required=True,
+        dest="path",
+        help="local directory of recorded GTFS-RT feed files",
+    )
+    parser.add_argument(
+        "--repeat",
+        default=5,
+        type=int,
+        dest="repeat",
+        help="number of times to decode each file",
+    )
+
+    return parser.parse_args(args)
+
+
+def legacy_decode_file(
+    file_system: fs.FileSystem, filename: str, schema: pyarrow.Schema
+) -> pyarrow.Table:
+    """legacy json.load and Table.from_pylist decoding of a feed file"""
+    try:
+        with file_system.open_input_stream(filename) as file:
+            json_data = json.load(file)
+    except UnicodeDecodeError:
+        with file_system.open_input_stream(
+            filename, compression="gzip"
+        ) as file:
+            json_data = json.load(file)
+
+    table = pyarrow.Table.from_pylist(json_data["entity"], schema=schema)
+    _, table = append_timestamp_columns(table, json_data["header"]["timestamp"])
+
+    return table
+
+
+def run_benchmark(files: List[str], repeat: int) -> Dict[str, float]:
+    """
+    decode every file with the legacy and schema driven decoders, verifying
+    that both produce identical tables
+
+    :return dictionary of benchmark results
+    """
+    file_system = fs.LocalFileSystem()
+    results: Dict[str, float] = {
+        "file_count": 0,
+        "rows": 0,
+        "legacy_seconds": 0.0,
+        "decoder_seconds": 0.0,
+    }
+
+    for filename in files:
+        try:
+            config_type = ConfigType.from_filename(filename)
+            converter = GtfsRtConverter(config_type, Queue())
+        except Exception:
+            continue
+
+        results["file_count"] += 1
+
+        for _ in range(repeat):
+            start = time.monotonic()
+            legacy = legacy_decode_file(
+                file_system, filename, converter.detail.import_schema
+            )
+            results["legacy_seconds"] += time.monotonic() - start
+
+            start = time.monotonic()
+            _, table = converter.decoder.decode_file(file_system, filename)
+            results["decoder_seconds"] += time.monotonic() - start
+
+        assert table.equals(legacy), f"decoder mismatch for {filename}"
+        results["rows"] += table.num_rows * repeat
+
+    results["legacy_rows_per_sec"] = results["rows"] / max(
+        results["legacy_seconds"], 1e-9
+    )
+    results["decoder_rows_per_sec"] = results["rows"] / max(
+        results["decoder_seconds"], 1e-9
+    )
+    results["speedup"] = results["legacy_seconds"] / max(
+        results["decoder_seconds"], 1e-9
+    )
+
+    return results
+
+
+def main(args: argparse.Namespace) -> None:
+    """run the gtfs-rt decode benchmark and log the results"""
+    process_logger = ProcessLogger("benchmark_gtfs_rt_decode", **vars(args))
+    process_logger.log_start()
+
+    files = sorted(
+        os.path.join(args.path, filename) for filename in os.listdir(args.path)
+    )
+
+    process_logger.add_metadata(**run_benchmark(files, args.repeat))
+    process_logger.log_complete()
+
+
+if __name__ == "__main__":
+    main(parse_args(sys.argv[1:]))
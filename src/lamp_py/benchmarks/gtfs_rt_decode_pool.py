@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+import argparse
+import os
+import sys
+import time
+from queue import Queue
+from typing import Dict, List
+from unittest.mock import patch
+
+from lamp_py.ingestion.converter import ConfigType
+from lamp_py.ingestion.convert_gtfs_rt import GtfsRtConverter
+from lamp_py.runtime_utils.process_logger import ProcessLogger
+
+DESCRIPTION = """Benchmark GTFS-RT thread and process pool decode modes"""
+
+
+def parse_args(args: List[str]) -> argparse.Namespace:
+    """parse args for running this benchmark"""
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument(
+        "--path",
+        required=True,
+        dest="path",
+        help="local directory of recorded GTFS-RT feed files",
+    )
+    parser.add_argument(
+        "--processes",
+        default="0,2,auto",
+        dest="processes",
+        help="comma separated GTFS_RT_DECODE_PROCESSES values to benchmark",
+    )
+
+    return parser.parse_args(args)
+
+
+def run_benchmark(files: List[str], processes: List[str]) -> Dict[str, float]:
+    """
+    convert every group of files with each decode mode, verifying that each
+    mode produces the same number of rows
+
+    :return dictionary of benchmark results
+    """
+    results: Dict[str, float] = {"file_count": 0}
+
+    file_groups: Dict[ConfigType, List[str]] = {}
+    for filename in files:
+        try:
+            config_type = ConfigType.from_filename(filename)
+            GtfsRtConverter(config_type, Queue())
+        except Exception:
+            continue
+        file_groups.setdefault(config_type, []).append(filename)
+
+    for config_type, file_group in file_groups.items():
+        results["file_count"] += len(file_group)
+        row_counts = set()
+        for decode_processes in processes:
+            converter = GtfsRtConverter(config_type, Queue())
+            converter.add_files(file_group)
+
+            with patch.dict(
+                os.environ, {"GTFS_RT_DECODE_PROCESSES": decode_processes}
+            ):
+                start = time.monotonic()
+                rows = sum(t.num_rows for t in converter.process_files())
+                duration = time.monotonic() - start
+
+            row_counts.add(rows)
+            key = f"processes_{decode_processes}_seconds"
+            results[key] = results.get(key, 0.0) + duration
+
+        assert len(row_counts) == 1, f"row count mismatch for {config_type}"
+
+    for decode_processes in processes:
+        results[f"processes_{decode_processes}_files_per_sec"] = results[
+            "file_count"
+        ] / max(results.get(f"processes_{decode_processes}_seconds", 0), 1e-9)
+
+    return results
+
+
+def main(args: argparse.Namespace) -> None:
+    """run the gtfs-rt decode pool benchmark and log the results"""
+    process_logger = ProcessLogger(
+        "benchmark_gtfs_rt_decode_pool", **vars(args)
+    )
+    process_logger.log_start()
+
+    files = sorted(
+        os.path.join(args.path, filename) for filename in os.listdir(args.path)
+    )
+
+    process_logger.add_metadata(
+        **run_benchmark(files, args.processes.split(","))
+    )
+    process_logger.log_complete()
+
+
+if __name__ == "__main__":
+    main(parse_args(sys.argv[1:]))
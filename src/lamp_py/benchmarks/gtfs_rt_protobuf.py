@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+from queue import Queue
+from typing import Dict, List
+
+import pyarrow
+from pyarrow import fs
+
+from lamp_py.ingestion.converter import ConfigType
+from lamp_py.ingestion.convert_gtfs_rt import GTFS_RT_DETAILS, GtfsRtConverter
+from lamp_py.ingestion.gtfs_rt_decoder import GZIP_MAGIC
+from lamp_py.ingestion.gtfs_rt_protobuf import encode_feed
+from lamp_py.runtime_utils.process_logger import ProcessLogger
+
+DESCRIPTION = """Benchmark GTFS-RT protobuf feed decoding against JSON"""
+
+
+def parse_args(args: List[str]) -> argparse.Namespace:
+    """parse args for running this benchmark"""
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument(
+        "--path",
+        required=True,
+        dest="path",
+        help="local directory of recorded GTFS-RT JSON feed files",
+    )
+    parser.add_argument(
+        "--repeat",
+        default=5,
+        type=int,
+        dest="repeat",
+        help="number of times to decode each file",
+    )
+
+    return parser.parse_args(args)
+
+
+def float32_flattened(table: pyarrow.Table) -> pyarrow.Table:
+    """
+    flatten struct columns of table and round its double columns to float32,
+    the precision of floats in protobuf feeds
+    """
+    while any(pyarrow.types.is_struct(column.type) for column in table.columns):
+        table = table.flatten()
+    for index, column in enumerate(table.columns):
+        if pyarrow.types.is_float64(column.type):
+            table = table.set_column(
+                index,
+                table.field(index).with_type(pyarrow.float32()),
+                column.cast(pyarrow.float32()),
+            )
+    return table
+
+
+def write_protobuf_feed(filename: str, folder: str) -> str:
+    """
+    encode a recorded JSON feed as a gzipped protobuf feed in folder
+
+    :return path of the protobuf feed
+    """
+    with open(filename, "rb") as file:
+        raw = file.read()
+    feed = json.loads(gzip.decompress(raw) if raw[:2] == GZIP_MAGIC else raw)
+
+    name = os.path.basename(filename).replace("_enhanced", "")
+    path = os.path.join(folder, f"{name.split('.json')[0]}.pb.gz")
+    with open(path, "wb") as file:
+        file.write(gzip.compress(encode_feed(feed)))
+    return path
+
+
+def run_benchmark(files: List[str], repeat: int) -> Dict[str, float]:
+    """
+    decode every recorded JSON feed, and the same feed encoded as protobuf,
+    verifying that both produce the same tables at float32 precision
+
+    :return dictionary of benchmark results
+    """
+    file_system = fs.LocalFileSystem()
+    results: Dict[str, float] = {
+        "file_count": 0,
+        "rows": 0,
+        "json_bytes": 0,
+        "protobuf_bytes": 0,
+        "json_seconds": 0.0,
+        "protobuf_seconds": 0.0,
+    }
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for filename in files:
+            try:
+                config_type = ConfigType.from_filename(filename)
+            except Exception:
+                continue
+            if config_type not in GTFS_RT_DETAILS:
+                continue
+
+            converter = GtfsRtConverter(config_type, Queue())
+            protobuf_filename = write_protobuf_feed(filename, temp_dir)
+
+            results["file_count"] += 1
+            results["json_bytes"] += os.path.getsize(filename)
+            results["protobuf_bytes"] += os.path.getsize(protobuf_filename)
+
+            for _ in range(repeat):
+                start = time.monotonic()
+                _, json_table = converter.decoder.decode_file(
+                    file_system, filename
+                )
+                results["json_seconds"] += time.monotonic() - start
+
+                start = time.monotonic()
+                _, protobuf_table = converter.decoder.decode_file(
+                    file_system, protobuf_filename
+                )
+                results["protobuf_seconds"] += time.monotonic() - start
+
+            assert float32_flattened(protobuf_table).equals(
+                float32_flattened(json_table)
+            ), f"decoder mismatch for {filename}"
+            results["rows"] += json_table.num_rows * repeat
+
+    for decoder in ("json", "protobuf"):
+        results[f"{decoder}_rows_per_sec"] = results["rows"] / max(
+            results[f"{decoder}_seconds"], 1e-9
+        )
+    results["protobuf_speedup"] = results["json_seconds"] / max(
+        results["protobuf_seconds"], 1e-9
+    )
+    results["protobuf_size_ratio"] = results["protobuf_bytes"] / max(
+        results["json_bytes"], 1
+    )
+
+    return results
+
+
+def main(args: argparse.Namespace) -> None:
+    """run the gtfs-rt protobuf benchmark and log the results"""
+    process_logger = ProcessLogger("benchmark_gtfs_rt_protobuf", **vars(args))
+    process_logger.log_start()
+
+    files = sorted(
+        os.path.join(args.path, filename) for filename in os.listdir(args.path)
+    )
+
+    process_logger.add_metadata(**run_benchmark(files, args.repeat))
+    process_logger.log_complete()
+
+
+if __name__ == "__main__":
+    main(parse_args(sys.argv[1:]))
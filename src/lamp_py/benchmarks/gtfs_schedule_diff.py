@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Dict, List, Tuple
+
+import polars as pl
+import psutil
+import pyarrow.compute as pc
+
+from lamp_py.benchmarks.ingestion_throughput import StageSampler
+from lamp_py.ingestion.compress_gtfs.gtfs_schema_map import (
+    GTFS_RECORD_HASH_COL,
+    gtfs_schema,
+)
+from lamp_py.ingestion.compress_gtfs.gtfs_to_parquet import (
+    frame_parquet_diffs,
+    hash_gtfs_frame,
+)
+from lamp_py.runtime_utils.process_logger import ProcessLogger
+
+DESCRIPTION = """Benchmark record hash schedule diffs against diffs joined on every gtfs table column"""
+
+GTFS_TABLE_FILE = "stop_times.txt"
+ACTIVE_DATE = 20240301
+END_DATE = 20250301
+
+
+def parse_args(args: List[str]) -> argparse.Namespace:
+    """parse args for running this benchmark"""
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument(
+        "--trips",
+        default=100_000,
+        type=int,
+        dest="trips",
+        help="trips of the synthetic stop_times schedules, with 20 stops each",
+    )
+    parser.add_argument(
+        "--changed-fraction",
+        default=0.05,
+        type=float,
+        dest="changed_fraction",
+        help="fraction of trips with new stop times in the new schedule",
+    )
+
+    return parser.parse_args(args)
+
+
+def synthetic_stop_times(trips: int, seed: int = 0) -> pl.DataFrame:
+    """stop_times records of a synthetic schedule, with 20 stops per trip"""
+    rng = random.Random(seed)
+    rows: Dict[str, List[Any]] = {
+        column: [] for column in gtfs_schema(GTFS_TABLE_FILE)
+    }
+    for trip in range(trips):
+        start_minutes = rng.randint(300, 1400)
+        for stop in range(20):
+            minutes = start_minutes + stop * 2
+            stop_time = f"{minutes // 60:02d}:{minutes % 60:02d}:00"
+            rows["trip_id"].append(f"trip-{trip}")
+            rows["arrival_time"].append(stop_time)
+            rows["departure_time"].append(stop_time)
+            rows["stop_id"].append(f"stop-{rng.randint(0, 8000)}")
+            rows["stop_sequence"].append(stop)
+            rows["stop_headsign"].append(None)
+            rows["pickup_type"].append(0)
+            rows["drop_off_type"].append(0)
+            rows["timepoint"].append(rng.randint(0, 1))
+            rows["checkpoint_id"].append(None)
+            rows["continuous_pickup"].append(None)
+            rows["continuous_drop_off"].append(None)
+
+    return pl.DataFrame(rows, schema=gtfs_schema(GTFS_TABLE_FILE))
+
+
+def write_schedules(
+    trips: int, changed_fraction: float, temp_dir: str
+) -> Tuple[str, str, str]:
+    """
+    write a yearly stop_times parquet file of one schedule, with and without
+    record hashes, and the records of a new schedule that changes the stop
+    times of changed_fraction of its trips
+
+    :return paths of the new schedule records, and the yearly parquet files
+        with and without record hashes
+    """
+    yearly = synthetic_stop_times(trips).with_columns(
+        pl.lit(ACTIVE_DATE).alias("gtfs_active_date"),
+        pl.lit(END_DATE).alias("gtfs_end_date"),
+    )
+    changed_trips = int(trips * changed_fraction)
+    new_frame = pl.concat(
+        (
+            yearly.filter(
+                ~pl.col("trip_id").is_in(
+                    [f"trip-{trip}" for trip in range(changed_trips)]
+                )
+            ),
+            synthetic_stop_times(changed_trips, seed=1).with_columns(
+                pl.lit(ACTIVE_DATE + 100).alias("gtfs_active_date"),
+                pl.lit(END_DATE + 100).alias("gtfs_end_date"),
+            ),
+        )
+    ).with_columns(pl.lit(True).cast(pl.Boolean).alias("from_zip"))
+
+    new_path = os.path.join(temp_dir, "new_frame.parquet")
+    legacy_path = os.path.join(temp_dir, "legacy_stop_times.parquet")
+    hash_path = os.path.join(temp_dir, "stop_times.parquet")
+    new_frame.write_parquet(new_path)
+    yearly.write_parquet(legacy_path, use_pyarrow=True, statistics=True)
+    hash_gtfs_frame(yearly, GTFS_TABLE_FILE).write_parquet(
+        hash_path, use_pyarrow=True, statistics=True
+    )
+    return new_path, legacy_path, hash_path
+
+
+def legacy_frame_parquet_diffs(
+    new_frame: pl.DataFrame, pq_path: str, filter_date: int
+) -> Tuple[pl.DataFrame, pl.DataFrame, pl.DataFrame]:
+    """
+    legacy schedule diffs, with an anti join and a left join on every gtfs
+    table column
+    """
+    pq_filter = (pc.field("gtfs_active_date") <= filter_date) & (
+        pc.field("gtfs_end_date") >= filter_date
+    )
+    pq_frame = pl.read_parquet(
+        pq_path, use_pyarrow=True, pyarrow_options={"filters": pq_filter}
+    )
+
+    join_columns = tuple(gtfs_schema(GTFS_TABLE_FILE).keys())
+    new_records = new_frame.join(
+        pq_frame.select(join_columns),
+        how="anti",
+        on=join_columns,
+        join_nulls=True,
+        coalesce=True,
+    ).drop("from_zip")
+    pq_frame = pq_frame.join(
+        new_frame.select(join_columns + ("from_zip",)),
+        how="left",
+        on=join_columns,
+        join_nulls=True,
+        coalesce=True,
+    )
+    same_records = pq_frame.filter(pl.col("from_zip").eq(True)).drop("from_zip")
+    old_records = pq_frame.filter(pl.col("from_zip").is_null()).drop("from_zip")
+
+    return old_records, same_records, new_records
+
+
+def run_diff(method: str, new_path: str, pq_path: str) -> Dict[str, Any]:
+    """
+    diff the new schedule against a yearly parquet file, in a fresh worker
+    process so that the peak memory of each method is measured on its own
+
+    :return dictionary of seconds, peak memory above the memory of the loaded
+        new schedule, and record counts of the diffs
+    """
+    new_frame = pl.read_parquet(new_path)
+    baseline_rss = psutil.Process().memory_info().rss
+
+    sampler = StageSampler()
+    sampler.thread.start()
+    with sampler.measure(method):
+        if method == "record_hash":
+            diffs = frame_parquet_diffs(
+                hash_gtfs_frame(new_frame, GTFS_TABLE_FILE),
+                [pq_path],
+                GTFS_TABLE_FILE,
+                ACTIVE_DATE + 100,
+            )
+        else:
+            diffs = legacy_frame_parquet_diffs(
+                new_frame, pq_path, ACTIVE_DATE + 100
+            )
+    sampler.stopped.set()
+
+    old_records, same_records, new_records = diffs
+    return {
+        "seconds": sampler.seconds[method],
+        "peak_mb": (sampler.peak_rss[method] - baseline_rss) / 1024 / 1024,
+        "old_records": old_records.shape[0],
+        "same_records": same_records.shape[0],
+        "new_records": new_records.shape[0],
+    }
+
+
+def run_benchmark(trips: int, changed_fraction: float) -> Dict[str, Any]:
+    """
+    diff a new synthetic stop_times schedule against a yearly parquet file
+    with joins on every gtfs table column, and with record hash joins
+
+    hashing the new schedule is included in the record hash timing, it
+    happens once per table file when a schedule is compressed
+
+    :return dictionary of benchmark results
+    """
+    results: Dict[str, Any] = {"trips": trips}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        start = time.monotonic()
+        new_path, legacy_path, hash_path = write_schedules(
+            trips, changed_fraction, temp_dir
+        )
+        results["setup_seconds"] = time.monotonic() - start
+
+        for method, pq_path in (
+            ("legacy", legacy_path),
+            ("record_hash", hash_path),
+        ):
+            with ProcessPoolExecutor(
+                max_workers=1, mp_context=get_context("spawn")
+            ) as pool:
+                result = pool.submit(run_diff, method, new_path, pq_path)
+                for key, value in result.result().items():
+                    results[f"{method}_{key}"] = value
+
+    for key in ("old_records", "same_records", "new_records"):
+        assert (
+            results[f"legacy_{key}"] == results[f"record_hash_{key}"]
+        ), f"{key} do not match"
+    results["speedup"] = (
+        results["legacy_seconds"] / results["record_hash_seconds"]
+    )
+    results["hash_column"] = GTFS_RECORD_HASH_COL
+    return results
+
+
+def main(args: argparse.Namespace) -> None:
+    """run the gtfs schedule diff benchmark and log the results"""
+    process_logger = ProcessLogger(
+        "benchmark_gtfs_schedule_diff",
+        changed_fraction=args.changed_fraction,
+    )
+    process_logger.log_start()
+    process_logger.add_metadata(
+        **run_benchmark(args.trips, args.changed_fraction)
+    )
+    process_logger.log_complete()
+
+
+if __name__ == "__main__":
+    main(parse_args(sys.argv[1:]))
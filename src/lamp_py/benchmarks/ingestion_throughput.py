@@ -0,0 +1,405 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict
+from datetime import datetime, timezone
+from queue import Queue
+from typing import Any, Dict, Iterator, List, Optional
+from unittest.mock import patch
+
+import psutil
+import pyarrow
+import pyarrow.parquet as pq
+
+from lamp_py.benchmarks.synthetic_feeds import (
+    FEED_FILENAMES,
+    FeedSettings,
+    write_synthetic_feeds,
+)
+from lamp_py.ingestion.converter import ConfigType
+from lamp_py.ingestion.convert_gtfs_rt import GtfsRtConverter
+from lamp_py.runtime_utils.process_logger import ProcessLogger
+
+DESCRIPTION = """Benchmark GTFS-RT ingestion throughput on synthetic feeds"""
+
+# stages of a converter run, in order
+STAGES = ["generate", "decode", "write", "archive", "compact"]
+
+
+def parse_args(args: List[str]) -> argparse.Namespace:
+    """parse args for running this benchmark"""
+    defaults = FeedSettings()
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument(
+        "--config-types",
+        nargs="+",
+        default=[str(config_type) for config_type in FEED_FILENAMES],
+        choices=[str(config_type) for config_type in FEED_FILENAMES],
+        dest="config_types",
+        help="GTFS-RT config types to benchmark, defaults to all of them",
+    )
+    for name, help_text in (
+        ("vehicles", "vehicles and trips in every snapshot"),
+        ("routes", "bus routes vehicles are spread over"),
+        ("rail_pct", "percent of vehicles on rail routes"),
+        ("stop_time_updates", "predicted stops of every trip update"),
+        ("alerts", "alerts in every alerts snapshot"),
+        ("snapshots", "snapshots written for each config type"),
+        ("cadence_seconds", "seconds between snapshots"),
+        ("change_pct", "percent of vehicles moving between snapshots"),
+    ):
+        parser.add_argument(
+            f"--{name.replace('_', '-')}",
+            default=getattr(defaults, name),
+            type=type(getattr(defaults, name)),
+            dest=name,
+            help=help_text,
+        )
+    parser.add_argument(
+        "--output",
+        default=None,
+        dest="output",
+        help="path of a JSON file to save results to",
+    )
+    parser.add_argument(
+        "--baseline",
+        default=None,
+        dest="baseline",
+        help=(
+            "path of a JSON results file of an earlier run, to report the "
+            "change in throughput against"
+        ),
+    )
+
+    return parser.parse_args(args)
+
+
+class StageSampler:
+    """
+    Samples the resident memory of this process in a background thread,
+    keeping the peak of each stage
+    """
+
+    def __init__(self, interval_seconds: float = 0.02) -> None:
+        self.interval_seconds = interval_seconds
+        self.stage: Optional[str] = None
+        self.peak_rss: Dict[str, int] = {}
+        self.seconds: Dict[str, float] = {}
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+
+    def sample(self) -> None:
+        """record the resident memory of the current stage until stopped"""
+        process = psutil.Process()
+        while not self.stopped.wait(self.interval_seconds):
+            stage = self.stage
+            if stage is not None:
+                self.peak_rss[stage] = max(
+                    self.peak_rss.get(stage, 0), process.memory_info().rss
+                )
+
+    @contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        """time a stage, adding to the time of earlier runs of the stage"""
+        self.stage = stage
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.seconds[stage] = (
+                self.seconds.get(stage, 0.0) + time.monotonic() - start
+            )
+            self.peak_rss[stage] = max(
+                self.peak_rss.get(stage, 0), psutil.Process().memory_info().rss
+            )
+            self.stage = None
+
+
+def dataset_files(folder: str) -> Iterator[str]:
+    """
+    paths of all files under folder, skipping folders that pyarrow datasets
+    ignore, like warm start checkpoints
+    """
+    for root, folders, filenames in os.walk(folder):
+        folders[:] = [name for name in folders if name[0] not in "_."]
+        for filename in filenames:
+            yield os.path.join(root, filename)
+
+
+def folder_bytes(folder: str) -> int:
+    """bytes of all dataset files under folder"""
+    return sum(os.path.getsize(path) for path in dataset_files(folder))
+
+
+def folder_rows(folder: str) -> int:
+    """rows of all parquet dataset files under folder"""
+    return sum(
+        pq.read_metadata(path).num_rows
+        for path in dataset_files(folder)
+        if path.endswith(".parquet")
+    )
+
+
+@contextmanager
+def local_buckets(root: str, incoming: str) -> Iterator[None]:
+    """
+    stand in for S3 buckets with local folders under root, for every S3
+    operation of the GTFS-RT converter. object paths "bucket/key" are stored
+    at root/bucket/key, and incoming files moved to a bucket keep their path
+    relative to the incoming folder.
+    """
+
+    def local_path(object_path: str) -> str:
+        return os.path.join(root, object_path.replace("s3://", ""))
+
+    # user metadata of uploaded objects is kept in files, so that it outlives
+    # the stand ins
+    def metadata_path(object_path: str) -> str:
+        return os.path.join(
+            root, ".metadata", object_path.replace("s3://", "") + ".json"
+        )
+
+    def upload_file(
+        file_name: str, object_path: str, extra_args: Optional[Dict] = None
+    ) -> bool:
+        os.makedirs(os.path.dirname(local_path(object_path)), exist_ok=True)
+        shutil.copyfile(file_name, local_path(object_path))
+
+        os.makedirs(os.path.dirname(metadata_path(object_path)), exist_ok=True)
+        with open(metadata_path(object_path), "w", encoding="utf8") as file:
+            json.dump((extra_args or {}).get("Metadata", {}), file)
+        return True
+
+    def object_metadata(obj: str) -> Dict[str, str]:
+        if not os.path.exists(local_path(obj)):
+            raise FileNotFoundError(f"{obj} not found")
+        if not os.path.exists(metadata_path(obj)):
+            return {}
+        with open(metadata_path(obj), encoding="utf8") as file:
+            return json.load(file)
+
+    def download_file(object_path: str, file_name: str) -> bool:
+        if not os.path.exists(local_path(object_path)):
+            return False
+        shutil.copyfile(local_path(object_path), file_name)
+        return True
+
+    def delete_object(del_obj: str) -> bool:
+        os.remove(local_path(del_obj))
+        return True
+
+    def file_list_from_s3(
+        bucket_name: str, file_prefix: str, max_list_size: int = 250_000
+    ) -> List[str]:
+        folder = os.path.join(root, bucket_name, os.path.dirname(file_prefix))
+        if not os.path.isdir(folder):
+            return []
+        return [
+            f"s3://{os.path.relpath(os.path.join(folder, filename), root)}"
+            for filename in sorted(os.listdir(folder))[:max_list_size]
+        ]
+
+    def move_s3_objects(files: List[str], to_bucket: str) -> List[str]:
+        # like S3 moves, only the bucket of to_bucket is used
+        for filename in files:
+            destination = os.path.join(
+                root,
+                to_bucket.split("/")[0],
+                os.path.relpath(filename, incoming),
+            )
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            shutil.move(filename, destination)
+        return []
+
+    module = "lamp_py.ingestion.convert_gtfs_rt"
+    with (
+        patch.dict(
+            os.environ,
+            {
+                "SPRINGBOARD_BUCKET": "springboard",
+                "ARCHIVE_BUCKET": "archive",
+                "ERROR_BUCKET": "error",
+            },
+        ),
+        patch(f"{module}.upload_file", upload_file),
+        patch(f"{module}.download_file", download_file),
+        patch(f"{module}.delete_object", delete_object),
+        patch(f"{module}.file_list_from_s3", file_list_from_s3),
+        patch(f"{module}.object_metadata", object_metadata),
+        patch(f"{module}.move_s3_objects", move_s3_objects),
+    ):
+        yield
+
+
+# pylint: disable=R0914
+# disable too many local variables
+def run_converter(
+    config_type: ConfigType, settings: FeedSettings, root: str
+) -> Dict[str, Dict[str, float]]:
+    """
+    generate synthetic feeds of a config type into a local incoming folder
+    and convert them end to end, the way GtfsRtConverter.convert does, with
+    local folders standing in for the springboard, archive and error buckets
+
+    :return dictionary of results, by stage
+    """
+    incoming = os.path.join(root, "incoming")
+    springboard = os.path.join(root, "springboard")
+    sampler = StageSampler()
+    sampler.thread.start()
+
+    with sampler.measure("generate"):
+        files = write_synthetic_feeds(config_type, incoming, settings)
+
+    results: Dict[str, Dict[str, float]] = {
+        stage: {"files": len(files)} for stage in STAGES
+    }
+    results["generate"]["output_bytes"] = folder_bytes(incoming)
+
+    with local_buckets(root, incoming):
+        converter = GtfsRtConverter(config_type, Queue())
+        converter.tmp_folder = os.path.join(root, "tmp")
+        converter.add_files(files)
+
+        kept_rows = 0
+        decoded_bytes = 0
+        tables = iter(converter.process_files())
+        while True:
+            with sampler.measure("decode"):
+                table: Optional[pyarrow.Table] = next(tables, None)
+            if table is None:
+                break
+            kept_rows += table.num_rows
+            decoded_bytes += table.nbytes
+
+            with sampler.measure("write"):
+                converter.continuous_pq_update(table)
+
+        # rows of decoded entities, and rows kept after change detection
+        change_filter = converter.data_parts.change_filter
+        results["decode"]["rows"] = (
+            kept_rows if change_filter is None else change_filter.input_rows
+        )
+        results["decode"]["kept_rows"] = kept_rows
+        results["decode"]["output_bytes"] = decoded_bytes
+        results["write"]["rows"] = folder_rows(springboard)
+        results["write"]["output_bytes"] = folder_bytes(springboard)
+
+        with sampler.measure("archive"):
+            converter.move_s3_files()
+        results["archive"]["output_bytes"] = folder_bytes(
+            os.path.join(root, "archive")
+        )
+
+        # compact every delta part, regardless of age or count
+        converter.compaction.max_part_count = 1
+        with sampler.measure("compact"):
+            converter.compact_day_files()
+            converter.clean_local_folders()
+        results["compact"]["rows"] = folder_rows(springboard)
+        results["compact"]["output_bytes"] = folder_bytes(springboard)
+
+    sampler.stopped.set()
+    sampler.thread.join()
+
+    for stage, result in results.items():
+        seconds = sampler.seconds.get(stage, 0.0)
+        result["seconds"] = seconds
+        result["files_per_sec"] = result["files"] / max(seconds, 1e-9)
+        if "rows" in result:
+            result["rows_per_sec"] = result["rows"] / max(seconds, 1e-9)
+        result["peak_rss_mb"] = sampler.peak_rss.get(stage, 0) / 1024 / 1024
+
+    return results
+
+
+# pylint: enable=R0914
+
+
+def compare_to_baseline(
+    results: Dict[str, Dict[str, Dict[str, float]]], baseline_path: str
+) -> None:
+    """
+    add the percent change in files and rows per second of every stage
+    against the results of an earlier run
+    """
+    with open(baseline_path, "r", encoding="utf8") as file:
+        baseline = json.load(file)["results"]
+
+    for config_type, stages in results.items():
+        for stage, result in stages.items():
+            previous = baseline.get(config_type, {}).get(stage, {})
+            for metric in ("files_per_sec", "rows_per_sec"):
+                if metric in result and previous.get(metric):
+                    result[f"{metric}_change_pct"] = 100 * (
+                        result[metric] / previous[metric] - 1
+                    )
+
+
+def run_benchmark(
+    config_types: List[ConfigType], settings: FeedSettings
+) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """
+    run every config type's converter on synthetic feeds, each in its own
+    local folders
+
+    :return dictionary of results, by config type and stage
+    """
+    results = {}
+    for config_type in config_types:
+        with tempfile.TemporaryDirectory() as root:
+            results[str(config_type)] = run_converter(
+                config_type, settings, root
+            )
+    return results
+
+
+def main(args: argparse.Namespace) -> None:
+    """run the ingestion throughput benchmark, log and save the results"""
+    settings = FeedSettings(
+        **{
+            name: getattr(args, name)
+            for name in asdict(FeedSettings())
+            if hasattr(args, name)
+        }
+    )
+    config_types = [ConfigType[name] for name in args.config_types]
+
+    results = run_benchmark(config_types, settings)
+    if args.baseline is not None:
+        compare_to_baseline(results, args.baseline)
+
+    for config_type, stages in results.items():
+        for stage, result in stages.items():
+            process_logger = ProcessLogger(
+                "benchmark_ingestion_throughput",
+                config_type=config_type,
+                stage=stage,
+            )
+            process_logger.log_start()
+            process_logger.add_metadata(**result)
+            process_logger.log_complete()
+
+    if args.output is not None:
+        run: Dict[str, Any] = {
+            "started": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "pyarrow": pyarrow.__version__,
+            "cpu_count": os.cpu_count(),
+            "settings": asdict(settings),
+        }
+        with open(args.output, "w", encoding="utf8") as file:
+            json.dump({"run": run, "results": results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main(parse_args(sys.argv[1:]))
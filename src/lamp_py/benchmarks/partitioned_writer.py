@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import numpy
+import pyarrow.compute as pc
+import pyarrow.dataset as pd
+import pyarrow.parquet as pq
+
+from lamp_py.benchmarks.record_hash import synthetic_vehicle_positions
+from lamp_py.ingestion.config_busloc_vehicle import RtBusVehicleDetail
+from lamp_py.ingestion.utils import hash_gtfs_rt_table, partition_groups
+from lamp_py.runtime_utils.process_logger import ProcessLogger
+
+DESCRIPTION = """Benchmark route partitioned day file writers"""
+
+
+def parse_args(args: List[str]) -> argparse.Namespace:
+    """parse args for running this benchmark"""
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument(
+        "--rows",
+        default=2_000_000,
+        type=int,
+        dest="rows",
+        help="number of rows in synthetic busloc vehicle positions day",
+    )
+    parser.add_argument(
+        "--parts",
+        default=12,
+        type=int,
+        dest="parts",
+        help="number of parquet files the synthetic day is split into",
+    )
+
+    return parser.parse_args(args)
+
+
+def legacy_write(out_ds: pd.Dataset, path: str) -> None:
+    """legacy writer, filter and sort the dataset once per partition"""
+    detail = RtBusVehicleDetail()
+    with pq.ParquetWriter(path, schema=out_ds.schema) as writer:
+        partitions = pc.unique(
+            out_ds.to_table(columns=[detail.partition_column]).column(
+                detail.partition_column
+            )
+        )
+        for part in partitions:
+            writer.write_table(
+                out_ds.to_table(
+                    filter=(pc.field(detail.partition_column) == part)
+                ).sort_by(detail.table_sort_order)
+            )
+
+
+def single_pass_write(out_ds: pd.Dataset, path: str) -> None:
+    """single pass writer, sort the dataset once and write each partition"""
+    detail = RtBusVehicleDetail()
+    with pq.ParquetWriter(path, schema=out_ds.schema) as writer:
+        for write_table in partition_groups(
+            out_ds.to_table(),
+            detail.partition_column,
+            detail.table_sort_order,
+        ):
+            writer.write_table(write_table)
+
+
+def synthetic_busloc_day(rows: int, parts: int, folder: str) -> List[str]:
+    """
+    write a synthetic busloc vehicle positions day, with record hashes, to
+    parts parquet files
+
+    :return list of parquet file paths
+    """
+    rng = numpy.random.default_rng(1)
+    table = synthetic_vehicle_positions(rows)
+    table = table.append_column(
+        "vehicle.block_id",
+        pc.binary_join_element_wise(
+            "B", rng.integers(0, 400, rows).astype(str).tolist(), ""
+        ),
+    )
+    table = hash_gtfs_rt_table(table)
+
+    paths = []
+    part_rows = -(-rows // parts)
+    for index in range(parts):
+        path = os.path.join(folder, f"part-{index}.parquet")
+        pq.write_table(table.slice(index * part_rows, part_rows), path)
+        paths.append(path)
+
+    return paths
+
+
+def run_benchmark(rows: int, parts: int) -> Dict[str, float]:
+    """
+    write a synthetic busloc day file with the legacy and single pass writers,
+    verifying that both produce the same file
+
+    :return dictionary of benchmark results
+    """
+    results: Dict[str, float] = {}
+    writers: Dict[str, Callable[[pd.Dataset, str], None]] = {
+        "legacy": legacy_write,
+        "single_pass": single_pass_write,
+    }
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        out_ds = pd.dataset(synthetic_busloc_day(rows, parts, temp_dir))
+        results["rows"] = out_ds.count_rows()
+
+        for name, writer in writers.items():
+            path = os.path.join(temp_dir, f"{name}.parquet")
+            start = time.monotonic()
+            writer(out_ds, path)
+            results[f"{name}_seconds"] = time.monotonic() - start
+            results[f"{name}_row_groups"] = pq.ParquetFile(
+                path
+            ).metadata.num_row_groups
+
+        assert pq.read_table(os.path.join(temp_dir, "legacy.parquet")).equals(
+            pq.read_table(os.path.join(temp_dir, "single_pass.parquet"))
+        ), "single pass writer output does not match legacy writer"
+
+    results["speedup"] = results["legacy_seconds"] / max(
+        results["single_pass_seconds"], 1e-9
+    )
+
+    return results
+
+
+def main(args: argparse.Namespace) -> None:
+    """run the partitioned writer benchmark and log the results"""
+    process_logger = ProcessLogger("benchmark_partitioned_writer", **vars(args))
+    process_logger.log_start()
+
+    process_logger.add_metadata(**run_benchmark(args.rows, args.parts))
+    process_logger.log_complete()
+
+
+if __name__ == "__main__":
+    main(parse_args(sys.argv[1:]))
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+
+import argparse
+import hashlib
+import pickle
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy
+import polars as pl
+import pyarrow
+import pyarrow.compute as pc
+import pyarrow.dataset as pd
+
+from lamp_py.ingestion.utils import (
+    GTFS_RT_HASH_COL,
+    gtfs_rt_hash_columns,
+    hash_gtfs_rt_table,
+)
+from lamp_py.runtime_utils.process_logger import ProcessLogger
+
+DESCRIPTION = """Benchmark GTFS-RT record hashing implementations"""
+
+
+def parse_args(args: List[str]) -> argparse.Namespace:
+    """parse args for running this benchmark"""
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument(
+        "--rows",
+        default=1_000_000,
+        type=int,
+        dest="rows",
+        help="number of rows in synthetic vehicle positions table",
+    )
+    parser.add_argument(
+        "--parquet",
+        default=None,
+        dest="parquet",
+        help="local springboard day file to hash instead of synthetic data",
+    )
+    parser.add_argument(
+        "--skip-legacy",
+        action="store_true",
+        dest="skip_legacy",
+        help="if set, do not run the legacy pickle + md5 implementation",
+    )
+
+    return parser.parse_args(args)
+
+
+def legacy_hash_gtfs_rt_row(row: Any) -> Tuple[bytes]:
+    """legacy per-row hash, pickle and md5 a row from a polars dataframe"""
+    return (hashlib.md5(pickle.dumps(row), usedforsecurity=False).digest(),)
+
+
+def legacy_hash_gtfs_rt_table(table: pyarrow.Table) -> pyarrow.Table:
+    """legacy implementation of hash_gtfs_rt_table using polars map_rows"""
+    hash_columns = gtfs_rt_hash_columns(table.schema)
+    hash_schema = table.schema.append(
+        pyarrow.field(GTFS_RT_HASH_COL, pyarrow.large_binary())
+    )
+
+    frame = pl.DataFrame(table)
+
+    return (
+        frame.with_columns(
+            frame.select(hash_columns)
+            .map_rows(legacy_hash_gtfs_rt_row, return_dtype=pl.Binary)
+            .to_series(0)
+            .alias(GTFS_RT_HASH_COL)
+        )
+        .to_arrow()
+        .cast(hash_schema)
+    )
+
+
+def synthetic_vehicle_positions(rows: int, seed: int = 0) -> pyarrow.Table:
+    """
+    create a flattened table that resembles a busloc vehicle positions day
+    file, with repetitive string columns, nullable numerics and a list column
+    """
+    rng = numpy.random.default_rng(seed)
+
+    vehicle_count = 1_000
+    route_count = 170
+
+    vehicle_idx = rng.integers(0, vehicle_count, rows)
+    route_idx = rng.integers(0, route_count, rows)
+    feed_timestamp = numpy.sort(
+        rng.integers(1_700_000_000, 1_700_086_400, rows)
+    ).astype(numpy.uint64)
+
+    def strings(prefix: str, idx: numpy.ndarray) -> pyarrow.Array:
+        values = pyarrow.array([f"{prefix}{i}" for i in range(idx.max() + 1)])
+        return values.take(pyarrow.array(idx))
+
+    latitude = pyarrow.array(42.35 + rng.normal(0, 0.05, rows))
+    trip_id = strings("trip_", rng.integers(0, 20_000, rows))
+    trip_id = pc.if_else(pyarrow.array(rng.random(rows) < 0.1), None, trip_id)
+
+    return pyarrow.table(
+        {
+            "id": strings("y", vehicle_idx),
+            "vehicle.position.latitude": latitude,
+            "vehicle.position.longitude": pyarrow.array(
+                -71.06 + rng.normal(0, 0.05, rows)
+            ),
+            "vehicle.position.bearing": pyarrow.array(
+                rng.integers(0, 360, rows).astype(numpy.uint16)
+            ),
+            "vehicle.timestamp": pyarrow.array(
+                feed_timestamp - rng.integers(0, 30, rows).astype(numpy.uint64)
+            ),
+            "vehicle.trip.trip_id": trip_id,
+            "vehicle.trip.route_id": strings("", route_idx),
+            "vehicle.vehicle.id": strings("y", vehicle_idx),
+            "vehicle.vehicle.consist": pyarrow.array(
+                [
+                    [{"label": "a"}, {"label": "b"}] if i % 7 == 0 else None
+                    for i in range(rows)
+                ],
+                pyarrow.list_(pyarrow.struct([("label", pyarrow.string())])),
+            ),
+            "vehicle.current_status": strings(
+                "STATUS_", rng.integers(0, 3, rows)
+            ),
+            "feed_timestamp": pyarrow.array(feed_timestamp),
+        }
+    )
+
+
+def run_benchmark(
+    table: pyarrow.Table, skip_legacy: bool = False
+) -> Dict[str, Optional[float]]:
+    """
+    hash table with the columnar record hash engine and the legacy pickle +
+    md5 implementation
+
+    :return dictionary of benchmark results
+    """
+    results: Dict[str, Optional[float]] = {
+        "rows": table.num_rows,
+        "columnar_seconds": None,
+        "columnar_rows_per_sec": None,
+        "legacy_seconds": None,
+        "legacy_rows_per_sec": None,
+        "speedup": None,
+    }
+
+    start = time.monotonic()
+    hashed = hash_gtfs_rt_table(table)
+    duration = time.monotonic() - start
+    results["columnar_seconds"] = duration
+    results["columnar_rows_per_sec"] = table.num_rows / max(duration, 1e-9)
+
+    results["columnar_unique_hashes"] = pc.count_distinct(
+        hashed[GTFS_RT_HASH_COL]
+    ).as_py()
+
+    if not skip_legacy:
+        start = time.monotonic()
+        legacy = legacy_hash_gtfs_rt_table(table)
+        duration = time.monotonic() - start
+        results["legacy_seconds"] = duration
+        results["legacy_rows_per_sec"] = table.num_rows / max(duration, 1e-9)
+        results["speedup"] = duration / max(
+            float(results["columnar_seconds"] or 0), 1e-9
+        )
+        # both implementations should find the same number of unique records
+        results["legacy_unique_hashes"] = pc.count_distinct(
+            legacy[GTFS_RT_HASH_COL]
+        ).as_py()
+
+    return results
+
+
+def main(args: argparse.Namespace) -> None:
+    """run the record hash benchmark and log the results"""
+    process_logger = ProcessLogger("benchmark_record_hash", **vars(args))
+    process_logger.log_start()
+
+    if args.parquet is not None:
+        table = pd.dataset(args.parquet).to_table()
+        if GTFS_RT_HASH_COL in table.column_names:
+            table = table.drop_columns(GTFS_RT_HASH_COL)
+    else:
+        table = synthetic_vehicle_positions(args.rows)
+
+    process_logger.add_metadata(**run_benchmark(table, args.skip_legacy))
+    process_logger.log_complete()
+
+
+if __name__ == "__main__":
+    main(parse_args(sys.argv[1:]))
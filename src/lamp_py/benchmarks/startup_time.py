@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy
+
+from lamp_py.runtime_utils.process_logger import ProcessLogger
+
+DESCRIPTION = (
+    """Benchmark import time of LAMP entry points in fresh interpreters"""
+)
+
+# modules of the entry points in pyproject.toml. spawned converter and
+# backfill workers import the module of their entry point again when they
+# start, so these are also the imports each worker pays for.
+ENTRY_POINTS = {
+    "ingestion": "lamp_py.ingestion.pipeline",
+    "backfill": "lamp_py.ingestion.backfill",
+    "performance_manager": "lamp_py.performance_manager.pipeline",
+    "bus_performance_manager": "lamp_py.bus_performance_manager.pipeline",
+    "seed_metadata": "lamp_py.postgres.seed_metadata",
+    "hyper_update": "lamp_py.tableau.pipeline",
+    "transit_master_ingestion": "lamp_py.ingestion_tm.pipeline",
+}
+
+# dependencies that are slow to import, reported when an entry point loads them
+HEAVY_MODULES = [
+    "alembic",
+    "boto3",
+    "numpy",
+    "pandas",
+    "polars",
+    "pyarrow",
+    "pyodbc",
+    "sqlalchemy",
+    "tableauhyperapi",
+]
+
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "modules": [name for name in {heavy} if name in sys.modules],
+}}))
+"""
+
+
+def parse_args(args: List[str]) -> argparse.Namespace:
+    """parse args for running this benchmark"""
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument(
+        "--entry-points",
+        nargs="+",
+        default=list(ENTRY_POINTS),
+        choices=list(ENTRY_POINTS),
+        dest="entry_points",
+        help="entry points to benchmark, defaults to all of them",
+    )
+    parser.add_argument(
+        "--repeat",
+        default=5,
+        type=int,
+        dest="repeat",
+        help="fresh interpreters to import each entry point in",
+    )
+    parser.add_argument(
+        "--top",
+        default=5,
+        type=int,
+        dest="top",
+        help="slowest top level imports to report for each entry point",
+    )
+    parser.add_argument(
+        "--profile-dir",
+        default=None,
+        dest="profile_dir",
+        help="folder to save the -X importtime profile of each entry point to",
+    )
+
+    return parser.parse_args(args)
+
+
+def parse_import_times(profile: str) -> List[Tuple[str, int, int]]:
+    """
+    parse the -X importtime output of an interpreter
+
+    :return list of module name, self and cumulative import microseconds,
+        with the module name indented by its depth in the import tree
+    """
+    import_times = []
+    for line in profile.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        import_times.append(
+            (name.rstrip(), int(self_us.strip()), int(cumulative_us.strip()))
+        )
+    return import_times
+
+
+def import_entry_point(module: str) -> Dict[str, Any]:
+    """
+    import the module of an entry point in a fresh interpreter, with
+    -X importtime enabled
+
+    :return dictionary with the seconds spent importing, heavy modules loaded
+        and the import time profile, or the import error if it failed
+    """
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            IMPORT_SCRIPT.format(module=module, heavy=HEAVY_MODULES),
+        ],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if result.returncode != 0:
+        # entry points with native dependencies that are not installed
+        error_lines = result.stderr.strip().splitlines()
+        return {
+            "import_error": (
+                error_lines[-1] if error_lines else "import failed"
+            )
+        }
+
+    output = json.loads(result.stdout.strip().splitlines()[-1])
+    output["profile"] = result.stderr
+    return output
+
+
+def top_level_imports(profile: str, module: str, top: int) -> Dict[str, float]:
+    """slowest imports made directly by the entry point module, in seconds"""
+    # imports are logged once complete, so the imports made directly by a
+    # module are the lines one level deeper logged just before it
+    children: List[Tuple[str, int]] = []
+    for name, _, cumulative_us in parse_import_times(profile):
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 0 and name.strip() == module:
+            break
+        if depth == 0:
+            children = []
+        elif depth == 1:
+            children.append((name.strip(), cumulative_us))
+
+    children.sort(key=lambda child: child[1], reverse=True)
+    return {name: cumulative_us / 1e6 for name, cumulative_us in children[:top]}
+
+
+def run_benchmark(
+    entry_points: List[str],
+    repeat: int,
+    top: int,
+    profile_dir: Optional[str] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    import each entry point repeat times, each in a fresh interpreter
+
+    :return dictionary of results, by entry point
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    for entry_point in entry_points:
+        module = ENTRY_POINTS[entry_point]
+        runs = [import_entry_point(module) for _ in range(repeat)]
+        if "import_error" in runs[0]:
+            results[entry_point] = {
+                "module": module,
+                "import_error": runs[0]["import_error"],
+            }
+            continue
+
+        seconds = numpy.array([run["seconds"] for run in runs])
+        results[entry_point] = {
+            "module": module,
+            "median_import_seconds": float(numpy.median(seconds)),
+            "min_import_seconds": float(seconds.min()),
+            "heavy_modules": ",".join(runs[0]["modules"]),
+            "slowest_imports": top_level_imports(
+                runs[0]["profile"], module, top
+            ),
+        }
+
+        if profile_dir is not None:
+            os.makedirs(profile_dir, exist_ok=True)
+            with open(
+                os.path.join(profile_dir, f"{entry_point}.importtime"),
+                "w",
+                encoding="utf8",
+            ) as profile_file:
+                profile_file.write(runs[0]["profile"])
+
+    return results
+
+
+def main(args: argparse.Namespace) -> None:
+    """run the startup time benchmark and log the results"""
+    results = run_benchmark(
+        args.entry_points, args.repeat, args.top, args.profile_dir
+    )
+    for entry_point, result in results.items():
+        process_logger = ProcessLogger(
+            "benchmark_startup_time", entry_point=entry_point
+        )
+        process_logger.log_start()
+        slowest_imports = result.pop("slowest_imports", {})
+        process_logger.add_metadata(
+            **result,
+            slowest_imports=",".join(
+                f"{name}={seconds:.3f}"
+                for name, seconds in slowest_imports.items()
+            ),
+        )
+        process_logger.log_complete()
+
+
+if __name__ == "__main__":
+    main(parse_args(sys.argv[1:]))
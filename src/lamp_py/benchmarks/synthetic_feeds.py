@@ -0,0 +1,390 @@
+import gzip
+import json
+import os
+import random
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from lamp_py.ingestion.converter import ConfigType
+
+RAIL_ROUTE_IDS = [
+    "Red",
+    "Mattapan",
+    "Orange",
+    "Blue",
+    "Green-B",
+    "Green-C",
+    "Green-D",
+    "Green-E",
+]
+
+# incoming filename suffix of each GTFS-RT config type, after the feed
+# timestamp
+FEED_FILENAMES = {
+    ConfigType.RT_ALERTS: "https_cdn.mbta.com_realtime_Alerts_enhanced.json.gz",
+    ConfigType.RT_TRIP_UPDATES: (
+        "https_cdn.mbta.com_realtime_TripUpdates_enhanced.json.gz"
+    ),
+    ConfigType.RT_VEHICLE_POSITIONS: (
+        "https_cdn.mbta.com_realtime_VehiclePositions_enhanced.json.gz"
+    ),
+    ConfigType.BUS_TRIP_UPDATES: (
+        "https_mbta_busloc_s3.s3.amazonaws.com_prod_TripUpdates_enhanced.json.gz"
+    ),
+    ConfigType.BUS_VEHICLE_POSITIONS: (
+        "https_mbta_busloc_s3.s3.amazonaws.com_prod_VehiclePositions_enhanced"
+        ".json.gz"
+    ),
+}
+
+
+# pylint: disable=R0902
+# disable too many instance attributes
+@dataclass
+class FeedSettings:
+    """
+    Shape of synthetic GTFS-RT feeds
+
+    vehicles: vehicles, and trips, in every snapshot
+    routes: bus routes vehicles that are not on rail routes are spread over
+    rail_pct: percent of vehicles on rail routes, busloc feeds are all buses
+    stop_time_updates: predicted stops of every trip update
+    alerts: alerts in every alerts snapshot
+    snapshots: number of snapshots written for each config type
+    cadence_seconds: seconds between snapshots
+    change_pct: percent of vehicles that move, updating their predictions,
+        between snapshots. alerts change a tenth as often.
+    start_timestamp: feed timestamp of the first snapshot
+    """
+
+    vehicles: int = 300
+    routes: int = 40
+    rail_pct: float = 40.0
+    stop_time_updates: int = 12
+    alerts: int = 150
+    snapshots: int = 120
+    cadence_seconds: int = 5
+    change_pct: float = 30.0
+    start_timestamp: int = 1_704_106_800
+
+
+@dataclass
+class SyntheticVehicle:
+    """state of a vehicle between snapshots"""
+
+    vehicle_id: str
+    route_id: str
+    direction_id: int
+    trip_id: str
+    start_time: str
+    stop_sequence: int
+    latitude: float
+    longitude: float
+    bearing: int
+    delay: int
+    timestamp: int
+
+
+# pylint: enable=R0902
+
+
+class SyntheticFeed:
+    """
+    Consecutive snapshots of a synthetic GTFS-RT feed
+
+    Every snapshot holds one entity per vehicle, trip or alert. Between
+    snapshots, change_pct of vehicles move and update their trip's
+    predictions, the rest are unchanged, like polled production feeds.
+    """
+
+    def __init__(self, config_type: ConfigType, settings: FeedSettings) -> None:
+        if config_type not in FEED_FILENAMES:
+            raise ValueError(f"no synthetic feed for {config_type}")
+
+        self.config_type = config_type
+        self.settings = settings
+        self.rng = random.Random(f"{config_type}")
+        self.timestamp = settings.start_timestamp
+
+        self.bus_feed = config_type in (
+            ConfigType.BUS_TRIP_UPDATES,
+            ConfigType.BUS_VEHICLE_POSITIONS,
+        )
+        bus_routes = [str(route) for route in range(1, settings.routes + 1)]
+        self.vehicles: List[SyntheticVehicle] = []
+        for index in range(settings.vehicles):
+            if not self.bus_feed and index < (
+                settings.vehicles * settings.rail_pct / 100
+            ):
+                route_id = RAIL_ROUTE_IDS[index % len(RAIL_ROUTE_IDS)]
+            else:
+                route_id = bus_routes[index % len(bus_routes)]
+            self.vehicles.append(
+                SyntheticVehicle(
+                    vehicle_id=f"y{1000 + index}",
+                    route_id=route_id,
+                    direction_id=index % 2,
+                    trip_id=f"{60_000_000 + index}",
+                    start_time=f"{5 + index % 19:02}:{index % 60:02}:00",
+                    stop_sequence=self.rng.randint(1, 20),
+                    latitude=42.36 + self.rng.uniform(-0.1, 0.1),
+                    longitude=-71.06 + self.rng.uniform(-0.1, 0.1),
+                    bearing=self.rng.randint(0, 359),
+                    delay=self.rng.randint(-60, 300),
+                    timestamp=self.timestamp,
+                )
+            )
+
+        self.alert_modified = [self.timestamp] * settings.alerts
+
+    @property
+    def start_date(self) -> str:
+        """service date of the current snapshot"""
+        return datetime.fromtimestamp(self.timestamp, timezone.utc).strftime(
+            "%Y%m%d"
+        )
+
+    def advance(self) -> None:
+        """move to the next snapshot"""
+        self.timestamp += self.settings.cadence_seconds
+        for vehicle in self.vehicles:
+            if self.rng.random() * 100 >= self.settings.change_pct:
+                continue
+            vehicle.latitude += self.rng.uniform(-0.001, 0.001)
+            vehicle.longitude += self.rng.uniform(-0.001, 0.001)
+            vehicle.bearing = (
+                vehicle.bearing + self.rng.randint(-20, 20)
+            ) % 360
+            vehicle.delay += self.rng.randint(-15, 30)
+            if self.rng.random() < 0.2:
+                vehicle.stop_sequence += 1
+            vehicle.timestamp = self.timestamp
+
+        self.alert_modified = [
+            (
+                self.timestamp
+                if self.rng.random() * 1000 < self.settings.change_pct
+                else modified
+            )
+            for modified in self.alert_modified
+        ]
+
+    def trip(self, vehicle: SyntheticVehicle) -> Dict[str, Any]:
+        """trip descriptor of a vehicle"""
+        return {
+            "trip_id": vehicle.trip_id,
+            "route_id": vehicle.route_id,
+            "direction_id": vehicle.direction_id,
+            "start_time": vehicle.start_time,
+            "start_date": self.start_date,
+            "schedule_relationship": "SCHEDULED",
+        }
+
+    def vehicle_entity(self, vehicle: SyntheticVehicle) -> Dict[str, Any]:
+        """vehicle positions entity of a vehicle"""
+        return {
+            "id": vehicle.vehicle_id,
+            "vehicle": {
+                "trip": self.trip(vehicle),
+                "vehicle": {
+                    "id": vehicle.vehicle_id,
+                    "label": vehicle.vehicle_id[1:],
+                },
+                "position": {
+                    "bearing": vehicle.bearing,
+                    "latitude": vehicle.latitude,
+                    "longitude": vehicle.longitude,
+                },
+                "current_stop_sequence": vehicle.stop_sequence,
+                "stop_id": f"{70000 + vehicle.stop_sequence}",
+                "current_status": "IN_TRANSIT_TO",
+                "timestamp": vehicle.timestamp,
+                "occupancy_status": "MANY_SEATS_AVAILABLE",
+                "occupancy_percentage": 20,
+            },
+        }
+
+    def bus_vehicle_entity(self, vehicle: SyntheticVehicle) -> Dict[str, Any]:
+        """busloc vehicle positions entity of a vehicle"""
+        return {
+            "id": f"{vehicle.timestamp}_{vehicle.vehicle_id[1:]}",
+            "is_deleted": False,
+            "vehicle": {
+                "position": {
+                    "bearing": vehicle.bearing,
+                    "latitude": vehicle.latitude,
+                    "longitude": vehicle.longitude,
+                    "speed": 5.0,
+                },
+                "location_source": "samsara",
+                "timestamp": vehicle.timestamp,
+                "trip": self.trip(vehicle),
+                "vehicle": {
+                    "id": vehicle.vehicle_id,
+                    "label": vehicle.vehicle_id[1:],
+                },
+                "operator": {
+                    "id": vehicle.vehicle_id[1:],
+                    "logon_time": self.settings.start_timestamp,
+                },
+                "block_id": f"B{vehicle.route_id}-{vehicle.direction_id}",
+                "run_id": f"123-{vehicle.vehicle_id[1:]}",
+                "stop_id": f"{vehicle.stop_sequence * 100}",
+                "current_stop_sequence": vehicle.stop_sequence,
+                "revenue": True,
+                "load": 12,
+                "capacity": 60,
+                "occupancy_percentage": 20,
+                "occupancy_status": "MANY_SEATS_AVAILABLE",
+            },
+        }
+
+    def trip_update_entity(self, vehicle: SyntheticVehicle) -> Dict[str, Any]:
+        """trip updates entity of a vehicle's trip"""
+        stop_time_updates = []
+        for offset in range(self.settings.stop_time_updates):
+            stop_sequence = vehicle.stop_sequence + offset
+            predicted = vehicle.timestamp + vehicle.delay + 120 * (offset + 1)
+            stop_time_update: Dict[str, Any] = {
+                "stop_sequence": stop_sequence,
+                "stop_id": f"{70000 + stop_sequence}",
+                "arrival": {"time": predicted, "uncertainty": 60},
+                "departure": {"time": predicted + 30, "uncertainty": 60},
+                "schedule_relationship": "SCHEDULED",
+            }
+            if self.bus_feed:
+                stop_time_update["arrival"]["delay"] = vehicle.delay
+                stop_time_update["departure"]["delay"] = vehicle.delay
+            stop_time_updates.append(stop_time_update)
+
+        entity_id = vehicle.trip_id
+        if self.bus_feed:
+            entity_id = (
+                f"B{vehicle.route_id}-{vehicle.direction_id}:"
+                f"{vehicle.route_id}:{vehicle.trip_id}"
+            )
+
+        return {
+            "id": entity_id,
+            "trip_update": {
+                "timestamp": vehicle.timestamp,
+                "trip": self.trip(vehicle),
+                "vehicle": {
+                    "id": vehicle.vehicle_id,
+                    "label": vehicle.vehicle_id[1:],
+                },
+                "stop_time_update": stop_time_updates,
+            },
+        }
+
+    def alert_entity(self, index: int) -> Dict[str, Any]:
+        """alerts entity of an alert"""
+        route_id = RAIL_ROUTE_IDS[index % len(RAIL_ROUTE_IDS)]
+        header = f"{route_id} Line delays of about {10 + index % 20} minutes"
+        return {
+            "id": f"{500_000 + index}",
+            "alert": {
+                "active_period": [
+                    {
+                        "start": self.settings.start_timestamp - 3600,
+                        "end": self.settings.start_timestamp + 86400,
+                    }
+                ],
+                "informed_entity": [
+                    {
+                        "agency_id": "1",
+                        "route_id": route_id,
+                        "route_type": 1,
+                        "stop_id": f"{70000 + stop}",
+                        "activities": ["BOARD", "EXIT", "RIDE"],
+                    }
+                    for stop in range(index % 5 + 1)
+                ],
+                "cause": "UNKNOWN_CAUSE",
+                "effect": "SIGNIFICANT_DELAYS",
+                "header_text": {
+                    "translation": [{"text": header, "language": "en"}]
+                },
+                "severity_level": "WARNING",
+                "severity": 3 + index % 5,
+                "created_timestamp": self.settings.start_timestamp - 3600,
+                "last_modified_timestamp": self.alert_modified[index],
+                "alert_lifecycle": "NEW",
+                "duration_certainty": "ESTIMATED",
+            },
+        }
+
+    def entities(self) -> List[Dict[str, Any]]:
+        """entities of the current snapshot"""
+        if self.config_type == ConfigType.RT_ALERTS:
+            return [
+                self.alert_entity(index)
+                for index in range(self.settings.alerts)
+            ]
+        if self.config_type == ConfigType.RT_VEHICLE_POSITIONS:
+            return [self.vehicle_entity(vehicle) for vehicle in self.vehicles]
+        if self.config_type == ConfigType.BUS_VEHICLE_POSITIONS:
+            return [
+                self.bus_vehicle_entity(vehicle) for vehicle in self.vehicles
+            ]
+        return [self.trip_update_entity(vehicle) for vehicle in self.vehicles]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """enhanced JSON feed of the current snapshot"""
+        return {
+            "header": {
+                "gtfs_realtime_version": "2.0",
+                "incrementality": "FULL_DATASET",
+                "timestamp": self.timestamp,
+            },
+            "entity": self.entities(),
+        }
+
+
+def write_synthetic_feeds(
+    config_type: ConfigType,
+    folder: str,
+    settings: Optional[FeedSettings] = None,
+) -> List[str]:
+    """
+    write consecutive snapshots of a synthetic feed to folder, named and
+    date partitioned like incoming files, e.g.
+    lamp/delta/2024/01/01/2024-01-01T11:00:00Z_https_cdn.mbta.com_...
+
+    entity ids follow their production feeds: vehicle ids, trip ids, busloc
+    block and trip ids, and busloc vehicle timestamps and labels
+
+    :return list of written file paths, in feed order
+    """
+    if settings is None:
+        settings = FeedSettings()
+
+    feed = SyntheticFeed(config_type, settings)
+
+    # busloc filenames do not use colons in their timestamps
+    timestamp_format = "%Y-%m-%dT%H:%M:%SZ"
+    if feed.bus_feed:
+        timestamp_format = "%Y-%m-%dT%H_%M_%SZ"
+    paths = []
+    for _ in range(settings.snapshots):
+        feed_dt = datetime.fromtimestamp(feed.timestamp, timezone.utc)
+        day_folder = os.path.join(
+            folder, "lamp", "delta", feed_dt.strftime("%Y/%m/%d")
+        )
+        os.makedirs(day_folder, exist_ok=True)
+
+        path = os.path.join(
+            day_folder,
+            f"{feed_dt.strftime(timestamp_format)}_"
+            f"{FEED_FILENAMES[config_type]}",
+        )
+        with open(path, "wb") as file:
+            file.write(
+                gzip.compress(json.dumps(feed.snapshot()).encode(), mtime=0)
+            )
+        paths.append(path)
+
+        feed.advance()
+
+    return paths
@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from dataclasses import replace
+from typing import Dict, List, Optional, Tuple
+
+import pyarrow
+import pyarrow.compute as pc
+import pyarrow.dataset as pd
+import pyarrow.parquet as pq
+
+from lamp_py.ingestion.converter import ConfigType
+from lamp_py.ingestion.convert_gtfs_rt import GTFS_RT_DETAILS
+from lamp_py.ingestion.gtfs_rt_detail import GTFSRTDetail, WriteProfile
+from lamp_py.ingestion.utils import partition_groups
+from lamp_py.performance_manager.l0_rt_trip_updates import (
+    TRIP_UPDATE_COLUMNS,
+    trip_update_filters,
+)
+from lamp_py.performance_manager.l0_rt_vehicle_positions import (
+    VEHICLE_POSITION_COLUMNS,
+    vehicle_position_filters,
+)
+from lamp_py.runtime_utils.process_logger import ProcessLogger
+
+DESCRIPTION = """Benchmark parquet write profiles on recorded GTFS-RT days"""
+
+RAIL_ROUTE_IDS = [
+    "Red",
+    "Mattapan",
+    "Orange",
+    "Blue",
+    "Green-B",
+    "Green-C",
+    "Green-D",
+    "Green-E",
+]
+
+
+def parse_args(args: List[str]) -> argparse.Namespace:
+    """parse args for running this benchmark"""
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument(
+        "--path",
+        required=True,
+        dest="path",
+        help=(
+            "local directory of recorded springboard parquet files, files "
+            "are grouped by the config type directory they are found under"
+        ),
+    )
+    parser.add_argument(
+        "--repeat",
+        default=3,
+        type=int,
+        dest="repeat",
+        help="number of times to read each written file",
+    )
+
+    return parser.parse_args(args)
+
+
+def read_projection(
+    config_type: ConfigType,
+) -> Tuple[Optional[List[str]], Optional[pc.Expression]]:
+    """
+    columns and filter the performance manager reads files of a config type
+    with, mirroring get_vp_dataframe and get_tu_dataframe_chunks for rail
+    routes. other config types are read in full.
+    """
+    if config_type == ConfigType.RT_VEHICLE_POSITIONS:
+        return (
+            VEHICLE_POSITION_COLUMNS,
+            vehicle_position_filters(RAIL_ROUTE_IDS),
+        )
+
+    if config_type == ConfigType.RT_TRIP_UPDATES:
+        return (TRIP_UPDATE_COLUMNS, trip_update_filters(RAIL_ROUTE_IDS))
+
+    return (None, None)
+
+
+def candidate_profiles(
+    detail: GTFSRTDetail, schema: pyarrow.Schema
+) -> Dict[str, WriteProfile]:
+    """candidate write profiles of a config type, by name"""
+    baseline = WriteProfile(sort_order=detail.table_sort_order)
+    zstd = replace(baseline, compression="zstd", compression_level=3)
+    string_columns = tuple(
+        field.name for field in schema if pyarrow.types.is_string(field.type)
+    )
+
+    return {
+        "configured": detail.write_profile,
+        "pyarrow_default": baseline,
+        "gzip": replace(baseline, compression="gzip"),
+        "zstd_1": replace(zstd, compression_level=1),
+        "zstd_3": zstd,
+        "zstd_9": replace(zstd, compression_level=9),
+        "zstd_3_string_dictionary": replace(
+            zstd, use_dictionary=string_columns
+        ),
+        "zstd_3_row_group_128k": replace(zstd, row_group_size=128 * 1024),
+        "zstd_3_page_index": replace(zstd, write_page_index=True),
+        "zstd_3_partition_sort": replace(zstd, sort_order=None),
+        "zstd_3_string_dictionary_page_index": replace(
+            zstd, use_dictionary=string_columns, write_page_index=True
+        ),
+        "zstd_9_string_dictionary_page_index": replace(
+            zstd,
+            compression_level=9,
+            use_dictionary=string_columns,
+            write_page_index=True,
+        ),
+    }
+
+
+def write_day_file(
+    table: pyarrow.Table,
+    path: str,
+    partition_column: str,
+    profile: WriteProfile,
+) -> None:
+    """write table partition by partition, the way day files are written"""
+    with pq.ParquetWriter(
+        path, schema=table.schema, **profile.writer_options()
+    ) as writer:
+        for write_table in partition_groups(
+            table, partition_column, profile.sort_order
+        ):
+            writer.write_table(
+                write_table, row_group_size=profile.row_group_size
+            )
+
+
+def time_read(
+    path: str,
+    columns: Optional[List[str]],
+    filters: Optional[pc.Expression],
+    repeat: int,
+) -> float:
+    """fastest of repeat reads of path"""
+    seconds = []
+    for _ in range(repeat):
+        start = time.monotonic()
+        pd.dataset(path).to_table(columns=columns, filter=filters)
+        seconds.append(time.monotonic() - start)
+    return min(seconds)
+
+
+def find_day_files(path: str) -> Dict[ConfigType, List[str]]:
+    """parquet files under path, by the config type directory they are in"""
+    day_files: Dict[ConfigType, List[str]] = {}
+    for root, _, filenames in os.walk(path):
+        config_types = [
+            ConfigType[part]
+            for part in root.split(os.sep)
+            if part in ConfigType.__members__
+            and ConfigType[part] in GTFS_RT_DETAILS
+        ]
+        if not config_types:
+            continue
+        day_files.setdefault(config_types[-1], []).extend(
+            os.path.join(root, filename)
+            for filename in sorted(filenames)
+            if filename.endswith(".parquet")
+        )
+    return day_files
+
+
+# pylint: disable=R0914
+# disable too many local variables
+def run_benchmark(
+    config_type: ConfigType, files: List[str], repeat: int
+) -> Dict[str, Dict[str, float]]:
+    """
+    write the recorded files of a config type as a single day file with each
+    candidate profile, verifying every profile writes the same records
+
+    :return dictionary of benchmark results, by profile name
+    """
+    detail = GTFS_RT_DETAILS[config_type]()
+    table = pd.dataset(files).to_table()
+    columns, filters = read_projection(config_type)
+
+    results: Dict[str, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name, profile in candidate_profiles(detail, table.schema).items():
+            path = os.path.join(temp_dir, f"{name}.parquet")
+
+            start = time.monotonic()
+            write_day_file(table, path, detail.partition_column, profile)
+            write_seconds = time.monotonic() - start
+
+            metadata = pq.read_metadata(path)
+            assert (
+                metadata.num_rows
+                == table.filter(
+                    pc.is_valid(table.column(detail.partition_column))
+                ).num_rows
+            ), f"{name} profile wrote the wrong number of rows"
+
+            results[name] = {
+                "rows": metadata.num_rows,
+                "row_groups": metadata.num_row_groups,
+                "file_bytes": os.path.getsize(path),
+                "write_seconds": write_seconds,
+                "read_seconds": time_read(path, None, None, repeat),
+                "projection_read_seconds": time_read(
+                    path, columns, filters, repeat
+                ),
+            }
+
+    for result in results.values():
+        result["size_ratio"] = (
+            result["file_bytes"] / results["pyarrow_default"]["file_bytes"]
+        )
+
+    return results
+
+
+# pylint: enable=R0914
+
+
+def main(args: argparse.Namespace) -> None:
+    """run the write profile benchmark and log the results"""
+    for config_type, files in find_day_files(args.path).items():
+        for name, result in run_benchmark(
+            config_type, files, args.repeat
+        ).items():
+            process_logger = ProcessLogger(
+                "benchmark_write_profile",
+                config_type=str(config_type),
+                profile=name,
+                file_count=len(files),
+            )
+            process_logger.log_start()
+            process_logger.add_metadata(**result)
+            process_logger.log_complete()
+
+
+if __name__ == "__main__":
+    main(parse_args(sys.argv[1:]))
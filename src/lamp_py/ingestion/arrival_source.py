@@ -0,0 +1,489 @@
+import json
+import math
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from queue import Empty, Queue
+from threading import Lock
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+from urllib.parse import unquote_plus
+
+import boto3
+
+from lamp_py.runtime_utils.process_logger import ProcessLogger
+
+# lists every file currently waiting to be ingested
+FileLister = Callable[[], List[str]]
+
+# an event queue message, as a receipt handle and message body
+EventMessage = Tuple[str, str]
+
+# max messages returned by a single SQS receive or delete
+SQS_BATCH_SIZE = 10
+
+
+# pylint: disable=R0902
+# disable too many instance attributes, settings of every arrival source
+@dataclass
+class ArrivalSettings:
+    """
+    Settings for handing incoming files to the converters as they arrive
+
+    source: "poll", "events" or "watch" (INGESTION_ARRIVAL_SOURCE)
+    poll_seconds: seconds between listings of the incoming bucket by the
+        poll source, and between static schedule and glides checks
+        (INGESTION_POLL_SECONDS)
+    batch_max_files: a batch is handed to the converters once this many
+        files have arrived (INGESTION_BATCH_MAX_FILES)
+    batch_max_age_seconds: a batch is handed to the converters once its
+        oldest file arrived this many seconds ago
+        (INGESTION_BATCH_MAX_AGE_SECONDS)
+    queue_url: SQS queue of incoming bucket event notifications, for the
+        events source (INGESTION_EVENT_QUEUE_URL)
+    reconcile_seconds: seconds between listings of the incoming bucket by
+        the events source, picking up files without a delivered event, or
+        left in the bucket by a converter (INGESTION_RECONCILE_SECONDS)
+    watch_path: local directory of incoming files, for the watch source
+        (INGESTION_WATCH_PATH)
+    watch_seconds: seconds between scans of watch_path
+    """
+
+    source: str = "poll"
+    poll_seconds: float = 30
+    batch_max_files: int = 1_000
+    batch_max_age_seconds: float = 2
+    queue_url: Optional[str] = None
+    reconcile_seconds: float = 60 * 10
+    watch_path: Optional[str] = None
+    watch_seconds: float = 0.5
+
+    @classmethod
+    def from_environment(cls) -> "ArrivalSettings":
+        """create settings, overriding defaults with environment variables"""
+        defaults = cls()
+        return cls(
+            source=os.environ.get("INGESTION_ARRIVAL_SOURCE", defaults.source),
+            poll_seconds=float(
+                os.environ.get("INGESTION_POLL_SECONDS", defaults.poll_seconds)
+            ),
+            batch_max_files=int(
+                os.environ.get(
+                    "INGESTION_BATCH_MAX_FILES", defaults.batch_max_files
+                )
+            ),
+            batch_max_age_seconds=float(
+                os.environ.get(
+                    "INGESTION_BATCH_MAX_AGE_SECONDS",
+                    defaults.batch_max_age_seconds,
+                )
+            ),
+            queue_url=os.environ.get("INGESTION_EVENT_QUEUE_URL"),
+            reconcile_seconds=float(
+                os.environ.get(
+                    "INGESTION_RECONCILE_SECONDS", defaults.reconcile_seconds
+                )
+            ),
+            watch_path=os.environ.get("INGESTION_WATCH_PATH"),
+        )
+
+
+# pylint: enable=R0902
+
+
+class ArrivalSource(ABC):
+    """
+    Source of incoming files, handing them to the converters in batches
+
+    Sources report each file they receive with the earliest time it may have
+    arrived. Files are collected until batch_max_files have arrived, or the
+    oldest of them arrived batch_max_age_seconds ago, and are then returned
+    as a batch by next_batch. Once a batch is ingested it is acknowledged.
+    """
+
+    def __init__(self, settings: ArrivalSettings) -> None:
+        self.settings = settings
+        # file -> earliest unix time the file may have arrived
+        self.pending: Dict[str, float] = {}
+
+    @abstractmethod
+    def receive(self, wait_seconds: float) -> Dict[str, float]:
+        """
+        receive files that arrived since the last call, waiting up to
+        wait_seconds for any to arrive
+
+        :return earliest unix time each file may have arrived, by file
+        """
+
+    def acknowledge(self, files: List[str]) -> None:
+        """
+        mark files returned by next_batch as ingested, once they were moved
+        out of the incoming bucket
+        """
+
+    def batch_ready(self, now: float) -> bool:
+        """True if the pending files cross the size or age threshold"""
+        if not self.pending:
+            return False
+        return (
+            len(self.pending) >= self.settings.batch_max_files
+            or now - min(self.pending.values())
+            >= self.settings.batch_max_age_seconds
+        )
+
+    def next_batch(self, timeout: float) -> List[str]:
+        """
+        wait up to timeout seconds for a batch of files to be ready
+
+        :return files of the batch, in arrival order, or an empty list if no
+            batch was ready in time
+        """
+        deadline = time.time() + timeout
+        while not self.batch_ready(time.time()):
+            now = time.time()
+            if now >= deadline:
+                return []
+
+            wait_seconds = deadline - now
+            if self.pending:
+                wait_seconds = min(
+                    wait_seconds,
+                    min(self.pending.values())
+                    + self.settings.batch_max_age_seconds
+                    - now,
+                )
+            for filename, arrived_at in self.receive(
+                max(wait_seconds, 0)
+            ).items():
+                self.pending.setdefault(filename, arrived_at)
+
+        files = sorted(self.pending, key=self.pending.__getitem__)
+        self.pending = {}
+        return files
+
+
+class PollingSource(ArrivalSource):
+    """
+    List every incoming file each poll_seconds
+
+    Files found by a listing arrived after the previous listing. The poll
+    interval stands in for the batch thresholds, each listing is handed to
+    the converters as a single batch.
+    """
+
+    def __init__(self, list_files: FileLister, settings: ArrivalSettings):
+        super().__init__(settings)
+        self.list_files = list_files
+        self.listed_at = 0.0
+
+    def batch_ready(self, now: float) -> bool:
+        return bool(self.pending)
+
+    def receive(self, wait_seconds: float) -> Dict[str, float]:
+        next_listing = self.listed_at + self.settings.poll_seconds
+        time.sleep(max(min(next_listing - time.time(), wait_seconds), 0))
+        if time.time() < next_listing:
+            return {}
+
+        previous_listing = self.listed_at
+        self.listed_at = time.time()
+        return dict.fromkeys(self.list_files(), previous_listing)
+
+
+class EventQueue(ABC):
+    """Queue of incoming bucket event notification messages"""
+
+    @abstractmethod
+    def receive(self, wait_seconds: float) -> List[EventMessage]:
+        """receive messages, waiting up to wait_seconds for any to arrive"""
+
+    @abstractmethod
+    def delete(self, receipt_handles: List[str]) -> None:
+        """delete handled messages from the queue"""
+
+
+class SqsEventQueue(EventQueue):
+    """SQS queue of incoming bucket event notifications"""
+
+    def __init__(self, queue_url: str) -> None:
+        self.queue_url = queue_url
+        self.sqs_client = boto3.client("sqs")
+
+    def receive(self, wait_seconds: float) -> List[EventMessage]:
+        response = self.sqs_client.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=SQS_BATCH_SIZE,
+            # whole seconds, so short waits long poll instead of spinning.
+            # long polls are limited to 20 seconds.
+            WaitTimeSeconds=min(math.ceil(wait_seconds), 20),
+        )
+        return [
+            (message["ReceiptHandle"], message["Body"])
+            for message in response.get("Messages", [])
+        ]
+
+    def delete(self, receipt_handles: List[str]) -> None:
+        for start in range(0, len(receipt_handles), SQS_BATCH_SIZE):
+            self.sqs_client.delete_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[
+                    {"Id": str(index), "ReceiptHandle": receipt_handle}
+                    for index, receipt_handle in enumerate(
+                        receipt_handles[start : start + SQS_BATCH_SIZE]
+                    )
+                ],
+            )
+
+
+class LocalEventQueue(EventQueue):
+    """
+    In process stand in for an SQS queue, for tests and benchmarks
+
+    Messages are removed from the queue when they are received, so deleted
+    messages are only recorded.
+    """
+
+    def __init__(self) -> None:
+        self.messages: Queue[str] = Queue()
+        self.deleted: List[str] = []
+        self.lock = Lock()
+        self.receipt_count = 0
+
+    def send(self, body: str) -> None:
+        """add a message to the queue"""
+        self.messages.put(body)
+
+    def receive(self, wait_seconds: float) -> List[EventMessage]:
+        try:
+            bodies = [self.messages.get(timeout=max(wait_seconds, 1e-3))]
+        except Empty:
+            return []
+        while len(bodies) < SQS_BATCH_SIZE and not self.messages.empty():
+            bodies.append(self.messages.get_nowait())
+
+        with self.lock:
+            start = self.receipt_count
+            self.receipt_count += len(bodies)
+        return [(str(start + index), body) for index, body in enumerate(bodies)]
+
+    def delete(self, receipt_handles: List[str]) -> None:
+        with self.lock:
+            self.deleted += receipt_handles
+
+
+def s3_event_record(bucket_name: str, key: str, event_time: str) -> str:
+    """S3 event notification message body for a new object"""
+    return json.dumps(
+        {
+            "Records": [
+                {
+                    "eventName": "ObjectCreated:Put",
+                    "eventTime": event_time,
+                    "s3": {
+                        "bucket": {"name": bucket_name},
+                        "object": {"key": key, "size": 1},
+                    },
+                }
+            ]
+        }
+    )
+
+
+def s3_event_files(body: str) -> Dict[str, float]:
+    """
+    files created by an S3 event notification message, directly from S3 or
+    wrapped in an SNS notification. test events hold no files.
+
+    :return unix time of each object's creation event, by s3 path
+    """
+    message = json.loads(body)
+    if "Message" in message:
+        message = json.loads(message["Message"])
+
+    files: Dict[str, float] = {}
+    for record in message.get("Records", []):
+        if not record.get("eventName", "").startswith("ObjectCreated"):
+            continue
+        s3_object = record["s3"]["object"]
+        if s3_object.get("size", 1) == 0:
+            continue
+        s3_path = os.path.join(
+            "s3://",
+            record["s3"]["bucket"]["name"],
+            unquote_plus(s3_object["key"]),
+        )
+        files[s3_path] = datetime.fromisoformat(
+            record["eventTime"].replace("Z", "+00:00")
+        ).timestamp()
+    return files
+
+
+class S3EventSource(ArrivalSource):
+    """
+    Receive incoming files from S3 event notifications
+
+    Messages are deleted from the event queue once all of their files are
+    acknowledged. Messages with files that are still in the incoming bucket,
+    because their batch failed or a converter left them there, become
+    visible again after the queue's visibility timeout, which should be
+    longer than an ingestion loop.
+
+    The incoming bucket is also listed every reconcile_seconds, picking up
+    files whose events were lost and files a converter left in the bucket.
+    Every listed file is still in the bucket, so listings are not filtered.
+    Late events for files that were already ingested are ignored.
+    """
+
+    def __init__(
+        self,
+        event_queue: EventQueue,
+        file_prefix: str,
+        list_files: Optional[FileLister],
+        settings: ArrivalSettings,
+    ) -> None:
+        super().__init__(settings)
+        self.event_queue = event_queue
+        self.file_prefix = file_prefix
+        self.list_files = list_files
+        self.reconciled_at = time.time()
+
+        # receipt handle -> files of the message waiting to be acknowledged
+        self.unacknowledged: Dict[str, Set[str]] = {}
+        # recently acknowledged files, oldest first, to ignore late events
+        self.acknowledged: Deque[Tuple[float, str]] = deque()
+        self.acknowledged_files: Set[str] = set()
+
+    def receive(self, wait_seconds: float) -> Dict[str, float]:
+        files: Dict[str, float] = {}
+        if self.list_files is not None:
+            next_reconcile = (
+                self.reconciled_at + self.settings.reconcile_seconds
+            )
+            if time.time() >= next_reconcile:
+                self.reconciled_at = time.time()
+                files = dict.fromkeys(self.list_files(), self.reconciled_at)
+                wait_seconds = 0
+            else:
+                wait_seconds = min(wait_seconds, next_reconcile - time.time())
+
+        handled = []
+        for receipt_handle, body in self.event_queue.receive(wait_seconds):
+            try:
+                message_files = {
+                    s3_path: event_time
+                    for s3_path, event_time in s3_event_files(body).items()
+                    if s3_path.split("/", 3)[-1].startswith(self.file_prefix)
+                    and s3_path not in self.acknowledged_files
+                }
+            except (ValueError, KeyError) as exception:
+                process_logger = ProcessLogger(
+                    "parse_s3_event", receipt_handle=receipt_handle
+                )
+                process_logger.log_start()
+                process_logger.log_failure(exception)
+                message_files = {}
+
+            if message_files:
+                self.unacknowledged[receipt_handle] = set(message_files)
+                files.update(message_files)
+            else:
+                handled.append(receipt_handle)
+
+        if handled:
+            self.event_queue.delete(handled)
+
+        return files
+
+    def acknowledge(self, files: List[str]) -> None:
+        now = time.time()
+        for filename in files:
+            if filename not in self.acknowledged_files:
+                self.acknowledged.append((now, filename))
+                self.acknowledged_files.add(filename)
+
+        # events are delivered at least once, forget files after events for
+        # them could no longer arrive
+        while (
+            self.acknowledged
+            and now - self.acknowledged[0][0]
+            > 2 * self.settings.reconcile_seconds
+        ):
+            self.acknowledged_files.discard(self.acknowledged.popleft()[1])
+
+        handled = []
+        for receipt_handle, message_files in list(self.unacknowledged.items()):
+            message_files.difference_update(files)
+            if not message_files:
+                handled.append(receipt_handle)
+                del self.unacknowledged[receipt_handle]
+
+        if handled:
+            self.event_queue.delete(handled)
+
+
+class DirectoryWatchSource(ArrivalSource):
+    """
+    Watch a local directory for incoming files, for development
+
+    The directory is scanned every watch_seconds. Files are reported once,
+    with their modification time, and reported again if they are removed
+    and written again. Hidden files are skipped, so files can be written
+    under a hidden name and renamed once complete.
+    """
+
+    def __init__(self, watch_path: str, settings: ArrivalSettings) -> None:
+        super().__init__(settings)
+        self.watch_path = watch_path
+        self.seen: Set[str] = set()
+
+    def receive(self, wait_seconds: float) -> Dict[str, float]:
+        deadline = time.time() + wait_seconds
+        while True:
+            files: Dict[str, float] = {}
+            current = set()
+            for root, _, filenames in os.walk(self.watch_path):
+                for filename in filenames:
+                    if filename.startswith("."):
+                        continue
+                    path = os.path.join(root, filename)
+                    current.add(path)
+                    if path not in self.seen:
+                        try:
+                            files[path] = os.path.getmtime(path)
+                        except FileNotFoundError:
+                            current.discard(path)
+            self.seen = current
+
+            remaining = deadline - time.time()
+            if files or remaining <= 0:
+                return files
+            time.sleep(min(self.settings.watch_seconds, remaining))
+
+
+def arrival_source_from_settings(
+    settings: ArrivalSettings, list_files: FileLister, file_prefix: str
+) -> ArrivalSource:
+    """
+    create the arrival source selected by settings
+
+    :param list_files: lists every file waiting in the incoming bucket
+    :param file_prefix: incoming bucket prefix of files to ingest
+    """
+    if settings.source == "poll":
+        return PollingSource(list_files, settings)
+    if settings.source == "events":
+        if settings.queue_url is None:
+            raise ValueError("events arrival source requires a queue url")
+        return S3EventSource(
+            SqsEventQueue(settings.queue_url),
+            file_prefix,
+            list_files,
+            settings,
+        )
+    if settings.source == "watch":
+        if settings.watch_path is None:
+            raise ValueError("watch arrival source requires a watch path")
+        return DirectoryWatchSource(settings.watch_path, settings)
+    raise ValueError(f"unknown arrival source {settings.source}")
@@ -0,0 +1,456 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from multiprocessing import get_context
+from queue import Queue
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import pyarrow
+import pyarrow.compute as pc
+
+from lamp_py.aws.s3 import file_list_from_s3, upload_file
+from lamp_py.runtime_utils.env_validation import validate_environment
+from lamp_py.runtime_utils.process_logger import ProcessLogger
+
+from lamp_py.ingestion.convert_gtfs_rt import (
+    DEDUP_WINDOW_SECONDS,
+    DELTA_PART_PREFIX,
+    GTFS_RT_DETAILS,
+    GtfsRtConverter,
+)
+from lamp_py.ingestion.converter import ConfigType
+from lamp_py.ingestion.error import ConfigTypeFromFilenameException
+from lamp_py.ingestion.hash_index import windowed_first_records
+from lamp_py.ingestion.utils import (
+    DEFAULT_S3_PREFIX,
+    GTFS_RT_HASH_COL,
+    hash_gtfs_rt_table,
+)
+
+DESCRIPTION = """Rebuild GTFS-RT day files from the archive bucket"""
+
+# archived files are named with the time they were fetched
+FETCHED_AT = re.compile(r"(\d{4}-\d{2}-\d{2}T\d{2}[:_]\d{2}[:_]\d{2})Z?_")
+
+
+@dataclass
+class BackfillSettings:
+    """
+    Settings for rebuilding day files from the archive bucket
+
+    processes: worker processes building days concurrently
+        (BACKFILL_PROCESSES)
+    archive_prefixes: date partitioned prefixes of archived feed files
+        (BACKFILL_ARCHIVE_PREFIXES, comma separated)
+    lookahead_seconds: files fetched this long after the end of a day are
+        read for its last feeds (BACKFILL_LOOKAHEAD_SECONDS)
+    """
+
+    processes: int = 4
+    archive_prefixes: Tuple[str, ...] = (f"{DEFAULT_S3_PREFIX}/delta/",)
+    lookahead_seconds: int = 60 * 10
+
+    @classmethod
+    def from_environment(cls) -> "BackfillSettings":
+        """create settings, overriding defaults with environment variables"""
+        defaults = cls()
+        prefixes = os.environ.get("BACKFILL_ARCHIVE_PREFIXES")
+        return cls(
+            processes=int(
+                os.environ.get("BACKFILL_PROCESSES", defaults.processes)
+            ),
+            archive_prefixes=(
+                defaults.archive_prefixes
+                if prefixes is None
+                else tuple(
+                    prefix.strip().rstrip("/") + "/"
+                    for prefix in prefixes.split(",")
+                )
+            ),
+            lookahead_seconds=int(
+                os.environ.get(
+                    "BACKFILL_LOOKAHEAD_SECONDS", defaults.lookahead_seconds
+                )
+            ),
+        )
+
+
+def parse_args(args: List[str]) -> argparse.Namespace:
+    """parse args for running a backfill"""
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument(
+        "--config-type",
+        required=True,
+        choices=[str(config_type) for config_type in GTFS_RT_DETAILS],
+        dest="config_type",
+        help="GTFS-RT config type to rebuild day files of",
+    )
+    parser.add_argument(
+        "--start",
+        required=True,
+        type=date.fromisoformat,
+        dest="start",
+        help="first day to rebuild, as YYYY-MM-DD",
+    )
+    parser.add_argument(
+        "--end",
+        required=True,
+        type=date.fromisoformat,
+        dest="end",
+        help="last day to rebuild, as YYYY-MM-DD",
+    )
+    parser.add_argument(
+        "--run-name",
+        default=None,
+        dest="run_name",
+        help=(
+            "name of the backfill checkpoints, rerunning with the same name "
+            "skips days that were already rebuilt. defaults to the config "
+            "type and days."
+        ),
+    )
+
+    return parser.parse_args(args)
+
+
+def backfill_days(first_day: date, last_day: date) -> List[date]:
+    """
+    days from first_day to last_day, inclusive. converters keep the two most recent
+    day partitions locally and continue to write to them, so those days can
+    not be rebuilt.
+    """
+    latest = datetime.now(tz=timezone.utc).date() - timedelta(days=2)
+    if last_day > latest:
+        raise ValueError(
+            f"days after {latest} are still being ingested, can not backfill "
+            f"up to {last_day}"
+        )
+    return [
+        first_day + timedelta(days=offset)
+        for offset in range((last_day - first_day).days + 1)
+    ]
+
+
+def checkpoint_prefix(run_name: str, config_type: ConfigType) -> str:
+    """springboard bucket prefix of the day checkpoints of a backfill"""
+    return os.path.join(
+        DEFAULT_S3_PREFIX, "backfill", run_name, str(config_type), ""
+    )
+
+
+def completed_days(run_name: str, config_type: ConfigType) -> Set[date]:
+    """days of a backfill that have a checkpoint in the springboard bucket"""
+    return {
+        date.fromisoformat(os.path.basename(path).removesuffix(".json"))
+        for path in file_list_from_s3(
+            os.environ["SPRINGBOARD_BUCKET"],
+            checkpoint_prefix(run_name, config_type),
+        )
+        if path.endswith(".json")
+    }
+
+
+def write_checkpoint(
+    run_name: str, config_type: ConfigType, day: date, result: Dict[str, Any]
+) -> None:
+    """upload the checkpoint of a rebuilt day to the springboard bucket"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "checkpoint.json")
+        with open(path, "w", encoding="utf8") as file:
+            json.dump(result, file)
+
+        object_path = os.path.join(
+            os.environ["SPRINGBOARD_BUCKET"],
+            checkpoint_prefix(run_name, config_type),
+            f"{day.isoformat()}.json",
+        )
+        if not upload_file(path, object_path):
+            raise OSError(f"failed to upload {object_path}")
+
+
+def fetched_at(filename: str) -> Optional[datetime]:
+    """time an archived feed file was fetched, from its name"""
+    match = FETCHED_AT.search(os.path.basename(filename))
+    if match is None:
+        return None
+    return datetime.strptime(
+        match[1].replace("_", ":"), "%Y-%m-%dT%H:%M:%S"
+    ).replace(tzinfo=timezone.utc)
+
+
+def archive_files(
+    config_type: ConfigType, day: date, settings: BackfillSettings
+) -> List[str]:
+    """
+    archived feed files of a config type that may hold feeds of day
+
+    feed header timestamps are never after their file was fetched, so files
+    fetched on day and files fetched within lookahead_seconds after it are
+    listed.
+
+    :return s3 paths of archived files, in fetch order
+    """
+    next_day = day + timedelta(days=1)
+    lookahead = datetime.combine(
+        next_day, datetime.min.time(), timezone.utc
+    ) + timedelta(seconds=settings.lookahead_seconds)
+
+    files = []
+    for prefix in settings.archive_prefixes:
+        for list_day in (day, next_day):
+            for filename in file_list_from_s3(
+                os.environ["ARCHIVE_BUCKET"],
+                f"{prefix}{list_day.strftime('%Y/%m/%d')}/",
+            ):
+                try:
+                    if ConfigType.from_filename(filename) != config_type:
+                        continue
+                except ConfigTypeFromFilenameException:
+                    continue
+
+                fetched = fetched_at(filename)
+                if list_day == next_day and (
+                    fetched is None or fetched > lookahead
+                ):
+                    continue
+                files.append(filename)
+
+    return sorted(files, key=os.path.basename)
+
+
+def decode_day(converter: GtfsRtConverter, day: date) -> pyarrow.Table:
+    """
+    decode and transform the files of converter, keeping the records of day
+    that continuous ingestion writes to the day file
+
+    :return pyarrow Table of the day partition, with GTFS_RT_HASH_COL
+    """
+    tables = []
+    for result_dt, result_filename, rt_data in converter.decode_files(0):
+        if result_dt is None or rt_data is None:
+            converter.error_files.append(result_filename)
+            continue
+        if result_dt.date() != day:
+            continue
+
+        # day files are written partition by partition, which never included
+        # records with a null partition_column value
+        rt_data = rt_data.filter(
+            pc.is_valid(rt_data.column(converter.detail.partition_column))
+        )
+        tables.append(
+            hash_gtfs_rt_table(rt_data.drop_columns(["year", "month", "day"]))
+        )
+
+    if not tables:
+        return pyarrow.table({})
+
+    table = pyarrow.concat_tables(tables, promote_options="permissive")
+    return table.filter(
+        windowed_first_records(
+            table.column(GTFS_RT_HASH_COL).to_numpy(),
+            table.column("feed_timestamp").to_numpy(),
+            DEDUP_WINDOW_SECONDS,
+        )
+    )
+
+
+def backfill_day(
+    config_type: ConfigType,
+    day: date,
+    run_name: str,
+    settings: BackfillSettings,
+    metadata_queue: Queue[Optional[str]],
+) -> Dict[str, Any]:
+    """
+    rebuild the day file of a config type from archived files in a single
+    pass, replacing the day file of the day in the springboard bucket, and
+    checkpoint the day
+
+    :return dictionary of results of the day
+    """
+    logger = ProcessLogger(
+        "backfill_day",
+        config_type=str(config_type),
+        day=day.isoformat(),
+        run_name=run_name,
+    )
+    logger.log_start()
+
+    result: Dict[str, Any] = {}
+    try:
+        converter = GtfsRtConverter(config_type, metadata_queue)
+        converter.add_files(archive_files(config_type, day, settings))
+        result["file_count"] = len(converter.files)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            converter.tmp_folder = temp_dir
+
+            table = decode_day(converter, day)
+            result.update(
+                error_file_count=len(converter.error_files),
+                number_of_rows=table.num_rows,
+            )
+            # an empty listing may be a failed listing, so the day is not
+            # checkpointed and is retried on the next run
+            if table.num_rows == 0:
+                raise FileNotFoundError(f"no archived records for {day}")
+
+            result["day_file_bytes"] = write_day(converter, day, table)
+
+        write_checkpoint(run_name, config_type, day, result)
+
+        logger.add_metadata(**result)
+        logger.log_complete()
+
+    except Exception as exception:
+        result["failed"] = True
+        logger.add_metadata(**result)
+        logger.log_failure(exception)
+
+    return result
+
+
+def write_day(
+    converter: GtfsRtConverter, day: date, table: pyarrow.Table
+) -> int:
+    """
+    write and upload the day file of day, and send the day file to the
+    metadata queue
+
+    delta parts of the day, written by continuous ingestion, are left in the
+    springboard bucket because metadata_log rows may still point at them.
+    their records are in the rebuilt day file, which lists them as merged so
+    that they are never merged into it again.
+
+    :return bytes of the written day file
+    """
+    partition_dt = datetime.combine(day, datetime.min.time())
+    day_folder = converter.day_folder(partition_dt)
+    os.makedirs(day_folder, exist_ok=True)
+    local_path = os.path.join(day_folder, f"{partition_dt.isoformat()}.parquet")
+
+    parts = [
+        os.path.basename(s3_file)
+        for s3_file in file_list_from_s3(
+            os.environ["SPRINGBOARD_BUCKET"],
+            file_prefix=f"{os.path.relpath(day_folder, converter.tmp_folder)}/",
+        )
+        if os.path.basename(s3_file).startswith(DELTA_PART_PREFIX)
+    ]
+    converter.write_day_table(table, local_path, merged_parts=parts)
+    converter.send_metadata(converter.s3_path(local_path))
+
+    return os.path.getsize(local_path)
+
+
+def run_backfill(
+    config_type: ConfigType,
+    days: List[date],
+    run_name: str,
+    metadata_queue: Queue[Optional[str]],
+    settings: BackfillSettings,
+) -> Dict[date, Dict[str, Any]]:
+    """
+    rebuild the day files of days that are not checkpointed yet, sharding
+    days across worker processes
+
+    :return dictionary of results, by rebuilt day
+    """
+    logger = ProcessLogger(
+        "backfill",
+        config_type=str(config_type),
+        run_name=run_name,
+        day_count=len(days),
+        processes=settings.processes,
+    )
+    logger.log_start()
+
+    completed = completed_days(run_name, config_type)
+    remaining = [day for day in days if day not in completed]
+    logger.add_metadata(completed_day_count=len(days) - len(remaining))
+
+    results: Dict[date, Dict[str, Any]] = {}
+    with ProcessPoolExecutor(
+        max_workers=max(min(settings.processes, len(remaining)), 1),
+        mp_context=get_context("spawn"),
+    ) as pool:
+        futures = {
+            pool.submit(
+                backfill_day,
+                config_type,
+                day,
+                run_name,
+                settings,
+                metadata_queue,
+            ): day
+            for day in remaining
+        }
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+
+    # failed days are not checkpointed, and are rebuilt on the next run
+    logger.add_metadata(
+        failed_day_count=sum(
+            1 for result in results.values() if result.get("failed")
+        )
+    )
+    logger.log_complete()
+    return results
+
+
+# pylint: disable=C0415
+# disable import outside toplevel
+def main(args: argparse.Namespace) -> None:
+    """run a backfill, notifying the metadata table of rebuilt day files"""
+    # backfill workers are spawned and import this module, the rds writer is
+    # only started by the main process
+    from lamp_py.postgres.postgres_utils import start_rds_writer_process
+
+    config_type = ConfigType[args.config_type]
+    days = backfill_days(args.start, args.end)
+    run_name = args.run_name or f"{config_type}_{args.start}_{args.end}"
+
+    metadata_queue, rds_process = start_rds_writer_process()
+    try:
+        run_backfill(
+            config_type,
+            days,
+            run_name,
+            metadata_queue,
+            BackfillSettings.from_environment(),
+        )
+    finally:
+        # stop the rds writer process once the queue is drained
+        metadata_queue.put(None)
+        rds_process.join()
+
+
+# pylint: enable=C0415
+
+
+def start() -> None:
+    """configure and start a backfill"""
+    os.environ["SERVICE_NAME"] = "ingestion_backfill"
+
+    validate_environment(
+        required_variables=[
+            "ARCHIVE_BUCKET",
+            "SPRINGBOARD_BUCKET",
+        ],
+        db_prefixes=["MD"],
+    )
+
+    main(parse_args(sys.argv[1:]))
+
+
+if __name__ == "__main__":
+    start()
@@ -0,0 +1,213 @@
+import os
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import numpy
+import pyarrow
+
+from lamp_py.ingestion.record_hash import (
+    hash_record_columns,
+    record_hash_field,
+)
+from lamp_py.ingestion.utils import GTFS_RT_HASH_COL, gtfs_rt_hash_columns
+
+
+def change_detection_from_environment() -> bool:
+    """
+    check if unchanged entities should be dropped while decoding, switched
+    off by setting the GTFS_RT_CHANGE_DETECTION environment variable to
+    "false". defaults to on.
+    """
+    setting = os.environ.get("GTFS_RT_CHANGE_DETECTION", "true")
+    return setting.lower() not in ("0", "false", "no", "off")
+
+
+# sorted fingerprints, and the latest feed timestamp of each fingerprint
+Fingerprints = Tuple[numpy.ndarray, numpy.ndarray]
+
+
+def merge_fingerprints(
+    cached: Optional[Fingerprints],
+    fingerprints: numpy.ndarray,
+    timestamps: numpy.ndarray,
+    window_seconds: int,
+) -> Fingerprints:
+    """
+    merge fingerprints and their feed timestamps into sorted cached
+    fingerprints, keeping the latest timestamp of each fingerprint and
+    forgetting fingerprints from before the window of the newest timestamp
+    """
+    # latest timestamp of each new fingerprint
+    order = numpy.lexsort((timestamps, fingerprints))
+    fingerprints = fingerprints[order]
+    timestamps = timestamps[order]
+    latest = numpy.append(fingerprints[1:] != fingerprints[:-1], True)
+    fingerprints = fingerprints[latest]
+    timestamps = timestamps[latest]
+
+    if cached is None:
+        cached = (
+            numpy.empty(0, dtype=fingerprints.dtype),
+            numpy.empty(0, dtype=numpy.int64),
+        )
+    cached_fingerprints, cached_at = cached
+
+    # drop cached fingerprints that are merged again, keeping the latest of
+    # both timestamps, or that are from before the window
+    current = cached_at > timestamps.max() - window_seconds
+    if len(cached_fingerprints) > 0:
+        positions = numpy.searchsorted(fingerprints, cached_fingerprints)
+        positions[positions == len(fingerprints)] = 0
+        merged = fingerprints[positions] == cached_fingerprints
+        timestamps[positions[merged]] = numpy.maximum(
+            timestamps[positions[merged]], cached_at[merged]
+        )
+        current &= ~merged
+    cached_fingerprints = cached_fingerprints[current]
+    cached_at = cached_at[current]
+
+    positions = numpy.searchsorted(cached_fingerprints, fingerprints)
+    return (
+        numpy.insert(cached_fingerprints, positions, fingerprints),
+        numpy.insert(cached_at, positions, timestamps),
+    )
+
+
+class EntityChangeFilter:
+    """
+    Drop entities that are unchanged since an earlier snapshot of a feed
+
+    GTFS-RT feeds are polled every few seconds and most of their entities are
+    identical between consecutive snapshots. Every entity of a decoded
+    snapshot is fingerprinted with the GTFS_RT_HASH_COL record hash, which
+    covers the entity id and every field except for the feed timestamp.
+    Entities of a day partition are dropped if their fingerprint was kept
+    from an earlier snapshot less than window_seconds before, and that
+    snapshot is either written or pending in the same table of the day.
+
+    Pending fingerprints share the fate of the entities they drop. They are
+    committed when the table of their day partition is written, and
+    discarded with it when it is not, so the filter never drops an entity
+    whose earlier copy was not written. Entities dropped for a pending
+    fingerprint would be dropped by the de-duplication of their table on
+    write. Entities dropped for a committed fingerprint would be dropped by
+    the hash index, which de-duplicates written records over a window that
+    starts window_seconds before the oldest snapshot of a table. The record
+    hash column is kept on filtered tables, so it is not computed again on
+    write.
+    """
+
+    def __init__(self, window_seconds: int) -> None:
+        self.window_seconds = window_seconds
+
+        # day partition -> fingerprints written to the day partition
+        self.written: Dict[datetime, Fingerprints] = {}
+        # day partition -> fingerprints kept in the table of the day
+        # partition that has not been written yet
+        self.pending: Dict[datetime, Fingerprints] = {}
+
+        self.input_rows = 0
+        self.unchanged_rows = 0
+
+    def unchanged(
+        self,
+        cached: Optional[Fingerprints],
+        fingerprints: numpy.ndarray,
+        feed_timestamp: int,
+    ) -> numpy.ndarray:
+        """
+        boolean mask, True for fingerprints cached from an earlier snapshot
+        within the window of feed_timestamp
+        """
+        if cached is None or len(cached[0]) == 0:
+            return numpy.zeros(len(fingerprints), dtype=bool)
+
+        cached_fingerprints, cached_at = cached
+        positions = numpy.searchsorted(cached_fingerprints, fingerprints)
+        positions[positions == len(cached_fingerprints)] = 0
+        age = feed_timestamp - cached_at[positions]
+
+        # entities of the same snapshot, or of earlier snapshots processed
+        # after it, are never dropped
+        return (
+            (cached_fingerprints[positions] == fingerprints)
+            & (age > 0)
+            & (age < self.window_seconds)
+        )
+
+    def filter(self, dt_part: datetime, table: pyarrow.Table) -> pyarrow.Table:
+        """
+        drop entities of a decoded snapshot that are unchanged since an
+        earlier snapshot of its day partition, that was written or is
+        pending, and add the fingerprints of kept entities to the pending
+        fingerprints of the day partition
+
+        :param dt_part: day partition of the snapshot
+        :param table: snapshot entities with "year", "month", "day" and
+            "feed_timestamp" columns
+
+        :return table of changed entities, with GTFS_RT_HASH_COL appended
+        """
+        # hash columns of the written table, which drops partition columns
+        hash_columns = [
+            column
+            for column in gtfs_rt_hash_columns(table.schema)
+            if column not in ("year", "month", "day")
+        ]
+        hashes = hash_record_columns(table, hash_columns)
+        table = table.append_column(record_hash_field(GTFS_RT_HASH_COL), hashes)
+        if table.num_rows == 0:
+            return table
+
+        feed_timestamp = table.column("feed_timestamp")[0].as_py()
+        fingerprints = hashes.to_numpy()
+
+        unchanged = self.unchanged(
+            self.written.get(dt_part), fingerprints, feed_timestamp
+        ) | self.unchanged(
+            self.pending.get(dt_part), fingerprints, feed_timestamp
+        )
+        kept = fingerprints[~unchanged]
+        self.pending[dt_part] = merge_fingerprints(
+            self.pending.get(dt_part),
+            kept,
+            numpy.full(len(kept), feed_timestamp, dtype=numpy.int64),
+            self.window_seconds,
+        )
+
+        self.input_rows += table.num_rows
+        self.unchanged_rows += int(unchanged.sum())
+
+        return table.filter(pyarrow.array(~unchanged))
+
+    def commit(self, dt_part: datetime, table: pyarrow.Table) -> None:
+        """
+        remember the fingerprints of records written to a day partition, in
+        place of the pending fingerprints of the day partition, and forget
+        day partitions older than the previous day
+
+        :param dt_part: day partition the records were written to
+        :param table: written records with GTFS_RT_HASH_COL and
+            "feed_timestamp" columns
+        """
+        self.pending.pop(dt_part, None)
+        if table.num_rows > 0:
+            self.written[dt_part] = merge_fingerprints(
+                self.written.get(dt_part),
+                table.column(GTFS_RT_HASH_COL).to_numpy(),
+                table.column("feed_timestamp").to_numpy().astype(numpy.int64),
+                self.window_seconds,
+            )
+
+        for old_day in sorted(self.written)[:-2]:
+            del self.written[old_day]
+
+    def discard(self, dt_part: Optional[datetime] = None) -> None:
+        """
+        forget pending fingerprints of a day partition, or of every day
+        partition, whose table will not be written
+        """
+        if dt_part is None:
+            self.pending = {}
+        else:
+            self.pending.pop(dt_part, None)
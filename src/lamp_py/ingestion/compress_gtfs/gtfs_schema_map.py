@@ -2,6 +2,10 @@ from typing import Dict, List
 
 import polars as pl
 
+# content hash of the gtfs table columns of each record, carried by yearly
+# parquet files so that schedules are compared to them on a single column
+GTFS_RECORD_HASH_COL = "lamp_record_hash"
+
 agency = {
     "agency_id": pl.Int64,
     "agency_name": pl.String,
@@ -1,9 +1,21 @@
 import os
 import time
+import datetime
 import tempfile
-from typing import Tuple
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    wait,
+)
+from dataclasses import dataclass
+from functools import lru_cache
+from multiprocessing import get_context
+from typing import Dict, List, Optional, Tuple
 
 import polars as pl
+import pyarrow
 import pyarrow.parquet as pq
 import pyarrow.compute as pc
 import pyarrow.dataset as pd
@@ -11,6 +23,7 @@ import pyarrow.dataset as pd
 from lamp_py.runtime_utils.process_logger import ProcessLogger
 
 from lamp_py.ingestion.compress_gtfs.gtfs_schema_map import (
+    GTFS_RECORD_HASH_COL,
     gtfs_schema_list,
     gtfs_schema,
 )
@@ -20,25 +33,188 @@ from lamp_py.ingestion.compress_gtfs.schedule_details import (
     GTFS_PATH,
 )
 from lamp_py.ingestion.compress_gtfs.pq_to_sqlite import pq_folder_to_sqlite
+from lamp_py.ingestion.compress_gtfs.yearly_table import (
+    YearlyTable,
+    export_yearly_tables,
+)
+from lamp_py.ingestion.record_hash import (
+    RECORD_HASH_TYPE,
+    hash_record_columns,
+)
 from lamp_py.aws.s3 import upload_file
 
+# approximate peak memory of compressing each table file of a schedule, in MB.
+# table files that are not listed are small.
+TABLE_MEMORY_HINTS_MB = {
+    "stop_times.txt": 4096,
+    "shapes.txt": 768,
+    "trips.txt": 512,
+    "stops.txt": 256,
+    "calendar_dates.txt": 256,
+    "route_patterns.txt": 256,
+}
+DEFAULT_MEMORY_HINT_MB = 128
+
+
+@dataclass
+class CompressSettings:
+    """
+    Settings for compressing gtfs schedules into yearly parquet files
+
+    processes: worker processes compressing the table files of a schedule
+        concurrently, table files are compressed one after another in the
+        main process if 1 (GTFS_COMPRESS_PROCESSES)
+    memory_budget_mb: table files are only started while the memory hints of
+        all running table files fit in this budget (GTFS_COMPRESS_MEMORY_MB)
+    retry_attempts: attempts to compress a table file again after it failed
+    retry_wait_seconds: wait before each retry of a table file
+    """
+
+    processes: int = 4
+    memory_budget_mb: int = 6144
+    retry_attempts: int = 3
+    retry_wait_seconds: float = 5
+
+    @classmethod
+    def from_environment(cls) -> "CompressSettings":
+        """create settings, overriding defaults with environment variables"""
+        defaults = cls()
+        return cls(
+            processes=int(
+                os.environ.get("GTFS_COMPRESS_PROCESSES", defaults.processes)
+            ),
+            memory_budget_mb=int(
+                os.environ.get(
+                    "GTFS_COMPRESS_MEMORY_MB", defaults.memory_budget_mb
+                )
+            ),
+        )
+
+
+@dataclass(frozen=True)
+class LocalSchedule:
+    """
+    schedule zip file copied to local disk, for worker processes to read
+    instead of each downloading the schedule again
+    """
+
+    zip_path: str
+    file_location: str
+    published_dt: datetime.datetime
+    tmp_folder: str
+
+
+def memory_hint_mb(gtfs_table_file: str) -> int:
+    """approximate peak memory of compressing gtfs_table_file, in MB"""
+    return TABLE_MEMORY_HINTS_MB.get(gtfs_table_file, DEFAULT_MEMORY_HINT_MB)
+
+
+def gtfs_record_hashes(
+    table: pyarrow.Table, gtfs_table_file: str
+) -> pyarrow.ChunkedArray:
+    """
+    create a GTFS_RECORD_HASH_COL record hash for every row of table, from
+    the gtfs table columns of gtfs_table_file in schema order
+
+    columns of the schema that are missing from table are hashed as null
+    values, like the all NULL columns that gtfs_to_frame adds for them
+
+    :param table: records of gtfs_table_file
+    :param gtfs_table_file: (ie. stop_times.txt)
+
+    :return ChunkedArray of RECORD_HASH_TYPE with one hash per table row
+    """
+    hash_columns = list(gtfs_schema(gtfs_table_file).keys())
+    for column in hash_columns:
+        if column not in table.column_names:
+            table = table.append_column(column, pyarrow.nulls(table.num_rows))
+
+    return hash_record_columns(table, hash_columns)
+
+
+def hash_gtfs_frame(frame: pl.DataFrame, gtfs_table_file: str) -> pl.DataFrame:
+    """
+    add GTFS_RECORD_HASH_COL column to frame of gtfs_table_file records
+
+    :param frame: records of gtfs_table_file
+    :param gtfs_table_file: (ie. stop_times.txt)
+
+    :return frame with GTFS_RECORD_HASH_COL column
+    """
+    hash_columns = [
+        column
+        for column in gtfs_schema(gtfs_table_file).keys()
+        if column in frame.columns
+    ]
+    hashes = gtfs_record_hashes(
+        frame.select(hash_columns).to_arrow(), gtfs_table_file
+    )
+    return frame.with_columns(
+        pl.Series(GTFS_RECORD_HASH_COL, hashes.to_numpy(), dtype=pl.UInt64)
+    )
+
+
+def hash_gtfs_parquet(pq_path: str, gtfs_table_file: str) -> None:
+    """
+    add GTFS_RECORD_HASH_COL to yearly parquet file, if not already present
+
+    yearly parquet files compressed by earlier versions of this process do not
+    carry record hashes, and are migrated the first time they are compared to
+    a schedule. the file is rewritten in batches to constrain memory usage.
+
+    :param pq_path: yearly parquet file of gtfs_table_file
+    :param gtfs_table_file: (ie. stop_times.txt)
+    """
+    ds = pd.dataset(pq_path)
+    if GTFS_RECORD_HASH_COL in ds.schema.names:
+        return
+
+    logger = ProcessLogger(
+        "hash_gtfs_parquet", pq_path=pq_path, row_count=ds.count_rows()
+    )
+    logger.log_start()
+
+    hash_schema = ds.schema.append(
+        pyarrow.field(GTFS_RECORD_HASH_COL, RECORD_HASH_TYPE)
+    )
+    with tempfile.TemporaryDirectory() as temp_dir:
+        tmp_pq = os.path.join(temp_dir, "hash.parquet")
+        with pq.ParquetWriter(tmp_pq, schema=hash_schema) as writer:
+            for batch in ds.to_batches(batch_size=1024 * 256):
+                table = pyarrow.Table.from_batches([batch])
+                writer.write_table(
+                    table.append_column(
+                        hash_schema.field(GTFS_RECORD_HASH_COL),
+                        gtfs_record_hashes(table, gtfs_table_file),
+                    )
+                )
+
+        os.replace(tmp_pq, pq_path)
+
+    logger.log_complete()
+
 
 def frame_parquet_diffs(
     new_frame: pl.DataFrame,
-    pq_path: str,
+    pq_paths: List[str],
     gtfs_table_file: str,
     filter_date: int,
 ) -> Tuple[pl.DataFrame, pl.DataFrame, pl.DataFrame]:
     """
-    compare new_frame records to applicable records from an existing parquet file
+    compare new_frame records to applicable records from existing parquet files
+
+    records are compared on their GTFS_RECORD_HASH_COL record hash, instead of
+    on every gtfs table column. parquet files without record hashes are
+    migrated to carry them before the comparison.
 
     creates 3 frames based on diffs:
         - new_records -> records in new_frame that are not found in parquet file
         - same_records -> records that are in new_frame and parquet file
         - old_records -> records in parquet file that are not found in new_frame
 
-    :param new_frame: records to compare to parquet file
-    :param pq_path: path to parquet file for comparison
+    :param new_frame: records to compare to parquet file, with GTFS_RECORD_HASH_COL
+    :param pq_paths: paths to parquet files for comparison (ie. the yearly
+        table bucket files that may hold records active on filter_date)
     :param gtfs_table_file: (ie. stop_times.txt)
     :param filter_date: value for inclusive filter on parquet file as YYYYMMDD (ie. service_date)
 
@@ -48,81 +224,59 @@ def frame_parquet_diffs(
         new_records: polars.DataFrame,
     ]
     """
+    for pq_path in pq_paths:
+        hash_gtfs_parquet(pq_path, gtfs_table_file)
+
     pq_filter = (pc.field("gtfs_active_date") <= filter_date) & (
         pc.field("gtfs_end_date") >= filter_date
     )
-    pq_frame = pl.read_parquet(
-        pq_path, use_pyarrow=True, pyarrow_options={"filters": pq_filter}
-    )
+    if pq_paths:
+        pq_frame = pl.DataFrame(pd.dataset(pq_paths).to_table(filter=pq_filter))
+    else:
+        # no records of the parquet files are applicable on filter_date
+        pq_frame = new_frame.clear().drop("from_zip")
 
-    join_columns = tuple(gtfs_schema(gtfs_table_file).keys())
+    pq_hashes = pq_frame.get_column(GTFS_RECORD_HASH_COL)
+    new_hashes = new_frame.get_column(GTFS_RECORD_HASH_COL)
 
-    # anti join of new_frame to pq_frame will create frame of only new records not found in pq_frame
+    # new_frame records with a record hash not found in pq_frame are new records
     # empty frame created if no new records exist
-    new_records = new_frame.join(
-        pq_frame.select(join_columns),
-        how="anti",
-        on=join_columns,
-        join_nulls=True,
-        coalesce=True,
-    ).drop("from_zip")
-
-    # left join to create frame of old and same records
-    pq_frame = pq_frame.join(
-        new_frame.select(join_columns + ("from_zip",)),
-        how="left",
-        on=join_columns,
-        join_nulls=True,
-        coalesce=True,
+    new_records = new_frame.filter(~new_hashes.is_in(pq_hashes)).drop(
+        "from_zip"
     )
-    same_records = pq_frame.filter(pl.col("from_zip").eq(True)).drop("from_zip")
-    old_records = pq_frame.filter(pl.col("from_zip").is_null()).drop("from_zip")
+
+    # pq_frame records with a record hash found in new_frame are same records,
+    # filtering pq_frame instead of joining it to new_frame avoids a copy of
+    # pq_frame with the joined columns
+    in_new_frame = pq_hashes.is_in(new_hashes)
+    same_records = pq_frame.filter(in_new_frame)
+    old_records = pq_frame.filter(~in_new_frame)
 
     return old_records, same_records, new_records
 
 
 def merge_frame_with_parquet(
-    merge_df: pl.DataFrame, export_path: str, filter_date: int
+    merge_df: pl.DataFrame, yearly_table: YearlyTable, filter_date: int
 ) -> None:
     """
-    merge merge_df with existing parqut file (export_path) and over-write with results
+    merge merge_df with the existing records of yearly_table, replacing its
+    records applicable on filter_date
 
-    all parquet read/write operations are done in batches to constrain memory usage
+    only the bucket files of yearly_table that may hold records applicable on
+    filter_date are rewritten, and all parquet read/write operations are done
+    in batches to constrain memory usage
 
-    :param merge_df: records to merge into export_path parquet file
-    :param export_path: existing parquet file to merge with merge_df
+    :param merge_df: records to merge into yearly_table
+    :param yearly_table: yearly records of the gtfs table file to merge with merge_df
     :param filter_date: value for exclusive filter on parquet files as YYYYMMDD (ie. service_date)
     """
-    batch_size = 1024 * 256
-    if merge_df.shape[0] == 0:
-        # No records to merge with parquet file
-        return
-
     # sort stop_times and trips frames to reduce file size
-    if "/stop_times.parquet" in export_path:
+    if yearly_table.table == "stop_times":
         merge_df = merge_df.sort(by=["stop_id", "trip_id"])
-    if "/trips.parquet" in export_path:
+    if yearly_table.table == "trips":
         merge_df = merge_df.sort(by=["route_id", "service_id"])
 
-    merge_df = merge_df.to_arrow()
-
-    with tempfile.TemporaryDirectory() as temp_dir:
-        tmp_path = os.path.join(temp_dir, "filter.parquet")
-
-        # create filtered parquet file, excluding records from merge_frame
-        pq_filter = (pc.field("gtfs_active_date") > filter_date) | (
-            pc.field("gtfs_end_date") < filter_date
-        )
-        filter_ds = pd.dataset(export_path).filter(pq_filter)
-        with pq.ParquetWriter(tmp_path, schema=merge_df.schema) as writer:
-            for batch in filter_ds.to_batches(batch_size=batch_size):
-                writer.write_batch(batch)
-
-        # over-write export_path file with merged dataset
-        export_ds = pd.dataset((pd.dataset(tmp_path), pd.dataset(merge_df)))
-        with pq.ParquetWriter(export_path, schema=merge_df.schema) as writer:
-            for batch in export_ds.to_batches(batch_size=batch_size):
-                writer.write_batch(batch)
+    yearly_table.merge(merge_df, filter_date)
 
 
 def compress_gtfs_file(
@@ -134,6 +288,9 @@ def compress_gtfs_file(
 
     yearly partition is based on ScheduleDetals.active_from_int value (1 day after published_dt)
 
+    yearly records are kept in the bucket files of a YearlyTable, and the
+    yearly parquet file is only written from them by export_yearly_tables
+
     will perform 1 of 3 operations:
     1.  if a yearly parquet file already exists, perform differential
         merge operation on existing parquet file with gtfs_table_file
@@ -150,28 +307,32 @@ def compress_gtfs_file(
     """
     partition_year = int(str(schedule_details.active_from_int)[:4])
 
-    gtfs_table = gtfs_table_file.replace(".txt", "")
-
-    export_path = os.path.join(
-        schedule_details.tmp_folder,
-        f"{partition_year}",
-        f"{gtfs_table}.parquet",
+    yearly_table = YearlyTable(
+        schedule_details.tmp_folder, partition_year, gtfs_table_file
     )
-    last_export_path = os.path.join(
-        schedule_details.tmp_folder,
-        f"{partition_year-1}",
-        f"{gtfs_table}.parquet",
+    last_yearly_table = YearlyTable(
+        schedule_details.tmp_folder, partition_year - 1, gtfs_table_file
     )
 
-    new_frame = schedule_details.gtfs_to_frame(gtfs_table_file)
+    new_frame = hash_gtfs_frame(
+        schedule_details.gtfs_to_frame(gtfs_table_file), gtfs_table_file
+    )
 
-    if os.path.exists(export_path):
+    # yearly files written by earlier versions of this process carry no
+    # record hashes, migrate them before they are split into bucket files
+    for table in (yearly_table, last_yearly_table):
+        if table.needs_split():
+            hash_gtfs_parquet(table.export_path, gtfs_table_file)
+
+    if yearly_table.exists():
         #
-        # regular merge operation (with export_path)
+        # regular merge operation (with yearly_table)
         #
         old_records, same_records, new_records = frame_parquet_diffs(
             new_frame=new_frame,
-            pq_path=export_path,
+            pq_paths=yearly_table.bucket_paths(
+                schedule_details.active_from_int
+            ),
             gtfs_table_file=gtfs_table_file,
             filter_date=schedule_details.active_from_int,
         )
@@ -192,19 +353,19 @@ def compress_gtfs_file(
         )
         merge_frame_with_parquet(
             merge_records,
-            export_path,
+            yearly_table,
             schedule_details.active_from_int,
         )
 
-    elif os.path.exists(last_export_path):
+    elif last_yearly_table.exists():
         #
-        # new year merge operation (with last_export_path)
+        # new year merge operation (with last_yearly_table)
         #
         end_last_year = int(f"{partition_year-1}1231")
         start_current_year = int(f"{partition_year}0101")
         old_records, same_records, new_records = frame_parquet_diffs(
             new_frame=new_frame,
-            pq_path=last_export_path,
+            pq_paths=last_yearly_table.bucket_paths(end_last_year),
             gtfs_table_file=gtfs_table_file,
             filter_date=end_last_year,
         )
@@ -218,7 +379,7 @@ def compress_gtfs_file(
         )
         merge_frame_with_parquet(
             last_year_records,
-            last_export_path,
+            last_yearly_table,
             end_last_year,
         )
 
@@ -233,58 +394,195 @@ def compress_gtfs_file(
             pl.lit(start_current_year).alias("gtfs_active_date"),
             pl.lit(schedule_details.published_int).alias("gtfs_end_date"),
         )
-        pl.concat(
-            (old_records, same_records, new_records),
-            how="diagonal",
-        ).filter(
-            pl.col("gtfs_end_date") > pl.col("gtfs_active_date")
-        ).write_parquet(
-            export_path, use_pyarrow=True, statistics=True
+        merge_frame_with_parquet(
+            pl.concat(
+                (old_records, same_records, new_records),
+                how="diagonal",
+            ).filter(pl.col("gtfs_end_date") > pl.col("gtfs_active_date")),
+            yearly_table,
+            schedule_details.active_from_int,
         )
     else:
         #
         # no partition file exists (current or last)
         # create new partition file, if new records exist (initialize process)
         #
-        if new_frame.shape[0] == 0:
-            return
-
-        new_frame.drop("from_zip").write_parquet(
-            export_path, use_pyarrow=True, statistics=True
+        merge_frame_with_parquet(
+            new_frame.drop("from_zip"),
+            yearly_table,
+            schedule_details.active_from_int,
         )
 
 
-def compress_gtfs_schedule(schedule_details: ScheduleDetails) -> None:
+def compress_gtfs_file_with_retries(
+    gtfs_table_file: str,
+    schedule_details: ScheduleDetails,
+    settings: CompressSettings,
+) -> None:
+    """
+    compress an individual gtfs_table_file, retrying it settings.retry_attempts
+    times before raising the exception of its last attempt
+
+    :param gtfs_table_file: (ie. stop_times.txt)
+    :param schedule_details: data required for schedule compression operation
+    :param settings: retry settings of the compression
+    """
+    logger = ProcessLogger(
+        "compress_gtfs_schedule_file",
+        gtfs_file=gtfs_table_file,
+    )
+    logger.log_start()
+    for attempt in range(settings.retry_attempts + 1):
+        try:
+            logger.add_metadata(retry_attemps=attempt)
+            compress_gtfs_file(gtfs_table_file, schedule_details)
+            logger.log_complete()
+            break
+        except Exception as exception:
+            # wait for gremlins to disappear...
+            time.sleep(settings.retry_wait_seconds)
+            if attempt == settings.retry_attempts:
+                logger.log_failure(exception)
+                raise exception
+
+
+@lru_cache(maxsize=1)
+def local_schedule_details(local_schedule: LocalSchedule) -> ScheduleDetails:
+    """
+    schedule details read from the local copy of a schedule zip, once for
+    all of the table files a worker process compresses for the schedule
+    """
+    schedule_details = ScheduleDetails(
+        local_schedule.zip_path,
+        local_schedule.published_dt,
+        local_schedule.tmp_folder,
+    )
+    # log table files with the location of the schedule, not its local copy
+    schedule_details.file_location = local_schedule.file_location
+    return schedule_details
+
+
+def compress_local_schedule_file(
+    gtfs_table_file: str,
+    local_schedule: LocalSchedule,
+    settings: CompressSettings,
+) -> None:
+    """compress an individual gtfs_table_file in a worker process"""
+    compress_gtfs_file_with_retries(
+        gtfs_table_file, local_schedule_details(local_schedule), settings
+    )
+
+
+def compress_files_in_pool(
+    gtfs_table_files: List[str],
+    local_schedule: LocalSchedule,
+    pool: Executor,
+    settings: CompressSettings,
+) -> None:
+    """
+    compress table files of a schedule concurrently in pool
+
+    table files are started largest memory hint first, and only while the
+    memory hints of all running table files fit in settings.memory_budget_mb,
+    so that stop_times.txt is started first and is not starved by the small
+    table files. a single table file is always started, even if its memory
+    hint does not fit in the budget.
+
+    once a table file fails all of its retries no more table files are
+    started, and its exception is raised after the running table files
+    complete
+
+    :param gtfs_table_files: table files to compress (ie. stop_times.txt)
+    :param local_schedule: local copy of the schedule zip
+    :param pool: pool to compress table files in
+    :param settings: concurrency and retry settings of the compression
+    """
+    pending = sorted(gtfs_table_files, key=memory_hint_mb, reverse=True)
+    running: Dict[Future, str] = {}
+    failure: Optional[BaseException] = None
+
+    while running or (pending and failure is None):
+        if failure is None:
+            running_mb = sum(memory_hint_mb(file) for file in running.values())
+            for gtfs_table_file in list(pending):
+                if len(running) >= settings.processes:
+                    break
+                hint_mb = memory_hint_mb(gtfs_table_file)
+                if running and running_mb + hint_mb > settings.memory_budget_mb:
+                    continue
+                future = pool.submit(
+                    compress_local_schedule_file,
+                    gtfs_table_file,
+                    local_schedule,
+                    settings,
+                )
+                running[future] = gtfs_table_file
+                running_mb += hint_mb
+                pending.remove(gtfs_table_file)
+
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            running.pop(future)
+            exception = future.exception()
+            if exception is not None and failure is None:
+                failure = exception
+
+    if failure is not None:
+        raise failure
+
+
+def compress_gtfs_schedule(
+    schedule_details: ScheduleDetails,
+    settings: Optional[CompressSettings] = None,
+    pool: Optional[Executor] = None,
+) -> None:
     """
     compress all table files of gtfs schedule into parquet files partitioned by year
 
-    this process is currently configured to run sequentially (oldest -> newest)
+    schedules are compressed sequentially (oldest -> newest). if a pool is
+    provided, the table files of the schedule are compressed concurrently in
+    the pool, otherwise they are compressed one after another.
 
-    the feed_info table file will be processed last, so that in the case of a
-    process failure, re-processsing of schedules will be possible
+    the feed_info table file will be processed last, only after every other
+    table file completed, so that in the case of a process failure,
+    re-processsing of schedules will be possible
 
     :param schedule_details: data required for schedule compression operation
+    :param settings: concurrency and retry settings of the compression
+    :param pool: pool to compress the table files of the schedule in
     """
-    retry_attemps = 3
+    if settings is None:
+        settings = CompressSettings()
 
-    for gtfs_file in gtfs_schema_list():
-        logger = ProcessLogger(
-            "compress_gtfs_schedule_file",
-            gtfs_file=gtfs_file,
-        )
-        logger.log_start()
-        for attempt in range(retry_attemps + 1):
-            try:
-                logger.add_metadata(retry_attemps=attempt)
-                compress_gtfs_file(gtfs_file, schedule_details)
-                logger.log_complete()
-                break
-            except Exception as exception:
-                # wait for gremlins to disappear...
-                time.sleep(5)
-                if attempt == retry_attemps:
-                    logger.log_failure(exception)
-                    raise exception
+    gtfs_files = gtfs_schema_list()
+    feed_info_file = gtfs_files.pop()
+
+    if pool is None:
+        for gtfs_file in gtfs_files:
+            compress_gtfs_file_with_retries(
+                gtfs_file, schedule_details, settings
+            )
+    else:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            local_schedule = LocalSchedule(
+                zip_path=os.path.join(temp_dir, "schedule.zip"),
+                file_location=schedule_details.file_location,
+                published_dt=schedule_details.published_dt,
+                tmp_folder=schedule_details.tmp_folder,
+            )
+            with open(local_schedule.zip_path, "wb") as zip_file:
+                zip_file.write(schedule_details.gtfs_bytes.getbuffer())
+            compress_files_in_pool(gtfs_files, local_schedule, pool, settings)
+
+    compress_gtfs_file_with_retries(feed_info_file, schedule_details, settings)
+
+    # feed_info.parquet lists the compressed schedules, keep it current after
+    # every schedule so that an interrupted run continues after them
+    YearlyTable(
+        schedule_details.tmp_folder,
+        int(str(schedule_details.active_from_int)[:4]),
+        feed_info_file,
+    ).export()
 
 
 def gtfs_to_parquet() -> None:
@@ -292,7 +590,10 @@ def gtfs_to_parquet() -> None:
     run gtfs -> parquet schedule compression process locally and then sync with S3 bucket
 
     maximum process memory usage for this operation peaked at 5440MB
-    while processing Feb-2018 to April-2024
+    while processing Feb-2018 to April-2024, when compressing table files one
+    after another. table files of each schedule are compressed concurrently
+    in GTFS_COMPRESS_PROCESSES worker processes, within a memory budget of
+    GTFS_COMPRESS_MEMORY_MB.
     """
     gtfs_tmp_folder = GTFS_PATH.replace(
         os.getenv("PUBLIC_ARCHIVE_BUCKET"), "/tmp"
@@ -302,22 +603,44 @@ def gtfs_to_parquet() -> None:
     )
     logger.log_start()
 
+    settings = CompressSettings.from_environment()
     feed = schedules_to_compress(gtfs_tmp_folder)
-    logger.add_metadata(schedule_count=feed.shape[0])
+    logger.add_metadata(
+        schedule_count=feed.shape[0],
+        processes=settings.processes,
+        memory_budget_mb=settings.memory_budget_mb,
+    )
 
-    # compress each schedule in feed
-    for schedule in feed.rows(named=True):
-        schedule_url = schedule["archive_url"]
-        schedule_pub_dt = schedule["published_dt"]
-        schedule_details = ScheduleDetails(
-            schedule_url,
-            schedule_pub_dt,
-            gtfs_tmp_folder,
+    # worker processes are kept for all schedules, so that they are only
+    # spawned once
+    pool: Optional[ProcessPoolExecutor] = None
+    if settings.processes > 1 and feed.shape[0] > 0:
+        pool = ProcessPoolExecutor(
+            max_workers=settings.processes,
+            mp_context=get_context("spawn"),
         )
-        compress_gtfs_schedule(schedule_details)
 
-    # send updates to S3 bucket...
-    for year in set(feed["published_dt"].dt.strftime("%Y").unique()):
+    # compress each schedule in feed
+    try:
+        for schedule in feed.rows(named=True):
+            schedule_url = schedule["archive_url"]
+            schedule_pub_dt = schedule["published_dt"]
+            schedule_details = ScheduleDetails(
+                schedule_url,
+                schedule_pub_dt,
+                gtfs_tmp_folder,
+            )
+            compress_gtfs_schedule(schedule_details, settings, pool)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    # write yearly files from the bucket files changed by this run, and send
+    # updates to S3 bucket...
+    exported_years = export_yearly_tables(gtfs_tmp_folder)
+    for year in set(feed["published_dt"].dt.strftime("%Y").unique()).union(
+        exported_years
+    ):
         year_path = os.path.join(gtfs_tmp_folder, year)
         pq_folder_to_sqlite(year_path)
         for file in os.listdir(year_path):
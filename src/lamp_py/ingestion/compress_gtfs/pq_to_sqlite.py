@@ -6,6 +6,7 @@ import pyarrow.dataset as pd
 
 from lamp_py.runtime_utils.process_logger import ProcessLogger
 from lamp_py.ingestion.utils import gzip_file
+from lamp_py.ingestion.compress_gtfs.gtfs_schema_map import GTFS_RECORD_HASH_COL
 
 
 def sqlite_type(pq_type: str) -> str:
@@ -62,15 +63,25 @@ def pq_folder_to_sqlite(year_path: str) -> None:
 
             ds = pd.dataset(os.path.join(year_path, file))
 
+            # record hashes are only used to compress schedules, and do not
+            # fit in a signed sqlite INTEGER
+            schema = ds.schema
+            if GTFS_RECORD_HASH_COL in schema.names:
+                schema = schema.remove(
+                    schema.get_field_index(GTFS_RECORD_HASH_COL)
+                )
+
             table = file.replace(".parquet", "")
-            columns = [f":{col}" for col in ds.schema.names]
+            columns = [f":{col}" for col in schema.names]
             insert_query = f"INSERT INTO {table} VALUES({','.join(columns)});"
 
             conn = sqlite3.connect(db_path)
             with conn:
-                conn.execute(sqlite_table_query(table, ds.schema))
+                conn.execute(sqlite_table_query(table, schema))
             with conn:
-                for batch in ds.to_batches(batch_size=250_000):
+                for batch in ds.to_batches(
+                    columns=schema.names, batch_size=250_000
+                ):
                     conn.executemany(insert_query, batch.to_pylist())
             conn.close()
 
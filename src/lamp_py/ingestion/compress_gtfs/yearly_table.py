@@ -0,0 +1,313 @@
+import os
+import json
+import tempfile
+from typing import Dict, Iterator, List, Optional
+
+import polars as pl
+import pyarrow
+import pyarrow.compute as pc
+import pyarrow.dataset as pd
+import pyarrow.parquet as pq
+
+from lamp_py.runtime_utils.process_logger import ProcessLogger
+
+# folder of tmp_folder holding the bucket files of yearly tables
+BUCKETS_FOLDER = "buckets"
+MANIFEST_FILENAME = "manifest.json"
+BATCH_SIZE = 1024 * 256
+
+
+def update_bucket_stats(stats: Dict[str, int], records: pyarrow.Table) -> None:
+    """add records to the row count and date range of a bucket"""
+    min_active_date = pc.min(records["gtfs_active_date"]).as_py()
+    max_end_date = pc.max(records["gtfs_end_date"]).as_py()
+    stats["rows"] = stats.get("rows", 0) + records.num_rows
+    stats["min_active_date"] = min(
+        stats.get("min_active_date", min_active_date), min_active_date
+    )
+    stats["max_end_date"] = max(
+        stats.get("max_end_date", max_end_date), max_end_date
+    )
+
+
+class YearlyTable:
+    """
+    compressed records of a gtfs table file for one year, stored as local
+    bucket files listed by a manifest
+
+    schedules are compressed oldest to newest, so a record that ended before
+    the filter date of a schedule can not be changed by any later schedule.
+    records that ended are written to closed buckets that are never
+    rewritten, and records that may still be changed are kept in a single
+    open bucket. merging a schedule only rewrites the buckets that hold
+    records active on its filter date, so its I/O is proportional to the
+    records of the active schedule and not to the records of the year.
+
+    the yearly {table}.parquet file read by sqlite exports and uploaded to
+    S3 is written from the buckets by export, once their records are final
+    for a run. a yearly file without buckets, like one downloaded from S3,
+    is split into buckets the first time it is read.
+
+    manifest.json lists every bucket with its row count and the minimum
+    "gtfs_active_date" and maximum "gtfs_end_date" of its records:
+    {
+        "buckets": {
+            "closed_20240302_0.parquet": {
+                "rows": int,
+                "min_active_date": int,
+                "max_end_date": int,
+            },
+            ...
+        },
+        "exported": bool,
+    }
+    """
+
+    def __init__(self, tmp_folder: str, year: int, gtfs_table_file: str):
+        self.table = gtfs_table_file.replace(".txt", "")
+        self.export_path = os.path.join(
+            tmp_folder, f"{year}", f"{self.table}.parquet"
+        )
+        self.folder = os.path.join(
+            tmp_folder, BUCKETS_FOLDER, f"{year}", self.table
+        )
+        self.manifest_path = os.path.join(self.folder, MANIFEST_FILENAME)
+
+        self.manifest: Dict = {"buckets": {}, "exported": True}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf8") as file:
+                self.manifest = json.load(file)
+
+    def exists(self) -> bool:
+        """check if any records of the table exist for the year"""
+        return bool(self.manifest["buckets"]) or os.path.exists(
+            self.export_path
+        )
+
+    def bucket_paths(self, filter_date: Optional[int] = None) -> List[str]:
+        """
+        paths of the bucket files of the table, oldest records first
+
+        :param filter_date: only include buckets that may hold records active
+            on filter_date as YYYYMMDD
+
+        :return List[bucket file paths]
+        """
+        self.split_export()
+        buckets = sorted(
+            self.manifest["buckets"].items(),
+            key=lambda bucket: (bucket[1]["min_active_date"], bucket[0]),
+        )
+        return [
+            os.path.join(self.folder, name)
+            for name, details in buckets
+            if filter_date is None
+            or details["min_active_date"]
+            <= filter_date
+            <= details["max_end_date"]
+        ]
+
+    def bucket_name(self, kind: str, filter_date: int) -> str:
+        """name of a new bucket file, that is not used by the manifest"""
+        index = 0
+        while f"{kind}_{filter_date}_{index}.parquet" in self.manifest[
+            "buckets"
+        ] or os.path.exists(
+            os.path.join(self.folder, f"{kind}_{filter_date}_{index}.parquet")
+        ):
+            index += 1
+        return f"{kind}_{filter_date}_{index}.parquet"
+
+    def write_manifest(self) -> None:
+        """atomically write the manifest of the bucket files"""
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf8") as file:
+            json.dump(self.manifest, file)
+        os.replace(tmp_path, self.manifest_path)
+
+    def needs_split(self) -> bool:
+        """check if the table is a yearly file that is not split into buckets"""
+        return not self.manifest["buckets"] and os.path.exists(self.export_path)
+
+    def split_export(self) -> None:
+        """
+        split a yearly file without bucket files into a closed bucket, with
+        the records that ended before the latest "gtfs_active_date" of the
+        yearly file, and an open bucket with all other records
+        """
+        if not self.needs_split():
+            return
+
+        logger = ProcessLogger("split_yearly_table", path=self.export_path)
+        logger.log_start()
+
+        latest_active_date = pc.max(
+            pq.read_table(self.export_path, columns=["gtfs_active_date"])[
+                "gtfs_active_date"
+            ]
+        ).as_py()
+        self.replace_buckets(
+            [],
+            pd.dataset(self.export_path).to_batches(batch_size=BATCH_SIZE),
+            latest_active_date,
+        )
+        # the yearly file already holds every record of the buckets
+        self.manifest["exported"] = True
+        self.write_manifest()
+
+        logger.add_metadata(bucket_count=len(self.manifest["buckets"]))
+        logger.log_complete()
+
+    # pylint: disable=R0914
+    # disable too many local variables
+    def replace_buckets(
+        self,
+        bucket_paths: List[str],
+        batches: Iterator[pyarrow.RecordBatch],
+        filter_date: int,
+    ) -> None:
+        """
+        replace bucket files with the records of batches, writing records
+        that ended before filter_date to a new closed bucket and all other
+        records to a new open bucket
+
+        new bucket files are listed by the manifest before the replaced
+        bucket files are removed, so an interrupted replacement only leaves
+        unlisted files behind
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        names = {
+            "closed": self.bucket_name("closed", filter_date),
+            "open": self.bucket_name("open", filter_date),
+        }
+        writers: Dict[str, pq.ParquetWriter] = {}
+        stats: Dict[str, Dict[str, int]] = {}
+        schema: Optional[pyarrow.Schema] = None
+
+        try:
+            for batch in batches:
+                if batch.num_rows == 0:
+                    continue
+                if schema is None:
+                    schema = batch.schema
+                table = pyarrow.Table.from_batches([batch]).select(schema.names)
+                closed = pc.less(table["gtfs_end_date"], filter_date)
+                for kind, records in (
+                    ("closed", table.filter(closed)),
+                    ("open", table.filter(pc.invert(closed))),
+                ):
+                    if records.num_rows == 0:
+                        continue
+                    if kind not in writers:
+                        writers[kind] = pq.ParquetWriter(
+                            os.path.join(self.folder, names[kind]),
+                            schema=schema,
+                        )
+                    writers[kind].write_table(records.cast(schema))
+                    update_bucket_stats(stats.setdefault(kind, {}), records)
+        finally:
+            for writer in writers.values():
+                writer.close()
+
+        for path in bucket_paths:
+            self.manifest["buckets"].pop(os.path.basename(path), None)
+        for kind, bucket_stats in stats.items():
+            self.manifest["buckets"][names[kind]] = bucket_stats
+        self.manifest["exported"] = False
+        self.write_manifest()
+
+        for path in bucket_paths:
+            os.remove(path)
+
+    # pylint: enable=R0914
+
+    def merge(self, merge_df: pl.DataFrame, filter_date: int) -> None:
+        """
+        replace the records active on filter_date with merge_df records
+
+        only the bucket files that may hold records active on filter_date are
+        read and rewritten, their records that are not active on filter_date
+        are kept
+
+        :param merge_df: records to merge into the table
+        :param filter_date: value for exclusive filter on bucket records as YYYYMMDD (ie. service_date)
+        """
+        if merge_df.shape[0] == 0:
+            # No records to merge with bucket files
+            return
+
+        merge_table = merge_df.to_arrow()
+        bucket_paths = self.bucket_paths(filter_date)
+
+        def merge_batches() -> Iterator[pyarrow.RecordBatch]:
+            if bucket_paths:
+                pq_filter = (pc.field("gtfs_active_date") > filter_date) | (
+                    pc.field("gtfs_end_date") < filter_date
+                )
+                yield from pd.dataset(bucket_paths).to_batches(
+                    columns=merge_table.schema.names,
+                    filter=pq_filter,
+                    batch_size=BATCH_SIZE,
+                )
+            yield from merge_table.to_batches(max_chunksize=BATCH_SIZE)
+
+        self.replace_buckets(bucket_paths, merge_batches(), filter_date)
+
+    def export(self) -> bool:
+        """
+        write the yearly {table}.parquet file from all bucket files, if the
+        buckets changed since the last export
+
+        :return True if the yearly file was written
+        """
+        if self.manifest["exported"] or not self.manifest["buckets"]:
+            return False
+
+        logger = ProcessLogger("export_yearly_table", path=self.export_path)
+        logger.log_start()
+
+        bucket_paths = self.bucket_paths()
+        schema = pq.read_schema(bucket_paths[-1])
+        export_ds = pd.dataset(bucket_paths, schema=schema)
+        with tempfile.TemporaryDirectory(dir=self.folder) as temp_dir:
+            tmp_path = os.path.join(temp_dir, f"{self.table}.parquet")
+            with pq.ParquetWriter(tmp_path, schema=schema) as writer:
+                for batch in export_ds.to_batches(batch_size=BATCH_SIZE):
+                    writer.write_batch(batch)
+            os.makedirs(os.path.dirname(self.export_path), exist_ok=True)
+            os.replace(tmp_path, self.export_path)
+
+        self.manifest["exported"] = True
+        self.write_manifest()
+
+        logger.add_metadata(
+            bucket_count=len(bucket_paths),
+            row_count=sum(
+                details["rows"] for details in self.manifest["buckets"].values()
+            ),
+        )
+        logger.log_complete()
+        return True
+
+
+def export_yearly_tables(tmp_folder: str) -> List[str]:
+    """
+    write the yearly {table}.parquet files of every yearly table with bucket
+    files that changed since their last export
+
+    :return List[years with written yearly files]
+    """
+    buckets_folder = os.path.join(tmp_folder, BUCKETS_FOLDER)
+    if not os.path.exists(buckets_folder):
+        return []
+
+    exported_years = []
+    for year in sorted(os.listdir(buckets_folder)):
+        exported = False
+        for table in sorted(os.listdir(os.path.join(buckets_folder, year))):
+            if YearlyTable(tmp_folder, int(year), f"{table}.txt").export():
+                exported = True
+        if exported:
+            exported_years.append(year)
+
+    return exported_years
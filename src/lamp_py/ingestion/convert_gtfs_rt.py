@@ -3,15 +3,12 @@ import logging
 import os
 import shutil
 import tempfile
-from concurrent.futures import ThreadPoolExecutor
-from dataclasses import (
-    dataclass,
-    field,
-)
-from datetime import (
-    datetime,
-    timezone,
-)
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from multiprocessing import current_process, get_context
 from queue import Queue
 from threading import current_thread
 from typing import (
@@ -19,24 +16,32 @@ from typing import (
     Iterable,
     List,
     Optional,
+    Set,
     Tuple,
+    Type,
 )
 
 import polars as pl
 import pyarrow
-from pyarrow import fs
+from pyarrow import fs, ipc
 import pyarrow.compute as pc
 import pyarrow.parquet as pq
 import pyarrow.dataset as pd
 
 from lamp_py.aws.s3 import (
+    delete_object,
     move_s3_objects,
     file_list_from_s3,
     download_file,
+    object_metadata,
     upload_file,
 )
 from lamp_py.runtime_utils.process_logger import ProcessLogger
 
+from lamp_py.ingestion.change_filter import (
+    EntityChangeFilter,
+    change_detection_from_environment,
+)
 from lamp_py.ingestion.config_rt_alerts import RtAlertsDetail
 from lamp_py.ingestion.config_busloc_trip import RtBusTripDetail
 from lamp_py.ingestion.config_busloc_vehicle import RtBusVehicleDetail
@@ -44,31 +49,72 @@ from lamp_py.ingestion.config_rt_trip import RtTripDetail
 from lamp_py.ingestion.config_rt_vehicle import RtVehicleDetail
 from lamp_py.ingestion.converter import ConfigType, Converter
 from lamp_py.ingestion.error import NoImplException
+from lamp_py.ingestion.gtfs_rt_decoder import GtfsRtDecoder
 from lamp_py.ingestion.gtfs_rt_detail import GTFSRTDetail
+from lamp_py.ingestion.hash_index import HASH_INDEX_FILE, WindowedHashIndex
+from lamp_py.ingestion.prefetch import (
+    FilePrefetcher,
+    PrefetchSettings,
+    ordered_map,
+)
+from lamp_py.ingestion.table_accumulator import DayAccumulators
 from lamp_py.ingestion.utils import (
     DEFAULT_S3_PREFIX,
     GTFS_RT_HASH_COL,
+    has_current_hash_column,
     hash_gtfs_rt_table,
     hash_gtfs_rt_parquet,
+    partition_groups,
 )
 
+# prefix of delta part files written next to the day file of a day partition
+DELTA_PART_PREFIX = "part-"
+
+# records within this many seconds of each other are de-duplicated
+DEDUP_WINDOW_SECONDS = 60 * 45
+
+# springboard folder, under DEFAULT_S3_PREFIX, of day files that keep
+# GTFS_RT_HASH_COL and hash indexes, restored by restarted converters
+WARM_START_FOLDER = "_warm_start"
+
+# S3 object metadata key pairing day files with their warm start checkpoint
+WRITE_ID_KEY = "lamp_write_id"
+
+# day file schema metadata key listing the delta parts merged into the day
+# file, that may not have been removed yet
+MERGED_PARTS_KEY = b"lamp_merged_parts"
+
+
+# GTFSRTDetail implementation for each config type with a GtfsRtConverter
+GTFS_RT_DETAILS: Dict[ConfigType, Type[GTFSRTDetail]] = {
+    ConfigType.RT_ALERTS: RtAlertsDetail,
+    ConfigType.RT_TRIP_UPDATES: RtTripDetail,
+    ConfigType.RT_VEHICLE_POSITIONS: RtVehicleDetail,
+    ConfigType.BUS_VEHICLE_POSITIONS: RtBusVehicleDetail,
+    ConfigType.BUS_TRIP_UPDATES: RtBusTripDetail,
+}
+
 
 @dataclass
-class TableData:
+class CompactionThresholds:
     """
-    Data structure for holding data related to yielding a parquet table
+    Thresholds for merging delta parts of a day partition into its day file
 
-    tables: list of pyarrow tables that will joined together for final table yield
-    files: list of files that make up tables
+    max_part_age_seconds: merge once the oldest delta part is this old
+    max_part_count: merge once this many delta parts exist
+    max_part_bytes: merge once delta parts are this many bytes
     """
 
-    table: Optional[pyarrow.Table] = None
-    files: List[str] = field(default_factory=list)
+    max_part_age_seconds: int = 60 * 5
+    max_part_count: int = 48
+    max_part_bytes: int = 256 * 1024 * 1024
 
 
+# pylint: disable=R0902,R0904
+# disable too many instance attributes and public methods
 class GtfsRtConverter(Converter):
     """
-    Converter that handles GTFS Real Time JSON data
+    Converter that handles GTFS Real Time JSON and protobuf data
 
     https_cdn.mbta.com_realtime_Alerts_enhanced.json.gz
     https_cdn.mbta.com_realtime_TripUpdates_enhanced.json.gz
@@ -76,6 +122,10 @@ class GtfsRtConverter(Converter):
     https_mbta_busloc_s3.s3.amazonaws.com_prod_TripUpdates_enhanced.json.gz
     https_mbta_busloc_s3.s3.amazonaws.com_prod_VehiclePositions_enhanced.json.gz
     https_mbta_integration.mybluemix.net_vehicleCount.gz
+
+    and binary protobuf feeds of the same entity types, named with a .pb or
+    .pb.gz suffix, once ConfigType.from_filename routes them
+    https_cdn.mbta.com_realtime_VehiclePositions.pb
     """
 
     def __init__(
@@ -85,28 +135,72 @@ class GtfsRtConverter(Converter):
 
         # Depending on filename, assign self.details to correct implementation
         # of GTFSRTDetail class.
-        self.detail: GTFSRTDetail
-
-        if config_type == ConfigType.RT_ALERTS:
-            self.detail = RtAlertsDetail()
-        elif config_type == ConfigType.RT_TRIP_UPDATES:
-            self.detail = RtTripDetail()
-        elif config_type == ConfigType.RT_VEHICLE_POSITIONS:
-            self.detail = RtVehicleDetail()
-        elif config_type == ConfigType.BUS_VEHICLE_POSITIONS:
-            self.detail = RtBusVehicleDetail()
-        elif config_type == ConfigType.BUS_TRIP_UPDATES:
-            self.detail = RtBusTripDetail()
-        else:
+        if config_type not in GTFS_RT_DETAILS:
             raise NoImplException(f"No Specialization for {config_type}")
+        self.detail: GTFSRTDetail = GTFS_RT_DETAILS[config_type]()
+
+        # compile the json and protobuf decoders for this detail's import
+        # schema once
+        self.decoder = GtfsRtDecoder(self.detail.import_schema)
 
         self.tmp_folder = "/tmp/gtfs-rt-continuous"
+        self.compaction = CompactionThresholds()
 
-        self.data_parts: Dict[datetime, TableData] = {}
+        self.data_parts = DayAccumulators(
+            change_filter=(
+                EntityChangeFilter(DEDUP_WINDOW_SECONDS)
+                if change_detection_from_environment()
+                else None
+            )
+        )
 
         self.error_files: List[str] = []
         self.archive_files: List[str] = []
 
+        # process pool decoding files with GTFS_RT_DECODE_PROCESSES, and the
+        # folder its workers write Arrow IPC tables to, kept across converts
+        self.decode_pool: Optional[ProcessPoolExecutor] = None
+        self.decode_pool_size = 0
+        self.ipc_folder: Optional[str] = None
+
+    def start_decode_pool(self, decode_processes: int) -> ProcessPoolExecutor:
+        """
+        start the decode process pool, if it is not running with
+        decode_processes workers
+
+        arrow IPC files left by results of an earlier convert, that were
+        discarded when it stopped early, are removed
+        """
+        if (
+            self.decode_pool is None
+            or self.decode_pool_size != decode_processes
+        ):
+            self.shutdown_decode_pool()
+            self.ipc_folder = tempfile.mkdtemp(prefix="gtfs-rt-ipc-")
+            self.decode_pool = ProcessPoolExecutor(
+                max_workers=decode_processes,
+                mp_context=get_context("spawn"),
+                initializer=decode_process_init,
+                initargs=(self.config_type, self.files[0], self.ipc_folder),
+            )
+            self.decode_pool_size = decode_processes
+
+        assert self.ipc_folder is not None
+        for filename in os.listdir(self.ipc_folder):
+            os.remove(os.path.join(self.ipc_folder, filename))
+
+        return self.decode_pool
+
+    def shutdown_decode_pool(self) -> None:
+        """shut down the decode process pool and remove its IPC folder"""
+        if self.decode_pool is not None:
+            self.decode_pool.shutdown(cancel_futures=True)
+            self.decode_pool = None
+            self.decode_pool_size = 0
+        if self.ipc_folder is not None:
+            shutil.rmtree(self.ipc_folder, ignore_errors=True)
+            self.ipc_folder = None
+
     def convert(self) -> None:
         max_tables_to_convert = 15
         process_logger = ProcessLogger(
@@ -135,7 +229,11 @@ class GtfsRtConverter(Converter):
         else:
             process_logger.log_complete()
         finally:
+            # tables still collecting are not written by this convert
+            if self.data_parts.change_filter is not None:
+                self.data_parts.change_filter.discard()
             self.move_s3_files()
+            self.compact_day_files()
             self.clean_local_folders()
 
     def thread_init(self) -> None:
@@ -151,29 +249,116 @@ class GtfsRtConverter(Converter):
         else:
             thread_data.__dict__["file_system"] = fs.LocalFileSystem()
 
+    def decode_files(
+        self, decode_processes: int
+    ) -> Iterable[Tuple[Optional[datetime], str, Optional[pyarrow.Table]]]:
+        """
+        decode and transform all of the files to be converted, in file order
+
+        by default, files are downloaded ahead of decoding by a FilePrefetcher
+        and decoded and transformed in a thread pool. results of both stages
+        are reordered to file order. with decode_processes, files are decoded
+        and transformed in a process pool that is kept across converts.
+        worker processes write each table to an Arrow IPC file that is memory
+        mapped by this process, so tables are not pickled between processes.
+
+        in both modes at most a window of files is submitted ahead of the
+        consumer, and files that were not started are cancelled when the
+        consumer stops early.
+
+        @yield Tuple[
+            datetime of feed header, None if the file could not be decoded,
+            filename with s3 prefix stripped out,
+            transformed pyarrow table of gtfs rt data,
+        ]
+        """
+        if decode_processes == 0:
+            settings = PrefetchSettings.from_environment()
+
+            def decode_fetched(
+                fetched: Tuple[str, Optional[pyarrow.Buffer]]
+            ) -> Tuple[Optional[datetime], str, Optional[pyarrow.Table]]:
+                """decode and transform a prefetched file"""
+                filename, buffer = fetched
+                if buffer is None:
+                    return (None, filename, None)
+                try:
+                    timestamp, table = self.decoder.decode_feed(
+                        buffer, filename
+                    )
+                except Exception:
+                    return (None, filename, None)
+                return (
+                    timestamp,
+                    filename,
+                    self.detail.transform_for_write(table),
+                )
+
+            with ThreadPoolExecutor(
+                max_workers=settings.cpu_workers
+            ) as decode_pool:
+                yield from ordered_map(
+                    decode_pool,
+                    decode_fetched,
+                    FilePrefetcher(self.files, settings),
+                    settings.cpu_workers * 2,
+                )
+            return
+
+        if not self.files:
+            return
+
+        for result_dt, result_filename, ipc_path in ordered_map(
+            self.start_decode_pool(decode_processes),
+            decode_file_to_ipc,
+            self.files,
+            decode_processes * 2,
+        ):
+            rt_data = None
+            if ipc_path is not None:
+                with pyarrow.memory_map(ipc_path) as source:
+                    rt_data = ipc.open_file(source).read_all()
+                # mapped memory remains valid after the file is removed
+                os.remove(ipc_path)
+            yield result_dt, result_filename, rt_data
+
     def process_files(self) -> Iterable[pyarrow.table]:
         """
         iterate through all of the files to be converted
 
-        only yield a new table when table size crosses over min_rows of yield_check
+        only yield a new table when a day partition has collected flush_bytes
+        of tables, see yield_check
         """
-        max_workers = 4
+        decode_processes = gtfs_rt_decode_processes()
+        if decode_processes > 0 and current_process().daemon:
+            # daemonic processes, like multiprocessing pool workers, can not
+            # start child processes
+            logging.warning(
+                "%s decoding with threads, daemonic processes can not start "
+                "a decode process pool",
+                self.config_type,
+            )
+            decode_processes = 0
 
         process_logger = ProcessLogger(
             "create_pyarrow_tables",
             config_type=str(self.config_type),
+            decode_mode="process" if decode_processes > 0 else "thread",
+            decode_processes=decode_processes,
         )
         process_logger.log_start()
 
-        with ThreadPoolExecutor(
-            max_workers=max_workers, initializer=self.thread_init
-        ) as pool:
-            for result_dt, result_filename, rt_data in pool.map(
-                self.gz_to_pyarrow, self.files
+        start = time.monotonic()
+        decoded_files = 0
+        failed = False
+        try:
+            for result_dt, result_filename, rt_data in self.decode_files(
+                decode_processes
             ):
-                # errors in gtfs_rt conversions are handled in the gz_to_pyarrow
-                # function. if one is encountered, the datetime will be none. log
-                # the error and move on to the next file.
+                decoded_files += 1
+                # errors in gtfs_rt conversions are handled in the
+                # gz_to_pyarrow function. if one is encountered, the datetime
+                # will be none. log the error and move on to the next file.
                 if result_dt is None:
                     self.error_files.append(result_filename)
                     logging.error(
@@ -189,67 +374,76 @@ class GtfsRtConverter(Converter):
                     day=result_dt.day,
                 )
 
-                # create new self.table_groups entry for key if it doesn't exist
-                if dt_part not in self.data_parts:
-                    self.data_parts[dt_part] = TableData()
-                    self.data_parts[dt_part].table = (
-                        self.detail.transform_for_write(rt_data)
-                    )
-                else:
-                    self.data_parts[dt_part].table = pyarrow.concat_tables(
-                        [
-                            self.data_parts[dt_part].table,
-                            self.detail.transform_for_write(rt_data),
-                        ]
-                    )
-
-                self.data_parts[dt_part].files.append(result_filename)
+                self.data_parts.append(dt_part, rt_data, result_filename)
 
                 yield from self.yield_check(process_logger)
 
-        # yield any remaining tables
-        yield from self.yield_check(process_logger, min_rows=-1)
+            # yield any remaining tables
+            yield from self.yield_check(process_logger, flush_all=True)
+
+        except Exception as exception:
+            failed = True
+            process_logger.log_failure(exception)
+            raise
 
-        process_logger.add_metadata(file_count=0, number_of_rows=0)
-        process_logger.log_complete()
+        finally:
+            # also logged when convert stops consuming tables early
+            change_filter = self.data_parts.change_filter
+            if change_filter is not None:
+                process_logger.add_metadata(
+                    decoded_rows=change_filter.input_rows,
+                    unchanged_rows=change_filter.unchanged_rows,
+                )
+            process_logger.add_metadata(
+                file_count=0,
+                number_of_rows=0,
+                decoded_files=decoded_files,
+                files_per_sec=decoded_files
+                / max(time.monotonic() - start, 1e-9),
+            )
+            if not failed:
+                process_logger.log_complete()
 
     def yield_check(
-        self, process_logger: ProcessLogger, min_rows: int = 5_000_000
+        self, process_logger: ProcessLogger, flush_all: bool = False
     ) -> Iterable[pyarrow.table]:
         """
         yield all tables in the data_parts map that have been sufficiently
         processed.
 
-        @min_rows - how many rows the table must have to be yielded
         @process_logger - a process logger for the conversion process. log a
             completion and reset before a file is yielded.
+        @flush_all - if True, yield tables of all day partitions, otherwise
+            only day partitions that have collected flush_bytes of tables
 
         @yield pyarrow.table - a concatenated table of gtfs realtime data.
         """
-        for iter_ts in list(self.data_parts.keys()):
-            table = self.data_parts[iter_ts].table
-            if table is not None and table.num_rows > min_rows:
-                self.archive_files += self.data_parts[iter_ts].files
-
-                process_logger.add_metadata(
-                    file_count=len(self.data_parts[iter_ts].files),
-                    number_of_rows=table.num_rows,
-                )
-                process_logger.log_complete()
+        for iter_ts in self.data_parts.ready(flush_all):
+            day = self.data_parts.pop(iter_ts)
+            self.archive_files += day.files
+
+            process_logger.add_metadata(
+                file_count=len(day.files),
+                number_of_rows=day.num_rows,
+                table_bytes=day.nbytes,
+                spilled_bytes=day.spilled_bytes,
+            )
+            process_logger.log_complete()
 
-                process_logger.add_metadata(file_count=0, number_of_rows=0)
-                process_logger.log_start()
+            process_logger.add_metadata(
+                file_count=0, number_of_rows=0, table_bytes=0, spilled_bytes=0
+            )
+            process_logger.log_start()
 
-                yield table
-                del self.data_parts[iter_ts]
+            yield day.to_table()
 
     def gz_to_pyarrow(
         self, filename: str
     ) -> Tuple[Optional[datetime], str, Optional[pyarrow.table]]:
         """
-        Convert a gzipped json of gtfs realtime data into a pyarrow table. This
-        function is executed inside of a thread, so all exceptions must be
-        handled internally.
+        Convert a gzipped json or protobuf feed of gtfs realtime data into a
+        pyarrow table. This function is executed inside of a thread, so all
+        exceptions must be handled internally.
 
         @filename file of gtfs rt data to be converted (file system chosen by
             GtfsRtConverter in thread_init)
@@ -265,52 +459,7 @@ class GtfsRtConverter(Converter):
             file_system = current_thread().__dict__["file_system"]
             filename = filename.replace("s3://", "")
 
-            # some of our older files are named incorrectly, with a simple
-            # .json suffix rather than a .json.gz suffix. in those cases, the
-            # s3 open_input_stream is unable to deduce the correct compression
-            # algo and fails with a UnicodeDecodeError. catch this failure and
-            # retry using a gzip compression algo. (EAFP Style)
-            try:
-                with file_system.open_input_stream(filename) as file:
-                    json_data = json.load(file)
-            except UnicodeDecodeError as _:
-                with file_system.open_input_stream(
-                    filename, compression="gzip"
-                ) as file:
-                    json_data = json.load(file)
-
-            # parse timestamp info out of the header
-            feed_timestamp = json_data["header"]["timestamp"]
-            timestamp = datetime.fromtimestamp(feed_timestamp, timezone.utc)
-
-            table = pyarrow.Table.from_pylist(
-                json_data["entity"], schema=self.detail.import_schema
-            )
-
-            table = table.append_column(
-                "year",
-                pyarrow.array(
-                    [timestamp.year] * table.num_rows, pyarrow.uint16()
-                ),
-            )
-            table = table.append_column(
-                "month",
-                pyarrow.array(
-                    [timestamp.month] * table.num_rows, pyarrow.uint8()
-                ),
-            )
-            table = table.append_column(
-                "day",
-                pyarrow.array(
-                    [timestamp.day] * table.num_rows, pyarrow.uint8()
-                ),
-            )
-            table = table.append_column(
-                "feed_timestamp",
-                pyarrow.array(
-                    [feed_timestamp] * table.num_rows, pyarrow.uint64()
-                ),
-            )
+            timestamp, table = self.decoder.decode_file(file_system, filename)
 
         except FileNotFoundError as _:
             return (None, filename, None)
@@ -351,165 +500,448 @@ class GtfsRtConverter(Converter):
             day=partitions["day"],
         )
 
-    def sync_with_s3(self, local_path: str) -> bool:
+    def day_folder(self, partition_dt: datetime) -> str:
         """
-        Sync local_path with S3 object
+        local folder holding the day file and delta parts of a day partition
+        """
+        return os.path.join(
+            self.tmp_folder,
+            DEFAULT_S3_PREFIX,
+            str(self.config_type),
+            f"year={partition_dt.year}",
+            f"month={partition_dt.month}",
+            f"day={partition_dt.day}",
+        )
+
+    def local_day_folders(self) -> Dict[datetime, str]:
+        """
+        all local day folders, containing files, keyed by partition datetime
+        """
+        root_folder = os.path.join(
+            self.tmp_folder,
+            DEFAULT_S3_PREFIX,
+            str(self.config_type),
+        )
+        paths = {}
+        for w_dir, _, files in os.walk(root_folder):
+            if len(files) == 0:
+                continue
+            paths[
+                datetime.strptime(
+                    w_dir, f"{root_folder}/year=%Y/month=%m/day=%d"
+                )
+            ] = w_dir
+
+        return paths
+
+    def s3_path(self, local_path: str) -> str:
+        """springboard bucket object path of a local tmp_folder path"""
+        return local_path.replace(
+            self.tmp_folder, os.environ["SPRINGBOARD_BUCKET"]
+        )
+
+    def warm_start_path(self, local_path: str) -> str:
+        """
+        springboard bucket object path of the warm start checkpoint of a local
+        tmp_folder path
+        """
+        return os.path.join(
+            os.environ["SPRINGBOARD_BUCKET"],
+            DEFAULT_S3_PREFIX,
+            WARM_START_FOLDER,
+            os.path.relpath(
+                local_path, os.path.join(self.tmp_folder, DEFAULT_S3_PREFIX)
+            ),
+        )
 
-        :param local_path: local tmp path file to sync
+    def sync_with_s3(self, day_folder: str) -> None:
+        """
+        Sync local day_folder with S3 objects of the same day partition
+
+        if day_folder does not exist locally, restore the warm start
+        checkpoint of the day file, or download the day file, and download all
+        delta parts of the partition from S3. GTFS_RT_HASH_COL is added to each
+        downloaded file.
 
-        :return bool: True if local_path is available, else False
+        :param day_folder: local day partition folder to sync
         """
-        if os.path.exists(local_path):
-            return True
+        if os.path.exists(day_folder):
+            return
 
-        local_folder = local_path.replace(os.path.basename(local_path), "")
-        os.makedirs(local_folder, exist_ok=True)
+        os.makedirs(day_folder, exist_ok=True)
 
+        # trailing slash so that day=1 does not also list day=10 objects
         s3_files = file_list_from_s3(
             os.environ["SPRINGBOARD_BUCKET"],
-            file_prefix=local_path.replace(f"{self.tmp_folder}/", ""),
+            file_prefix=f"{day_folder.replace(f'{self.tmp_folder}/', '')}/",
         )
-        if len(s3_files) == 1:
-            s3_path = s3_files[0].replace("s3://", "")
-            download_file(s3_path, local_path)
-            return True
+        restored = self.restore_warm_start(day_folder, s3_files)
+        for s3_file in s3_files:
+            if not s3_file.endswith(".parquet") or s3_file == restored:
+                continue
+            local_path = os.path.join(day_folder, os.path.basename(s3_file))
+            if not download_file(s3_file.replace("s3://", ""), local_path):
+                # a partially synced day folder would be compacted over the
+                # complete day file in S3
+                shutil.rmtree(day_folder, ignore_errors=True)
+                raise FileNotFoundError(f"unable to sync {s3_file}")
+            hash_gtfs_rt_parquet(local_path)
 
-        return False
+    def restore_warm_start(
+        self, day_folder: str, s3_files: List[str]
+    ) -> Optional[str]:
+        """
+        restore the warm start checkpoint of the day file of a day partition,
+        and its hash index, into day_folder
+
+        a checkpoint is only restored if it was written along with the day
+        file in S3, checked with the WRITE_ID_KEY metadata of both objects.
 
-    def make_hash_dataset(
-        self, table: pyarrow.Table, local_path: str
-    ) -> pyarrow.dataset:
+        :param day_folder: local day partition folder
+        :param s3_files: springboard bucket objects of the day partition
+
+        :return s3 path of the day file, if its checkpoint was restored
         """
-        create dataset, with hash column, that will be written to parquet file
+        day_files = [
+            s3_file
+            for s3_file in s3_files
+            if s3_file.endswith(".parquet")
+            and not os.path.basename(s3_file).startswith(DELTA_PART_PREFIX)
+        ]
+        if len(day_files) != 1:
+            return None
+
+        local_path = os.path.join(day_folder, os.path.basename(day_files[0]))
+        index_path = os.path.join(day_folder, HASH_INDEX_FILE)
+        checkpoint_files = {
+            s3_file.replace("s3://", "")
+            for s3_file in file_list_from_s3(
+                os.environ["SPRINGBOARD_BUCKET"],
+                file_prefix=os.path.relpath(
+                    self.warm_start_path(day_folder),
+                    os.environ["SPRINGBOARD_BUCKET"],
+                )
+                + "/",
+            )
+        }
+        if self.warm_start_path(local_path) not in checkpoint_files:
+            return None
+
+        logger = ProcessLogger("restore_warm_start", local_path=local_path)
+        logger.log_start()
+        try:
+            write_id = object_metadata(day_files[0]).get(WRITE_ID_KEY)
+            logger.add_metadata(write_id=write_id)
+
+            checkpoints = [(local_path, True)]
+            if self.warm_start_path(index_path) in checkpoint_files:
+                checkpoints.append((index_path, False))
+
+            for path, required in checkpoints:
+                checkpoint = self.warm_start_path(path)
+                if write_id is None or (
+                    object_metadata(checkpoint).get(WRITE_ID_KEY) != write_id
+                ):
+                    if required:
+                        raise ValueError(f"{checkpoint} is out of date")
+                    continue
+                # a missing hash index is rebuilt from the day file
+                if not download_file(checkpoint, path) and required:
+                    raise FileNotFoundError(f"unable to download {checkpoint}")
+
+            # checkpoints written before a RECORD_HASH_VERSION change are
+            # re-hashed, their hash index is discarded when it is loaded
+            if not has_current_hash_column(pq.read_schema(local_path)):
+                logger.add_metadata(rehash=True)
+                hash_gtfs_rt_parquet(local_path)
+
+            logger.log_complete()
+            return day_files[0]
 
-        :param table: pyarrow Table
-        :param local_path: path to local parquet file
+        except Exception as exception:
+            for path in (local_path, index_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            logger.log_failure(exception)
+            return None
+
+    def day_files(self, day_folder: str) -> Tuple[Optional[str], List[str]]:
         """
-        table = hash_gtfs_rt_table(table)
-        out_ds = pd.dataset(table)
+        local parquet files of a day partition
 
-        if self.sync_with_s3(local_path):
-            hash_gtfs_rt_parquet(local_path)
-            out_ds = pd.dataset(
-                [
-                    pd.dataset(table),
-                    pd.dataset(local_path),
-                ]
-            )
+        :return Tuple[
+            day file path, if it exists,
+            delta part paths ordered by their first feed_timestamp
+        ]
+        """
+        day_file = None
+        parts = []
+        for file in os.listdir(day_folder):
+            if file.startswith(DELTA_PART_PREFIX):
+                parts.append(os.path.join(day_folder, file))
+            elif file.endswith(".parquet"):
+                day_file = os.path.join(day_folder, file)
+
+        return day_file, sorted(parts)
+
+    def dedup_table(
+        self, table: pyarrow.Table, hash_index: WindowedHashIndex
+    ) -> pyarrow.Table:
+        """
+        drop records of table that duplicate each other, or duplicate records
+        already written to the day partition inside of the dedup window
 
-        return out_ds
+        :param table: pyarrow Table with GTFS_RT_HASH_COL column
+        :param hash_index: loaded hash index of the day partition
 
-    # pylint: disable=R0914
-    # pylint too many local variables (more than 15)
-    def write_local_pq(self, table: pyarrow.Table, local_path: str) -> None:
+        :return pyarrow Table of records new to the day partition
         """
-        merge pyarrow Table with existing local_path parquet file
+        table = (
+            pl.DataFrame(table)
+            .sort(by=["feed_timestamp"])
+            .unique(subset=GTFS_RT_HASH_COL, keep="first", maintain_order=True)
+            .to_arrow()
+            .cast(table.schema)
+        )
+
+        day_file, parts = self.day_files(os.path.dirname(hash_index.path))
+        day_files = parts if day_file is None else [day_file] + parts
 
-        :param table: pyarrow Table
-        :param local_path: path to local parquet file
+        return table.filter(hash_index.new_records(table, day_files))
+
+    def write_delta_part(self, table: pyarrow.Table, day_folder: str) -> str:
         """
+        write table as a new delta part of a day partition
+
+        the local part keeps GTFS_RT_HASH_COL for de-duplication, the part
+        uploaded to S3 does not.
+
+        :param table: pyarrow Table with GTFS_RT_HASH_COL column
+        :param day_folder: local day partition folder
+
+        :return local path of new delta part
+        """
+        first_ts = pc.min(table.column("feed_timestamp")).as_py()
+        part_path = os.path.join(
+            day_folder,
+            f"{DELTA_PART_PREFIX}{first_ts}-{uuid.uuid4().hex}.parquet",
+        )
+
         logger = ProcessLogger(
-            "write_local_pq", local_path=local_path, table_rows=table.num_rows
+            "write_delta_part", part_path=part_path, table_rows=table.num_rows
         )
         logger.log_start()
 
-        out_ds = self.make_hash_dataset(table, local_path)
+        profile = self.detail.write_profile
+        sort_order = [(self.detail.partition_column, "ascending")]
+        if profile.sort_order is not None:
+            sort_order += profile.sort_order
+        table = table.sort_by(sort_order)
 
-        unique_ts_min = pc.min(table.column("feed_timestamp")).as_py() - (
-            60 * 45
+        with tempfile.TemporaryDirectory() as temp_dir:
+            upload_path = os.path.join(temp_dir, "upload.parquet")
+            pq.write_table(
+                table.drop_columns(GTFS_RT_HASH_COL),
+                upload_path,
+                row_group_size=profile.row_group_size,
+                **profile.writer_options(),
+            )
+            if not upload_file(upload_path, self.s3_path(part_path)):
+                raise OSError(f"failed to upload {part_path}")
+
+        pq.write_table(
+            table,
+            part_path,
+            row_group_size=profile.row_group_size,
+            **profile.writer_options(),
+        )
+
+        logger.log_complete()
+        return part_path
+
+    def write_local_pq(
+        self,
+        day_files: List[str],
+        local_path: str,
+        merged_parts: Optional[List[str]] = None,
+    ) -> None:
+        """
+        merge day_files into a single local_path parquet file, sorted by
+        partition, and upload it to S3
+
+        :param day_files: local parquet files, with GTFS_RT_HASH_COL, to merge
+        :param local_path: path to local parquet day file
+        :param merged_parts: delta part file names merged into the day file
+        """
+        logger = ProcessLogger(
+            "write_local_pq", local_path=local_path, file_count=len(day_files)
         )
+        logger.log_start()
 
-        no_hash_schema = out_ds.schema.remove(
-            out_ds.schema.get_field_index(GTFS_RT_HASH_COL)
+        # read the day once, instead of scanning it for every partition
+        self.write_day_table(
+            pd.dataset(day_files).to_table(), local_path, merged_parts
         )
 
+        logger.log_complete()
+
+    def write_day_table(
+        self,
+        table: pyarrow.Table,
+        local_path: str,
+        merged_parts: Optional[List[str]] = None,
+    ) -> None:
+        """
+        write table as the local_path day file, sorted by partition, and
+        upload it to S3
+
+        the local day file keeps GTFS_RT_HASH_COL for de-duplication, the day
+        file uploaded to S3 does not. both list merged_parts in their schema
+        metadata, so that delta parts left behind by an interrupted compaction
+        are not merged into the day file again.
+
+        :param table: pyarrow Table of the day partition, with GTFS_RT_HASH_COL
+        :param local_path: path to local parquet day file
+        :param merged_parts: delta part file names merged into the day file
+        """
+        metadata = dict(table.schema.metadata or {})
+        metadata[MERGED_PARTS_KEY] = json.dumps(merged_parts or []).encode()
+        table = table.replace_schema_metadata(metadata)
+
+        no_hash_schema = table.schema.remove(
+            table.schema.get_field_index(GTFS_RT_HASH_COL)
+        )
+
+        profile = self.detail.write_profile
+
         with tempfile.TemporaryDirectory() as temp_dir:
             hash_pq_path = os.path.join(temp_dir, "hash.parquet")
             upload_path = os.path.join(temp_dir, "upload.parquet")
-            hash_writer = pq.ParquetWriter(hash_pq_path, schema=out_ds.schema)
-            upload_writer = pq.ParquetWriter(upload_path, schema=no_hash_schema)
-
-            partitions = pc.unique(
-                out_ds.to_table(columns=[self.detail.partition_column]).column(
-                    self.detail.partition_column
-                )
+            hash_writer = pq.ParquetWriter(
+                hash_pq_path,
+                schema=table.schema,
+                **profile.writer_options(),
+            )
+            upload_writer = pq.ParquetWriter(
+                upload_path,
+                schema=no_hash_schema,
+                **profile.writer_options(),
             )
-            for part in partitions:
-                unique_table = (
-                    pl.DataFrame(
-                        out_ds.to_table(
-                            filter=(
-                                (pc.field(self.detail.partition_column) == part)
-                                & (pc.field("feed_timestamp") >= unique_ts_min)
-                            )
-                        )
-                    )
-                    .sort(by=["feed_timestamp"])
-                    .unique(subset=GTFS_RT_HASH_COL, keep="first")
-                    .to_arrow()
-                    .cast(out_ds.schema)
-                )
-                ds_table = out_ds.to_table(
-                    filter=(
-                        (pc.field(self.detail.partition_column) == part)
-                        & (pc.field("feed_timestamp") < unique_ts_min)
-                    )
-                )
-                write_table = pyarrow.concat_tables(
-                    [unique_table, ds_table]
-                ).sort_by(self.detail.table_sort_order)
 
-                hash_writer.write_table(write_table)
+            for write_table in partition_groups(
+                table,
+                self.detail.partition_column,
+                profile.sort_order,
+            ):
+                hash_writer.write_table(
+                    write_table, row_group_size=profile.row_group_size
+                )
 
                 # drop GTFS_RT_HASH_COL column for S3 upload
                 upload_writer.write_table(
-                    write_table.drop_columns(GTFS_RT_HASH_COL)
+                    write_table.drop_columns(GTFS_RT_HASH_COL),
+                    row_group_size=profile.row_group_size,
                 )
 
             hash_writer.close()
             upload_writer.close()
 
-            os.replace(hash_pq_path, local_path)
-            upload_file(
+            # checkpoints are uploaded before the day file they are restored
+            # in place of, so a failed upload leaves mismatched write ids
+            write_id = uuid.uuid4().hex
+            self.upload_warm_start(hash_pq_path, local_path, write_id)
+
+            if not upload_file(
                 upload_path,
-                local_path.replace(
-                    self.tmp_folder, os.environ["SPRINGBOARD_BUCKET"]
-                ),
-            )
+                self.s3_path(local_path),
+                extra_args={"Metadata": {WRITE_ID_KEY: write_id}},
+            ):
+                raise OSError(f"failed to upload {local_path}")
+            os.replace(hash_pq_path, local_path)
 
-        logger.log_complete()
+    def upload_warm_start(
+        self, hash_pq_path: str, local_path: str, write_id: str
+    ) -> None:
+        """
+        upload the warm start checkpoint of a day file, and the hash index of
+        its day partition, to the springboard bucket
 
-    # pylint: enable=R0914
+        checkpoints are an optimization, failed uploads are logged by
+        upload_file and otherwise ignored.
+
+        :param hash_pq_path: day file with GTFS_RT_HASH_COL
+        :param local_path: path to local parquet day file
+        :param write_id: WRITE_ID_KEY metadata of the day file upload
+        """
+        extra_args = {"Metadata": {WRITE_ID_KEY: write_id}}
+        upload_file(
+            hash_pq_path,
+            self.warm_start_path(local_path),
+            extra_args=extra_args,
+        )
+
+        index_path = os.path.join(os.path.dirname(local_path), HASH_INDEX_FILE)
+        if os.path.exists(index_path):
+            upload_file(
+                index_path,
+                self.warm_start_path(index_path),
+                extra_args=extra_args,
+            )
 
     def continuous_pq_update(self, table: pyarrow.Table) -> None:
         """
-        Continuous updating of local parquet files that are synced with S3
+        Append a table to its day partition as a new delta part
+
+        records are de-duplicated against the hash index of the day partition
+        and committed to the change filter once written. delta parts are
+        merged into the day file by compact_day_files, which
+        sends the S3 path of the day file to the metadata queue.
         """
         log = ProcessLogger("continuous_pq_update")
         log.log_start()
+        change_filter = self.data_parts.change_filter
+        partition_dt: Optional[datetime] = None
         try:
             partition_dt = self.partition_dt(table)
+            day_folder = self.day_folder(partition_dt)
+            log.add_metadata(day_folder=day_folder, table_rows=table.num_rows)
 
-            local_path = os.path.join(
-                self.tmp_folder,
-                DEFAULT_S3_PREFIX,
-                str(self.config_type),
-                f"year={partition_dt.year}",
-                f"month={partition_dt.month}",
-                f"day={partition_dt.day}",
-                f"{partition_dt.isoformat()}.parquet",
-            )
+            self.sync_with_s3(day_folder)
 
-            table = table.drop_columns(["year", "month", "day"])
-
-            log.add_metadata(local_path=local_path)
-
-            self.write_local_pq(table, local_path)
-            self.send_metadata(
-                local_path.replace(
-                    self.tmp_folder, os.environ["SPRINGBOARD_BUCKET"]
-                )
+            # day files are written partition by partition, which never
+            # included records with a null partition_column value
+            table = table.filter(
+                pc.is_valid(table.column(self.detail.partition_column))
+            )
+            table = hash_gtfs_rt_table(
+                table.drop_columns(["year", "month", "day"])
             )
+            hash_index = WindowedHashIndex(day_folder, DEDUP_WINDOW_SECONDS)
+            hash_index.load(self.day_files(day_folder)[1])
+
+            table = self.dedup_table(table, hash_index)
+            log.add_metadata(unique_rows=table.num_rows)
+
+            if table.num_rows > 0:
+                part_path = self.write_delta_part(table, day_folder)
+                hash_index.add(table, part_path)
+                hash_index.save()
+
+                # seconds from the newest and oldest feeds of the delta part
+                # to its write, measuring end to end ingestion latency
+                feed_timestamps = pc.min_max(table.column("feed_timestamp"))
+                written_at = time.time()
+                log.add_metadata(
+                    feed_latency_seconds=round(
+                        written_at - feed_timestamps["max"].as_py(), 1
+                    ),
+                    max_feed_latency_seconds=round(
+                        written_at - feed_timestamps["min"].as_py(), 1
+                    ),
+                )
+
+            if change_filter is not None:
+                change_filter.commit(partition_dt, table)
 
             log.log_complete()
 
@@ -524,36 +956,118 @@ class GtfsRtConverter(Converter):
             )
             self.error_files += self.archive_files
             self.archive_files = []
+            if change_filter is not None:
+                change_filter.discard(partition_dt)
             log.log_failure(exception)
 
+    def compact_day_files(self) -> None:
+        """
+        merge delta parts of local day partitions into their day files
+
+        a day partition is compacted when its delta parts cross the part
+        age, part count or part size thresholds, or when a newer day partition
+        exists locally. the age threshold bounds the time from a write of a
+        delta part to the metadata queue receiving its day file.
+        """
+        day_folders = self.local_day_folders()
+        newest_day = max(day_folders.keys(), default=None)
+        now = time.time()
+
+        for partition_dt, day_folder in sorted(day_folders.items()):
+            day_file, parts = self.day_files(day_folder)
+            if len(parts) == 0:
+                continue
+
+            if (
+                partition_dt != newest_day
+                or now - min(os.path.getmtime(part) for part in parts)
+                >= self.compaction.max_part_age_seconds
+                or len(parts) >= self.compaction.max_part_count
+                or sum(os.path.getsize(part) for part in parts)
+                >= self.compaction.max_part_bytes
+            ):
+                self.compact_day(partition_dt, day_file, parts)
+
+    def compact_day(
+        self, partition_dt: datetime, day_file: Optional[str], parts: List[str]
+    ) -> None:
+        """
+        merge delta parts into the day file of a day partition, upload the
+        day file, send its S3 path to the metadata queue and remove the merged
+        delta parts from S3 and locally
+
+        delta parts listed as merged by the day file, left behind by an
+        interrupted compaction or a failed delete, are removed without being
+        merged again. the metadata queue only receives day file paths, which
+        are never removed, so consumers can read them after any delay.
+
+        :param partition_dt: datetime of day partition
+        :param day_file: local day file path, if it exists
+        :param parts: local delta part paths to merge
+        """
+        local_path = os.path.join(
+            self.day_folder(partition_dt), f"{partition_dt.isoformat()}.parquet"
+        )
+        logger = ProcessLogger(
+            "compact_day", local_path=local_path, part_count=len(parts)
+        )
+        logger.log_start()
+        try:
+            merged_parts = day_file_merged_parts(day_file)
+            new_parts = [
+                part
+                for part in parts
+                if os.path.basename(part) not in merged_parts
+            ]
+            logger.add_metadata(merged_part_count=len(parts) - len(new_parts))
+
+            if new_parts:
+                day_files = (
+                    new_parts if day_file is None else [day_file] + new_parts
+                )
+                # every part is listed until it is removed from S3
+                self.write_local_pq(
+                    day_files,
+                    local_path,
+                    merged_parts=[os.path.basename(part) for part in parts],
+                )
+                self.send_metadata(self.s3_path(local_path))
+
+            failed_deletes = 0
+            for part in parts:
+                if delete_object(self.s3_path(part)):
+                    os.remove(part)
+                else:
+                    failed_deletes += 1
+            logger.add_metadata(failed_deletes=failed_deletes)
+
+            logger.log_complete()
+
+        except Exception as exception:
+            logger.log_failure(exception)
+
     def clean_local_folders(self) -> None:
         """
         clean local temp folders
         """
         days_to_keep = 2
-        root_folder = os.path.join(
-            self.tmp_folder,
-            DEFAULT_S3_PREFIX,
-            str(self.config_type),
-        )
-        paths = {}
-        for w_dir, _, files in os.walk(root_folder):
-            if len(files) == 0:
-                continue
-            paths[
-                datetime.strptime(
-                    w_dir, f"{root_folder}/year=%Y/month=%m/day=%d"
-                )
-            ] = w_dir
+        paths = self.local_day_folders()
 
-        # remove all local day folders except two most recent
+        # remove all local day folders except two most recent, day folders
+        # with delta parts are kept until their parts are compacted
         for key in sorted(paths.keys())[:-days_to_keep]:
-            shutil.rmtree(paths[key])
+            _, parts = self.day_files(paths[key])
+            if len(parts) == 0:
+                shutil.rmtree(paths[key])
 
     def move_s3_files(self) -> None:
         """
-        move archive and error files to their respective s3 buckets.
+        move archive and error files to their respective s3 buckets, listing
+        the moved files in moved_files. files that failed to move are kept,
+        and are moved again by the next convert.
         """
+        moving = self.error_files + self.archive_files
+
         if len(self.error_files) > 0:
             self.error_files = move_s3_objects(
                 self.error_files,
@@ -565,3 +1079,81 @@ class GtfsRtConverter(Converter):
                 self.archive_files,
                 os.path.join(os.environ["ARCHIVE_BUCKET"], DEFAULT_S3_PREFIX),
             )
+
+        failed_moves = set(self.error_files + self.archive_files)
+        self.moved_files = [
+            filename for filename in moving if filename not in failed_moves
+        ]
+
+
+# pylint: enable=R0902,R0904
+
+
+def day_file_merged_parts(day_file: Optional[str]) -> Set[str]:
+    """
+    file names of the delta parts merged into a local day file, from its
+    MERGED_PARTS_KEY schema metadata
+    """
+    if day_file is None:
+        return set()
+    metadata = pq.read_schema(day_file).metadata or {}
+    return set(json.loads(metadata.get(MERGED_PARTS_KEY, b"[]")))
+
+
+def gtfs_rt_decode_processes() -> int:
+    """
+    number of worker processes to decode gtfs rt files with, set by the
+    GTFS_RT_DECODE_PROCESSES environment variable. "auto" sizes the pool to
+    the cores available to the container. if unset or 0, files are decoded in
+    a thread pool.
+    """
+    processes = os.environ.get("GTFS_RT_DECODE_PROCESSES", "0")
+    if processes == "auto":
+        return len(os.sched_getaffinity(0))
+    return int(processes)
+
+
+def decode_process_init(
+    config_type: ConfigType, first_file: str, ipc_folder: str
+) -> None:
+    """
+    initialize a decode worker process with its own converter for config_type
+    """
+    converter = GtfsRtConverter(config_type, Queue())
+    converter.add_files([first_file])
+    converter.thread_init()
+
+    process_data = current_process()
+    process_data.__dict__["converter"] = converter
+    process_data.__dict__["ipc_folder"] = ipc_folder
+
+
+def decode_file_to_ipc(
+    filename: str,
+) -> Tuple[Optional[datetime], str, Optional[str]]:
+    """
+    decode and transform a file of gtfs rt data in a decode worker process,
+    writing the table to an Arrow IPC file
+
+    @return Optional[datetime] - datetime contained in header of gtfs rt
+        feed. (returns None if an Exception is thrown during conversion)
+    @return str - input filename with s3 prefix stripped out.
+    @return Optional[str] - path of the Arrow IPC file holding the transformed
+        table. (returns None if an Exception is thrown during conversion)
+    """
+    process_data = current_process()
+    converter: GtfsRtConverter = process_data.__dict__["converter"]
+
+    result_dt, filename, rt_data = converter.gz_to_pyarrow(filename)
+    if result_dt is None or rt_data is None:
+        return (result_dt, filename, None)
+
+    table = converter.detail.transform_for_write(rt_data)
+
+    ipc_path = os.path.join(
+        process_data.__dict__["ipc_folder"], f"{uuid.uuid4().hex}.arrow"
+    )
+    with ipc.new_file(ipc_path, table.schema) as writer:
+        writer.write_table(table)
+
+    return (result_dt, filename, ipc_path)
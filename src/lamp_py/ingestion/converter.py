@@ -106,6 +106,10 @@ class Converter(ABC):
         self.files: List[str] = []
         self.metadata_queue: Queue[Optional[str]] = metadata_queue
 
+        # files moved out of the incoming bucket, to the archive or error
+        # bucket, by the last convert
+        self.moved_files: List[str] = []
+
     def add_files(self, files: List[str]) -> None:
         """add files to this converter"""
         self.files += files
@@ -118,5 +122,6 @@ class Converter(ABC):
     def convert(self) -> None:
         """
         convert files to pyarrow tables, write them to s3 as parquete, and move
-        files from incoming to archive (or error)
+        files from incoming to archive (or error), listing the files that were
+        moved in moved_files
         """
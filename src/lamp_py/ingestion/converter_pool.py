@@ -0,0 +1,251 @@
+import os
+import signal
+from multiprocessing import get_context, parent_process
+from multiprocessing.context import SpawnProcess
+from multiprocessing.queues import Queue as ProcessQueue
+from queue import Empty, Queue
+from typing import Callable, Dict, List, Optional, Tuple
+
+import psutil
+import pyarrow
+
+from lamp_py.aws.ecs import handle_ecs_sigterm
+from lamp_py.ingestion.converter import ConfigType, Converter
+from lamp_py.ingestion.convert_gtfs_rt import GtfsRtConverter
+from lamp_py.ingestion.table_accumulator import DayAccumulators
+from lamp_py.runtime_utils.process_logger import ProcessLogger
+
+# creates the converter of a config type inside of a worker process. it is
+# sent to spawned processes, so it must be a module level function.
+ConverterFactory = Callable[[ConfigType, Queue[Optional[str]]], Converter]
+
+# a batch of files and the number of workers sharing the memory budget
+WorkItem = Tuple[List[str], int]
+
+# if the worker is exiting, and the files of its batch it moved out of the
+# incoming bucket
+DoneItem = Tuple[bool, List[str]]
+
+# seconds between checks that a worker's parent, or a busy worker, is alive
+POLL_SECONDS = 10
+
+
+def worker_max_rss_from_environment() -> int:
+    """
+    resident memory, in bytes, a converter worker may grow to before it is
+    recycled, set in megabytes by the CONVERTER_WORKER_MAX_RSS_MB environment
+    variable. defaults to a quarter of system memory.
+    """
+    max_rss_mb = os.environ.get("CONVERTER_WORKER_MAX_RSS_MB")
+    if max_rss_mb is not None:
+        return int(max_rss_mb) * 1024 * 1024
+    return psutil.virtual_memory().total // 4
+
+
+def run_converter_worker(
+    config_type: ConfigType,
+    converter_factory: ConverterFactory,
+    metadata_queue: Queue[Optional[str]],
+    work_queue: Queue[Optional[WorkItem]],
+    done_queue: Queue[DoneItem],
+) -> None:
+    """
+    convert files of a single config type, one batch of files from the work
+    queue at a time, keeping the converter between batches
+
+    after each batch, put on the done queue if the worker is exiting, either
+    because its memory went over its high-water mark or ECS sent a SIGTERM,
+    along with the files the converter moved out of the incoming bucket. a
+    None batch shuts down the worker.
+    """
+    signal.signal(signal.SIGTERM, handle_ecs_sigterm)
+    max_rss = worker_max_rss_from_environment()
+    converter = converter_factory(config_type, metadata_queue)
+
+    try:
+        while True:
+            try:
+                work_item = work_queue.get(timeout=POLL_SECONDS)
+            except Empty:
+                # exit if the ingestion process died without a shutdown
+                parent = parent_process()
+                if parent is None or not parent.is_alive():
+                    return
+                continue
+
+            if work_item is None:
+                return
+
+            converter.files, budget_shares = work_item
+            if isinstance(converter, GtfsRtConverter):
+                # files of tables that were not written last batch are still in
+                # the incoming bucket, and are part of this batch
+                converter.data_parts = DayAccumulators(
+                    change_filter=converter.data_parts.change_filter
+                )
+                converter.data_parts.share_budget(budget_shares)
+
+            converter.moved_files = []
+            converter.convert()
+
+            pyarrow.default_memory_pool().release_unused()
+            exiting = (
+                psutil.Process().memory_info().rss > max_rss
+                or os.environ.get("GOT_SIGTERM") is not None
+            )
+            done_queue.put((exiting, converter.moved_files))
+            if exiting:
+                return
+    finally:
+        if isinstance(converter, GtfsRtConverter):
+            converter.shutdown_decode_pool()
+
+
+class ConverterWorker:
+    """
+    Long lived process converting files of a single config type
+
+    Converters keep their state, like compiled decoders and accumulated
+    archive files, across ingestion loops. Workers are not daemonic, so
+    their converters can start decode process pools.
+    """
+
+    def __init__(
+        self,
+        config_type: ConfigType,
+        converter_factory: ConverterFactory,
+        metadata_queue: Queue[Optional[str]],
+    ) -> None:
+        context = get_context("spawn")
+        self.config_type = config_type
+        self.work_queue: ProcessQueue[Optional[WorkItem]] = context.Queue()
+        self.done_queue: ProcessQueue[DoneItem] = context.Queue()
+        # files of the last batch moved out of the incoming bucket
+        self.moved_files: List[str] = []
+        self.process: SpawnProcess = context.Process(
+            target=run_converter_worker,
+            args=(
+                config_type,
+                converter_factory,
+                metadata_queue,
+                self.work_queue,
+                self.done_queue,
+            ),
+            name=f"converter_{config_type}",
+        )
+        self.process.start()
+
+    def submit(self, files: List[str], budget_shares: int) -> None:
+        """
+        send a batch of files to the worker, along with the number of workers
+        sharing the memory budget for accumulating tables
+        """
+        self.moved_files = []
+        self.work_queue.put((files, budget_shares))
+
+    def wait(self) -> bool:
+        """
+        wait for the worker to finish its batch of files, setting the files it
+        moved out of the incoming bucket. a worker that crashed moved none.
+
+        :return True if the worker is still running and can be sent another
+            batch, else False
+        """
+        while True:
+            try:
+                exiting, self.moved_files = self.done_queue.get(
+                    timeout=POLL_SECONDS
+                )
+                break
+            except Empty:
+                if not self.process.is_alive():
+                    return False
+
+        if exiting:
+            self.process.join()
+        return not exiting
+
+    def stop(self, timeout: float = 60) -> None:
+        """shut down the worker, terminating it if it does not exit"""
+        if self.process.is_alive():
+            self.work_queue.put(None)
+            self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+
+
+class ConverterPool:
+    """
+    Converter workers for each config type, kept across ingestion loops
+
+    Workers are started the first time their config type has files, and
+    replaced if they exit, crash, or recycle themselves after going over
+    their memory high-water mark.
+    """
+
+    def __init__(
+        self,
+        converter_factory: ConverterFactory,
+        metadata_queue: Queue[Optional[str]],
+    ) -> None:
+        self.converter_factory = converter_factory
+        self.metadata_queue = metadata_queue
+        self.workers: Dict[ConfigType, ConverterWorker] = {}
+
+    def run(self, files: Dict[ConfigType, List[str]]) -> List[str]:
+        """
+        convert each config type's files in its worker, returning once all
+        workers have finished
+
+        :return files moved out of the incoming bucket by the workers
+        """
+        process_logger = ProcessLogger(
+            "run_converter_pool",
+            config_type_count=len(files),
+            worker_count=len(self.workers),
+        )
+        process_logger.log_start()
+
+        # converters run in parallel processes, split the memory budget for
+        # accumulating tables between them
+        budget_shares = len(files)
+
+        started = 0
+        for config_type, config_files in files.items():
+            if config_type not in self.workers:
+                self.workers[config_type] = ConverterWorker(
+                    config_type,
+                    self.converter_factory,
+                    self.metadata_queue,
+                )
+                started += 1
+            self.workers[config_type].submit(config_files, budget_shares)
+
+        recycled = 0
+        moved_files: List[str] = []
+        for config_type in files:
+            running = self.workers[config_type].wait()
+            moved_files += self.workers[config_type].moved_files
+            if not running:
+                self.workers.pop(config_type).stop()
+                recycled += 1
+
+        process_logger.add_metadata(
+            started_count=started,
+            recycled_count=recycled,
+            moved_file_count=len(moved_files),
+        )
+        process_logger.log_complete()
+        return moved_files
+
+    def shutdown(self) -> None:
+        """stop all workers"""
+        process_logger = ProcessLogger(
+            "shutdown_converter_pool", worker_count=len(self.workers)
+        )
+        process_logger.log_start()
+        for worker in self.workers.values():
+            worker.stop()
+        self.workers = {}
+        process_logger.log_complete()
@@ -1,4 +1,5 @@
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
+import json
 import os
 from datetime import datetime
 import tempfile
@@ -7,17 +8,49 @@ from queue import Queue
 from abc import ABC, abstractmethod
 import polars as pl
 import pyarrow
+import pyarrow.compute as pc
 import pyarrow.dataset as pd
+import pyarrow.json as pj
 import pyarrow.parquet as pq
-import pyarrow.compute as pc
 from dateutil.relativedelta import relativedelta
 
-from lamp_py.aws.s3 import download_file, upload_file
+from lamp_py.aws.s3 import download_file, file_list_from_s3, upload_file
 from lamp_py.aws.kinesis import KinesisReader
 from lamp_py.ingestion.utils import explode_table_column, flatten_schema
 from lamp_py.runtime_utils.process_logger import ProcessLogger
 
+# lists the month partitions of a glides event type, with their paths and row
+# counts, so readers can find the full history without listing the bucket
+MANIFEST_FILENAME = "manifest.json"
+
+
+def json_string(item: Dict[str, Any], key: str) -> Optional[str]:
+    """
+    string of a loosely structured field of a unique_key list item, as the
+    python str() of its value. month partitions have always been written
+    with str(), so events read again match the events already written.
+    missing fields are null, and fields set to null are the string "None".
+    """
+    if key not in item:
+        return None
+    return str(item[key])
 
+
+def parse_event_times(times: pyarrow.ChunkedArray) -> pyarrow.ChunkedArray:
+    """
+    parse iso 8601 event time strings, with any fraction of a second, into
+    the timestamp("ms") of the event schema. fractions below a millisecond are
+    truncated, as they are when events are converted one at a time.
+    """
+    return (
+        times.cast(pyarrow.timestamp("us", tz="UTC"))
+        .cast(pyarrow.timestamp("ms", tz="UTC"), safe=False)
+        .cast(pyarrow.timestamp("ms"))
+    )
+
+
+# pylint: disable=R0902
+# disable too many instance attributes
 class GlidesConverter(ABC):
     """
     Abstract Base Class for Archiving Glides Events
@@ -50,12 +83,24 @@ class GlidesConverter(ABC):
         self.tmp_dir = "/tmp"
         self.base_filename = base_filename
         self.type = self.base_filename.replace(".parquet", "")
-        self.local_path = os.path.join(self.tmp_dir, self.base_filename)
-        self.remote_path = f"s3://{os.environ['SPRINGBOARD_BUCKET']}/lamp/GLIDES/{base_filename}"
+        self.bucket = os.environ["SPRINGBOARD_BUCKET"]
+        self.remote_folder = f"s3://{self.bucket}/lamp/GLIDES/{self.type}"
+        self.local_manifest_path = os.path.join(
+            self.tmp_dir, f"{self.type}_{MANIFEST_FILENAME}"
+        )
+        self.remote_manifest_path = f"{self.remote_folder}/{MANIFEST_FILENAME}"
+
+        # single file of every event, written before month partitions
+        self.legacy_path = f"s3://{self.bucket}/lamp/GLIDES/{base_filename}"
 
-        self.records: List[Dict] = []
+        # raw json events from kinesis, converted together in a micro-batch
+        self.payloads: List[bytes] = []
 
-        self.download_remote()
+        # downloaded on the first append, so converters can decode events
+        # without reading from s3
+        self.manifest: Dict[str, Dict] = {"partitions": {}}
+        self.manifest_downloaded = False
+        self.migrate_legacy = False
 
     @property
     @abstractmethod
@@ -67,79 +112,355 @@ class GlidesConverter(ABC):
     def unique_key(self) -> str:
         """Key in record['data'] that is unique to this event type"""
 
-    def download_remote(self) -> None:
-        """download the remote parquet path for appending"""
-        if os.path.exists(self.local_path):
-            os.remove(self.local_path)
+    def download_manifest(self) -> None:
+        """
+        download the manifest of month partitions written so far. if there is
+        no manifest, events of the legacy single file are split into month
+        partitions on the next append.
+        """
+        if download_file(
+            object_path=self.remote_manifest_path,
+            file_name=self.local_manifest_path,
+        ):
+            with open(self.local_manifest_path, "r", encoding="utf8") as file:
+                self.manifest = json.load(file)
+            return
+
+        # a manifest that could not be downloaded must not be replaced, as
+        # history would be lost when months are rewritten from the legacy file.
+        # the trailing slash keeps the legacy file, which shares the folder's
+        # name, out of the listing.
+        folder_prefix = self.remote_folder.replace(f"s3://{self.bucket}/", "")
+        if file_list_from_s3(
+            bucket_name=self.bucket, file_prefix=f"{folder_prefix}/"
+        ):
+            raise FileNotFoundError(
+                f"Unable to download {self.remote_manifest_path}"
+            )
+
+        self.manifest_downloaded = True
+        self.migrate_legacy = True
+
+    def upload_manifest(self) -> None:
+        """upload the manifest after the month partitions it lists"""
+        with open(self.local_manifest_path, "w", encoding="utf8") as file:
+            json.dump(self.manifest, file, indent=2, sort_keys=True)
+
+        if not upload_file(
+            file_name=self.local_manifest_path,
+            object_path=self.remote_manifest_path,
+        ):
+            raise RuntimeError(f"Unable to upload {self.remote_manifest_path}")
+
+    def legacy_table(self, tmp_dir: str) -> Optional[pyarrow.Table]:
+        """events of the legacy single file, if it exists"""
+        local_path = os.path.join(tmp_dir, self.base_filename)
+        if not download_file(
+            object_path=self.legacy_path, file_name=local_path
+        ):
+            return None
+        return pq.read_table(local_path)
+
+    @property
+    def json_string_fields(self) -> List[str]:
+        """
+        fields of the unique_key list items that are too poorly structured to
+        be strongly typed, kept as json strings to be parsed when analyzing
+        """
+        return []
 
-        download_file(object_path=self.remote_path, file_name=self.local_path)
+    @property
+    def decode_schema(self) -> pyarrow.Schema:
+        """
+        event schema read by arrow, with event times read as strings and
+        without json string fields, which are both converted apart
+        """
+        schema = self.event_schema.set(
+            self.event_schema.get_field_index("time"),
+            pyarrow.field("time", pyarrow.string()),
+        )
+        if not self.json_string_fields:
+            return schema
+
+        data_fields = []
+        for data_field in self.event_schema.field("data").type:
+            if data_field.name == self.unique_key:
+                data_field = data_field.with_type(
+                    pyarrow.list_(
+                        pyarrow.struct(
+                            item_field
+                            for item_field in data_field.type.value_type
+                            if item_field.name not in self.json_string_fields
+                        )
+                    )
+                )
+            data_fields.append(data_field)
 
-    @abstractmethod
-    def convert_records(self) -> pd.Dataset:
-        """Convert incoming records into a flattened table of records"""
+        return schema.set(
+            schema.get_field_index("data"),
+            pyarrow.field("data", pyarrow.struct(data_fields)),
+        )
+
+    def flatten_events(self, events: pyarrow.Table) -> pyarrow.Table:
+        """flatten events, with a row for each item of unique_key lists"""
+        events = flatten_schema(events)
+        unique_column = f"data.{self.unique_key}"
+        if unique_column in events.schema.names and pyarrow.types.is_list(
+            events.schema.field(unique_column).type
+        ):
+            events = flatten_schema(explode_table_column(events, unique_column))
+        return events
+
+    def event_record(self, payload: bytes) -> Dict:
+        """decode a raw event into a record of event_schema"""
+        record = json.loads(payload)
+        # format this so it can be used to partition parquet files
+        record["time"] = datetime.fromisoformat(
+            record["time"].replace("Z", "+00:00")
+        )
+
+        for item in record["data"].get(self.unique_key) or []:
+            if item is None:
+                continue
+            for key in self.json_string_fields:
+                if key in item:
+                    item[key] = json_string(item, key)
+        return record
+
+    def json_string_columns(
+        self, events: pyarrow.Table
+    ) -> Dict[str, pyarrow.Array]:
+        """
+        stringify the json string fields of every unique_key list item, in
+        the order of the rows of the flattened events. arrow can not read a
+        json value as its text, so these fields are stringified from one pass
+        of the json module over the payloads.
+        """
+        strings: Dict[str, List[Optional[str]]] = {
+            key: [] for key in self.json_string_fields
+        }
+        for payload in self.payloads:
+            for item in json.loads(payload)["data"].get(self.unique_key) or []:
+                # null items are exploded to a row of nulls
+                for key, values in strings.items():
+                    values.append(
+                        None if item is None else json_string(item, key)
+                    )
+
+        # events without a list are exploded to a single row at the end
+        null_count = pc.list_value_length(
+            pc.struct_field(events.column("data"), self.unique_key)
+        ).null_count
+        return {
+            f"data.{self.unique_key}.{key}": pyarrow.array(
+                values + [None] * null_count, pyarrow.string()
+            )
+            for key, values in strings.items()
+        }
+
+    def decode_payloads(self) -> pyarrow.Table:
+        """
+        decode all payloads with a single arrow json read into the flattened
+        event table. arrow only reads timestamps with fractions of a second
+        that fit their unit, so event times are read as strings and parsed
+        together once read.
+        """
+        events = pj.read_json(
+            pyarrow.BufferReader(b"\n".join(self.payloads)),
+            parse_options=pj.ParseOptions(
+                explicit_schema=self.decode_schema,
+                unexpected_field_behavior="ignore",
+            ),
+        )
+        events = events.set_column(
+            events.schema.get_field_index("time"),
+            pyarrow.field("time", pyarrow.timestamp("ms")),
+            parse_event_times(events.column("time")),
+        )
+        table = self.flatten_events(events)
+        if not self.json_string_fields:
+            return table
+
+        columns = self.json_string_columns(events)
+        for name, column in columns.items():
+            table = table.append_column(name, column)
+        return table
+
+    def decode_records(self) -> pyarrow.Table:
+        """
+        decode payloads one event at a time into the flattened event table.
+        events that can not be decoded, like those with values that do not
+        match the event schema, are logged and dropped so that the rest of
+        their batch is still written and checkpointed.
+        """
+        tables = [self.event_schema.empty_table()]
+        for index, payload in enumerate(self.payloads):
+            try:
+                tables.append(
+                    pyarrow.Table.from_pylist(
+                        [self.event_record(payload)],
+                        schema=self.event_schema,
+                    )
+                )
+            except (ValueError, KeyError, TypeError, AttributeError) as error:
+                process_logger = ProcessLogger(
+                    process_name="decode_glides_event",
+                    type=self.type,
+                    payload_index=index,
+                )
+                process_logger.log_start()
+                process_logger.log_failure(error)
 
-    def append_records(self) -> None:
-        """Add incoming records to a local parquet file"""
+        return self.flatten_events(pyarrow.concat_tables(tables))
+
+    @property
+    def flat_schema(self) -> pyarrow.Schema:
+        """schema of the flattened event table"""
+        return self.flatten_events(self.event_schema.empty_table()).schema
+
+    def convert_records(self) -> pd.Dataset:
+        """
+        Convert incoming payloads into a flattened table of records. Batches
+        that can not be decoded by arrow, like those with events that do not
+        match the schema, are decoded one event at a time.
+        """
         process_logger = ProcessLogger(
-            process_name="append_glides_records", type=self.type
+            process_name="convert_records",
+            type=self.type,
+            payload_count=len(self.payloads),
         )
         process_logger.log_start()
 
-        new_dataset = self.convert_records()
+        flat_schema = self.flat_schema
+        try:
+            if not self.payloads:
+                table = flat_schema.empty_table()
+            else:
+                table = self.decode_payloads()
+        except (pyarrow.ArrowInvalid, pl.ComputeError) as exception:
+            process_logger.add_metadata(
+                decode_fallback=True, decode_error=str(exception)
+            )
+            table = self.decode_records()
 
-        joined_ds = new_dataset
-        if os.path.exists(self.local_path):
-            joined_ds = pd.dataset([new_dataset, pd.dataset(self.local_path)])
+        table = table.select(flat_schema.names).cast(flat_schema)
 
-        process_logger.add_metadata(
-            new_records=new_dataset.count_rows(),
-            total_records=joined_ds.count_rows(),
-        )
+        process_logger.log_complete()
+        return pd.dataset(table)
+
+    def write_month(
+        self,
+        new_records: pl.DataFrame,
+        month: datetime,
+        schema: pyarrow.Schema,
+        tmp_dir: str,
+    ) -> str:
+        """
+        merge new records into the partition of their month, dropping
+        duplicate events, and upload it
 
-        now = datetime.now()
-        start = datetime(2024, 1, 1)
+        :return remote path of the month partition
+        """
+        partition = f"year={month.year}/month={month.month}"
+        local_path = os.path.join(tmp_dir, partition, self.base_filename)
+        remote_path = f"{self.remote_folder}/{partition}/{self.base_filename}"
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+
+        month_table = new_records.to_arrow().cast(schema)
+        if partition in self.manifest["partitions"]:
+            if not download_file(object_path=remote_path, file_name=local_path):
+                raise FileNotFoundError(f"Unable to download {remote_path}")
+            month_table = pyarrow.concat_tables(
+                [month_table, pq.read_table(local_path).cast(schema)]
+            )
+
+        unique_table = (
+            pl.DataFrame(month_table)
+            .unique(keep="first")
+            .sort(by=["time"])
+            .to_arrow()
+            .cast(schema)
+        )
+        pq.write_table(unique_table, local_path)
 
-        with tempfile.TemporaryDirectory() as tmp_dir:
+        if not upload_file(file_name=local_path, object_path=remote_path):
+            raise RuntimeError(f"Unable to upload {remote_path}")
 
-            new_path = os.path.join(tmp_dir, self.base_filename)
-            row_group_count = 0
-            with pq.ParquetWriter(new_path, schema=joined_ds.schema) as writer:
-                while start < now:
-                    end = start + relativedelta(months=1)
-                    if end < now:
-                        row_group = pl.DataFrame(
-                            joined_ds.filter(
-                                (pc.field("time") >= start)
-                                & (pc.field("time") < end)
-                            ).to_table()
-                        )
+        self.manifest["partitions"][partition] = {
+            "path": remote_path,
+            "rows": unique_table.num_rows,
+        }
+        return remote_path
 
-                    else:
-                        row_group = pl.DataFrame(
-                            joined_ds.filter(
-                                (pc.field("time") >= start)
-                            ).to_table()
-                        )
+    def append_records(self) -> List[str]:
+        """
+        Add incoming records to the month partitions of their events. Only
+        months with new records are downloaded, rewritten and uploaded.
 
-                    if not row_group.is_empty():
-                        unique_table = (
-                            row_group.unique(keep="first")
-                            .sort(by=["time"])
-                            .to_arrow()
-                            .cast(new_dataset.schema)
-                        )
+        :return remote paths of the month partitions that were written
+        """
+        process_logger = ProcessLogger(
+            process_name="append_glides_records", type=self.type
+        )
+        process_logger.log_start()
 
-                        row_group_count += 1
-                        writer.write_table(unique_table)
+        if not self.manifest_downloaded:
+            self.download_manifest()
 
-                    start = end
+        new_table = self.convert_records().to_table()
+        process_logger.add_metadata(new_records=new_table.num_rows)
 
-            os.replace(new_path, self.local_path)
-            process_logger.add_metadata(row_group_count=row_group_count)
+        written_paths: List[str] = []
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            if self.migrate_legacy:
+                legacy_table = self.legacy_table(tmp_dir)
+                if legacy_table is not None:
+                    process_logger.add_metadata(
+                        legacy_records=legacy_table.num_rows
+                    )
+                    new_table = pyarrow.concat_tables(
+                        [new_table, legacy_table.cast(new_table.schema)]
+                    )
+
+            new_records = pl.DataFrame(new_table)
+            months = (
+                new_records.select(pl.col("time").dt.truncate("1mo"))
+                .drop_nulls()
+                .unique()
+                .sort(by="time")
+                .get_column("time")
+                .to_list()
+            )
+
+            for month in months:
+                written_paths.append(
+                    self.write_month(
+                        new_records.filter(
+                            (pl.col("time") >= month)
+                            & (pl.col("time") < month + relativedelta(months=1))
+                        ),
+                        month,
+                        new_table.schema,
+                        tmp_dir,
+                    )
+                )
 
-        upload_file(file_name=self.local_path, object_path=self.remote_path)
+        if written_paths or self.migrate_legacy:
+            self.upload_manifest()
+            self.migrate_legacy = False
 
+        process_logger.add_metadata(
+            month_count=len(written_paths),
+            total_records=sum(
+                partition["rows"]
+                for partition in self.manifest["partitions"].values()
+            ),
+        )
         process_logger.log_complete()
+        return written_paths
+
+
+# pylint: enable=R0902
 
 
 class EditorChanges(GlidesConverter):
@@ -191,23 +512,6 @@ class EditorChanges(GlidesConverter):
     def unique_key(self) -> str:
         return "changes"
 
-    def convert_records(self) -> pd.Dataset:
-        process_logger = ProcessLogger(
-            process_name="convert_records", type=self.type
-        )
-        process_logger.log_start()
-
-        editors_table = pyarrow.Table.from_pylist(
-            self.records, schema=self.event_schema
-        )
-        editors_table = flatten_schema(editors_table)
-        editors_table = explode_table_column(editors_table, "data.changes")
-        editors_table = flatten_schema(editors_table)
-        editors_dataset = pd.dataset(editors_table)
-
-        process_logger.log_complete()
-        return editors_dataset
-
 
 class OperatorSignIns(GlidesConverter):
     """
@@ -264,20 +568,6 @@ class OperatorSignIns(GlidesConverter):
     def unique_key(self) -> str:
         return "operator"
 
-    def convert_records(self) -> pd.Dataset:
-        process_logger = ProcessLogger(
-            process_name="convert_records", type=self.type
-        )
-        process_logger.log_start()
-        osi_table = pyarrow.Table.from_pylist(
-            self.records, schema=self.event_schema
-        )
-        osi_table = flatten_schema(osi_table)
-        osi_dataset = pd.dataset(osi_table)
-
-        process_logger.log_complete()
-        return osi_dataset
-
 
 class TripUpdates(GlidesConverter):
     """
@@ -349,40 +639,93 @@ class TripUpdates(GlidesConverter):
     def unique_key(self) -> str:
         return "tripUpdates"
 
-    def convert_records(self) -> pd.Dataset:
-        def flatten_multitypes(record: Dict) -> Dict:
-            """
-            For each update in a record, flatten out the objects in "cars",
-            "dropped", and "cars". These objects are poorly structured for our
-            needs and can't be strongly typed. Leave them as json strings for
-            now and parse them later when analyzing.
-            """
-            for update in record["data"]["tripUpdates"]:
-                # convert these objects into strings if they exist
-                for key in ["scheduled", "dropped", "cars"]:
-                    try:
-                        update[key] = str(update[key])
-                    except KeyError:
-                        pass
-
-            return record
+    @property
+    def json_string_fields(self) -> List[str]:
+        # "scheduled", "dropped" and "cars" objects can't be strongly typed
+        return ["scheduled", "dropped", "cars"]
 
-        process_logger = ProcessLogger(
-            process_name="convert_records", type=self.type
+
+def presence_type(data_type: pyarrow.DataType) -> pyarrow.DataType:
+    """type that reads if a value is present, without reading its fields"""
+    if pyarrow.types.is_list(data_type):
+        return pyarrow.list_(pyarrow.struct([]))
+    return pyarrow.struct([])
+
+
+def route_payloads(
+    payloads: List[bytes], converters: List[GlidesConverter]
+) -> int:
+    """
+    add raw glides events to the converter of their event type, reading the
+    unique keys of all payloads with a single arrow json read. if a payload
+    can not be read, payloads are routed one at a time and unreadable ones
+    are dropped.
+
+    :return count of events without a distinguishing key
+    """
+    if not payloads:
+        return 0
+
+    unique_keys = pyarrow.schema(
+        [
+            (
+                "data",
+                pyarrow.struct(
+                    (
+                        converter.unique_key,
+                        presence_type(
+                            converter.event_schema.field("data")
+                            .type.field(converter.unique_key)
+                            .type
+                        ),
+                    )
+                    for converter in converters
+                ),
+            )
+        ]
+    )
+    try:
+        data = pj.read_json(
+            pyarrow.BufferReader(b"\n".join(payloads)),
+            parse_options=pj.ParseOptions(
+                explicit_schema=unique_keys, unexpected_field_behavior="ignore"
+            ),
+        ).column("data")
+    except pyarrow.ArrowInvalid:
+        return sum(
+            0 if route_payload(payload, converters) else 1
+            for payload in payloads
         )
-        process_logger.log_start()
 
-        modified_records = [flatten_multitypes(r) for r in self.records]
-        tu_table = pyarrow.Table.from_pylist(
-            modified_records, schema=self.event_schema
+    routed = pyarrow.array([False] * len(payloads))
+    for converter in converters:
+        matches = pc.and_not(
+            pc.is_valid(pc.struct_field(data, converter.unique_key)), routed
         )
-        tu_table = flatten_schema(tu_table)
-        tu_table = explode_table_column(tu_table, "data.tripUpdates")
-        tu_table = flatten_schema(tu_table)
-        tu_dataset = pd.dataset(tu_table)
+        converter.payloads += [
+            payloads[index] for index in pc.indices_nonzero(matches).to_pylist()
+        ]
+        routed = pc.or_(routed, matches)
 
-        process_logger.log_complete()
-        return tu_dataset
+    return len(payloads) - pc.sum(routed).as_py()
+
+
+def route_payload(payload: bytes, converters: List[GlidesConverter]) -> bool:
+    """
+    add a raw glides event to the converter of its event type
+
+    :return if the event was readable and had a distinguishing key
+    """
+    try:
+        data = json.loads(payload)["data"]
+    except (ValueError, KeyError, TypeError):
+        return False
+
+    for converter in converters:
+        if data.get(converter.unique_key) is not None:
+            converter.payloads.append(payload)
+            return True
+    return False
 
 
 def ingest_glides_events(
@@ -390,6 +733,10 @@ def ingest_glides_events(
 ) -> None:
     """
     ingest glides records from the kinesis stream and add them to parquet files
+
+    records are appended in the batches they are read in, and each batch is
+    checkpointed once it has been written. if a batch fails, reading stops and
+    it is read again on the next call.
     """
     process_logger = ProcessLogger(process_name="ingest_glides_events")
     process_logger.log_start()
@@ -401,27 +748,21 @@ def ingest_glides_events(
             TripUpdates(),
         ]
 
-        for record in kinesis_reader.get_records():
-            try:
-                # format this so it can be used to partition parquet files
-                record["time"] = datetime.fromisoformat(
-                    record["time"].replace("Z", "+00:00")
+        for batch in kinesis_reader.read_batches():
+            unrouted_count = route_payloads(batch.payloads, converters)
+            if unrouted_count > 0:
+                process_logger.log_failure(
+                    KeyError(
+                        f"No distinguishing key in {unrouted_count} records"
+                    )
                 )
 
-                data_keys = record["data"].keys()
-
-                for converter in converters:
-                    if converter.unique_key in data_keys:
-                        converter.records.append(record)
-                        break
-                else:
-                    raise KeyError(f"No distinguishing key in {data_keys}")
-            except Exception as e:
-                process_logger.log_failure(e)
+            for converter in converters:
+                for remote_path in converter.append_records():
+                    metadata_queue.put(remote_path)
+                converter.payloads = []
 
-        for converter in converters:
-            converter.append_records()
-            metadata_queue.put(converter.remote_path)
+            kinesis_reader.checkpoint(batch)
 
     except Exception as e:
         process_logger.log_failure(e)
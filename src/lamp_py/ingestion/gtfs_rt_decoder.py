@@ -0,0 +1,185 @@
+import json
+from datetime import datetime, timezone
+from typing import Tuple
+
+import pyarrow
+import pyarrow.json as pj
+from pyarrow import fs
+
+from lamp_py.ingestion.gtfs_rt_protobuf import (
+    GtfsRtProtobufDecoder,
+    is_protobuf_feed,
+)
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+class GtfsRtJsonDecoder:
+    """
+    Decoder for GTFS-RT enhanced JSON feeds
+
+    The decoder is compiled once for a GTFSRTDetail import schema. Feeds are
+    parsed by the Arrow C++ JSON reader directly into Arrow builders using a
+    feed level schema wrapping the import schema, so no python objects are
+    created for individual entities. Fields not described by the import schema
+    are ignored.
+    """
+
+    def __init__(self, import_schema: pyarrow.Schema) -> None:
+        self.import_schema = import_schema
+
+        self.feed_schema = pyarrow.schema(
+            [
+                (
+                    "header",
+                    pyarrow.struct([("timestamp", pyarrow.uint64())]),
+                ),
+                (
+                    "entity",
+                    pyarrow.list_(pyarrow.struct(list(import_schema))),
+                ),
+            ]
+        )
+
+        self.parse_options = pj.ParseOptions(
+            explicit_schema=self.feed_schema,
+            unexpected_field_behavior="ignore",
+            newlines_in_values=True,
+        )
+
+    def decode(self, buffer: pyarrow.Buffer) -> Tuple[int, pyarrow.Table]:
+        """
+        decode an uncompressed GTFS-RT JSON feed
+
+        feeds are a single JSON object, so the reader block size is set to the
+        size of the feed. if the Arrow reader rejects the feed, fall back to
+        decoding with the python json library, matching the behavior of
+        pyarrow.Table.from_pylist.
+
+        :param buffer: buffer containing uncompressed JSON feed
+
+        :return Tuple[
+            feed_timestamp from feed header,
+            pyarrow Table of feed entities with import_schema
+        ]
+        """
+        try:
+            feed = pj.read_json(
+                pyarrow.BufferReader(buffer),
+                read_options=pj.ReadOptions(
+                    use_threads=False, block_size=buffer.size + 1
+                ),
+                parse_options=self.parse_options,
+            )
+        except pyarrow.ArrowInvalid:
+            return self._decode_pylist(buffer)
+
+        feed_timestamp = feed.column("header").chunk(0).field("timestamp")[0]
+        if not feed_timestamp.is_valid:
+            raise KeyError("GTFS-RT feed header missing timestamp")
+
+        entities = feed.column("entity").chunk(0).flatten()
+        table = pyarrow.Table.from_struct_array(entities)
+
+        return feed_timestamp.as_py(), table
+
+    def _decode_pylist(
+        self, buffer: pyarrow.Buffer
+    ) -> Tuple[int, pyarrow.Table]:
+        """decode feed with python json library"""
+        json_data = json.loads(buffer.to_pybytes())
+
+        table = pyarrow.Table.from_pylist(
+            json_data["entity"], schema=self.import_schema
+        )
+
+        return json_data["header"]["timestamp"], table
+
+
+class GtfsRtDecoder:
+    """
+    Decoder for GTFS-RT feed files of a GTFSRTDetail import schema
+
+    Feeds are decoded by a GtfsRtProtobufDecoder if they are named as binary
+    protobuf feeds and by a GtfsRtJsonDecoder otherwise, so both formats fill
+    the same import schema Arrow layout.
+    """
+
+    def __init__(self, import_schema: pyarrow.Schema) -> None:
+        self.json_decoder = GtfsRtJsonDecoder(import_schema)
+        self.protobuf_decoder = GtfsRtProtobufDecoder(import_schema)
+
+    def decode_feed(
+        self, buffer: pyarrow.Buffer, filename: str
+    ) -> Tuple[datetime, pyarrow.Table]:
+        """
+        decode a GTFS-RT feed, that may be gzip compressed, appending the year,
+        month, day and feed_timestamp columns from the feed header
+
+        some of our older files are named incorrectly, with a simple .json
+        suffix rather than a .json.gz suffix. so compression is detected by
+        checking for the gzip magic number rather than by file name.
+
+        :param buffer: buffer containing the raw contents of a feed file
+        :param filename: name of the feed file, used to detect its format
+
+        :return Tuple[
+            datetime of the feed header timestamp,
+            pyarrow Table of feed entities with timestamp columns
+        ]
+        """
+        if buffer[: len(GZIP_MAGIC)].to_pybytes() == GZIP_MAGIC:
+            with pyarrow.input_stream(
+                pyarrow.BufferReader(buffer), compression="gzip"
+            ) as file:
+                buffer = file.read_buffer()
+
+        if is_protobuf_feed(filename):
+            feed_timestamp, table = self.protobuf_decoder.decode(buffer)
+        else:
+            feed_timestamp, table = self.json_decoder.decode(buffer)
+
+        return append_timestamp_columns(table, feed_timestamp)
+
+    def decode_file(
+        self, file_system: fs.FileSystem, filename: str
+    ) -> Tuple[datetime, pyarrow.Table]:
+        """
+        decode a GTFS-RT feed file, appending the year, month, day and
+        feed_timestamp columns from the feed header
+
+        :param file_system: pyarrow file system to open filename with
+        :param filename: path of file to decode, without s3:// prefix
+
+        :return Tuple[
+            datetime of the feed header timestamp,
+            pyarrow Table of feed entities with timestamp columns
+        ]
+        """
+        with file_system.open_input_stream(filename, compression=None) as file:
+            return self.decode_feed(file.read_buffer(), filename)
+
+
+def append_timestamp_columns(
+    table: pyarrow.Table, feed_timestamp: int
+) -> Tuple[datetime, pyarrow.Table]:
+    """
+    append year, month, day and feed_timestamp columns to a table of feed
+    entities as constant arrays
+
+    :return Tuple[datetime of feed_timestamp, table with timestamp columns]
+    """
+    timestamp = datetime.fromtimestamp(feed_timestamp, timezone.utc)
+
+    for column, value, column_type in (
+        ("year", timestamp.year, pyarrow.uint16()),
+        ("month", timestamp.month, pyarrow.uint8()),
+        ("day", timestamp.day, pyarrow.uint8()),
+        ("feed_timestamp", feed_timestamp, pyarrow.uint64()),
+    ):
+        table = table.append_column(
+            column,
+            pyarrow.repeat(pyarrow.scalar(value, column_type), table.num_rows),
+        )
+
+    return timestamp, table
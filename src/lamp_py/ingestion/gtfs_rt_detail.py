@@ -1,12 +1,66 @@
 from abc import ABC
 from abc import abstractmethod
-from typing import Optional, List, Tuple
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, List, Tuple, Union
 
 import pyarrow
 
 from lamp_py.ingestion.utils import flatten_schema
 
 
+# pylint: disable=R0902
+# disable too many instance attributes, one per parquet writer setting
+@dataclass
+class WriteProfile:
+    """
+    Parquet writer settings used to write the files of a GTFS-RT config type
+
+    The defaults match pyarrow's ParquetWriter defaults. Profiles can be
+    compared on recorded day files with the write_profiles benchmark.
+    """
+
+    # parquet compression codec and level, a level of None uses the
+    # codec's default level
+    compression: str = "snappy"
+    compression_level: Optional[int] = None
+
+    # dictionary encode all columns, no columns, or only the listed columns
+    use_dictionary: Union[bool, Tuple[str, ...]] = True
+
+    # maximum rows per row group, None uses pyarrow's default. row groups
+    # never span partitions of a day file
+    row_group_size: Optional[int] = None
+
+    # target bytes of a data page, None uses pyarrow's default of 1 MB
+    data_page_size: Optional[int] = None
+
+    # write page indexes and column statistics, used to skip pages and row
+    # groups when reading with filters
+    write_page_index: bool = False
+    write_statistics: bool = True
+
+    # sort keys of each partition, written after sorting by partition column
+    sort_order: Optional[List[Tuple[str, str]]] = None
+
+    def writer_options(self) -> Dict[str, Any]:
+        """keyword arguments for pyarrow.parquet.ParquetWriter"""
+        return {
+            "compression": self.compression,
+            "compression_level": self.compression_level,
+            "use_dictionary": (
+                list(self.use_dictionary)
+                if isinstance(self.use_dictionary, tuple)
+                else self.use_dictionary
+            ),
+            "data_page_size": self.data_page_size,
+            "write_page_index": self.write_page_index,
+            "write_statistics": self.write_statistics,
+        }
+
+
+# pylint: enable=R0902
+
+
 class GTFSRTDetail(ABC):
     """
     Abstract Base Class for all GTFSRTDetail implementations.
@@ -39,6 +93,18 @@ class GTFSRTDetail(ABC):
 
         Currently specified sort orders were determined by a small amount of experimentation
 
-        TODO: perform additional experiments to optimize sort order of all parquet file types  # pylint: disable=fixme
+        Sort orders can be compared with the write_profiles benchmark
         """
         return None
+
+    @property
+    def write_profile(self) -> WriteProfile:
+        """
+        Parquet writer settings for files of this config, sorted by
+        table_sort_order
+
+        pyarrow's ParquetWriter defaults are kept until candidate profiles
+        are compared on production day files with the write_profiles
+        benchmark. Configs may override this with a tuned profile.
+        """
+        return WriteProfile(sort_order=self.table_sort_order)
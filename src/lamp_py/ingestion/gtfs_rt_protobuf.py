@@ -0,0 +1,602 @@
+import struct
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy
+import pyarrow
+
+# GTFS-RT messages, by message name, as field name -> (field number, type).
+# types are protobuf scalar types, or names of ENUMS or other MESSAGES.
+# https://gtfs.org/realtime/reference/
+MESSAGES: Dict[str, Dict[str, Tuple[int, str]]] = {
+    "FeedMessage": {
+        "header": (1, "FeedHeader"),
+        "entity": (2, "FeedEntity"),
+    },
+    "FeedHeader": {
+        "gtfs_realtime_version": (1, "string"),
+        "incrementality": (2, "Incrementality"),
+        "timestamp": (3, "uint64"),
+    },
+    "FeedEntity": {
+        "id": (1, "string"),
+        "is_deleted": (2, "bool"),
+        "trip_update": (3, "TripUpdate"),
+        "vehicle": (4, "VehiclePosition"),
+        "alert": (5, "Alert"),
+    },
+    "TripUpdate": {
+        "trip": (1, "TripDescriptor"),
+        "stop_time_update": (2, "StopTimeUpdate"),
+        "vehicle": (3, "VehicleDescriptor"),
+        "timestamp": (4, "uint64"),
+        "delay": (5, "int32"),
+    },
+    "StopTimeEvent": {
+        "delay": (1, "int32"),
+        "time": (2, "int64"),
+        "uncertainty": (3, "int32"),
+    },
+    "StopTimeUpdate": {
+        "stop_sequence": (1, "uint32"),
+        "arrival": (2, "StopTimeEvent"),
+        "departure": (3, "StopTimeEvent"),
+        "stop_id": (4, "string"),
+        "schedule_relationship": (5, "StopTimeScheduleRelationship"),
+    },
+    "VehiclePosition": {
+        "trip": (1, "TripDescriptor"),
+        "position": (2, "Position"),
+        "current_stop_sequence": (3, "uint32"),
+        "current_status": (4, "VehicleStopStatus"),
+        "timestamp": (5, "uint64"),
+        "congestion_level": (6, "CongestionLevel"),
+        "stop_id": (7, "string"),
+        "vehicle": (8, "VehicleDescriptor"),
+        "occupancy_status": (9, "OccupancyStatus"),
+        "occupancy_percentage": (10, "uint32"),
+        "multi_carriage_details": (11, "CarriageDetails"),
+    },
+    "CarriageDetails": {
+        "id": (1, "string"),
+        "label": (2, "string"),
+        "occupancy_status": (3, "OccupancyStatus"),
+        "occupancy_percentage": (4, "int32"),
+        "carriage_sequence": (5, "uint32"),
+    },
+    "Alert": {
+        "active_period": (1, "TimeRange"),
+        "informed_entity": (5, "EntitySelector"),
+        "cause": (6, "Cause"),
+        "effect": (7, "Effect"),
+        "url": (8, "TranslatedString"),
+        "header_text": (10, "TranslatedString"),
+        "description_text": (11, "TranslatedString"),
+        "severity_level": (14, "SeverityLevel"),
+    },
+    "TimeRange": {
+        "start": (1, "uint64"),
+        "end": (2, "uint64"),
+    },
+    "Position": {
+        "latitude": (1, "float"),
+        "longitude": (2, "float"),
+        "bearing": (3, "float"),
+        "odometer": (4, "double"),
+        "speed": (5, "float"),
+    },
+    "TripDescriptor": {
+        "trip_id": (1, "string"),
+        "start_time": (2, "string"),
+        "start_date": (3, "string"),
+        "schedule_relationship": (4, "TripScheduleRelationship"),
+        "route_id": (5, "string"),
+        "direction_id": (6, "uint32"),
+    },
+    "VehicleDescriptor": {
+        "id": (1, "string"),
+        "label": (2, "string"),
+        "license_plate": (3, "string"),
+    },
+    "EntitySelector": {
+        "agency_id": (1, "string"),
+        "route_id": (2, "string"),
+        "route_type": (3, "int32"),
+        "trip": (4, "TripDescriptor"),
+        "stop_id": (5, "string"),
+        "direction_id": (6, "uint32"),
+    },
+    "TranslatedString": {
+        "translation": (1, "Translation"),
+    },
+    "Translation": {
+        "text": (1, "string"),
+        "language": (2, "string"),
+    },
+}
+
+# fields of the MBTA enhanced and Busloc feeds that are not in the GTFS-RT
+# spec, using field numbers of the 9000-9999 private extension range. cause
+# and effect details are strings in enhanced feeds, rather than the spec's
+# TranslatedString, so they are extensions as well.
+#
+# these field numbers are placeholders that are not taken from the
+# producer's .proto, so ConfigType.from_filename does not route protobuf
+# feeds to a converter until they are aligned with it.
+MBTA_EXTENSIONS: Dict[str, Dict[str, Tuple[int, str]]] = {
+    "TripDescriptor": {
+        "route_pattern_id": (9001, "string"),
+        "tm_trip_id": (9002, "string"),
+        "overload_id": (9003, "int64"),
+        "overload_offset": (9004, "int64"),
+    },
+    "VehicleDescriptor": {
+        "consist": (9001, "Consist"),
+        "assignment_status": (9002, "string"),
+    },
+    "Consist": {
+        "label": (1, "string"),
+    },
+    "StopTimeUpdate": {
+        "boarding_status": (9001, "string"),
+        "cause_id": (9002, "uint32"),
+        "cause_description": (9003, "string"),
+        "remark": (9004, "string"),
+    },
+    "VehiclePosition": {
+        "location_source": (9001, "string"),
+        "operator": (9002, "Operator"),
+        "block_id": (9003, "string"),
+        "run_id": (9004, "string"),
+        "revenue": (9005, "bool"),
+        "load": (9006, "uint32"),
+        "capacity": (9007, "uint32"),
+    },
+    "Operator": {
+        "id": (1, "string"),
+        "first_name": (2, "string"),
+        "last_name": (3, "string"),
+        "name": (4, "string"),
+        "logon_time": (5, "uint64"),
+    },
+    "Alert": {
+        "cause_detail": (9001, "string"),
+        "effect_detail": (9002, "string"),
+        "severity": (9003, "uint32"),
+        "created_timestamp": (9004, "uint64"),
+        "last_modified_timestamp": (9005, "uint64"),
+        "last_push_notification_timestamp": (9006, "uint64"),
+        "closed_timestamp": (9007, "int64"),
+        "alert_lifecycle": (9008, "string"),
+        "duration_certainty": (9009, "string"),
+        "reminder_times": (9010, "uint64"),
+        "short_header_text": (9011, "TranslatedString"),
+        "service_effect_text": (9012, "TranslatedString"),
+        "timeframe_text": (9013, "TranslatedString"),
+        "recurrence_text": (9014, "TranslatedString"),
+    },
+    "EntitySelector": {
+        "facility_id": (9001, "string"),
+        "activities": (9002, "string"),
+    },
+}
+
+# GTFS-RT enums, by enum name, as value -> name
+ENUMS: Dict[str, Dict[int, str]] = {
+    "Incrementality": {0: "FULL_DATASET", 1: "DIFFERENTIAL"},
+    "TripScheduleRelationship": {
+        0: "SCHEDULED",
+        1: "ADDED",
+        2: "UNSCHEDULED",
+        3: "CANCELED",
+        5: "REPLACEMENT",
+        6: "DUPLICATED",
+        7: "DELETED",
+    },
+    "StopTimeScheduleRelationship": {
+        0: "SCHEDULED",
+        1: "SKIPPED",
+        2: "NO_DATA",
+        3: "UNSCHEDULED",
+    },
+    "VehicleStopStatus": {
+        0: "INCOMING_AT",
+        1: "STOPPED_AT",
+        2: "IN_TRANSIT_TO",
+    },
+    "CongestionLevel": {
+        0: "UNKNOWN_CONGESTION_LEVEL",
+        1: "RUNNING_SMOOTHLY",
+        2: "STOP_AND_GO",
+        3: "CONGESTION",
+        4: "SEVERE_CONGESTION",
+    },
+    "OccupancyStatus": {
+        0: "EMPTY",
+        1: "MANY_SEATS_AVAILABLE",
+        2: "FEW_SEATS_AVAILABLE",
+        3: "STANDING_ROOM_ONLY",
+        4: "CRUSHED_STANDING_ROOM_ONLY",
+        5: "FULL",
+        6: "NOT_ACCEPTING_PASSENGERS",
+        7: "NO_DATA_AVAILABLE",
+        8: "NOT_BOARDABLE",
+    },
+    "Cause": {
+        1: "UNKNOWN_CAUSE",
+        2: "OTHER_CAUSE",
+        3: "TECHNICAL_PROBLEM",
+        4: "STRIKE",
+        5: "DEMONSTRATION",
+        6: "ACCIDENT",
+        7: "HOLIDAY",
+        8: "WEATHER",
+        9: "MAINTENANCE",
+        10: "CONSTRUCTION",
+        11: "POLICE_ACTIVITY",
+        12: "MEDICAL_EMERGENCY",
+    },
+    "Effect": {
+        1: "NO_SERVICE",
+        2: "REDUCED_SERVICE",
+        3: "SIGNIFICANT_DELAYS",
+        4: "DETOUR",
+        5: "ADDITIONAL_SERVICE",
+        6: "MODIFIED_SERVICE",
+        7: "OTHER_EFFECT",
+        8: "UNKNOWN_EFFECT",
+        9: "STOP_MOVED",
+        10: "NO_EFFECT",
+        11: "ACCESSIBILITY_ISSUE",
+    },
+    "SeverityLevel": {
+        1: "UNKNOWN_SEVERITY",
+        2: "INFO",
+        3: "WARNING",
+        4: "SEVERE",
+    },
+}
+
+# wire types of protobuf scalar types, anything else is length delimited
+VARINT_TYPES = {"bool", "int32", "int64", "uint32", "uint64"}
+WIRE_VARINT = 0
+WIRE_FIXED64 = 1
+WIRE_LENGTH_DELIMITED = 2
+WIRE_FIXED32 = 5
+
+UINT64_MASK = (1 << 64) - 1
+INT64_SIGN = 1 << 63
+
+
+def is_protobuf_feed(filename: str) -> bool:
+    """check if filename is of a binary GTFS-RT protobuf feed"""
+    return filename.endswith((".pb", ".pb.gz"))
+
+
+def message_fields(message: str) -> Dict[str, Tuple[int, str]]:
+    """spec and MBTA extension fields of a message"""
+    return {**MESSAGES.get(message, {}), **MBTA_EXTENSIONS.get(message, {})}
+
+
+def read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    """
+    read a base 128 varint from data at pos
+
+    :return Tuple[value, position after the varint]
+    """
+    value = data[pos]
+    pos += 1
+    if value < 0x80:
+        return value, pos
+    value &= 0x7F
+    shift = 7
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def float32(raw: bytes) -> float:
+    """
+    little endian float32 as the shortest python float that rounds to it,
+    the way protobuf json printers and the MBTA json feeds write them
+    """
+    return float(str(numpy.float32(struct.unpack("<f", raw)[0])))
+
+
+def float64(raw: bytes) -> float:
+    """little endian float64"""
+    return struct.unpack("<d", raw)[0]
+
+
+def signed(value: int) -> int:
+    """two's complement int32 or int64 varint as a signed int"""
+    return value - (1 << 64) if value & INT64_SIGN else value
+
+
+@dataclass
+class CompiledField:
+    """
+    Field of a message, compiled for the Arrow type it is decoded into
+
+    name: name of the field in the Arrow struct
+    repeated: decode into a list, for Arrow list types
+    convert: converts a varint or fixed width value, or decodes the bytes of
+        a string. values are kept as read if None.
+    fields: compiled fields of message types, by field key
+    """
+
+    name: str
+    repeated: bool
+    convert: Optional[Callable[[Any], Any]] = None
+    fields: Optional[Dict[int, "CompiledField"]] = None
+
+
+def compile_fields(
+    message: str, arrow_fields: List[pyarrow.Field]
+) -> Dict[int, CompiledField]:
+    """
+    compile the fields of a message that are described by Arrow fields,
+    other fields of the message are skipped when decoding
+
+    :return compiled fields by field key, the field number and wire type.
+        repeated scalars are compiled for both their packed and unpacked keys.
+    """
+    spec = message_fields(message)
+    compiled = {}
+    for arrow_field in arrow_fields:
+        if arrow_field.name not in spec:
+            raise KeyError(
+                f"{message} has no protobuf field for {arrow_field.name}"
+            )
+        number, field_type = spec[arrow_field.name]
+        arrow_type = arrow_field.type
+        repeated = pyarrow.types.is_list(arrow_type)
+        if repeated:
+            arrow_type = arrow_type.value_type
+
+        if field_type in MESSAGES or field_type in MBTA_EXTENSIONS:
+            compiled[number << 3 | WIRE_LENGTH_DELIMITED] = CompiledField(
+                name=arrow_field.name,
+                repeated=repeated,
+                fields=compile_fields(field_type, list(arrow_type)),
+            )
+            continue
+
+        convert: Optional[Callable[[Any], Any]] = None
+        wire_type = WIRE_VARINT
+        if field_type in ENUMS:
+            convert = ENUMS[field_type].get
+        elif field_type == "string":
+            convert = bytes.decode
+            wire_type = WIRE_LENGTH_DELIMITED
+        elif field_type == "bool":
+            convert = bool
+        elif field_type in ("int32", "int64"):
+            convert = signed
+        elif field_type == "float":
+            convert = float32
+            wire_type = WIRE_FIXED32
+        elif field_type == "double":
+            convert = float64
+            wire_type = WIRE_FIXED64
+        elif field_type not in ("uint32", "uint64"):
+            raise TypeError(f"unsupported protobuf type {field_type}")
+
+        compiled_field = CompiledField(
+            name=arrow_field.name, repeated=repeated, convert=convert
+        )
+        compiled[number << 3 | wire_type] = compiled_field
+        if repeated and wire_type != WIRE_LENGTH_DELIMITED:
+            compiled[number << 3 | WIRE_LENGTH_DELIMITED] = compiled_field
+
+    return compiled
+
+
+# pylint: disable=R0912,R0915
+# disable too many branches and statements
+def decode_message(
+    data: bytes, pos: int, end: int, fields: Dict[int, CompiledField]
+) -> Dict[str, Any]:
+    """
+    decode the compiled fields of a message in data[pos:end] into a dict,
+    fields that were not compiled are skipped
+
+    most keys, lengths and values are single byte varints, so they are read
+    inline before falling back to read_varint.
+    """
+    record: Dict[str, Any] = {}
+    while pos < end:
+        key = data[pos]
+        pos += 1
+        if key >= 0x80:
+            key, pos = read_varint(data, pos - 1)
+        compiled = fields.get(key)
+        wire_type = key & 0x07
+
+        value: Any
+        if wire_type == WIRE_VARINT:
+            value = data[pos]
+            pos += 1
+            if value >= 0x80:
+                value, pos = read_varint(data, pos - 1)
+        elif wire_type == WIRE_LENGTH_DELIMITED:
+            length = data[pos]
+            pos += 1
+            if length >= 0x80:
+                length, pos = read_varint(data, pos - 1)
+            start = pos
+            pos += length
+            if compiled is None:
+                continue
+
+            if compiled.fields is not None:
+                value = decode_message(data, start, pos, compiled.fields)
+            elif compiled.convert is bytes.decode:
+                value = data[start:pos].decode()
+            else:
+                # packed repeated scalars
+                values = record.setdefault(compiled.name, [])
+                while start < pos:
+                    value, start = read_varint(data, start)
+                    values.append(
+                        value
+                        if compiled.convert is None
+                        else compiled.convert(value)
+                    )
+                continue
+
+            if compiled.repeated:
+                record.setdefault(compiled.name, []).append(value)
+            else:
+                record[compiled.name] = value
+            continue
+        elif wire_type == WIRE_FIXED32:
+            value = data[pos : pos + 4]
+            pos += 4
+        elif wire_type == WIRE_FIXED64:
+            value = data[pos : pos + 8]
+            pos += 8
+        else:
+            raise ValueError(f"unsupported protobuf wire type {wire_type}")
+
+        if compiled is None:
+            continue
+        if compiled.convert is not None:
+            value = compiled.convert(value)
+        if compiled.repeated:
+            record.setdefault(compiled.name, []).append(value)
+        else:
+            record[compiled.name] = value
+
+    if pos != end:
+        raise ValueError("protobuf message overruns its length")
+
+    return record
+
+
+# pylint: enable=R0912,R0915
+
+
+class GtfsRtProtobufDecoder:
+    """
+    Decoder for binary GTFS-RT protobuf feeds
+
+    Feeds are decoded from the protobuf wire format by a decoder compiled once
+    for a GTFSRTDetail import schema, so entities fill the same Arrow layout
+    as the JSON decoder. Fields of the MBTA enhanced feeds are read from
+    MBTA_EXTENSIONS where present, and fields not described by the import
+    schema are skipped.
+
+    Floats are float32 on the wire, so positions written with more than 7
+    significant digits in JSON feeds decode to their nearest float32.
+    """
+
+    def __init__(self, import_schema: pyarrow.Schema) -> None:
+        self.import_schema = import_schema
+
+        # the feed message, with the header timestamp and import schema
+        # entities
+        self.feed_fields = compile_fields(
+            "FeedMessage",
+            [
+                pyarrow.field(
+                    "header",
+                    pyarrow.struct([("timestamp", pyarrow.uint64())]),
+                ),
+                pyarrow.field(
+                    "entity", pyarrow.list_(pyarrow.struct(list(import_schema)))
+                ),
+            ],
+        )
+
+    def decode(self, buffer: pyarrow.Buffer) -> Tuple[int, pyarrow.Table]:
+        """
+        decode an uncompressed GTFS-RT protobuf feed
+
+        :param buffer: buffer containing uncompressed protobuf feed
+
+        :return Tuple[
+            feed_timestamp from feed header,
+            pyarrow Table of feed entities with import_schema
+        ]
+        """
+        data = buffer.to_pybytes()
+        feed = decode_message(data, 0, len(data), self.feed_fields)
+
+        header = feed.get("header", {})
+        if header.get("timestamp") is None:
+            raise KeyError("GTFS-RT feed header missing timestamp")
+
+        table = pyarrow.Table.from_pylist(
+            feed.get("entity", []), schema=self.import_schema
+        )
+
+        return header["timestamp"], table
+
+
+def write_varint(value: int, out: bytearray) -> None:
+    """append value to out as a base 128 varint"""
+    value &= UINT64_MASK
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode_value(
+    number: int, field_type: str, value: Any, out: bytearray
+) -> None:
+    """append a field of a message to out"""
+    if field_type in MESSAGES or field_type in MBTA_EXTENSIONS:
+        encoded = encode_message(field_type, value)
+        write_varint(number << 3 | WIRE_LENGTH_DELIMITED, out)
+        write_varint(len(encoded), out)
+        out.extend(encoded)
+    elif field_type == "string":
+        encoded = value.encode()
+        write_varint(number << 3 | WIRE_LENGTH_DELIMITED, out)
+        write_varint(len(encoded), out)
+        out.extend(encoded)
+    elif field_type in ENUMS:
+        # enums may be written as their names or their values
+        values = {name: key for key, name in ENUMS[field_type].items()}
+        write_varint(number << 3 | WIRE_VARINT, out)
+        write_varint(values.get(value, value), out)
+    elif field_type in VARINT_TYPES:
+        write_varint(number << 3 | WIRE_VARINT, out)
+        write_varint(int(value), out)
+    elif field_type == "float":
+        write_varint(number << 3 | WIRE_FIXED32, out)
+        out.extend(struct.pack("<f", value))
+    elif field_type == "double":
+        write_varint(number << 3 | WIRE_FIXED64, out)
+        out.extend(struct.pack("<d", value))
+    else:
+        raise TypeError(f"unsupported protobuf type {field_type}")
+
+
+def encode_message(message: str, record: Dict[str, Any]) -> bytes:
+    """
+    encode a dict, laid out like GTFS-RT JSON, as a protobuf message. keys
+    without a field in the message and null values are skipped.
+    """
+    out = bytearray()
+    for name, (number, field_type) in message_fields(message).items():
+        value = record.get(name)
+        if value is None:
+            continue
+        for item in value if isinstance(value, list) else [value]:
+            encode_value(number, field_type, item, out)
+    return bytes(out)
+
+
+def encode_feed(feed: Dict[str, Any]) -> bytes:
+    """
+    encode a GTFS-RT JSON feed as a binary protobuf feed, used to produce
+    protobuf feeds for tests and benchmarks
+    """
+    return encode_message("FeedMessage", feed)
@@ -0,0 +1,245 @@
+import json
+import os
+from typing import List, Optional
+
+import numpy
+import pyarrow
+import pyarrow.compute as pc
+import pyarrow.dataset as pd
+from pyarrow import ipc
+
+from lamp_py.ingestion.record_hash import RECORD_HASH_VERSION
+from lamp_py.ingestion.utils import GTFS_RT_HASH_COL
+
+# file name of the hash index kept in each local day partition folder
+HASH_INDEX_FILE = "_hash_index.arrow"
+
+_INDEX_SCHEMA = pyarrow.schema(
+    [
+        (GTFS_RT_HASH_COL, pyarrow.uint64()),
+        ("feed_timestamp", pyarrow.uint64()),
+    ]
+)
+
+
+class WindowedHashIndex:
+    """
+    Persistent sliding window index of the record hashes of a day partition
+
+    The index holds every record hash written to the day partition inside of
+    the dedup window, sorted by hash, along with the latest feed_timestamp the
+    hash was written at. It is stored as an Arrow IPC file in the local day
+    folder, so new records can be checked against it without re-scanning the
+    parquet files of the partition.
+
+    window_start is the oldest feed_timestamp the index is complete for.
+    entries older than twice the dedup window are evicted as newer records
+    are added. if a table with records older than the window is checked, the
+    index is rebuilt from the parquet files of the day partition.
+    """
+
+    def __init__(self, day_folder: str, window_seconds: int) -> None:
+        self.path = os.path.join(day_folder, HASH_INDEX_FILE)
+        self.window_seconds = window_seconds
+
+        self.hashes = numpy.zeros(0, dtype=numpy.uint64)
+        self.timestamps = numpy.zeros(0, dtype=numpy.uint64)
+        self.window_start: Optional[int] = None
+        self.indexed_parts: List[str] = []
+
+    def load(self, parts: List[str]) -> None:
+        """
+        load the index from disk
+
+        the index on disk is discarded if it was created with a different
+        record hash version, or if any of parts were written without being
+        added to the index.
+
+        :param parts: local delta part files of the day partition
+        """
+        if not os.path.exists(self.path):
+            return
+
+        with pyarrow.memory_map(self.path) as source:
+            table = ipc.open_file(source).read_all()
+
+        metadata = table.schema.metadata or {}
+        if metadata.get(b"hash_version") != str(RECORD_HASH_VERSION).encode():
+            return
+
+        indexed_parts = json.loads(metadata[b"indexed_parts"])
+        if not {os.path.basename(path) for path in parts} <= set(indexed_parts):
+            return
+
+        self.hashes = table.column(GTFS_RT_HASH_COL).to_numpy()
+        self.timestamps = table.column("feed_timestamp").to_numpy()
+        self.window_start = int(metadata[b"window_start"])
+        self.indexed_parts = indexed_parts
+
+    def build(self, day_files: List[str], window_start: int) -> None:
+        """
+        build the index from the parquet files of the day partition
+
+        :param day_files: local parquet files of the day partition
+        :param window_start: oldest feed_timestamp to index
+        """
+        self.hashes = numpy.zeros(0, dtype=numpy.uint64)
+        self.timestamps = numpy.zeros(0, dtype=numpy.uint64)
+        self.window_start = window_start
+        self.indexed_parts = [os.path.basename(path) for path in day_files]
+
+        if len(day_files) > 0:
+            table = pd.dataset(day_files).to_table(
+                columns=[GTFS_RT_HASH_COL, "feed_timestamp"],
+                filter=(pc.field("feed_timestamp") >= window_start),
+            )
+            self._merge(
+                table.column(GTFS_RT_HASH_COL).to_numpy(),
+                table.column("feed_timestamp").to_numpy(),
+            )
+
+    def new_records(
+        self, table: pyarrow.Table, day_files: List[str]
+    ) -> pyarrow.Array:
+        """
+        find records of table whose hash was not written to the day partition
+        within the dedup window of the table
+
+        :param table: pyarrow Table with GTFS_RT_HASH_COL and feed_timestamp
+        :param day_files: local parquet files of the day partition, used to
+            rebuild the index if it does not cover the dedup window of table
+
+        :return boolean mask, True for records new to the day partition
+        """
+        unique_ts_min = (
+            pc.min(table.column("feed_timestamp")).as_py() - self.window_seconds
+        )
+        if self.window_start is None or unique_ts_min < self.window_start:
+            self.build(day_files, unique_ts_min)
+
+        hashes = table.column(GTFS_RT_HASH_COL).to_numpy()
+        if self.hashes.size == 0:
+            return pyarrow.array(numpy.ones(hashes.size, dtype=numpy.bool_))
+
+        positions = numpy.minimum(
+            numpy.searchsorted(self.hashes, hashes), self.hashes.size - 1
+        )
+        duplicate = (self.hashes[positions] == hashes) & (
+            self.timestamps[positions] >= numpy.uint64(unique_ts_min)
+        )
+
+        return pyarrow.array(~duplicate)
+
+    def add(self, table: pyarrow.Table, part_path: str) -> None:
+        """
+        add the records of a newly written delta part to the index and evict
+        entries that are outside of the dedup window
+
+        :param table: pyarrow Table with GTFS_RT_HASH_COL and feed_timestamp
+        :param part_path: local path of the delta part table was written to
+        """
+        self._merge(
+            table.column(GTFS_RT_HASH_COL).to_numpy(),
+            table.column("feed_timestamp").to_numpy(),
+        )
+        self.indexed_parts.append(os.path.basename(part_path))
+
+        # keep two windows of history, so that a following table that
+        # overlaps this one does not force a rebuild of the index
+        window_start = int(self.timestamps.max()) - 2 * self.window_seconds
+        if self.window_start is None or window_start > self.window_start:
+            keep = self.timestamps >= numpy.uint64(max(window_start, 0))
+            self.hashes = self.hashes[keep]
+            self.timestamps = self.timestamps[keep]
+            self.window_start = window_start
+
+    def save(self) -> None:
+        """atomically write the index to disk"""
+        table = pyarrow.table(
+            [
+                pyarrow.array(self.hashes, pyarrow.uint64()),
+                pyarrow.array(self.timestamps, pyarrow.uint64()),
+            ],
+            schema=_INDEX_SCHEMA.with_metadata(
+                {
+                    "hash_version": str(RECORD_HASH_VERSION),
+                    "window_start": str(self.window_start),
+                    "indexed_parts": json.dumps(self.indexed_parts),
+                }
+            ),
+        )
+
+        tmp_path = f"{self.path}.tmp"
+        with ipc.new_file(tmp_path, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp_path, self.path)
+
+    def _merge(self, hashes: numpy.ndarray, timestamps: numpy.ndarray) -> None:
+        """
+        merge hashes into the index, keeping the latest feed_timestamp of each
+        hash and the index sorted by hash
+        """
+        hashes = numpy.concatenate((self.hashes, hashes.astype(numpy.uint64)))
+        timestamps = numpy.concatenate(
+            (self.timestamps, timestamps.astype(numpy.uint64))
+        )
+
+        # sort by hash, then by descending timestamp, so the first entry of
+        # each hash holds its latest feed_timestamp
+        order = numpy.lexsort((~timestamps, hashes))
+        hashes = hashes[order]
+        timestamps = timestamps[order]
+
+        first = numpy.ones(hashes.size, dtype=numpy.bool_)
+        first[1:] = hashes[1:] != hashes[:-1]
+
+        self.hashes = hashes[first]
+        self.timestamps = timestamps[first]
+
+
+def windowed_first_records(
+    hashes: numpy.ndarray, timestamps: numpy.ndarray, window_seconds: int
+) -> numpy.ndarray:
+    """
+    find the records of a whole day partition that continuous ingestion keeps,
+    in a single pass. a record is kept if no record with the same hash was
+    kept within window_seconds before its feed_timestamp.
+
+    :param hashes: record hashes of the day partition
+    :param timestamps: feed_timestamp of each record
+
+    :return boolean mask, True for records to keep
+    """
+    order = numpy.lexsort((timestamps, hashes))
+    hashes = hashes[order]
+    timestamps = timestamps[order].astype(numpy.int64)
+
+    # a record starts a run if it is the first of its hash, or is more than a
+    # window after the previous record of its hash. run starts are kept.
+    keep = numpy.ones(hashes.size, dtype=numpy.bool_)
+    keep[1:] = (hashes[1:] != hashes[:-1]) | (
+        timestamps[1:] - timestamps[:-1] > window_seconds
+    )
+    starts = numpy.flatnonzero(keep)
+    ends = numpy.append(starts[1:], hashes.size)
+
+    # runs longer than a window also keep the first record more than a
+    # window after the last kept record of the run
+    long_runs = timestamps[ends - 1] - timestamps[starts] > window_seconds
+    for start, end in zip(starts[long_runs], ends[long_runs]):
+        kept = start
+        while True:
+            kept = start + int(
+                numpy.searchsorted(
+                    timestamps[start:end],
+                    timestamps[kept] + window_seconds,
+                    side="right",
+                )
+            )
+            if kept >= end:
+                break
+            keep[kept] = True
+
+    mask = numpy.empty(hashes.size, dtype=numpy.bool_)
+    mask[order] = keep
+    return mask
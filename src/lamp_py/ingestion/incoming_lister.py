@@ -0,0 +1,375 @@
+import json
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from lamp_py.aws.s3 import download_file, get_s3_client, upload_file
+from lamp_py.ingestion.prefetch import ordered_map
+from lamp_py.runtime_utils.process_logger import ProcessLogger
+
+DAY_FORMAT = "%Y/%m/%d"
+DAY_PARTITION = re.compile(r"(?P<day>\d{4}/\d{2}/\d{2})/[^/]+$")
+YEAR_PARTITION = re.compile(r"\d{4}/$")
+
+
+@dataclass
+class ListingSettings:
+    """
+    Settings for incrementally listing the incoming bucket
+
+    cursor_path: s3 path or local file cursors are saved to across loops and
+        restarts, defaults to a file named after the incoming bucket under
+        lamp/_incoming_list_cursors/ in the springboard bucket
+        (INCOMING_LIST_CURSOR_PATH)
+    rewind_seconds: seconds between rediscovering source prefixes and
+        listing each source from its first object, picking up any files
+        written behind a cursor (INCOMING_LIST_REWIND_SECONDS)
+    lookback_days: days before today that are always listed
+    fan_out_days: list day prefixes of a source concurrently once its
+        cursor is this many days behind today (INCOMING_LIST_FAN_OUT_DAYS)
+    list_threads: threads listing day prefixes concurrently
+        (INCOMING_LIST_THREADS)
+    """
+
+    cursor_path: Optional[str] = None
+    rewind_seconds: int = 60 * 60
+    lookback_days: int = 1
+    fan_out_days: int = 3
+    list_threads: int = 8
+
+    @classmethod
+    def from_environment(cls) -> "ListingSettings":
+        """create settings, overriding defaults with environment variables"""
+        defaults = cls()
+        return cls(
+            cursor_path=os.environ.get(
+                "INCOMING_LIST_CURSOR_PATH", defaults.cursor_path
+            ),
+            rewind_seconds=int(
+                os.environ.get(
+                    "INCOMING_LIST_REWIND_SECONDS", defaults.rewind_seconds
+                )
+            ),
+            fan_out_days=int(
+                os.environ.get(
+                    "INCOMING_LIST_FAN_OUT_DAYS", defaults.fan_out_days
+                )
+            ),
+            list_threads=int(
+                os.environ.get("INCOMING_LIST_THREADS", defaults.list_threads)
+            ),
+        )
+
+
+# pylint: disable=R0902
+# Too many instance attributes
+class IncomingLister:
+    """
+    List files in the incoming bucket incrementally
+
+    Incoming files are written to date partitioned source prefixes, like
+    "lamp/delta/2022/10/12/", and are moved out of the bucket once ingested.
+    Instead of paginating the whole prefix every loop, each source keeps a
+    cursor, the oldest day that may still hold incoming files, and is listed
+    with StartAfter from that day. Cursors are saved to S3, or a local file,
+    so they are kept across loops and task restarts.
+
+    Sources whose cursor is more than a few days behind, like during a
+    backfill, have their day prefixes listed concurrently. Sources are
+    periodically rediscovered and listed from their first object, so files
+    written behind a cursor are never skipped for long.
+    """
+
+    def __init__(
+        self,
+        bucket_name: str,
+        file_prefix: str,
+        settings: Optional[ListingSettings] = None,
+    ) -> None:
+        self.bucket_name = bucket_name
+        self.file_prefix = file_prefix.rstrip("/") + "/"
+        self.settings = settings if settings is not None else ListingSettings()
+        self.s3_client = get_s3_client()
+        self.cursor_path = (
+            self.settings.cursor_path
+            if self.settings.cursor_path is not None
+            else f"s3://{os.environ['SPRINGBOARD_BUCKET']}/lamp/_incoming_list_cursors/{bucket_name}.json"
+        )
+
+        # source prefix -> oldest day that may hold incoming files, None
+        # if the source should be listed from its first object
+        self.cursors: Dict[str, Optional[date]] = {}
+        # files found outside of date partitioned sources during discovery
+        self.loose_files: List[str] = []
+        self.discovered_at = 0.0
+        # last state written to the cursor file, unchanged cursors are not
+        # written again
+        self.saved_state: Optional[Dict[str, Any]] = None
+
+        self.load()
+
+    def load(self) -> None:
+        """load cursors from the cursor file, if it exists and is readable"""
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                local_path = self.cursor_path
+                if self.cursor_path.startswith("s3://"):
+                    local_path = os.path.join(tmp_dir, "cursor.json")
+                    download_file(self.cursor_path, local_path)
+
+                with open(local_path, "r", encoding="utf8") as file:
+                    state = json.load(file)
+            if state["bucket_name"] != self.bucket_name:
+                return
+            self.cursors = {
+                source: (
+                    None
+                    if day is None
+                    else datetime.strptime(day, DAY_FORMAT).date()
+                )
+                for source, day in state["cursors"].items()
+            }
+            self.discovered_at = float(state["discovered_at"])
+            self.saved_state = state
+        except Exception:
+            self.cursors = {}
+            self.discovered_at = 0.0
+
+    def save(self) -> None:
+        """
+        atomically write cursors to the cursor file, if they changed since
+        they were last saved
+
+        a failed upload is logged by upload_file and retried on the next
+        save, at worst a restarted lister lists from older cursors
+        """
+        state = {
+            "bucket_name": self.bucket_name,
+            "discovered_at": self.discovered_at,
+            "cursors": {
+                source: None if day is None else day.strftime(DAY_FORMAT)
+                for source, day in self.cursors.items()
+            },
+        }
+        if state == self.saved_state:
+            return
+
+        if self.cursor_path.startswith("s3://"):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                local_path = os.path.join(tmp_dir, "cursor.json")
+                with open(local_path, "w", encoding="utf8") as file:
+                    json.dump(state, file)
+                if not upload_file(local_path, self.cursor_path):
+                    return
+        else:
+            tmp_path = f"{self.cursor_path}.tmp"
+            with open(tmp_path, "w", encoding="utf8") as file:
+                json.dump(state, file)
+            os.replace(tmp_path, self.cursor_path)
+
+        self.saved_state = state
+
+    def s3_path(self, key: str) -> str:
+        """s3 path of an object key in the incoming bucket"""
+        return os.path.join("s3://", self.bucket_name, key)
+
+    def list_keys(
+        self,
+        prefix: str,
+        start_after: Optional[str] = None,
+        max_keys: Optional[int] = None,
+    ) -> List[str]:
+        """
+        list object keys, in key order, under prefix that sort after
+        start_after, skipping empty objects
+
+        :return up to max_keys s3 paths, more if the last page went over
+        """
+        list_kwargs = {"Bucket": self.bucket_name, "Prefix": prefix}
+        if start_after is not None:
+            list_kwargs["StartAfter"] = start_after
+
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        filepaths = []
+        for page in paginator.paginate(**list_kwargs):
+            for obj in page.get("Contents", []):
+                if obj["Size"] > 0:
+                    filepaths.append(self.s3_path(obj["Key"]))
+
+            if max_keys is not None and len(filepaths) >= max_keys:
+                break
+
+        return filepaths
+
+    def discover(self, prefix: str, depth: int = 4) -> None:
+        """
+        walk "directories" under prefix, adding prefixes whose children are
+        year partitions as sources and collecting any files along the way
+        """
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        children: List[str] = []
+        for page in paginator.paginate(
+            Bucket=self.bucket_name, Prefix=prefix, Delimiter="/"
+        ):
+            children += [
+                common["Prefix"] for common in page.get("CommonPrefixes", [])
+            ]
+            self.loose_files += [
+                self.s3_path(obj["Key"])
+                for obj in page.get("Contents", [])
+                if obj["Size"] > 0
+            ]
+
+        if any(YEAR_PARTITION.search(child) for child in children):
+            self.cursors[prefix] = None
+            return
+
+        for child in children:
+            if depth > 0:
+                self.discover(child, depth - 1)
+            else:
+                self.loose_files += self.list_keys(child)
+
+    def first_day(self, source: str) -> Optional[date]:
+        """
+        day partition of the first object in source, None if the source is
+        empty or its first object is not in a day partition
+        """
+        response = self.s3_client.list_objects_v2(
+            Bucket=self.bucket_name, Prefix=source, MaxKeys=1
+        )
+        for obj in response.get("Contents", []):
+            match = DAY_PARTITION.search(obj["Key"])
+            if match:
+                return datetime.strptime(match["day"], DAY_FORMAT).date()
+        return None
+
+    def list_days(
+        self, source: str, start: date, end: date
+    ) -> Iterator[List[str]]:
+        """
+        list day prefixes of source from start up to, but not including, end
+        concurrently, yielding the files of each day in day order
+        """
+        days = (
+            f"{source}{(start + timedelta(days=offset)).strftime(DAY_FORMAT)}/"
+            for offset in range((end - start).days)
+        )
+        with ThreadPoolExecutor(max_workers=self.settings.list_threads) as pool:
+            yield from ordered_map(
+                pool, self.list_keys, days, self.settings.list_threads
+            )
+
+    def list_source(
+        self, source: str, today: date, max_files: int
+    ) -> Tuple[List[str], bool]:
+        """
+        list files of a source from its cursor
+
+        :return files in key order, and True if the listing was complete
+        """
+        files: List[str] = []
+        start = self.cursors.get(source)
+        if start is None:
+            start = self.first_day(source)
+
+        # no cursor to start from, list the source from its first object
+        if start is None:
+            files = self.list_keys(source, max_keys=max_files)
+            return (files, len(files) < max_files)
+
+        start = min(start, today)
+
+        # backfill, list the day prefixes before today concurrently
+        if (today - start).days >= self.settings.fan_out_days:
+            for day_files in self.list_days(source, start, today):
+                files += day_files
+                if len(files) >= max_files:
+                    return (files[:max_files], False)
+            start = today
+
+        # files of the start day sort after the source and day without a
+        # trailing "/", as do files of every day after it
+        files += self.list_keys(
+            source,
+            start_after=f"{source}{start.strftime(DAY_FORMAT)}",
+            max_keys=max_files - len(files),
+        )
+        return (files, len(files) < max_files)
+
+    def update_cursor(
+        self, source: str, files: List[str], complete: bool, today: date
+    ) -> None:
+        """
+        move the cursor of a source to the oldest day still holding files,
+        but never past the lookback days before today
+        """
+        lookback = today - timedelta(days=self.settings.lookback_days)
+        days = [
+            datetime.strptime(match["day"], DAY_FORMAT).date()
+            for match in map(DAY_PARTITION.search, files)
+            if match
+        ]
+        if days:
+            self.cursors[source] = min(*days, lookback)
+        elif complete:
+            self.cursors[source] = lookback
+
+    def list_files(self, max_list_size: int = 250_000) -> List[str]:
+        """
+        list incoming files, oldest day first within each source
+
+        :return List[
+            object path as s3://bucket-name/object-key
+        ]
+        """
+        process_logger = ProcessLogger(
+            "list_incoming_files",
+            bucket_name=self.bucket_name,
+            file_prefix=self.file_prefix,
+        )
+        process_logger.log_start()
+
+        try:
+            rewind = (
+                not self.cursors
+                or time.time() - self.discovered_at
+                > self.settings.rewind_seconds
+            )
+            self.loose_files = []
+            if rewind:
+                self.cursors = {}
+                self.discover(self.file_prefix)
+                self.discovered_at = time.time()
+
+            today = datetime.now(tz=timezone.utc).date()
+            filepaths = list(self.loose_files)
+            for source in sorted(self.cursors):
+                if len(filepaths) >= max_list_size:
+                    break
+                files, complete = self.list_source(
+                    source, today, max_list_size - len(filepaths)
+                )
+                self.update_cursor(source, files, complete, today)
+                filepaths += files
+
+            self.save()
+
+            process_logger.add_metadata(
+                rewind=rewind,
+                source_count=len(self.cursors),
+                list_size=len(filepaths),
+            )
+            process_logger.log_complete()
+            return filepaths
+        except Exception as exception:
+            process_logger.log_failure(exception)
+            return []
+
+
+# pylint: enable=R0902
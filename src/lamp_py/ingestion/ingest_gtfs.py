@@ -1,5 +1,4 @@
 import os
-from multiprocessing import get_context
 from queue import Queue
 from typing import (
     Dict,
@@ -7,22 +6,24 @@ from typing import (
     Optional,
 )
 
-from lamp_py.aws.s3 import (
-    move_s3_objects,
-    file_list_from_s3,
-)
+from lamp_py.aws.s3 import move_s3_objects
 from lamp_py.runtime_utils.process_logger import ProcessLogger
 
 from lamp_py.ingestion.convert_gtfs import GtfsConverter
-from lamp_py.ingestion.convert_gtfs_rt import GtfsRtConverter
+from lamp_py.ingestion.convert_gtfs_rt import GTFS_RT_DETAILS, GtfsRtConverter
 from lamp_py.ingestion.converter import (
     ConfigType,
     Converter,
 )
+from lamp_py.ingestion.converter_pool import ConverterPool
 from lamp_py.ingestion.error import (
     ConfigTypeFromFilenameException,
     NoImplException,
 )
+from lamp_py.ingestion.incoming_lister import (
+    IncomingLister,
+    ListingSettings,
+)
 from lamp_py.ingestion.utils import (
     DEFAULT_S3_PREFIX,
     group_sort_file_list,
@@ -38,17 +39,15 @@ class NoImplConverter(Converter):
     """
 
     def convert(self) -> None:
-        move_s3_objects(
-            self.files,
-            os.path.join(os.environ["ERROR_BUCKET"], DEFAULT_S3_PREFIX),
+        failed_moves = set(
+            move_s3_objects(
+                self.files,
+                os.path.join(os.environ["ERROR_BUCKET"], DEFAULT_S3_PREFIX),
+            )
         )
-
-
-def run_converter(converter: Converter) -> None:
-    """
-    Run converters in subprocess
-    """
-    converter.convert()
+        self.moved_files = [
+            filename for filename in self.files if filename not in failed_moves
+        ]
 
 
 def ingest_gtfs_archive(metadata_queue: Queue[Optional[str]]) -> None:
@@ -64,81 +63,115 @@ def ingest_gtfs_archive(metadata_queue: Queue[Optional[str]]) -> None:
     logger.log_complete()
 
 
-def ingest_s3_files(metadata_queue: Queue[Optional[str]]) -> None:
+def create_converter(
+    config_type: ConfigType, metadata_queue: Queue[Optional[str]]
+) -> Converter:
+    """
+    create the converter for a config type, files of config types without a
+    converter are passed through to the error bucket
+    """
+    if config_type in GTFS_RT_DETAILS:
+        return GtfsRtConverter(config_type, metadata_queue)
+    return NoImplConverter(config_type, metadata_queue)
+
+
+def incoming_lister() -> IncomingLister:
+    """lister of the incoming bucket, from the cursors of previous loops"""
+    return IncomingLister(
+        bucket_name=os.environ["INCOMING_BUCKET"],
+        file_prefix=DEFAULT_S3_PREFIX,
+        settings=ListingSettings.from_environment(),
+    )
+
+
+def ingest_s3_files(
+    metadata_queue: Queue[Optional[str]],
+    converter_pool: Optional[ConverterPool] = None,
+    incoming_files: Optional[List[str]] = None,
+) -> List[str]:
     """
     get all of the filepaths currently in the incoming bucket, sort them into
     batches of similar gtfs-rt files, convert each batch into tables, write the
     tables to parquet files in the springboard bucket, add the parquet
     filepaths to the metadata table as unprocessed, and move gtfs files to the
     archive bucket (or error bucket in the event of an error)
+
+    each batch is converted in a long lived worker process of converter_pool.
+    if no pool is provided, one is created and shut down for this call.
+
+    :param incoming_files: files handed over by an arrival source, the
+        incoming bucket is listed if not provided
+
+    :return files moved out of the incoming bucket, files left in it are
+        converted again by a later call
     """
     logger = ProcessLogger(process_name="ingest_s3_files")
     logger.log_start()
 
+    files: Dict[ConfigType, List[str]] = {}
     try:
-        files = file_list_from_s3(
-            bucket_name=os.environ["INCOMING_BUCKET"],
-            file_prefix=DEFAULT_S3_PREFIX,
-        )
+        if incoming_files is None:
+            incoming_files = incoming_lister().list_files()
+        logger.add_metadata(file_count=len(incoming_files))
 
-        grouped_files = group_sort_file_list(files)
+        grouped_files = group_sort_file_list(incoming_files)
 
-        # initialize with an error / no impl converter, the rest will be added in as
-        # the appear.
-        converters: Dict[ConfigType, Converter] = {}
         error_files: List[str] = []
 
         for file_group in grouped_files.values():
-            # get the config type from the file name and create a converter for this
-            # type if one does not already exist. add the files to their converter.
-            # if something goes wrong, add these files to the error converter where
-            # they will be moved from incoming to error s3 buckets.
+            # get the config type from the file name and add the files to the
+            # batch of their config type. if something goes wrong, add these
+            # files to the error batch where they will be moved from incoming
+            # to error s3 buckets.
             try:
                 config_type = ConfigType.from_filename(file_group[0])
-                if config_type not in converters:
-                    converters[config_type] = GtfsRtConverter(
-                        config_type, metadata_queue
-                    )
-                converters[config_type].add_files(file_group)
+                if config_type not in GTFS_RT_DETAILS:
+                    raise NoImplException(f"No Converter for {config_type}")
+                files.setdefault(config_type, []).extend(file_group)
             except (ConfigTypeFromFilenameException, NoImplException):
                 error_files += file_group
 
-        converters[ConfigType.ERROR] = NoImplConverter(
-            ConfigType.ERROR, metadata_queue
-        )
-        converters[ConfigType.ERROR].add_files(error_files)
+        if len(error_files) > 0:
+            files[ConfigType.ERROR] = error_files
 
     except Exception as exception:
         logger.log_failure(exception)
 
-    # The remaining converters can be run in parallel
-    #
-    # Using signal.signal to detect ECS termination and multiprocessing.Manager
-    # to manage the metadata queue along with multiprocessing.Pool.map causes
-    # inadvertent SIGTERM signals to be sent and blocks the main event loop. To
-    # fix this, we use multiprocessing.Pool.map_async. We use pool.close()
-    # and pool.join() to ensure all work has completed in pools.
-    #
-    # Also worth noting, this application is run on Ubuntu when run on ECS,
-    # who's default subprocess start method is "fork". On OSX, this default is
-    # "spawn" some of the behavior described above only occurs when using
-    # "fork". On OSX (and Windows?) to force this behavior, run
-    # multiprocessing.set_start_method("fork") when starting the script.
-    if len(converters) > 0:
-        with get_context("spawn").Pool(processes=len(converters)) as pool:
-            pool.map_async(run_converter, converters.values())
-            pool.close()
-            pool.join()
+    # converters run in parallel, each in a worker process of the converter
+    # pool. workers are started with "spawn" and are kept across event loops,
+    # so the cost of starting interpreters and importing pyarrow, polars and
+    # boto3 is only paid once. converters keep their state between loops.
+    moved_files: List[str] = []
+    if len(files) > 0:
+        if converter_pool is None:
+            pool = ConverterPool(create_converter, metadata_queue)
+            try:
+                moved_files = pool.run(files)
+            finally:
+                pool.shutdown()
+        else:
+            moved_files = converter_pool.run(files)
 
+    logger.add_metadata(moved_file_count=len(moved_files))
     logger.log_complete()
+    return moved_files
 
 
-def ingest_gtfs(metadata_queue: Queue[Optional[str]]) -> None:
+def ingest_static_gtfs(metadata_queue: Queue[Optional[str]]) -> None:
+    """ingest static schedule files"""
+    gtfs_to_parquet()
+    ingest_gtfs_archive(metadata_queue)
+
+
+def ingest_gtfs(
+    metadata_queue: Queue[Optional[str]],
+    converter_pool: Optional[ConverterPool] = None,
+    incoming_files: Optional[List[str]] = None,
+) -> None:
     """
     ingest all gtfs file types
 
     static schedule files should be ingested first
     """
-    gtfs_to_parquet()
-    ingest_gtfs_archive(metadata_queue)
-    ingest_s3_files(metadata_queue)
+    ingest_static_gtfs(metadata_queue)
+    ingest_s3_files(metadata_queue, converter_pool, incoming_files)
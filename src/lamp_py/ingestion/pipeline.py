@@ -6,18 +6,32 @@ import logging
 import signal
 
 from lamp_py.aws.ecs import handle_ecs_sigterm, check_for_sigterm
-from lamp_py.aws.kinesis import KinesisReader
-from lamp_py.postgres.postgres_utils import start_rds_writer_process
-from lamp_py.runtime_utils.alembic_migration import alembic_upgrade_to_head
 from lamp_py.runtime_utils.env_validation import validate_environment
 from lamp_py.runtime_utils.process_logger import ProcessLogger
 
-from lamp_py.ingestion.ingest_gtfs import ingest_gtfs
-from lamp_py.ingestion.glides import ingest_glides_events
+from lamp_py.ingestion.arrival_source import (
+    ArrivalSettings,
+    arrival_source_from_settings,
+)
+from lamp_py.ingestion.converter_pool import ConverterPool
+from lamp_py.ingestion.ingest_gtfs import (
+    create_converter,
+    incoming_lister,
+    ingest_s3_files,
+    ingest_static_gtfs,
+)
+from lamp_py.ingestion.utils import DEFAULT_S3_PREFIX
 
 logging.getLogger().setLevel("INFO")
 DESCRIPTION = """Entry Point For GTFS Ingestion Scripts"""
 
+# converter workers are spawned, and import this module again when they start.
+# the rds writer, alembic migrations and glides reader are only used by the
+# main process, so sqlalchemy, alembic and pandas are imported where they are
+# started instead of at the top of this module.
+# pylint: disable=C0415
+# disable import outside toplevel
+
 
 def main() -> None:
     """
@@ -25,31 +39,72 @@ def main() -> None:
 
     * setup metadata queue metadata writer process
     * setup a glides kinesis reader
+    * setup a pool of converter worker processes
+    * setup the arrival source of incoming files
     * on a loop
         * check to see if the pipeline should be terminated
-        * ingest files from incoming s3 bucket
+        * ingest static schedules, every poll_seconds
+        * wait for a batch of incoming files, up to the next schedule check
+        * ingest the batch of files from incoming s3 bucket
         * ingest glides events from kinesis
     """
+    from lamp_py.postgres.postgres_utils import start_rds_writer_process
+    from lamp_py.ingestion.glides import ingest_glides_events
+    from lamp_py.aws.kinesis import KinesisReader, KinesisSettings
+
     # start rds writer process
     # this will create only one rds engine while app is running
     metadata_queue, rds_process = start_rds_writer_process()
 
     # connect to the glides kinesis stream
-    glides_reader = KinesisReader(stream_name="ctd-glides-prod")
-
-    # run the event loop every 30 seconds
-    while True:
-        process_logger = ProcessLogger(process_name="main")
-        process_logger.log_start()
+    glides_reader = KinesisReader(
+        stream_name="ctd-glides-prod",
+        settings=KinesisSettings.from_environment(),
+    )
 
-        check_for_sigterm(metadata_queue, rds_process)
-        ingest_gtfs(metadata_queue)
-        ingest_glides_events(glides_reader, metadata_queue)
-        check_for_sigterm(metadata_queue, rds_process)
+    # start converter workers as files arrive, and keep them across loops
+    converter_pool = ConverterPool(create_converter, metadata_queue)
 
-        process_logger.log_complete()
+    # hand incoming files to the converters as they arrive, in batches
+    settings = ArrivalSettings.from_environment()
+    lister = incoming_lister()
+    arrival_source = arrival_source_from_settings(
+        settings, lister.list_files, DEFAULT_S3_PREFIX
+    )
 
-        time.sleep(30)
+    # run the event loop whenever a batch of files is ready, or every
+    # poll_seconds. converter workers are idle between loops, and are
+    # stopped when a SIGTERM exits the loop.
+    next_static_check = 0.0
+    try:
+        while True:
+            process_logger = ProcessLogger(
+                process_name="main", arrival_source=settings.source
+            )
+            process_logger.log_start()
+
+            check_for_sigterm(metadata_queue, rds_process)
+            if time.monotonic() >= next_static_check:
+                ingest_static_gtfs(metadata_queue)
+                next_static_check = time.monotonic() + settings.poll_seconds
+
+            files = arrival_source.next_batch(
+                timeout=max(next_static_check - time.monotonic(), 0)
+            )
+            if files:
+                # only files that left the incoming bucket are acknowledged,
+                # others are received again and converted by a later loop
+                arrival_source.acknowledge(
+                    ingest_s3_files(metadata_queue, converter_pool, files)
+                )
+            process_logger.add_metadata(file_count=len(files))
+
+            ingest_glides_events(glides_reader, metadata_queue)
+            check_for_sigterm(metadata_queue, rds_process)
+
+            process_logger.log_complete()
+    finally:
+        converter_pool.shutdown()
 
 
 def start() -> None:
@@ -73,11 +128,16 @@ def start() -> None:
     )
 
     # run metadata rds migrations
+    from lamp_py.runtime_utils.alembic_migration import alembic_upgrade_to_head
+
     alembic_upgrade_to_head(db_name=os.environ["ALEMBIC_MD_DB_NAME"])
 
     # run the main method
     main()
 
 
+# pylint: enable=C0415
+
+
 if __name__ == "__main__":
     start()
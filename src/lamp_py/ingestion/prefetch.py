@@ -0,0 +1,139 @@
+import os
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from threading import current_thread
+from typing import (
+    Callable,
+    Deque,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+import pyarrow
+from pyarrow import fs
+
+InputT = TypeVar("InputT")
+ResultT = TypeVar("ResultT")
+
+
+@dataclass
+class PrefetchSettings:
+    """
+    Concurrency settings for prefetching and decoding incoming files
+
+    io_workers: threads downloading files (GTFS_RT_IO_THREADS)
+    cpu_workers: threads decoding downloaded files (GTFS_RT_DECODE_THREADS)
+    prefetch_files: max files downloaded ahead of the decoder
+        (GTFS_RT_PREFETCH_FILES)
+    """
+
+    io_workers: int = 16
+    cpu_workers: int = 4
+    prefetch_files: int = 64
+
+    @classmethod
+    def from_environment(cls) -> "PrefetchSettings":
+        """create settings, overriding defaults with environment variables"""
+        defaults = cls()
+        return cls(
+            io_workers=int(
+                os.environ.get("GTFS_RT_IO_THREADS", defaults.io_workers)
+            ),
+            cpu_workers=int(
+                os.environ.get("GTFS_RT_DECODE_THREADS", defaults.cpu_workers)
+            ),
+            prefetch_files=int(
+                os.environ.get(
+                    "GTFS_RT_PREFETCH_FILES", defaults.prefetch_files
+                )
+            ),
+        )
+
+
+def ordered_map(
+    executor: Executor,
+    func: Callable[[InputT], ResultT],
+    items: Iterable[InputT],
+    window: int,
+) -> Iterator[ResultT]:
+    """
+    map func over items with executor, yielding results in the order of items
+
+    unlike Executor.map, items are consumed lazily and at most window items
+    are in flight at once. completed results wait in a reorder buffer until
+    all earlier results have been yielded, while later items keep running.
+    if the consumer stops early, items that have not started are cancelled.
+    """
+    pending: Deque[Future] = deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+class FilePrefetcher:
+    """
+    Download files ahead of their consumer with a bounded pool of I/O threads
+
+    Files are read into memory, without decompression, so that network
+    latency is not shared with decoding. Iterating a FilePrefetcher yields
+    (filename, buffer) tuples in the order of files, filenames are stripped of
+    their s3:// prefix and buffer is None if the file could not be read.
+    """
+
+    def __init__(self, files: List[str], settings: PrefetchSettings) -> None:
+        self.files = files
+        self.settings = settings
+
+    def file_system(self, filename: str) -> fs.FileSystem:
+        """
+        file system of the current download thread for filename, file systems
+        are created on first use in each thread
+        """
+        thread_data = current_thread().__dict__
+        if filename.startswith("s3://"):
+            if "s3_file_system" not in thread_data:
+                thread_data["s3_file_system"] = fs.S3FileSystem()
+            return thread_data["s3_file_system"]
+
+        if "local_file_system" not in thread_data:
+            thread_data["local_file_system"] = fs.LocalFileSystem()
+        return thread_data["local_file_system"]
+
+    def fetch(self, filename: str) -> Tuple[str, Optional[pyarrow.Buffer]]:
+        """
+        read a file into memory. this function is executed inside of a
+        thread, so all exceptions must be handled internally.
+        """
+        try:
+            file_system = self.file_system(filename)
+            filename = filename.replace("s3://", "")
+            with file_system.open_input_stream(
+                filename, compression=None
+            ) as file:
+                return (filename, file.read_buffer())
+        except FileNotFoundError:
+            return (filename.replace("s3://", ""), None)
+        except Exception:
+            # recreate file systems of this thread for its next download
+            current_thread().__dict__.pop("s3_file_system", None)
+            current_thread().__dict__.pop("local_file_system", None)
+            return (filename.replace("s3://", ""), None)
+
+    def __iter__(self) -> Iterator[Tuple[str, Optional[pyarrow.Buffer]]]:
+        with ThreadPoolExecutor(max_workers=self.settings.io_workers) as pool:
+            yield from ordered_map(
+                pool, self.fetch, self.files, self.settings.prefetch_files
+            )
@@ -0,0 +1,308 @@
+from typing import List
+
+import numpy
+import pyarrow
+import pyarrow.compute as pc
+
+# pylint: disable=C0103
+# numpy scalar constants use upper case names
+U64 = numpy.uint64
+
+# version of the hashing algorithm, bump when hash output changes so that
+# persisted hash columns can be recognized as stale and recomputed
+RECORD_HASH_VERSION = 1
+
+# arrow type used to store record hashes
+RECORD_HASH_TYPE = pyarrow.uint64()
+
+# field metadata key of persisted record hash columns, holding the
+# RECORD_HASH_VERSION their hashes were created with
+RECORD_HASH_VERSION_KEY = b"record_hash_version"
+
+# constants used to mix and tag hash values
+_GOLDEN = U64(0x9E3779B97F4A7C15)
+_MIX_1 = U64(0xBF58476D1CE4E5B9)
+_MIX_2 = U64(0x94D049BB133111EB)
+_BYTE_PRIME = U64(0x100000001B3)
+_NULL_HASH = U64(0x6A09E667F3BCC908)
+_EMPTY_HASH = U64(0xBB67AE8584CAA73B)
+_LIST_TAG = U64(0x3C6EF372FE94F82B)
+_STRUCT_TAG = U64(0xA54FF53A5F1D36F1)
+# pylint: enable=C0103
+
+
+def _mix(values: numpy.ndarray) -> numpy.ndarray:
+    """
+    splitmix64 finalizer applied to an array of uint64 values
+
+    numpy uint64 array arithmetic wraps on overflow, which is what we want here
+    """
+    values = values ^ (values >> U64(30))
+    values = values * _MIX_1
+    values = values ^ (values >> U64(27))
+    values = values * _MIX_2
+    return values ^ (values >> U64(31))
+
+
+def _validity(array: pyarrow.Array) -> numpy.ndarray:
+    """boolean numpy mask, True where array value is not null"""
+    if array.null_count == 0:
+        return numpy.ones(len(array), dtype=numpy.bool_)
+    return array.is_valid().to_numpy(zero_copy_only=False)
+
+
+def _hash_bytes(array: pyarrow.Array) -> numpy.ndarray:
+    """
+    hash every value of a null free string or binary array, directly from its
+    offsets and data buffers
+
+    each byte is weighted by a power of _BYTE_PRIME based on its position in
+    its value, and the weighted bytes of each value are summed together.
+    """
+    if pyarrow.types.is_large_string(
+        array.type
+    ) or pyarrow.types.is_large_binary(array.type):
+        offset_type = "int64"
+    else:
+        offset_type = "int32"
+
+    _, offset_buf, data_buf = array.buffers()
+    offsets = numpy.frombuffer(offset_buf, dtype=offset_type)[
+        array.offset : array.offset + len(array) + 1
+    ].astype(numpy.int64)
+    lengths = numpy.diff(offsets)
+
+    if data_buf is None or offsets[-1] == offsets[0]:
+        data = numpy.zeros(0, dtype=numpy.uint8)
+    else:
+        data = numpy.frombuffer(data_buf, dtype=numpy.uint8)[
+            offsets[0] : offsets[-1]
+        ]
+
+    hashes = numpy.full(len(array), _EMPTY_HASH, dtype=U64)
+    if data.size == 0:
+        return _mix(hashes ^ lengths.astype(U64))
+
+    # position of each byte inside of its own value
+    starts = offsets[:-1] - offsets[0]
+    positions = numpy.arange(data.size, dtype=numpy.int64) - numpy.repeat(
+        starts, lengths
+    )
+    powers = numpy.cumprod(
+        numpy.full(int(lengths.max()), _BYTE_PRIME, dtype=U64), dtype=U64
+    )
+    weighted = (data.astype(U64) + U64(1)) * powers[positions]
+
+    # reduceat misbehaves on empty segments, only reduce non-empty values
+    non_empty = lengths > 0
+    hashes[non_empty] = numpy.add.reduceat(weighted, starts[non_empty])
+
+    return _mix(hashes ^ lengths.astype(U64))
+
+
+def _hash_primitive(array: pyarrow.Array) -> numpy.ndarray:
+    """hash every value of a numeric, boolean or temporal array"""
+    if pyarrow.types.is_boolean(array.type):
+        values = pc.fill_null(array, False).to_numpy(zero_copy_only=False)
+        return _mix(values.astype(U64) + _GOLDEN)
+
+    if pyarrow.types.is_floating(array.type):
+        values = (
+            pc.fill_null(array.cast(pyarrow.float64()), 0.0)
+            .to_numpy(zero_copy_only=False)
+            .view(U64)
+        )
+        return _mix(values + _GOLDEN)
+
+    if pyarrow.types.is_temporal(array.type):
+        # temporal values can only be cast to an integer of their own width
+        if array.type.bit_width == 32:
+            array = array.cast(pyarrow.int32())
+        else:
+            array = array.cast(pyarrow.int64())
+
+    if pyarrow.types.is_unsigned_integer(array.type):
+        values = pc.fill_null(array.cast(pyarrow.uint64()), 0)
+    else:
+        values = pc.fill_null(array.cast(pyarrow.int64()), 0)
+
+    return _mix(values.to_numpy(zero_copy_only=False).view(U64) + _GOLDEN)
+
+
+def _hash_list(array: pyarrow.Array) -> numpy.ndarray:
+    """
+    hash every list of a list array. element hashes are salted with their
+    position in the list so that element order is respected.
+    """
+    lengths = (
+        pc.fill_null(pc.list_value_length(array), 0)
+        .to_numpy(zero_copy_only=False)
+        .astype(numpy.int64)
+    )
+    hashes = numpy.zeros(len(array), dtype=U64)
+
+    if lengths.sum() > 0:
+        element_hashes = hash_arrow_array(pc.list_flatten(array))
+        starts = numpy.concatenate(([0], numpy.cumsum(lengths)[:-1]))
+        positions = numpy.arange(
+            element_hashes.size, dtype=numpy.int64
+        ) - numpy.repeat(starts, lengths)
+        element_hashes = _mix(
+            element_hashes ^ (positions.astype(U64) * _GOLDEN)
+        )
+
+        non_empty = lengths > 0
+        hashes[non_empty] = numpy.add.reduceat(
+            element_hashes, starts[non_empty]
+        )
+
+    return _mix(hashes ^ _LIST_TAG ^ (lengths.astype(U64) * _GOLDEN))
+
+
+def _hash_struct(array: pyarrow.StructArray) -> numpy.ndarray:
+    """hash every struct of a struct array by combining its field hashes"""
+    hashes = numpy.full(len(array), _STRUCT_TAG, dtype=U64)
+    for child in array.flatten():
+        hashes = _mix((hashes * _GOLDEN) ^ hash_arrow_array(child))
+    return hashes
+
+
+def _hash_dictionary(dictionary: pyarrow.Array) -> numpy.ndarray:
+    """hash the values of a dictionary array dictionary"""
+    if not _is_bytes_type(dictionary.type):
+        return hash_arrow_array(dictionary)
+
+    if dictionary.null_count == 0:
+        return _hash_bytes(dictionary)
+
+    hashes = _hash_bytes(
+        pc.fill_null(dictionary, pyarrow.scalar(b"", dictionary.type))
+    )
+    return numpy.where(_validity(dictionary), hashes, _NULL_HASH)
+
+
+def _is_bytes_type(array_type: pyarrow.DataType) -> bool:
+    """is array_type a variable length string or binary type"""
+    return (
+        pyarrow.types.is_string(array_type)
+        or pyarrow.types.is_large_string(array_type)
+        or pyarrow.types.is_binary(array_type)
+        or pyarrow.types.is_large_binary(array_type)
+    )
+
+
+def hash_arrow_array(array: pyarrow.Array) -> numpy.ndarray:
+    """
+    create a deterministic uint64 hash for every value of a pyarrow Array
+
+    nulls hash to a shared null value, and nested list and struct values are
+    hashed recursively, so that equal values always produce equal hashes
+    regardless of how the array is chunked, sliced or dictionary encoded.
+
+    :param array: pyarrow Array or ChunkedArray
+
+    :return numpy uint64 array with the same length as array
+    """
+    # pylint: disable-msg=R0911
+    # disable too many returns error message
+    if isinstance(array, pyarrow.ChunkedArray):
+        if array.num_chunks == 0:
+            return numpy.zeros(0, dtype=U64)
+        return numpy.concatenate(
+            [hash_arrow_array(chunk) for chunk in array.chunks]
+        )
+
+    if len(array) == 0:
+        return numpy.zeros(0, dtype=U64)
+
+    array_type = array.type
+
+    if pyarrow.types.is_null(array_type):
+        return numpy.full(len(array), _NULL_HASH, dtype=U64)
+
+    if pyarrow.types.is_dictionary(array_type):
+        if len(array.dictionary) == 0:
+            return numpy.full(len(array), _NULL_HASH, dtype=U64)
+        dictionary_hashes = _hash_dictionary(array.dictionary)
+        indices = pc.fill_null(array.indices, 0).to_numpy(zero_copy_only=False)
+        hashes = dictionary_hashes[indices]
+
+    elif _is_bytes_type(array_type):
+        # gtfs-rt string columns are very repetitive, so only hash each unique
+        # value once and gather the results with the dictionary indices
+        return hash_arrow_array(pc.dictionary_encode(array))
+
+    elif pyarrow.types.is_struct(array_type):
+        hashes = _hash_struct(array)
+
+    elif (
+        pyarrow.types.is_list(array_type)
+        or pyarrow.types.is_large_list(array_type)
+        or pyarrow.types.is_fixed_size_list(array_type)
+    ):
+        hashes = _hash_list(array)
+
+    elif (
+        pyarrow.types.is_integer(array_type)
+        or pyarrow.types.is_floating(array_type)
+        or pyarrow.types.is_boolean(array_type)
+        or pyarrow.types.is_temporal(array_type)
+    ):
+        hashes = _hash_primitive(array)
+
+    else:
+        # any other type (decimal, fixed size binary, ...) is hashed by value
+        # of its string representation
+        return hash_arrow_array(array.cast(pyarrow.string()))
+
+    return numpy.where(_validity(array), hashes, _NULL_HASH)
+
+
+def hash_record_columns(
+    table: pyarrow.Table, columns: List[str]
+) -> pyarrow.ChunkedArray:
+    """
+    create a record hash for every row of table, using the values of columns
+
+    the order of columns is significant, callers should sort column names if
+    they want a column order independent hash.
+
+    :param table: pyarrow Table (or RecordBatch) to hash
+    :param columns: columns of table to include in the record hash
+
+    :return ChunkedArray of RECORD_HASH_TYPE with one hash per table row
+    """
+    hashes = numpy.full(table.num_rows, _GOLDEN, dtype=U64)
+    for column in columns:
+        hashes = _mix((hashes * _GOLDEN) ^ hash_arrow_array(table[column]))
+
+    return pyarrow.chunked_array([pyarrow.array(hashes, RECORD_HASH_TYPE)])
+
+
+def record_hash_field(name: str) -> pyarrow.Field:
+    """
+    arrow field of a record hash column, with the RECORD_HASH_VERSION of its
+    hashes stored in the field metadata
+
+    field metadata is kept in the arrow schema of parquet files, so persisted
+    hash columns can be checked against the current hashing algorithm
+    """
+    return pyarrow.field(
+        name,
+        RECORD_HASH_TYPE,
+        metadata={RECORD_HASH_VERSION_KEY: str(RECORD_HASH_VERSION)},
+    )
+
+
+def is_current_record_hash(field: pyarrow.Field) -> bool:
+    """
+    check if field is a record hash column created with the current
+    RECORD_HASH_VERSION
+    """
+    if field.type != RECORD_HASH_TYPE:
+        return False
+    metadata = field.metadata or {}
+    return (
+        metadata.get(RECORD_HASH_VERSION_KEY)
+        == str(RECORD_HASH_VERSION).encode()
+    )
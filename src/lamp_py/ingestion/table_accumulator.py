@@ -0,0 +1,210 @@
+import os
+import tempfile
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import psutil
+import pyarrow
+from pyarrow import ipc
+
+from lamp_py.ingestion.change_filter import EntityChangeFilter
+from lamp_py.runtime_utils.process_logger import ProcessLogger
+
+
+def memory_budget_from_environment() -> int:
+    """
+    total bytes of Arrow tables all GTFS-RT converters may hold in memory, set
+    in megabytes by the GTFS_RT_MEMORY_BUDGET_MB environment variable.
+    defaults to a quarter of system memory.
+    """
+    budget_mb = os.environ.get("GTFS_RT_MEMORY_BUDGET_MB")
+    if budget_mb is None:
+        return psutil.virtual_memory().total // 4
+    return int(budget_mb) * 1024 * 1024
+
+
+def flush_bytes_from_environment() -> int:
+    """
+    bytes of Arrow tables a day partition collects before it is flushed, set
+    in megabytes by the GTFS_RT_FLUSH_MB environment variable. defaults to
+    512 MB.
+    """
+    return int(os.environ.get("GTFS_RT_FLUSH_MB", "512")) * 1024 * 1024
+
+
+class TableAccumulator:
+    """
+    Collects the pyarrow tables of a day partition, and the files they were
+    converted from, without repeatedly concatenating them
+
+    Tables can be spilled to local Arrow IPC files, which are memory mapped
+    back into the accumulator. Spilled tables are backed by the page cache
+    instead of process memory, so the kernel can reclaim them under memory
+    pressure.
+    """
+
+    def __init__(self) -> None:
+        self.tables: List[pyarrow.Table] = []
+        self.spilled_tables: List[pyarrow.Table] = []
+        self.files: List[str] = []
+
+        self.num_rows = 0
+        self.memory_bytes = 0
+        self.spilled_bytes = 0
+
+    @property
+    def nbytes(self) -> int:
+        """bytes of all collected tables, in memory and spilled"""
+        return self.memory_bytes + self.spilled_bytes
+
+    def append(self, table: pyarrow.Table, filename: str) -> None:
+        """add a table, converted from filename, to the accumulator"""
+        self.tables.append(table)
+        self.files.append(filename)
+
+        self.num_rows += table.num_rows
+        self.memory_bytes += table.nbytes
+
+    def spill(self) -> int:
+        """
+        write in memory tables to a local Arrow IPC file and replace them with
+        a memory mapped table of that file
+
+        the file is removed as soon as it is mapped, its disk space is
+        released once the mapped table is dropped.
+
+        :return number of bytes spilled
+        """
+        if len(self.tables) == 0:
+            return 0
+
+        fd, spill_path = tempfile.mkstemp(suffix=".arrow")
+        os.close(fd)
+        try:
+            with ipc.new_file(spill_path, self.tables[0].schema) as writer:
+                for table in self.tables:
+                    writer.write_table(table)
+
+            with pyarrow.memory_map(spill_path) as source:
+                self.spilled_tables.append(ipc.open_file(source).read_all())
+        finally:
+            os.remove(spill_path)
+
+        spilled_bytes = self.memory_bytes
+        self.tables = []
+        self.spilled_bytes += spilled_bytes
+        self.memory_bytes = 0
+
+        return spilled_bytes
+
+    def to_table(self) -> pyarrow.Table:
+        """concatenate all collected tables, without copying their data"""
+        # tables are spilled in the order they were appended, so spilled
+        # tables always precede in memory tables
+        return pyarrow.concat_tables(self.spilled_tables + self.tables)
+
+
+class DayAccumulators:
+    """
+    TableAccumulators for each day partition of a converter, kept within a
+    memory budget
+
+    Every GTFS-RT converter runs in its own process, so the memory budget is
+    shared by splitting it evenly between converters with share_budget. When
+    the in memory tables of the converter exceed its share of the budget, the
+    day partitions holding the most memory are spilled to disk until it is
+    back within budget.
+
+    System memory use includes other processes and does not drop when this
+    converter spills, so it only triggers a single spill each time it rises
+    over max_memory_pct. It has to fall memory_pct_hysteresis below that
+    before it can trigger another.
+
+    If a change_filter is provided, entities unchanged since an earlier
+    snapshot are dropped from tables before they are collected. The filter
+    can be handed to a new DayAccumulators to keep its state.
+    """
+
+    def __init__(
+        self,
+        max_memory_pct: float = 80.0,
+        memory_pct_hysteresis: float = 5.0,
+        change_filter: Optional[EntityChangeFilter] = None,
+    ) -> None:
+        self.days: Dict[datetime, TableAccumulator] = {}
+        self.change_filter = change_filter
+
+        self.memory_budget = memory_budget_from_environment()
+        self.flush_bytes = flush_bytes_from_environment()
+        self.max_memory_pct = max_memory_pct
+        self.memory_pct_hysteresis = memory_pct_hysteresis
+        self.memory_pressure = False
+
+    def share_budget(self, shares: int) -> None:
+        """split the memory budget between shares converter processes"""
+        self.memory_budget = memory_budget_from_environment() // max(shares, 1)
+
+    @property
+    def memory_bytes(self) -> int:
+        """bytes of all in memory tables of all day partitions"""
+        return sum(day.memory_bytes for day in self.days.values())
+
+    def append(
+        self, dt_part: datetime, table: pyarrow.Table, filename: str
+    ) -> None:
+        """add a table to the accumulator of its day partition"""
+        if self.change_filter is not None:
+            table = self.change_filter.filter(dt_part, table)
+
+        if dt_part not in self.days:
+            self.days[dt_part] = TableAccumulator()
+        self.days[dt_part].append(table, filename)
+
+        self.enforce_budget()
+
+    def enforce_budget(self) -> None:
+        """
+        spill day partitions to disk until memory is within budget, and once
+        when system memory use rises over max_memory_pct
+        """
+        while self.memory_bytes > self.memory_budget:
+            self.spill_largest_day(reason="over_budget")
+
+        used_pct = psutil.virtual_memory().percent
+        if self.memory_pressure:
+            self.memory_pressure = (
+                used_pct > self.max_memory_pct - self.memory_pct_hysteresis
+            )
+        elif used_pct > self.max_memory_pct:
+            self.memory_pressure = True
+            if self.memory_bytes > 0:
+                self.spill_largest_day(reason="memory_pressure")
+
+    def spill_largest_day(self, reason: str) -> None:
+        """spill the day partition holding the most memory to disk"""
+        dt_part, day = max(
+            self.days.items(), key=lambda item: item[1].memory_bytes
+        )
+        logger = ProcessLogger(
+            "spill_table_accumulator",
+            day=dt_part.date().isoformat(),
+            reason=reason,
+            memory_bytes=self.memory_bytes,
+            memory_budget=self.memory_budget,
+        )
+        logger.log_start()
+        logger.add_metadata(spilled_bytes=day.spill())
+        logger.log_complete()
+
+    def ready(self, flush_all: bool = False) -> Iterable[datetime]:
+        """
+        day partitions that have collected at least flush_bytes of tables,
+        or all day partitions if flush_all
+        """
+        for dt_part, day in list(self.days.items()):
+            if flush_all or day.nbytes >= self.flush_bytes:
+                yield dt_part
+
+    def pop(self, dt_part: datetime) -> TableAccumulator:
+        """remove and return the accumulator of a day partition"""
+        return self.days.pop(dt_part)
@@ -2,16 +2,14 @@ import os
 import re
 import gzip
 import shutil
-import pathlib
 import datetime
 import zoneinfo
-import pickle
-import hashlib
 import tempfile
-from typing import Dict, List, Any, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 from urllib import request
 from io import BytesIO
 
+import numpy
 import pyarrow
 import pyarrow.dataset as pd
 import pyarrow.parquet as pq
@@ -19,6 +17,11 @@ import pyarrow.compute as pc
 import polars as pl
 
 from lamp_py.runtime_utils.process_logger import ProcessLogger
+from lamp_py.ingestion.record_hash import (
+    hash_record_columns,
+    is_current_record_hash,
+    record_hash_field,
+)
 
 DEFAULT_S3_PREFIX = "lamp"
 GTFS_RT_HASH_COL = "lamp_record_hash"
@@ -46,14 +49,13 @@ def group_sort_file_list(filepaths: List[str]) -> Dict[str, List[str]]:
     def strip_timestamp(fileobject: str) -> str:
         """
         utility for sorting pulling timestamp string out of file path.
-        assumption is that the objects will have a bunch of "directories" that
-        pathlib can parse out, and the filename will start with a timestamp
+        assumption is that the objects will have a bunch of "directories"
+        separated by "/", and the filename will start with a timestamp
         "YYY-MM-DDTHH:MM:SSZ" (20 char) format.
 
         This utility will be used to sort the list of objects.
         """
-        filepath = pathlib.Path(fileobject)
-        return filepath.name[:20]
+        return fileobject.rsplit("/", 1)[-1][:20]
 
     grouped_files: Dict[str, List[str]] = {}
 
@@ -62,7 +64,7 @@ def group_sort_file_list(filepaths: List[str]) -> Dict[str, List[str]]:
         if file[-1] == "/":
             continue
 
-        _, file_type = pathlib.Path(file).name.split("_", maxsplit=1)
+        _, file_type = file.rsplit("/", 1)[-1].split("_", maxsplit=1)
 
         if file_type not in grouped_files:
             grouped_files[file_type] = []
@@ -220,75 +222,132 @@ def explode_table_column(table: pyarrow.table, column: str) -> pyarrow.table:
     )
 
 
-def hash_gtfs_rt_row(row: Any) -> Tuple[bytes]:
-    """hash row from polars dataframe"""
-    return (hashlib.md5(pickle.dumps(row), usedforsecurity=False).digest(),)
+def partition_groups(
+    table: pyarrow.Table,
+    partition_column: str,
+    sort_order: Optional[List[Tuple[str, str]]],
+) -> Iterable[pyarrow.Table]:
+    """
+    split table into one sorted table per partition_column value, with a
+    single sort of the whole table
+
+    partitions are yielded in order of their first appearance in table, and
+    each partition is sorted by sort_order. records with a null
+    partition_column value are dropped. the result is the same as filtering
+    table for each unique partition_column value and sorting each filtered
+    table, because pyarrow sorts are stable.
+
+    :param table: pyarrow Table to split
+    :param partition_column: column to group table by
+    :param sort_order: sort keys of each partition
+
+    :yield pyarrow Table slice of each partition
+    """
+    rank_column = "__partition_rank"
+
+    table = table.filter(pc.is_valid(table.column(partition_column)))
+    if table.num_rows == 0:
+        return
+
+    table = table.append_column(
+        rank_column,
+        pc.index_in(
+            table.column(partition_column),
+            value_set=pc.unique(table.column(partition_column)),
+        ),
+    )
+    table = table.sort_by([(rank_column, "ascending")] + (sort_order or []))
+
+    ranks = table.column(rank_column).to_numpy()
+    bounds = [0, *(numpy.flatnonzero(numpy.diff(ranks)) + 1), table.num_rows]
+
+    table = table.drop_columns(rank_column)
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        yield table.slice(start, end - start)
+
+
+def gtfs_rt_hash_columns(schema: pyarrow.Schema) -> List[str]:
+    """
+    sorted list of columns used to create GTFS_RT_HASH_COL record hashes
+
+    all columns except for "feed_timestamp" and GTFS_RT_HASH_COL are hashed
+    """
+    return sorted(
+        name
+        for name in schema.names
+        if name not in ("feed_timestamp", GTFS_RT_HASH_COL)
+    )
+
+
+def has_current_hash_column(schema: pyarrow.Schema) -> bool:
+    """
+    check if schema contains a GTFS_RT_HASH_COL generated by the current record
+    hashing engine and RECORD_HASH_VERSION
+
+    day files created by earlier versions of ingestion carry a large_binary
+    md5 hash column, or a hash column of an older RECORD_HASH_VERSION, those
+    hashes need to be re-generated before use
+    """
+    if GTFS_RT_HASH_COL not in schema.names:
+        return False
+    return is_current_record_hash(schema.field(GTFS_RT_HASH_COL))
 
 
 def hash_gtfs_rt_table(table: pyarrow.Table) -> pyarrow.Table:
     """
     add GTFS_RT_HASH_COL column to pyarrow table, if not already present
+
+    an existing GTFS_RT_HASH_COL of an older hash type will be replaced
     """
-    hash_columns = table.column_names
-    if GTFS_RT_HASH_COL in hash_columns:
+    if has_current_hash_column(table.schema):
         return table
 
-    hash_columns.remove("feed_timestamp")
-    hash_columns = sorted(hash_columns)
+    if GTFS_RT_HASH_COL in table.column_names:
+        table = table.drop_columns(GTFS_RT_HASH_COL)
 
-    hash_schema = table.schema.append(
-        pyarrow.field(GTFS_RT_HASH_COL, pyarrow.large_binary())
-    )
-
-    table = pl.from_arrow(table)
-
-    return (
-        table.with_columns(
-            table.select(hash_columns)
-            .map_rows(hash_gtfs_rt_row, return_dtype=pl.Binary)
-            .to_series(0)
-            .alias(GTFS_RT_HASH_COL)
-        )
-        .to_arrow()
-        .cast(hash_schema)
+    return table.append_column(
+        record_hash_field(GTFS_RT_HASH_COL),
+        hash_record_columns(table, gtfs_rt_hash_columns(table.schema)),
     )
 
 
 def hash_gtfs_rt_parquet(path: str) -> None:
     """
     add GTFS_RT_HASH_COL to local parquet file, if not already present
+
+    local files carrying a GTFS_RT_HASH_COL from an older hash type will be
+    migrated to the current record hash
     """
     ds = pd.dataset(path)
-    hash_columns = ds.schema.names
-    if GTFS_RT_HASH_COL in hash_columns:
+    if has_current_hash_column(ds.schema):
         return
 
-    hash_columns.remove("feed_timestamp")
-    hash_columns = sorted(hash_columns)
+    logger = ProcessLogger("hash_gtfs_rt_parquet", path=path)
+    logger.log_start()
 
-    hash_schema = ds.schema.append(
-        pyarrow.field(GTFS_RT_HASH_COL, pyarrow.large_binary())
-    )
+    no_hash_schema = ds.schema
+    if GTFS_RT_HASH_COL in no_hash_schema.names:
+        logger.add_metadata(migrate_hash_column=True)
+        no_hash_schema = no_hash_schema.remove(
+            no_hash_schema.get_field_index(GTFS_RT_HASH_COL)
+        )
+
+    hash_schema = no_hash_schema.append(record_hash_field(GTFS_RT_HASH_COL))
 
     with tempfile.TemporaryDirectory() as temp_dir:
         tmp_pq = os.path.join(temp_dir, "temp.parquet")
         with pq.ParquetWriter(tmp_pq, schema=hash_schema) as writer:
-            for batch in ds.to_batches(batch_size=1024 * 1024):
-                batch = pl.from_arrow(batch)
-                batch = (
-                    batch.with_columns(
-                        batch.select(hash_columns)
-                        .map_rows(hash_gtfs_rt_row, return_dtype=pl.Binary)
-                        .to_series(0)
-                        .alias(GTFS_RT_HASH_COL)
-                    )
-                    .to_arrow()
-                    .cast(hash_schema)
+            for batch in ds.to_batches(
+                columns=no_hash_schema.names, batch_size=1024 * 1024
+            ):
+                writer.write_table(
+                    hash_gtfs_rt_table(pyarrow.Table.from_batches([batch]))
                 )
-                writer.write_table(batch)
 
         os.replace(tmp_pq, path)
 
+    logger.log_complete()
+
 
 def gzip_file(path: str, keep_original: bool = False) -> None:
     """
@@ -18,26 +18,25 @@ from .gtfs_utils import (
 )
 
 
-def get_tu_dataframe_chunks(
-    to_load: Union[str, List[str]], route_ids: List[str]
-) -> Iterator[pandas.DataFrame]:
+TRIP_UPDATE_COLUMNS = [
+    "feed_timestamp",
+    "trip_update.timestamp",
+    "trip_update.stop_time_update.stop_id",
+    "trip_update.stop_time_update.arrival.time",
+    "trip_update.trip.direction_id",
+    "trip_update.trip.route_id",
+    "trip_update.trip.start_date",
+    "trip_update.trip.start_time",
+    "trip_update.vehicle.id",
+    "trip_update.trip.trip_id",
+]
+
+
+def trip_update_filters(route_ids: List[str]) -> pc.Expression:
     """
-    return interator of dataframe chunks from a trip updates parquet file
-    (or list of files)
+    filter for trip update records of route_ids with predicted arrivals
     """
-    trip_update_columns = [
-        "feed_timestamp",
-        "trip_update.timestamp",
-        "trip_update.stop_time_update.stop_id",
-        "trip_update.stop_time_update.arrival.time",
-        "trip_update.trip.direction_id",
-        "trip_update.trip.route_id",
-        "trip_update.trip.start_date",
-        "trip_update.trip.start_time",
-        "trip_update.vehicle.id",
-        "trip_update.trip.trip_id",
-    ]
-    trip_update_filters = (
+    return (
         (pc.field("trip_update.trip.direction_id").isin((0, 1)))
         & (pc.field("trip_update.trip.trip_id").is_valid())
         & (pc.field("trip_update.vehicle.id").is_valid())
@@ -45,13 +44,21 @@ def get_tu_dataframe_chunks(
         & (pc.field("trip_update.stop_time_update.arrival.time") > 0)
     )
 
+
+def get_tu_dataframe_chunks(
+    to_load: Union[str, List[str]], route_ids: List[str]
+) -> Iterator[pandas.DataFrame]:
+    """
+    return interator of dataframe chunks from a trip updates parquet file
+    (or list of files)
+    """
     # 100_000 batch size should result in ~5-6 GB of memory use per batch
     # of trip update records
     return read_parquet_chunks(
         to_load,
         max_rows=1_000_000,
-        columns=trip_update_columns,
-        filters=trip_update_filters,
+        columns=TRIP_UPDATE_COLUMNS,
+        filters=trip_update_filters(route_ids),
     )
 
 
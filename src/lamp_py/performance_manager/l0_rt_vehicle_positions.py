@@ -17,33 +17,28 @@ from .gtfs_utils import (
 )
 
 
-def get_vp_dataframe(
-    to_load: Union[str, List[str]], route_ids: List[str]
-) -> pandas.DataFrame:
+VEHICLE_POSITION_COLUMNS = [
+    "vehicle.current_status",
+    "vehicle.current_stop_sequence",
+    "vehicle.stop_id",
+    "vehicle.timestamp",
+    "vehicle.trip.direction_id",
+    "vehicle.trip.route_id",
+    "vehicle.trip.start_date",
+    "vehicle.trip.start_time",
+    "vehicle.vehicle.id",
+    "vehicle.trip.trip_id",
+    "vehicle.vehicle.label",
+    "vehicle.vehicle.consist",
+    "vehicle.multi_carriage_details",
+]
+
+
+def vehicle_position_filters(route_ids: List[str]) -> pc.Expression:
     """
-    return a dataframe from a vehicle position parquet file (or list of files)
-    with expected columns without null data.
+    filter for vehicle position records of route_ids without null data
     """
-    process_logger = ProcessLogger("vp.get_dataframe")
-    process_logger.log_start()
-
-    vehicle_position_cols = [
-        "vehicle.current_status",
-        "vehicle.current_stop_sequence",
-        "vehicle.stop_id",
-        "vehicle.timestamp",
-        "vehicle.trip.direction_id",
-        "vehicle.trip.route_id",
-        "vehicle.trip.start_date",
-        "vehicle.trip.start_time",
-        "vehicle.vehicle.id",
-        "vehicle.trip.trip_id",
-        "vehicle.vehicle.label",
-        "vehicle.vehicle.consist",
-        "vehicle.multi_carriage_details",
-    ]
-
-    vehicle_position_filters = (
+    return (
         (pc.field("vehicle.current_status").is_valid())
         & (pc.field("vehicle.current_stop_sequence") >= 0)
         & (pc.field("vehicle.stop_id").is_valid())
@@ -55,6 +50,17 @@ def get_vp_dataframe(
         & (pc.field("vehicle.trip.trip_id").is_valid())
     )
 
+
+def get_vp_dataframe(
+    to_load: Union[str, List[str]], route_ids: List[str]
+) -> pandas.DataFrame:
+    """
+    return a dataframe from a vehicle position parquet file (or list of files)
+    with expected columns without null data.
+    """
+    process_logger = ProcessLogger("vp.get_dataframe")
+    process_logger.log_start()
+
     rename_mapper = {
         "vehicle.current_status": "current_status",
         "vehicle.current_stop_sequence": "current_stop_sequence",
@@ -73,8 +79,8 @@ def get_vp_dataframe(
 
     result = read_parquet(
         to_load,
-        columns=vehicle_position_cols,
-        filters=vehicle_position_filters,
+        columns=VEHICLE_POSITION_COLUMNS,
+        filters=vehicle_position_filters(route_ids),
     )
 
     result = result.rename(columns=rename_mapper)
@@ -0,0 +1,75 @@
+import os
+import tempfile
+from typing import List
+
+from lamp_py.aws.kinesis import (
+    KinesisReader,
+    KinesisSettings,
+    LocalKinesisStream,
+)
+
+
+def read_ids(reader: KinesisReader, checkpoint: bool = True) -> List[int]:
+    """ids of the records read in one loop, checkpointing each batch"""
+    ids = []
+    for batch in reader.read_batches():
+        assert len(batch.records) <= reader.settings.batch_max_records
+        ids += [record["id"] for record in batch.records]
+        if checkpoint:
+            reader.checkpoint(batch)
+    return ids
+
+
+def test_multi_shard_checkpoints() -> None:
+    """
+    test that every shard is read in bounded batches, and that restarted
+    readers continue after the checkpoints of processed batches
+    """
+    stream = LocalKinesisStream(shard_count=3)
+    for record_id in range(25):
+        stream.put_record({"id": record_id}, partition_key=str(record_id))
+    assert all(records for records in stream.shards.values())
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        settings = KinesisSettings(
+            checkpoint_path=os.path.join(tmp_dir, "checkpoints.json"),
+            batch_max_records=4,
+        )
+
+        reader = KinesisReader("glides", settings, stream)
+        assert sorted(read_ids(reader)) == list(range(25))
+        assert not read_ids(reader)
+
+        # a restarted reader continues after its checkpoints
+        stream.put_record({"id": 25}, partition_key="25")
+        stream.put_record({"id": 26}, partition_key="26")
+        reader = KinesisReader("glides", settings, stream)
+        assert sorted(read_ids(reader)) == [25, 26]
+
+        # expired iterators are regenerated from the checkpoints
+        stream.expire_iterators()
+        stream.put_record({"id": 27}, partition_key="27")
+        assert read_ids(reader) == [27]
+
+
+def test_unprocessed_batches() -> None:
+    """
+    test that batches that were not checkpointed are read again, and that
+    each loop reads at most max_batches_per_loop batches
+    """
+    stream = LocalKinesisStream(shard_count=1)
+    for record_id in range(10):
+        stream.put_record({"id": record_id}, partition_key="key")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        settings = KinesisSettings(
+            checkpoint_path=os.path.join(tmp_dir, "checkpoints.json"),
+            batch_max_records=3,
+            max_batches_per_loop=2,
+        )
+        reader = KinesisReader("glides", settings, stream)
+
+        assert read_ids(reader, checkpoint=False) == [0, 1, 2, 3, 4, 5]
+        assert read_ids(reader) == [0, 1, 2, 3, 4, 5]
+        assert read_ids(reader) == [6, 7, 8, 9]
+        assert not read_ids(reader)
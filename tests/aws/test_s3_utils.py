@@ -6,6 +6,7 @@ import json
 import logging
 import os
 
+from typing import Dict, List
 from unittest.mock import patch
 
 import boto3
@@ -16,6 +17,7 @@ from botocore.stub import ANY
 
 from lamp_py.aws.s3 import file_list_from_s3
 from lamp_py.aws.s3 import move_s3_objects
+from lamp_py.aws.s3 import bulk_move_s3_objects
 
 from ..test_resources import incoming_dir
 
@@ -135,3 +137,55 @@ def test_move_bad_objects(s3_stub, caplog):  # type: ignore
             found_error = True
 
     assert found_error
+
+
+def test_bulk_move_objects(s3_stub):  # type: ignore
+    """
+    test that copied objects are deleted in batches, and that only objects
+    that failed to copy or delete are retried
+    """
+    files = [
+        "s3://incoming/lamp/a.json",
+        "s3://incoming/lamp/b.json",
+        "s3://incoming/lamp/c.json",
+    ]
+
+    def copy_params(key: str) -> Dict:
+        return {
+            "Bucket": "archive",
+            "Key": key,
+            "CopySource": {"Bucket": "incoming", "Key": key},
+        }
+
+    def delete_params(keys: List[str]) -> Dict:
+        return {
+            "Bucket": "incoming",
+            "Delete": {
+                "Objects": [{"Key": key} for key in keys],
+                "Quiet": True,
+            },
+        }
+
+    # first attempt, b fails to copy and c fails to delete
+    s3_stub.add_response("copy_object", {}, copy_params("lamp/a.json"))
+    s3_stub.add_client_error(
+        "copy_object", "SlowDown", expected_params=copy_params("lamp/b.json")
+    )
+    s3_stub.add_response("copy_object", {}, copy_params("lamp/c.json"))
+    s3_stub.add_response(
+        "delete_objects",
+        {"Errors": [{"Key": "lamp/c.json", "Code": "InternalError"}]},
+        delete_params(["lamp/a.json", "lamp/c.json"]),
+    )
+
+    # second attempt, b and c are moved
+    s3_stub.add_response("copy_object", {}, copy_params("lamp/b.json"))
+    s3_stub.add_response("copy_object", {}, copy_params("lamp/c.json"))
+    s3_stub.add_response(
+        "delete_objects", {}, delete_params(["lamp/b.json", "lamp/c.json"])
+    )
+
+    with s3_stub:
+        results = bulk_move_s3_objects(files, "archive/lamp", backoff_seconds=0)
+
+    assert results == dict.fromkeys(files)
@@ -0,0 +1,176 @@
+import json
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+from lamp_py.benchmarks.arrival_latency import run_benchmark
+from lamp_py.benchmarks.synthetic_feeds import FeedSettings
+from lamp_py.ingestion.arrival_source import (
+    ArrivalSettings,
+    ArrivalSource,
+    DirectoryWatchSource,
+    LocalEventQueue,
+    PollingSource,
+    S3EventSource,
+    s3_event_files,
+    s3_event_record,
+)
+from lamp_py.ingestion.converter import ConfigType
+
+
+class ListSource(ArrivalSource):
+    """arrival source receiving prepared files, one dictionary per call"""
+
+    def __init__(
+        self, arrivals: List[Dict[str, float]], settings: ArrivalSettings
+    ) -> None:
+        super().__init__(settings)
+        self.arrivals = arrivals
+
+    def receive(self, wait_seconds: float) -> Dict[str, float]:
+        if not self.arrivals:
+            time.sleep(wait_seconds)
+            return {}
+        return self.arrivals.pop(0)
+
+
+def test_batch_thresholds() -> None:
+    """
+    test that batches are handed over once they reach the size threshold,
+    or their oldest file reaches the age threshold
+    """
+    settings = ArrivalSettings(batch_max_files=3, batch_max_age_seconds=0.2)
+    now = time.time()
+
+    # size threshold, in arrival order
+    source = ListSource([{"b": now, "a": now - 0.1}, {"c": now}], settings)
+    assert source.next_batch(timeout=5) == ["a", "b", "c"]
+
+    # age threshold, waiting for the oldest file to age
+    source = ListSource([{"a": time.time()}], settings)
+    start = time.monotonic()
+    assert source.next_batch(timeout=5) == ["a"]
+    assert 0.15 < time.monotonic() - start < 1
+
+    # nothing ready before the timeout
+    source = ListSource([{"a": time.time()}], settings)
+    assert not source.next_batch(timeout=0.05)
+    assert source.next_batch(timeout=1) == ["a"]
+
+
+def test_polling_source() -> None:
+    """test that listings are handed over every poll_seconds"""
+    listings = [["a", "b"], ["c"]]
+    source = PollingSource(
+        lambda: listings.pop(0), ArrivalSettings(poll_seconds=0.3)
+    )
+
+    assert source.next_batch(timeout=1) == ["a", "b"]
+    assert not source.next_batch(timeout=0.1)
+    start = time.monotonic()
+    assert source.next_batch(timeout=1) == ["c"]
+    assert 0.1 < time.monotonic() - start < 0.5
+
+
+def test_s3_event_files() -> None:
+    """test parsing direct and SNS wrapped S3 event notifications"""
+    body = s3_event_record(
+        "incoming",
+        "lamp/delta/2024/01/01/2024-01-01T11%3A00%3A00Z_feed.json.gz",
+        "2024-01-01T11:00:01.000Z",
+    )
+    expected = {
+        "s3://incoming/lamp/delta/2024/01/01/2024-01-01T11:00:00Z_feed.json.gz": 1704106801.0
+    }
+    assert s3_event_files(body) == expected
+    assert s3_event_files(json.dumps({"Message": body})) == expected
+    assert not s3_event_files(json.dumps({"Event": "s3:TestEvent"}))
+
+
+def test_s3_event_source() -> None:
+    """
+    test that event messages are deleted once their files are acknowledged,
+    that other messages are deleted when received, that late events of
+    ingested files are ignored, and that reconciliation lists every file
+    """
+    event_queue = LocalEventQueue()
+    listing = ["s3://incoming/lamp/delta/2024/01/01/missed.json.gz"]
+    settings = ArrivalSettings(batch_max_age_seconds=0.1, reconcile_seconds=0.5)
+    source = S3EventSource(event_queue, "lamp/", lambda: listing, settings)
+
+    now = time.time()
+    event_time = "2024-01-01T11:00:00Z"
+    event_queue.send(s3_event_record("incoming", "lamp/a.json.gz", event_time))
+    event_queue.send(s3_event_record("incoming", "other/b.json.gz", event_time))
+    event_queue.send(json.dumps({"Event": "s3:TestEvent"}))
+
+    files = source.next_batch(timeout=1)
+    assert files == ["s3://incoming/lamp/a.json.gz"]
+    assert sorted(event_queue.deleted) == ["1", "2"]
+
+    source.acknowledge(files)
+    assert sorted(event_queue.deleted) == ["0", "1", "2"]
+
+    # redelivered events of ingested files are deleted and ignored, and
+    # files without events are picked up by reconciliation
+    event_queue.send(s3_event_record("incoming", "lamp/a.json.gz", event_time))
+    files = source.next_batch(timeout=2)
+    assert files == listing
+    assert "3" in event_queue.deleted
+    assert time.time() - now >= 0.5
+
+    # messages of files left in the incoming bucket are kept, and listed
+    # files are picked up even if they were acknowledged
+    event_queue.send(s3_event_record("incoming", "lamp/c.json.gz", event_time))
+    files = source.next_batch(timeout=1)
+    assert files == ["s3://incoming/lamp/c.json.gz"]
+    source.acknowledge([])
+    assert "4" not in event_queue.deleted
+
+    listing.append("s3://incoming/lamp/a.json.gz")
+    files = source.next_batch(timeout=2)
+    assert sorted(files) == sorted(listing)
+
+
+def test_directory_watch_source() -> None:
+    """test that new files are reported once, skipping hidden files"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source = DirectoryWatchSource(
+            temp_dir,
+            ArrivalSettings(batch_max_age_seconds=0, watch_seconds=0.05),
+        )
+        os.makedirs(os.path.join(temp_dir, "lamp"))
+        for filename in ("lamp/a.json.gz", "lamp/.b.json.gz.tmp"):
+            with open(os.path.join(temp_dir, filename), "wb") as file:
+                file.write(b"{}")
+
+        assert source.next_batch(timeout=1) == [
+            os.path.join(temp_dir, "lamp/a.json.gz")
+        ]
+        assert not source.next_batch(timeout=0.2)
+
+        os.rename(
+            os.path.join(temp_dir, "lamp/.b.json.gz.tmp"),
+            os.path.join(temp_dir, "lamp/b.json.gz"),
+        )
+        assert source.next_batch(timeout=1) == [
+            os.path.join(temp_dir, "lamp/b.json.gz")
+        ]
+
+
+def test_arrival_latency() -> None:
+    """
+    test that feeds arriving through an event queue are converted as they
+    arrive, measuring the latency of every snapshot
+    """
+    results = run_benchmark(
+        ["events"],
+        ConfigType.RT_VEHICLE_POSITIONS,
+        FeedSettings(vehicles=5, snapshots=2, cadence_seconds=1),
+        ArrivalSettings(batch_max_age_seconds=0.1),
+    )
+
+    assert results["events"]["files"] == 2
+    assert results["events"]["written_snapshots"] == 2
+    assert 0 < results["events"]["max_latency_seconds"] < 1
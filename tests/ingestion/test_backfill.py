@@ -0,0 +1,136 @@
+import os
+import shutil
+import tempfile
+from datetime import date
+from queue import Queue
+from unittest.mock import patch
+
+import numpy
+import pyarrow.parquet as pq
+
+from lamp_py.benchmarks.ingestion_throughput import local_buckets, run_converter
+from lamp_py.benchmarks.synthetic_feeds import FeedSettings
+from lamp_py.ingestion import convert_gtfs_rt
+from lamp_py.ingestion.backfill import (
+    BackfillSettings,
+    backfill_day,
+    completed_days,
+    fetched_at,
+    run_backfill,
+)
+from lamp_py.ingestion.converter import ConfigType
+from lamp_py.ingestion.convert_gtfs_rt import day_file_merged_parts
+from lamp_py.ingestion.hash_index import windowed_first_records
+
+
+def test_windowed_first_records() -> None:
+    """
+    test that records are kept when their hash was not kept within the window
+    before them, including inside of runs longer than the window
+    """
+    hashes = numpy.array([1, 1, 1, 1, 2, 2, 1, 1], dtype=numpy.uint64)
+    timestamps = numpy.array(
+        [0, 10, 50, 100, 0, 200, 61, 200], dtype=numpy.uint64
+    )
+
+    assert windowed_first_records(hashes, timestamps, 60).tolist() == [
+        True,
+        False,
+        False,
+        False,
+        True,
+        True,
+        True,
+        True,
+    ]
+
+
+def test_fetched_at() -> None:
+    """test reading fetch times from rail and busloc archived file names"""
+    assert fetched_at(
+        "lamp/delta/2024/01/02/2024-01-02T00:04:55Z_https_cdn.mbta.com_realtime_TripUpdates_enhanced.json.gz"
+    ).isoformat() == ("2024-01-02T00:04:55+00:00")
+    assert fetched_at(
+        "2024-01-02T00_04_55Z_https_mbta_busloc_s3.s3.amazonaws.com_prod_TripUpdates_enhanced.json.gz"
+    ).isoformat() == ("2024-01-02T00:04:55+00:00")
+    assert fetched_at("MBTA_GTFS.zip") is None
+
+
+def test_backfill_day() -> None:
+    """
+    test that a day rebuilt from the archive in a single pass holds the same
+    records as the day file written by continuous ingestion, lists the delta
+    parts of the day as merged without removing them, and is checkpointed
+    """
+    config_type = ConfigType.RT_TRIP_UPDATES
+    settings = FeedSettings(
+        vehicles=10, stop_time_updates=3, snapshots=6, change_pct=50
+    )
+    day_folder = "springboard/lamp/RT_TRIP_UPDATES/year=2024/month=1/day=1"
+    day_file = "2024-01-01T00:00:00.parquet"
+
+    with tempfile.TemporaryDirectory() as root:
+        run_converter(config_type, settings, root)
+        ingested = pq.read_table(os.path.join(root, day_folder, day_file))
+
+        # a stale delta part left by continuous ingestion
+        shutil.copyfile(
+            os.path.join(root, day_folder, day_file),
+            os.path.join(root, day_folder, "part-0-stale.parquet"),
+        )
+        os.remove(os.path.join(root, day_folder, day_file))
+
+        metadata_queue: Queue = Queue()
+        module = "lamp_py.ingestion.backfill"
+        with local_buckets(root, os.path.join(root, "incoming")):
+            # the backfill uses the same local stand ins as the converter,
+            # listing local paths so that archived files are read locally
+            list_local = convert_gtfs_rt.file_list_from_s3
+            with (
+                patch(
+                    f"{module}.file_list_from_s3",
+                    lambda bucket_name, file_prefix: [
+                        path.replace("s3://", f"{root}/")
+                        for path in list_local(bucket_name, file_prefix)
+                    ],
+                ),
+                patch(f"{module}.upload_file", convert_gtfs_rt.upload_file),
+            ):
+                result = backfill_day(
+                    config_type,
+                    date(2024, 1, 1),
+                    "test",
+                    BackfillSettings(),
+                    metadata_queue,
+                )
+                assert completed_days("test", config_type) == {date(2024, 1, 1)}
+
+                # checkpointed days are skipped
+                assert not run_backfill(
+                    config_type,
+                    [date(2024, 1, 1)],
+                    "test",
+                    metadata_queue,
+                    BackfillSettings(),
+                )
+
+        assert result["file_count"] == 6
+        assert "failed" not in result
+        assert sorted(os.listdir(os.path.join(root, day_folder))) == [
+            day_file,
+            "part-0-stale.parquet",
+        ]
+        assert day_file_merged_parts(
+            os.path.join(root, day_folder, day_file)
+        ) == {"part-0-stale.parquet"}
+        assert metadata_queue.get_nowait() == f"{day_folder}/{day_file}"
+
+        rebuilt = pq.read_table(os.path.join(root, day_folder, day_file))
+        assert rebuilt.schema == ingested.schema
+        # row order within partitions follows the order records were written
+        sort_keys = [
+            ("id", "ascending"),
+            ("feed_timestamp", "ascending"),
+            ("trip_update.stop_time_update.stop_sequence", "ascending"),
+        ]
+        assert rebuilt.sort_by(sort_keys).equals(ingested.sort_by(sort_keys))
@@ -0,0 +1,87 @@
+from datetime import datetime
+from typing import List
+
+import pyarrow
+
+from lamp_py.ingestion.change_filter import EntityChangeFilter
+from lamp_py.ingestion.utils import GTFS_RT_HASH_COL, hash_gtfs_rt_table
+
+
+def snapshot(feed_timestamp: int, positions: List[float]) -> pyarrow.Table:
+    """snapshot of vehicle entities, one per position"""
+    rows = len(positions)
+    return pyarrow.table(
+        {
+            "id": [f"vehicle_{i}" for i in range(rows)],
+            "vehicle.position.latitude": positions,
+            "year": pyarrow.array([2024] * rows, pyarrow.uint16()),
+            "month": pyarrow.array([1] * rows, pyarrow.uint8()),
+            "day": pyarrow.array([1] * rows, pyarrow.uint8()),
+            "feed_timestamp": pyarrow.array(
+                [feed_timestamp] * rows, pyarrow.uint64()
+            ),
+        }
+    )
+
+
+def test_entity_change_filter() -> None:
+    """
+    test that entities unchanged since an earlier written or pending snapshot
+    are dropped within the window of their day partition, that discarded
+    pending snapshots drop nothing, and that record hashes of kept entities
+    match the record hashes computed on write
+    """
+    day = datetime(2024, 1, 1)
+    change_filter = EntityChangeFilter(window_seconds=60)
+
+    first = change_filter.filter(day, snapshot(1000, [1.0, 2.0, 3.0]))
+    assert first.num_rows == 3
+    assert first.equals(
+        hash_gtfs_rt_table(
+            snapshot(1000, [1.0, 2.0, 3.0]).drop_columns(
+                ["year", "month", "day"]
+            )
+        )
+        .add_column(2, "year", first.column("year"))
+        .add_column(3, "month", first.column("month"))
+        .add_column(4, "day", first.column("day"))
+    )
+
+    # entities of a discarded table, like one that failed to write, do not
+    # drop entities of later snapshots
+    change_filter.discard(day)
+    discarded = change_filter.filter(day, snapshot(1000, [1.0, 2.0, 3.0]))
+    assert discarded.num_rows == 3
+
+    # only the moved vehicle is kept from the next snapshot of the table
+    second = change_filter.filter(day, snapshot(1005, [1.0, 2.5, 3.0]))
+    assert second.column("id").to_pylist() == ["vehicle_1"]
+
+    # written entities drop entities of the tables that follow
+    change_filter.commit(
+        day,
+        pyarrow.concat_tables([discarded, second]).drop_columns(
+            ["year", "month", "day"]
+        ),
+    )
+    assert not change_filter.pending
+    third = change_filter.filter(day, snapshot(1010, [1.0, 2.5, 3.5]))
+    assert third.column("id").to_pylist() == ["vehicle_2"]
+
+    # re-decoding a written snapshot keeps all of its entities
+    again = change_filter.filter(day, snapshot(1000, [1.0, 2.0, 3.0]))
+    assert again.num_rows == 3
+
+    # entities are kept again once the window since they were last kept has
+    # passed, or on a new day
+    change_filter.discard()
+    later = change_filter.filter(day, snapshot(1061, [1.0, 2.5, 3.0]))
+    assert later.column("id").to_pylist() == ["vehicle_0", "vehicle_2"]
+    next_day = change_filter.filter(
+        datetime(2024, 1, 2), snapshot(1062, [1.0, 2.5, 3.0])
+    )
+    assert next_day.num_rows == 3
+
+    assert change_filter.input_rows == 21
+    assert change_filter.unchanged_rows == 5
+    assert GTFS_RT_HASH_COL in later.column_names
@@ -30,3 +30,35 @@ def test_filname_parsing() -> None:
 
     with pytest.raises(ConfigTypeFromFilenameException):
         ConfigType.from_filename("this.is.a.bad.filename.json.gz")
+
+
+def test_protobuf_filename_parsing() -> None:
+    """
+    Check that binary protobuf feeds are not given a Configuration type, so
+    they are moved to the error bucket until the MBTA extension field numbers
+    are aligned with the producer's .proto
+    """
+    for filename, _ in (
+        (
+            "2022-01-01T00:00:02Z_https_cdn.mbta.com_realtime_TripUpdates.pb",
+            ConfigType.RT_TRIP_UPDATES,
+        ),
+        (
+            "2022-01-01T00:00:03Z_https_cdn.mbta.com_realtime_VehiclePositions.pb.gz",
+            ConfigType.RT_VEHICLE_POSITIONS,
+        ),
+        (
+            "2022-01-01T00:00:38Z_https_cdn.mbta.com_realtime_Alerts.pb",
+            ConfigType.RT_ALERTS,
+        ),
+        (
+            "2022-05-05T16_00_15Z_https_mbta_busloc_s3.s3.amazonaws.com_prod_VehiclePositions.pb",
+            ConfigType.BUS_VEHICLE_POSITIONS,
+        ),
+        (
+            "2022-06-28T10_03_18Z_https_mbta_busloc_s3.s3.amazonaws.com_prod_TripUpdates.pb",
+            ConfigType.BUS_TRIP_UPDATES,
+        ),
+    ):
+        with pytest.raises(ConfigTypeFromFilenameException):
+            ConfigType.from_filename(filename)
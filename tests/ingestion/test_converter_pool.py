@@ -0,0 +1,96 @@
+import os
+from multiprocessing import Manager
+from queue import Queue
+from typing import Optional
+from unittest.mock import patch
+
+from lamp_py.ingestion.converter import ConfigType, Converter
+from lamp_py.ingestion.converter_pool import ConverterPool
+
+
+class CountingConverter(Converter):
+    """
+    converter that reports its files and how many batches it converted, and
+    moves every file but "left" out of the incoming bucket
+    """
+
+    def __init__(
+        self, config_type: ConfigType, metadata_queue: Queue[Optional[str]]
+    ) -> None:
+        Converter.__init__(self, config_type, metadata_queue)
+        self.batch_count = 0
+
+    def convert(self) -> None:
+        self.batch_count += 1
+        for filename in self.files:
+            self.send_metadata(
+                f"{self.config_type}:{os.getpid()}:{self.batch_count}:{filename}"
+            )
+        self.moved_files = [
+            filename for filename in self.files if filename != "left"
+        ]
+
+
+def create_counting_converter(
+    config_type: ConfigType, metadata_queue: Queue[Optional[str]]
+) -> Converter:
+    """converter factory for the converter pool"""
+    return CountingConverter(config_type, metadata_queue)
+
+
+def drain(metadata_queue: Queue[Optional[str]]) -> list:
+    """get all metadata sent by converters, split into its parts"""
+    results = []
+    while not metadata_queue.empty():
+        message = metadata_queue.get()
+        assert message is not None
+        results.append(message.split(":"))
+    return results
+
+
+def test_converter_pool() -> None:
+    """
+    test that converter workers keep their converters across batches, report
+    the files they moved out of the incoming bucket, and are replaced after
+    going over their memory high-water mark
+    """
+    with Manager() as manager:
+        metadata_queue: Queue[Optional[str]] = manager.Queue()
+        pool = ConverterPool(create_counting_converter, metadata_queue)
+        try:
+            assert sorted(
+                pool.run({ConfigType.RT_ALERTS: ["a"], ConfigType.ERROR: ["b"]})
+            ) == ["a", "b"]
+            assert pool.run({ConfigType.RT_ALERTS: ["c", "left"]}) == ["c"]
+
+            results = drain(metadata_queue)
+            assert sorted(
+                (config, batch, filename)
+                for config, _, batch, filename in results
+            ) == [
+                ("ERROR", "1", "b"),
+                ("RT_ALERTS", "1", "a"),
+                ("RT_ALERTS", "2", "c"),
+                ("RT_ALERTS", "2", "left"),
+            ]
+            alerts_pids = {
+                pid for config, pid, _, _ in results if config == "RT_ALERTS"
+            }
+            assert len(alerts_pids) == 1
+            assert len(pool.workers) == 2
+
+            # workers over their high-water mark exit after their batch
+            pool.shutdown()
+            with patch.dict(os.environ, {"CONVERTER_WORKER_MAX_RSS_MB": "1"}):
+                pool.run({ConfigType.RT_ALERTS: ["d"]})
+                assert not pool.workers
+                pool.run({ConfigType.RT_ALERTS: ["e"]})
+
+            results = drain(metadata_queue)
+            assert [(batch, filename) for _, _, batch, filename in results] == [
+                ("1", "d"),
+                ("1", "e"),
+            ]
+            assert results[0][1] != results[1][1]
+        finally:
+            pool.shutdown()
@@ -0,0 +1,354 @@
+# pylint: disable=[W0621]
+# disable this warning that is triggered by pylint not understanding how test
+# fixtures work. https://stackoverflow.com/q/59664605
+
+import os
+import shutil
+import tempfile
+import json
+from queue import Queue
+from typing import Dict, Iterator, List
+from unittest.mock import patch
+
+import pyarrow.parquet as pq
+import pytest
+
+from lamp_py.aws.kinesis import (
+    KinesisReader,
+    KinesisSettings,
+    LocalKinesisStream,
+)
+from lamp_py.benchmarks.glides_conversion import synthetic_glides_events
+from lamp_py.ingestion.glides import (
+    EditorChanges,
+    OperatorSignIns,
+    TripUpdates,
+    ingest_glides_events,
+    route_payloads,
+)
+
+
+def sign_in(event_id: str, time: str) -> Dict:
+    """an operator sign in event, as read from kinesis"""
+    return {
+        "data": {
+            "metadata": {
+                "location": {"gtfsId": "place-alfcl", "todsId": "1"},
+                "author": {"emailAddress": "a@mbta.com", "badgeNumber": "1"},
+                "inputType": "manual",
+                "inputTimestamp": time,
+            },
+            "operator": {"badgeNumber": "1234"},
+            "signedInAt": time,
+            "signature": {"type": "text", "version": 1},
+        },
+        "id": event_id,
+        "type": "com.mbta.ctd.glides.operator_signed_in.v1",
+        "time": f"{time}Z",
+        "source": "glides",
+        "specversion": "1.0",
+        "dataschema": "schema",
+    }
+
+
+def payload(event: Dict) -> bytes:
+    """raw json payload of an event, as read from kinesis"""
+    return json.dumps(event).encode()
+
+
+@pytest.fixture
+def springboard() -> Iterator[Dict]:
+    """
+    a local folder standing in for the springboard bucket, recording the
+    objects uploaded to it
+    """
+    with tempfile.TemporaryDirectory() as root:
+        uploads: List[str] = []
+
+        def local_path(object_path: str) -> str:
+            return os.path.join(root, object_path.replace("s3://", ""))
+
+        def download_file(object_path: str, file_name: str) -> bool:
+            if not os.path.exists(local_path(object_path)):
+                return False
+            shutil.copyfile(local_path(object_path), file_name)
+            return True
+
+        def upload_file(file_name: str, object_path: str) -> bool:
+            os.makedirs(os.path.dirname(local_path(object_path)), exist_ok=True)
+            shutil.copyfile(file_name, local_path(object_path))
+            uploads.append(object_path)
+            return True
+
+        def file_list_from_s3(bucket_name: str, file_prefix: str) -> List[str]:
+            # object keys are matched by string prefix, like S3 does
+            bucket = os.path.join(root, bucket_name)
+            keys = [
+                os.path.relpath(os.path.join(path, filename), bucket)
+                for path, _, filenames in os.walk(bucket)
+                for filename in filenames
+            ]
+            return [
+                f"s3://{bucket_name}/{key}"
+                for key in sorted(keys)
+                if key.startswith(file_prefix)
+            ]
+
+        module = "lamp_py.ingestion.glides"
+        with (
+            patch.dict(os.environ, {"SPRINGBOARD_BUCKET": "springboard"}),
+            patch(f"{module}.download_file", download_file),
+            patch(f"{module}.upload_file", upload_file),
+            patch(f"{module}.file_list_from_s3", file_list_from_s3),
+        ):
+            yield {"root": root, "uploads": uploads, "local_path": local_path}
+
+
+def test_month_partitions(springboard: Dict) -> None:
+    """
+    test that events of the legacy single file are split into month
+    partitions once, and that later appends only rewrite the months of their
+    new events
+    """
+    folder = "s3://springboard/lamp/GLIDES/operator_sign_ins"
+
+    # legacy single file of every event
+    legacy = OperatorSignIns()
+    legacy.payloads = [
+        payload(sign_in("1", "2024-01-05T12:00:00")),
+        payload(sign_in("2", "2024-01-31T23:59:59")),
+        payload(sign_in("3", "2024-02-01T00:00:00")),
+    ]
+    legacy_path = springboard["local_path"](legacy.legacy_path)
+    os.makedirs(os.path.dirname(legacy_path))
+    pq.write_table(legacy.convert_records().to_table(), legacy_path)
+
+    # the first append migrates the legacy file, dropping duplicate events
+    converter = OperatorSignIns()
+    converter.download_manifest()
+    assert converter.migrate_legacy
+    converter.payloads = [
+        payload(sign_in("3", "2024-02-01T00:00:00")),
+        payload(sign_in("4", "2024-03-10T08:00:00")),
+    ]
+    assert converter.append_records() == [
+        f"{folder}/year=2024/month=1/operator_sign_ins.parquet",
+        f"{folder}/year=2024/month=2/operator_sign_ins.parquet",
+        f"{folder}/year=2024/month=3/operator_sign_ins.parquet",
+    ]
+    assert {
+        partition: details["rows"]
+        for partition, details in converter.manifest["partitions"].items()
+    } == {
+        "year=2024/month=1": 2,
+        "year=2024/month=2": 1,
+        "year=2024/month=3": 1,
+    }
+
+    # later appends only rewrite and upload months with new events
+    springboard["uploads"].clear()
+    converter = OperatorSignIns()
+    converter.download_manifest()
+    assert not converter.migrate_legacy
+    converter.payloads = [payload(sign_in("5", "2024-03-11T08:00:00"))]
+    assert converter.append_records() == [
+        f"{folder}/year=2024/month=3/operator_sign_ins.parquet"
+    ]
+    assert springboard["uploads"] == [
+        f"{folder}/year=2024/month=3/operator_sign_ins.parquet",
+        f"{folder}/manifest.json",
+    ]
+
+    # nothing is written without new events
+    springboard["uploads"].clear()
+    converter = OperatorSignIns()
+    assert not converter.append_records()
+    assert not springboard["uploads"]
+
+    # the manifest lists the full history
+    history = pq.ParquetDataset(
+        [
+            springboard["local_path"](details["path"])
+            for details in converter.manifest["partitions"].values()
+        ]
+    ).read()
+    assert sorted(history.column("id").to_pylist()) == ["1", "2", "3", "4", "5"]
+
+
+def test_missing_manifest(springboard: Dict) -> None:
+    """
+    test that month partitions are not rewritten from the legacy file if
+    their manifest can not be downloaded
+    """
+    converter = OperatorSignIns()
+    converter.payloads = [payload(sign_in("1", "2024-01-05T12:00:00"))]
+    converter.append_records()
+
+    os.remove(springboard["local_path"](converter.remote_manifest_path))
+    with pytest.raises(FileNotFoundError):
+        OperatorSignIns().download_manifest()
+
+
+def test_ingest_glides_events(springboard: Dict) -> None:
+    """
+    test that glides events read from every shard of a stream are written to
+    month partitions and checkpointed
+    """
+    stream = LocalKinesisStream(shard_count=2)
+    for event_id in range(5):
+        stream.put_record(
+            sign_in(str(event_id), f"2024-04-0{event_id + 1}T12:00:00"),
+            partition_key=str(event_id),
+        )
+
+    reader = KinesisReader(
+        "glides",
+        KinesisSettings(
+            checkpoint_path=os.path.join(springboard["root"], "checkpoints"),
+            batch_max_records=2,
+        ),
+        stream,
+    )
+    metadata_queue: Queue = Queue()
+    ingest_glides_events(reader, metadata_queue)
+
+    partition = "year=2024/month=4/operator_sign_ins.parquet"
+    month_path = f"s3://springboard/lamp/GLIDES/operator_sign_ins/{partition}"
+    assert metadata_queue.qsize() == 3
+    assert metadata_queue.get_nowait() == month_path
+    assert pq.read_table(springboard["local_path"](month_path)).num_rows == 5
+
+    # processed batches are not read again
+    assert not list(reader.read_batches())
+
+
+def test_malformed_events(springboard: Dict) -> None:
+    """
+    test that events that can not be converted are dropped, and that the
+    rest of their batch is written and checkpointed
+    """
+    stream = LocalKinesisStream(shard_count=1)
+    malformed = sign_in("bad", "2024-04-02T12:00:00")
+    malformed["data"]["signature"]["version"] = "abc"
+    for event in (
+        sign_in("1", "2024-04-01T12:00:00"),
+        malformed,
+        sign_in("2", "2024-04-03T12:00:00"),
+    ):
+        stream.put_record(event, partition_key=event["id"])
+
+    # a null trip update is exploded to a row of nulls
+    trip_update = next(
+        event
+        for event in map(json.loads, synthetic_glides_events(20))
+        if "tripUpdates" in event["data"]
+    )
+    trip_update["data"]["tripUpdates"].append(None)
+    stream.put_record(trip_update, partition_key="trip_update")
+
+    reader = KinesisReader(
+        "glides",
+        KinesisSettings(
+            checkpoint_path=os.path.join(springboard["root"], "checkpoints")
+        ),
+        stream,
+    )
+    ingest_glides_events(reader, Queue())
+
+    sign_ins = "s3://springboard/lamp/GLIDES/operator_sign_ins"
+    table = pq.read_table(
+        springboard["local_path"](
+            f"{sign_ins}/year=2024/month=4/operator_sign_ins.parquet"
+        )
+    )
+    assert sorted(table.column("id").to_pylist()) == ["1", "2"]
+
+    trip_updates = "s3://springboard/lamp/GLIDES/trip_updates"
+    table = pq.read_table(
+        springboard["local_path"](
+            f"{trip_updates}/year=2024/month=4/trip_updates.parquet"
+        )
+    )
+    assert table.num_rows == len(trip_update["data"]["tripUpdates"])
+
+    # the batch was checkpointed, so it is not read again
+    assert not list(reader.read_batches())
+
+
+@pytest.mark.usefixtures("springboard")
+def test_columnar_conversion() -> None:
+    """
+    test that the columnar conversion of a micro-batch of raw events matches
+    the conversion of one event at a time, with json string fields kept as
+    the str() of their values, as month partitions were always written
+    """
+    payloads = synthetic_glides_events(300)
+    converters = [EditorChanges(), OperatorSignIns(), TripUpdates()]
+    assert (
+        route_payloads(payloads + [b"not json", b'{"data": {}}'], converters)
+        == 2
+    )
+    assert sum(len(converter.payloads) for converter in converters) == 300
+
+    for converter in converters:
+        flat_schema = converter.flat_schema
+        columnar = converter.decode_payloads().select(flat_schema.names)
+        per_record = converter.decode_records().select(flat_schema.names)
+        assert columnar.cast(flat_schema).equals(per_record.cast(flat_schema))
+        assert columnar.num_rows >= len(converter.payloads)
+
+    trip_updates = converters[2]
+    cars = [
+        str(update["cars"]) if "cars" in update else None
+        for payload in trip_updates.payloads
+        for update in json.loads(payload)["data"]["tripUpdates"]
+    ]
+    columnar_cars = trip_updates.decode_payloads().column(
+        "data.tripUpdates.cars"
+    )
+    assert columnar_cars.to_pylist() == cars
+
+
+@pytest.mark.usefixtures("springboard")
+def test_conversion_fallback() -> None:
+    """
+    test that batches with events the columnar read can not parse are
+    converted one event at a time
+    """
+    converter = TripUpdates()
+    route_payloads(
+        synthetic_glides_events(30),
+        [EditorChanges(), OperatorSignIns(), converter],
+    )
+
+    # event times with more precision than arrow parses are only read by the
+    # per event conversion
+    unexpected = json.loads(converter.payloads[0])
+    unexpected["id"] = "unexpected"
+    unexpected["time"] = "2024-04-01T12:00:00.1234567Z"
+    converter.payloads.append(payload(unexpected))
+
+    table = converter.convert_records().to_table()
+    assert table.schema == converter.flat_schema
+    assert "unexpected" in table.column("id").to_pylist()
+
+
+@pytest.mark.usefixtures("springboard")
+def test_event_times() -> None:
+    """
+    test that event times with fractions of a second below a millisecond are
+    read by the columnar conversion, truncated like the per event conversion
+    """
+    converter = OperatorSignIns()
+    converter.payloads = [
+        payload(sign_in("1", "2024-04-01T12:00:00.123456")),
+        payload(sign_in("2", "2024-04-01T12:00:00")),
+    ]
+    flat_schema = converter.flat_schema
+    columnar = converter.decode_payloads().select(flat_schema.names)
+    per_record = converter.decode_records().select(flat_schema.names)
+    assert columnar.cast(flat_schema).equals(per_record.cast(flat_schema))
+    assert [str(time) for time in columnar.column("time").to_pylist()] == [
+        "2024-04-01 12:00:00.123000",
+        "2024-04-01 12:00:00",
+    ]
@@ -1,21 +1,41 @@
 import os
+import json
+import time
+import shutil
+import zipfile
 import tempfile
 import datetime
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+from typing import Dict, List, Tuple
 from unittest import mock
 
 import pyarrow.compute as pc
 import pyarrow.dataset as pd
 import polars as pl
+import pytest
 
 from lamp_py.ingestion.compress_gtfs.schedule_details import (
     ScheduleDetails,
     schedules_to_compress,
 )
 from lamp_py.ingestion.compress_gtfs.gtfs_to_parquet import (
+    CompressSettings,
     compress_gtfs_schedule,
+    export_yearly_tables,
+    hash_gtfs_frame,
+    memory_hint_mb,
+)
+from lamp_py.ingestion.compress_gtfs.gtfs_schema_map import (
+    GTFS_RECORD_HASH_COL,
+    gtfs_schema_list,
 )
-from lamp_py.ingestion.compress_gtfs.gtfs_schema_map import gtfs_schema_list
 from lamp_py.ingestion.compress_gtfs.pq_to_sqlite import pq_folder_to_sqlite
+from lamp_py.ingestion.compress_gtfs.yearly_table import (
+    BUCKETS_FOLDER,
+    YearlyTable,
+)
 
 
 # pylint: disable=R0914
@@ -54,6 +74,7 @@ def test_gtfs_to_parquet_compression() -> None:
             compress_gtfs_schedule(schedule_details)
 
         # verify sqlite db creation and gzip for 1 year
+        export_yearly_tables(temp_dir)
         year = feed["published_dt"].dt.strftime("%Y").unique()[0]
         year_path = os.path.join(temp_dir, year)
         pq_folder_to_sqlite(year_path)
@@ -116,3 +137,253 @@ def test_gtfs_to_parquet_compression() -> None:
 
 
 # pylint: enable=R0914
+
+
+def write_schedule(zip_path: str, feed_version: str, trip_count: int) -> None:
+    """write a small gtfs schedule zip file, with trip_count trips"""
+    tables: Dict[str, List[List]] = {
+        "feed_info.txt": [
+            ["feed_publisher_name", "feed_version", "feed_start_date"],
+            ["MBTA", feed_version, 20240101],
+        ],
+        "routes.txt": [["route_id", "route_type"], ["Red", 1]],
+        "trips.txt": [["route_id", "service_id", "trip_id"]]
+        + [["Red", "weekday", f"trip-{trip}"] for trip in range(trip_count)],
+        "stop_times.txt": [["trip_id", "stop_id", "stop_sequence"]]
+        + [
+            [f"trip-{trip}", f"stop-{stop}", stop]
+            for trip in range(trip_count)
+            for stop in range(5)
+        ],
+    }
+    with zipfile.ZipFile(zip_path, "w") as zip_file:
+        for table_file, rows in tables.items():
+            with zip_file.open(table_file, "w") as table:
+                lines = [",".join(str(value) for value in row) for row in rows]
+                table.write("\n".join(lines).encode())
+
+
+def compress_local_schedules(
+    tmp_folder: str, processes: int, schedules: List[Tuple[int, str]]
+) -> None:
+    """compress local schedules of trip count and publish date into tmp_folder"""
+    os.makedirs(os.path.join(tmp_folder, "2024"), exist_ok=True)
+    settings = CompressSettings(processes=processes)
+    pool = None
+    if processes > 1:
+        pool = ProcessPoolExecutor(processes, mp_context=get_context("spawn"))
+
+    for trip_count, published in schedules:
+        zip_path = os.path.join(tmp_folder, f"{published}.zip")
+        write_schedule(zip_path, published, trip_count)
+        compress_gtfs_schedule(
+            ScheduleDetails(
+                zip_path,
+                datetime.datetime.strptime(published, "%Y%m%d"),
+                tmp_folder,
+            ),
+            settings,
+            pool,
+        )
+
+    if pool is not None:
+        pool.shutdown()
+
+    export_yearly_tables(tmp_folder)
+
+
+def assert_same_tables(expected_folder: str, folder: str) -> None:
+    """assert that two compressed schedule folders hold the same records"""
+    tables = sorted(os.listdir(os.path.join(expected_folder, "2024")))
+    assert tables == sorted(os.listdir(os.path.join(folder, "2024")))
+    assert "stop_times.parquet" in tables
+    for table in tables:
+        frames = [
+            pl.read_parquet(os.path.join(table_folder, "2024", table))
+            for table_folder in (expected_folder, folder)
+        ]
+        # column order of the table files depends on set ordering
+        columns = sorted(frames[0].columns)
+        assert (
+            frames[0]
+            .select(columns)
+            .sort(columns)
+            .equals(frames[1].select(columns).sort(columns))
+        ), table
+
+
+def test_parallel_compression() -> None:
+    """
+    test that compressing the table files of schedules concurrently in
+    worker processes writes the same files as compressing them in order
+    """
+    with (
+        tempfile.TemporaryDirectory() as sequential,
+        tempfile.TemporaryDirectory() as parallel,
+    ):
+        schedules = [(10, "20240301"), (12, "20240401")]
+        compress_local_schedules(sequential, 1, schedules)
+        compress_local_schedules(parallel, 2, schedules)
+
+        assert_same_tables(sequential, parallel)
+
+
+def test_memory_budget_and_feed_info_last() -> None:
+    """
+    test that table files are started largest memory hint first within the
+    memory budget, and that feed_info is compressed after every other table
+    file, and not at all if one of them fails
+    """
+    lock = threading.Lock()
+    started: List[str] = []
+    running: List[str] = []
+    running_mb: List[int] = []
+    completed: List[str] = []
+    failing_files: List[str] = []
+
+    def compress_gtfs_file(gtfs_table_file: str, _: ScheduleDetails) -> None:
+        with lock:
+            started.append(gtfs_table_file)
+            running.append(gtfs_table_file)
+            running_mb.append(sum(memory_hint_mb(file) for file in running))
+        time.sleep(0.01)
+        with lock:
+            running.remove(gtfs_table_file)
+            completed.append(gtfs_table_file)
+        if gtfs_table_file in failing_files:
+            raise RuntimeError(gtfs_table_file)
+
+    settings = CompressSettings(
+        processes=4, memory_budget_mb=4400, retry_wait_seconds=0
+    )
+    module = "lamp_py.ingestion.compress_gtfs.gtfs_to_parquet"
+    with (
+        tempfile.TemporaryDirectory() as tmp_folder,
+        mock.patch(f"{module}.compress_gtfs_file", compress_gtfs_file),
+        ThreadPoolExecutor(settings.processes) as pool,
+    ):
+        zip_path = os.path.join(tmp_folder, "schedule.zip")
+        write_schedule(zip_path, "20240301", 1)
+        schedule_details = ScheduleDetails(
+            zip_path, datetime.datetime(2024, 3, 1), tmp_folder
+        )
+
+        compress_gtfs_schedule(schedule_details, settings, pool)
+        # stop_times fits in the budget with one small table file at a time
+        assert "stop_times.txt" in started[:2]
+        assert completed[-1] == "feed_info.txt"
+        assert sorted(completed) == sorted(gtfs_schema_list())
+        assert max(running_mb) <= settings.memory_budget_mb
+
+        # failed table files are retried, and feed_info is not compressed
+        completed.clear()
+        failing_files.append("trips.txt")
+        with pytest.raises(RuntimeError):
+            compress_gtfs_schedule(schedule_details, settings, pool)
+        assert completed.count("trips.txt") == settings.retry_attempts + 1
+        assert "feed_info.txt" not in completed
+
+
+def test_record_hash_migration() -> None:
+    """
+    test that yearly files without record hashes or bucket files are
+    migrated to carry them, and that compressing a schedule against migrated
+    files writes the same records as compressing it against files that always
+    had record hashes and bucket files
+    """
+    with (
+        tempfile.TemporaryDirectory() as hashed,
+        tempfile.TemporaryDirectory() as migrated,
+    ):
+        compress_local_schedules(hashed, 1, [(10, "20240301")])
+        compress_local_schedules(migrated, 1, [(10, "20240301")])
+
+        # yearly files as written by earlier versions of the compression
+        shutil.rmtree(os.path.join(migrated, BUCKETS_FOLDER))
+        year_path = os.path.join(migrated, "2024")
+        for table in os.listdir(year_path):
+            frame = pl.read_parquet(os.path.join(year_path, table))
+            assert GTFS_RECORD_HASH_COL in frame.columns
+            frame.drop(GTFS_RECORD_HASH_COL).write_parquet(
+                os.path.join(year_path, table)
+            )
+
+        schedules = [(12, "20240401"), (11, "20240501")]
+        compress_local_schedules(hashed, 1, schedules)
+        compress_local_schedules(migrated, 1, schedules)
+        assert_same_tables(hashed, migrated)
+
+        # record hashes only depend on the gtfs table columns of a record
+        stop_times = pl.read_parquet(
+            os.path.join(year_path, "stop_times.parquet")
+        )
+        assert stop_times.get_column(GTFS_RECORD_HASH_COL).equals(
+            hash_gtfs_frame(
+                stop_times.drop(GTFS_RECORD_HASH_COL).with_columns(
+                    pl.lit(0).alias("gtfs_end_date")
+                ),
+                "stop_times.txt",
+            ).get_column(GTFS_RECORD_HASH_COL)
+        )
+
+        # record hashes are not exported to sqlite
+        pq_folder_to_sqlite(year_path)
+        assert os.path.exists(os.path.join(year_path, "GTFS_ARCHIVE.db.gz"))
+
+
+def test_yearly_table_buckets() -> None:
+    """
+    test that schedules only rewrite the bucket files holding records they
+    can change, and that the exported yearly file holds the records of every
+    schedule on its active date
+    """
+    with tempfile.TemporaryDirectory() as tmp_folder:
+        schedules = [
+            (10, "20240301"),
+            (12, "20240401"),
+            (11, "20240501"),
+            (11, "20240601"),
+            (9, "20240701"),
+        ]
+        compress_local_schedules(tmp_folder, 1, schedules[:3])
+
+        stop_times = YearlyTable(tmp_folder, 2024, "stop_times.txt")
+        closed_buckets = {
+            path: os.stat(path).st_mtime_ns
+            for path in stop_times.bucket_paths()
+            if os.path.basename(path).startswith("closed")
+        }
+        assert closed_buckets
+
+        compress_local_schedules(tmp_folder, 1, schedules[3:])
+
+        # closed buckets are never rewritten, and each schedule only keeps
+        # the records it can change in the open bucket
+        for path, mtime_ns in closed_buckets.items():
+            assert os.stat(path).st_mtime_ns == mtime_ns
+        with open(
+            os.path.join(stop_times.folder, "manifest.json"), encoding="utf8"
+        ) as manifest_file:
+            manifest = json.load(manifest_file)
+        assert manifest["exported"]
+        open_rows = [
+            details["rows"]
+            for name, details in manifest["buckets"].items()
+            if name.startswith("open")
+        ]
+        assert open_rows == [9 * 5]
+
+        # every schedule is active on its active date
+        stop_times_frame = pl.read_parquet(stop_times.export_path)
+        assert stop_times_frame.shape[0] == sum(
+            details["rows"] for details in manifest["buckets"].values()
+        )
+        for trip_count, published in schedules:
+            active_date = int(published) + 1
+            assert (
+                stop_times_frame.filter(
+                    (pl.col("gtfs_active_date") <= active_date)
+                    & (pl.col("gtfs_end_date") >= active_date)
+                ).shape[0]
+                == trip_count * 5
+            )
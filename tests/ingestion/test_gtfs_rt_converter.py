@@ -1,13 +1,26 @@
+import gzip
 import os
+import shutil
+import tempfile
 from queue import Queue
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
+import pyarrow
 from pyarrow import fs
+import pyarrow.parquet as pq
 import pandas
 
-from lamp_py.ingestion.convert_gtfs_rt import GtfsRtConverter
+from lamp_py.benchmarks.ingestion_throughput import local_buckets, run_converter
+from lamp_py.benchmarks.synthetic_feeds import FeedSettings
+from lamp_py.ingestion import convert_gtfs_rt
+from lamp_py.ingestion.convert_gtfs_rt import WRITE_ID_KEY, GtfsRtConverter
 from lamp_py.ingestion.converter import ConfigType
-from lamp_py.ingestion.utils import flatten_schema
+from lamp_py.ingestion.hash_index import HASH_INDEX_FILE
+from lamp_py.ingestion.utils import (
+    GTFS_RT_HASH_COL,
+    flatten_schema,
+    hash_gtfs_rt_parquet,
+)
 
 from ..test_resources import (
     incoming_dir,
@@ -354,3 +367,228 @@ def test_bus_trip_updates_file_conversion() -> None:
 
     compare_result = np_df.compare(parquet_df, align_axis=1)
     assert compare_result.shape[0] == 0, f"{compare_result}"
+
+
+def test_json_decoder_matches_pylist() -> None:
+    """
+    test that the schema driven json decoder creates the same tables as
+    decoding the feed into python objects, including nested stop time updates
+    """
+    gtfs_rt_file = os.path.join(
+        incoming_dir,
+        "2022-06-28T10_03_18Z_https_mbta_busloc_s3.s3.amazonaws.com_prod_TripUpdates_enhanced.json.gz",
+    )
+    converter = GtfsRtConverter(
+        ConfigType.BUS_TRIP_UPDATES, metadata_queue=Queue()
+    )
+
+    with gzip.open(gtfs_rt_file, "rb") as file:
+        buffer = pyarrow.py_buffer(file.read())
+
+    feed_timestamp, table = converter.decoder.json_decoder.decode(buffer)
+    # pylint: disable=W0212
+    pylist_timestamp, pylist_table = (
+        converter.decoder.json_decoder._decode_pylist(buffer)
+    )
+    # pylint: enable=W0212
+
+    assert feed_timestamp == pylist_timestamp
+    assert table.schema == converter.detail.import_schema
+    assert table.equals(pylist_table)
+
+
+@patch.dict(os.environ, {"SPRINGBOARD_BUCKET": "springboard"})
+@patch("lamp_py.ingestion.convert_gtfs_rt.delete_object")
+@patch("lamp_py.ingestion.convert_gtfs_rt.upload_file")
+@patch("lamp_py.ingestion.convert_gtfs_rt.file_list_from_s3")
+def test_delta_parts_and_compaction(
+    file_list_from_s3: MagicMock,
+    upload_file: MagicMock,
+    delete_object: MagicMock,
+) -> None:
+    """
+    test that tables are appended to a day partition as de-duplicated delta
+    parts, and that delta parts are compacted into the day file
+    """
+    gtfs_rt_file = os.path.join(
+        incoming_dir,
+        "2022-05-05T16_00_15Z_https_mbta_busloc_s3.s3.amazonaws.com_prod_VehiclePositions_enhanced.json.gz",
+    )
+    file_list_from_s3.return_value = []
+    upload_file.return_value = True
+
+    metadata_queue: Queue = Queue()
+    converter = GtfsRtConverter(
+        ConfigType.BUS_VEHICLE_POSITIONS, metadata_queue=metadata_queue
+    )
+    converter.add_files([gtfs_rt_file])
+    table = next(iter(converter.process_files()))
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        converter.tmp_folder = temp_dir
+        day_folder = os.path.join(
+            temp_dir,
+            "lamp/BUS_VEHICLE_POSITIONS/year=2022/month=5/day=5",
+        )
+
+        # second update of the same records does not create a new delta part
+        converter.continuous_pq_update(table)
+        converter.continuous_pq_update(table)
+
+        _, parts = converter.day_files(day_folder)
+        assert len(parts) == 1
+        # records with a null partition_column value are not written
+        written_rows = (
+            table.num_rows - table["vehicle.trip.route_id"].null_count
+        )
+        assert pq.read_table(parts[0]).num_rows == written_rows
+        # delta parts are not sent to the metadata queue
+        assert metadata_queue.empty()
+        file_list_from_s3.assert_called_once_with(
+            "springboard",
+            file_prefix="lamp/BUS_VEHICLE_POSITIONS/year=2022/month=5/day=5/",
+        )
+
+        # parts younger than the maximum age are not compacted
+        converter.compact_day_files()
+        assert converter.day_files(day_folder) == (None, parts)
+
+        # a failed delete keeps the merged part, that is not merged again
+        delete_object.return_value = False
+        converter.compaction.max_part_count = 1
+        converter.compact_day_files()
+        day_file, remaining_parts = converter.day_files(day_folder)
+
+        assert remaining_parts == parts
+        assert day_file == os.path.join(
+            day_folder, "2022-05-05T00:00:00.parquet"
+        )
+        assert pq.read_table(day_file).num_rows == written_rows
+        assert GTFS_RT_HASH_COL in pq.read_schema(day_file).names
+        assert metadata_queue.get_nowait() == day_file.replace(
+            temp_dir, "springboard"
+        )
+        upload_file.assert_called_with(
+            upload_file.call_args.args[0],
+            day_file.replace(temp_dir, "springboard"),
+            extra_args=upload_file.call_args.kwargs["extra_args"],
+        )
+        upload_count = upload_file.call_count
+
+        delete_object.reset_mock(return_value=True)
+        delete_object.return_value = True
+        converter.compact_day_files()
+
+        assert converter.day_files(day_folder) == (day_file, [])
+        assert pq.read_table(day_file).num_rows == written_rows
+        delete_object.assert_called_once_with(
+            parts[0].replace(temp_dir, "springboard")
+        )
+        # the day file is not rewritten or sent again
+        assert upload_file.call_count == upload_count
+        assert metadata_queue.empty()
+
+
+def test_process_pool_decode() -> None:
+    """
+    test that decoding files in a process pool creates the same tables as
+    decoding them in a thread pool
+    """
+    gtfs_rt_files = [
+        os.path.join(
+            incoming_dir,
+            "2022-05-05T16_00_15Z_https_mbta_busloc_s3.s3.amazonaws.com_prod_VehiclePositions_enhanced.json.gz",
+        ),
+        "badfile",
+    ]
+
+    tables = {}
+    for decode_processes in ("0", "2"):
+        converter = GtfsRtConverter(
+            ConfigType.BUS_VEHICLE_POSITIONS, metadata_queue=Queue()
+        )
+        converter.add_files(gtfs_rt_files)
+        with patch.dict(
+            os.environ, {"GTFS_RT_DECODE_PROCESSES": decode_processes}
+        ):
+            tables[decode_processes] = list(converter.process_files())
+
+            # the decode process pool is kept for the next files
+            decode_pool = converter.decode_pool
+            converter.error_files = []
+            assert len(list(converter.process_files())) == 1
+            assert converter.decode_pool is decode_pool
+
+        assert converter.error_files == ["badfile"]
+        converter.shutdown_decode_pool()
+        assert converter.decode_pool is None
+
+    assert decode_pool is not None
+    assert len(tables["0"]) == len(tables["2"]) == 1
+    assert tables["0"][0].equals(tables["2"][0])
+
+
+def test_warm_start_restore() -> None:
+    """
+    test that a restarted converter restores the warm start checkpoint of a
+    compacted day file without rehashing it, and rehashes the day file when
+    its checkpoint was written for a different day file
+    """
+    config_type = ConfigType.RT_TRIP_UPDATES
+    day_path = "lamp/RT_TRIP_UPDATES/year=2024/month=1/day=1"
+    day_file = "2024-01-01T00:00:00.parquet"
+
+    with tempfile.TemporaryDirectory() as root:
+        run_converter(
+            config_type,
+            FeedSettings(vehicles=10, stop_time_updates=3, snapshots=4),
+            root,
+        )
+        written = pq.read_table(os.path.join(root, "tmp", day_path, day_file))
+        assert os.path.exists(
+            os.path.join(
+                root,
+                "springboard/lamp/_warm_start/RT_TRIP_UPDATES/year=2024/month=1/day=1",
+                HASH_INDEX_FILE,
+            )
+        )
+
+        with (
+            local_buckets(root, os.path.join(root, "incoming")),
+            patch(
+                "lamp_py.ingestion.convert_gtfs_rt.hash_gtfs_rt_parquet",
+                wraps=hash_gtfs_rt_parquet,
+            ) as rehash,
+        ):
+            converter = GtfsRtConverter(config_type, Queue())
+            converter.tmp_folder = os.path.join(root, "restarted")
+            day_folder = os.path.join(converter.tmp_folder, day_path)
+            converter.sync_with_s3(day_folder)
+
+            rehash.assert_not_called()
+            assert pq.read_table(os.path.join(day_folder, day_file)).equals(
+                written
+            )
+            assert os.path.exists(os.path.join(day_folder, HASH_INDEX_FILE))
+
+            # a day file written without a checkpoint, like by an older
+            # converter, is downloaded and rehashed
+            public_file = os.path.join(root, "public.parquet")
+            shutil.copyfile(
+                os.path.join(root, "springboard", day_path, day_file),
+                public_file,
+            )
+            convert_gtfs_rt.upload_file(
+                public_file,
+                os.path.join("springboard", day_path, day_file),
+                extra_args={"Metadata": {WRITE_ID_KEY: "other"}},
+            )
+            converter.tmp_folder = os.path.join(root, "rehashed")
+            day_folder = os.path.join(converter.tmp_folder, day_path)
+            converter.sync_with_s3(day_folder)
+
+            rehash.assert_called_once()
+            assert os.listdir(day_folder) == [day_file]
+            assert pq.read_table(os.path.join(day_folder, day_file)).equals(
+                written
+            )
@@ -0,0 +1,168 @@
+import gzip
+import json
+import os
+from pathlib import Path
+from queue import Queue
+
+import pyarrow
+import pytest
+from pyarrow import fs
+
+from lamp_py.ingestion.converter import ConfigType
+from lamp_py.ingestion.convert_gtfs_rt import GtfsRtConverter
+from lamp_py.ingestion.error import ConfigTypeFromFilenameException
+from lamp_py.ingestion.gtfs_rt_protobuf import (
+    GtfsRtProtobufDecoder,
+    encode_feed,
+    encode_message,
+    is_protobuf_feed,
+)
+
+from ..test_resources import incoming_dir
+
+RECORDED_FEEDS = [
+    "2022-01-01T00:00:03Z_https_cdn.mbta.com_realtime_VehiclePositions_enhanced.json.gz",
+    "2022-05-04T15:59:48Z_https_cdn.mbta.com_realtime_Alerts_enhanced.json.gz",
+    "2022-05-05T16_00_15Z_https_mbta_busloc_s3.s3.amazonaws.com_prod_VehiclePositions_enhanced.json.gz",
+    "2022-05-08T06:04:57Z_https_cdn.mbta.com_realtime_TripUpdates_enhanced.json.gz",
+    "2022-06-28T10_03_18Z_https_mbta_busloc_s3.s3.amazonaws.com_prod_TripUpdates_enhanced.json.gz",
+]
+
+
+def at_float32_precision(table: pyarrow.Table) -> pyarrow.Table:
+    """
+    flatten struct columns of table and round its double columns to float32,
+    the precision of floats in protobuf feeds
+    """
+    while any(pyarrow.types.is_struct(column.type) for column in table.columns):
+        table = table.flatten()
+    for index, column in enumerate(table.columns):
+        if pyarrow.types.is_float64(column.type):
+            table = table.set_column(
+                index,
+                table.field(index).with_type(pyarrow.float32()),
+                column.cast(pyarrow.float32()),
+            )
+    return table
+
+
+def test_protobuf_matches_json(tmp_path: Path) -> None:
+    """
+    test that recorded enhanced JSON feeds, encoded as protobuf feeds, are
+    decoded by the converter into the same tables as the JSON feeds, and
+    that protobuf feeds are not routed to a config type
+    """
+    file_system = fs.LocalFileSystem()
+    for json_filename in RECORDED_FEEDS:
+        json_path = os.path.join(incoming_dir, json_filename)
+        config_type = ConfigType.from_filename(json_filename)
+        converter = GtfsRtConverter(config_type, metadata_queue=Queue())
+
+        with gzip.open(json_path, "rb") as file:
+            feed = json.load(file)
+
+        protobuf_filename = json_filename.replace("_enhanced.json", ".pb")
+        protobuf_path = os.path.join(tmp_path, protobuf_filename)
+        with open(protobuf_path, "wb") as file:
+            file.write(gzip.compress(encode_feed(feed)))
+
+        assert is_protobuf_feed(protobuf_path)
+        with pytest.raises(ConfigTypeFromFilenameException):
+            ConfigType.from_filename(protobuf_filename)
+
+        json_dt, json_table = converter.decoder.decode_file(
+            file_system, json_path
+        )
+        protobuf_dt, protobuf_table = converter.decoder.decode_file(
+            file_system, protobuf_path
+        )
+
+        assert json_dt == protobuf_dt
+        assert protobuf_table.schema == json_table.schema
+        assert at_float32_precision(protobuf_table).equals(
+            at_float32_precision(json_table)
+        ), json_filename
+
+
+def test_protobuf_wire_format() -> None:
+    """
+    test decoding negative varints, packed repeated fields, unknown enum
+    values and unknown fields
+    """
+    schema = pyarrow.schema(
+        [
+            ("id", pyarrow.string()),
+            (
+                "trip_update",
+                pyarrow.struct(
+                    [
+                        ("delay", pyarrow.int32()),
+                        (
+                            "trip",
+                            pyarrow.struct(
+                                [("schedule_relationship", pyarrow.string())]
+                            ),
+                        ),
+                    ]
+                ),
+            ),
+            (
+                "alert",
+                pyarrow.struct(
+                    [("reminder_times", pyarrow.list_(pyarrow.uint64()))]
+                ),
+            ),
+        ]
+    )
+
+    # packed reminder times 1, 300 and 2**40 (field 9010, wire type 2)
+    packed = bytes([0x92, 0xB3, 0x04, 0x09, 0x01, 0xAC, 0x02])
+    packed += bytes([0x80, 0x80, 0x80, 0x80, 0x80, 0x20])
+    feed = encode_message("FeedHeader", {"timestamp": 1_700_000_000})
+    entity = encode_message(
+        "FeedEntity",
+        {
+            "id": "1",
+            "trip_update": {"delay": -30, "trip": {"trip_id": "trip"}},
+        },
+    )
+    # unknown enum value 4 of schedule relationship, in trip (field 1) of
+    # trip update (field 3)
+    unknown_enum = bytes([0x1A, 0x04, 0x0A, 0x02, 0x20, 0x04])
+    # unknown field 15, a string
+    unknown_field = bytes([0x7A, 0x03]) + b"abc"
+    entities = [
+        entity,
+        encode_message("FeedEntity", {"id": "2"})
+        + unknown_enum
+        + unknown_field
+        + bytes([0x2A, len(packed)])
+        + packed,
+    ]
+    buffer = bytes([0x0A, len(feed)]) + feed
+    for encoded in entities:
+        buffer += bytes([0x12, len(encoded)]) + encoded
+
+    decoder = GtfsRtProtobufDecoder(schema)
+    feed_timestamp, table = decoder.decode(pyarrow.py_buffer(buffer))
+
+    assert feed_timestamp == 1_700_000_000
+    assert table.schema == schema
+    assert table.to_pylist() == [
+        {
+            "id": "1",
+            "trip_update": {
+                "delay": -30,
+                "trip": {"schedule_relationship": None},
+            },
+            "alert": None,
+        },
+        {
+            "id": "2",
+            "trip_update": {
+                "delay": None,
+                "trip": {"schedule_relationship": None},
+            },
+            "alert": {"reminder_times": [1, 300, 2**40]},
+        },
+    ]
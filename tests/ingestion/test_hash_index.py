@@ -0,0 +1,62 @@
+import os
+import tempfile
+
+import pyarrow
+import pyarrow.parquet as pq
+
+from lamp_py.ingestion.hash_index import HASH_INDEX_FILE, WindowedHashIndex
+from lamp_py.ingestion.utils import GTFS_RT_HASH_COL
+
+
+def make_table(hashes: list, timestamps: list) -> pyarrow.Table:
+    """create a table with record hash and feed_timestamp columns"""
+    return pyarrow.table(
+        {
+            GTFS_RT_HASH_COL: pyarrow.array(hashes, pyarrow.uint64()),
+            "feed_timestamp": pyarrow.array(timestamps, pyarrow.uint64()),
+        }
+    )
+
+
+def test_windowed_hash_index() -> None:
+    """
+    test that the hash index only rejects records written inside of the
+    dedup window, persists to disk, and is rebuilt from parquet files when
+    it is stale
+    """
+    window = 100
+    with tempfile.TemporaryDirectory() as day_folder:
+        part_path = os.path.join(day_folder, "part-1000-a.parquet")
+        written = make_table([1, 2, 3], [1000, 1000, 1050])
+        pq.write_table(written, part_path)
+
+        hash_index = WindowedHashIndex(day_folder, window)
+        hash_index.load([part_path])
+        # no index on disk, new_records builds it from the parquet files
+        mask = hash_index.new_records(
+            make_table([1, 3, 4], [1080, 1080, 1080]), [part_path]
+        )
+        assert mask.to_pylist() == [False, False, True]
+
+        # hash 1 was written outside of the window of this table
+        mask = hash_index.new_records(
+            make_table([1, 3], [1120, 1120]), [part_path]
+        )
+        assert mask.to_pylist() == [True, False]
+
+        second_part = os.path.join(day_folder, "part-1120-b.parquet")
+        hash_index.add(make_table([1, 5], [1120, 1120]), second_part)
+        hash_index.save()
+        assert os.path.exists(os.path.join(day_folder, HASH_INDEX_FILE))
+
+        loaded = WindowedHashIndex(day_folder, window)
+        loaded.load([part_path, second_part])
+        assert loaded.hashes.tolist() == [1, 2, 3, 5]
+        assert loaded.timestamps.tolist() == [1120, 1000, 1050, 1120]
+        # index was built for the window of the first table, 1080 - window
+        assert loaded.window_start == 980
+
+        # a part missing from the index makes the index on disk stale
+        stale = WindowedHashIndex(day_folder, window)
+        stale.load([part_path, second_part, "part-1200-c.parquet"])
+        assert stale.window_start is None
@@ -0,0 +1,184 @@
+import os
+import shutil
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional
+from unittest.mock import patch
+
+from lamp_py.ingestion.incoming_lister import IncomingLister, ListingSettings
+
+
+class FakeS3Client:
+    """in memory list_objects_v2 over a sorted set of keys"""
+
+    def __init__(self, keys: List[str]) -> None:
+        self.keys = set(keys)
+        self.listed_keys = 0
+
+    def list_objects_v2(
+        self,
+        Bucket: str,
+        Prefix: str,
+        StartAfter: str = "",
+        Delimiter: Optional[str] = None,
+        MaxKeys: int = 1000,
+    ) -> Dict[str, Any]:
+        """list one page of keys, grouping keys under Delimiter"""
+        # pylint: disable=C0103,R0913,W0613
+        contents: List[Dict[str, Any]] = []
+        prefixes: List[str] = []
+        for key in sorted(self.keys):
+            if not key.startswith(Prefix) or key <= StartAfter:
+                continue
+            if len(contents) + len(prefixes) == MaxKeys:
+                break
+            rest = key[len(Prefix) :]
+            if Delimiter is not None and Delimiter in rest:
+                common = Prefix + rest.split(Delimiter)[0] + Delimiter
+                if common not in prefixes:
+                    prefixes.append(common)
+                continue
+            contents.append({"Key": key, "Size": 10})
+
+        self.listed_keys += len(contents)
+        return {
+            "Contents": contents,
+            "CommonPrefixes": [{"Prefix": prefix} for prefix in prefixes],
+        }
+
+    def get_paginator(self, _: str) -> "FakeS3Client":
+        """the fake client is its own paginator"""
+        return self
+
+    def paginate(self, **kwargs: Any) -> Iterator[Dict[str, Any]]:
+        """
+        yield pages of 2 keys, continuing after the last listed key. keys
+        grouped under a delimiter are listed in a single page.
+        """
+        if "Delimiter" in kwargs:
+            yield self.list_objects_v2(**kwargs)
+            return
+
+        kwargs["MaxKeys"] = 2
+        while True:
+            page = self.list_objects_v2(**kwargs)
+            yield page
+            if not page["Contents"]:
+                return
+            kwargs["StartAfter"] = page["Contents"][-1]["Key"]
+
+
+def day_key(source: str, day: date, name: str) -> str:
+    """incoming object key of a file in a day partition"""
+    return f"lamp/{source}/{day.strftime('%Y/%m/%d')}/{day}T00:00:00Z_{name}"
+
+
+def test_incoming_lister(tmpdir) -> None:  # type: ignore
+    """
+    test that the incoming lister lists every file the first loop, then only
+    lists files from each source's cursor, across restarts, and fans out over
+    day prefixes when a source falls behind
+    """
+    today = datetime.now(tz=timezone.utc).date()
+    old_day = today - timedelta(days=10)
+    keys = [
+        day_key("delta", old_day, "old_a"),
+        day_key("delta", today, "new_a"),
+        day_key("gtfs", today - timedelta(days=1), "new_b"),
+        "lamp/loose_file.json",
+    ]
+    s3_client = FakeS3Client(keys)
+    settings = ListingSettings(
+        cursor_path=os.path.join(tmpdir, "cursor.json"), list_threads=2
+    )
+
+    def lister() -> IncomingLister:
+        with patch(
+            "lamp_py.ingestion.incoming_lister.get_s3_client",
+            return_value=s3_client,
+        ):
+            return IncomingLister("incoming", "lamp", settings)
+
+    # first loop discovers sources, fanning out over delta's old days
+    files = lister().list_files()
+    assert sorted(files) == sorted(f"s3://incoming/{key}" for key in keys)
+
+    state = lister()
+    assert state.cursors == {
+        "lamp/delta/": old_day,
+        "lamp/gtfs/": today - timedelta(days=1),
+    }
+
+    # once the old file is ingested, the cursor moves up to the lookback day
+    s3_client.keys.remove(keys[0])
+    files = lister().list_files()
+    assert files == [f"s3://incoming/{key}" for key in keys[1:3]]
+    assert lister().cursors["lamp/delta/"] == today - timedelta(days=1)
+
+    # new files are listed without paginating files behind the cursor
+    for index in range(20):
+        s3_client.keys.add(
+            day_key("delta", today - timedelta(days=5), f"behind_{index}")
+        )
+    new_key = day_key("delta", today, "new_c")
+    s3_client.keys.add(new_key)
+    s3_client.listed_keys = 0
+    files = lister().list_files()
+    assert files == [
+        f"s3://incoming/{key}" for key in [keys[1], new_key, keys[2]]
+    ]
+    assert s3_client.listed_keys == len(files)
+
+    # files behind the cursor are listed when sources are rewound, and
+    # max_list_size limits listing to the oldest files of each source
+    settings.rewind_seconds = 0
+    files = lister().list_files(max_list_size=3)
+    assert files == [f"s3://incoming/{keys[3]}"] + [
+        f"s3://incoming/{day_key('delta', today - timedelta(days=5), name)}"
+        for name in ["behind_0", "behind_1"]
+    ]
+
+
+def test_incoming_lister_s3_cursor(tmpdir) -> None:  # type: ignore
+    """
+    test that cursors are saved to the springboard bucket by default, so they
+    survive a task restart, and are only uploaded when they change
+    """
+    today = datetime.now(tz=timezone.utc).date()
+    keys = [day_key("delta", today - timedelta(days=2), "old_a")]
+    s3_client = FakeS3Client(keys)
+    uploads: List[str] = []
+
+    def local_path(object_path: str) -> str:
+        return os.path.join(tmpdir, object_path.replace("s3://", ""))
+
+    def download_file(object_path: str, file_name: str) -> bool:
+        if not os.path.exists(local_path(object_path)):
+            return False
+        shutil.copyfile(local_path(object_path), file_name)
+        return True
+
+    def upload_file(file_name: str, object_path: str) -> bool:
+        os.makedirs(os.path.dirname(local_path(object_path)), exist_ok=True)
+        shutil.copyfile(file_name, local_path(object_path))
+        uploads.append(object_path)
+        return True
+
+    module = "lamp_py.ingestion.incoming_lister"
+    with (
+        patch.dict(os.environ, {"SPRINGBOARD_BUCKET": "springboard"}),
+        patch(f"{module}.get_s3_client", return_value=s3_client),
+        patch(f"{module}.download_file", download_file),
+        patch(f"{module}.upload_file", upload_file),
+    ):
+        lister = IncomingLister("incoming", "lamp")
+        lister.list_files()
+        lister.list_files()
+        assert uploads == [
+            "s3://springboard/lamp/_incoming_list_cursors/incoming.json"
+        ]
+
+        # a restarted lister continues from the saved cursors
+        restarted = IncomingLister("incoming", "lamp")
+        assert restarted.cursors == {"lamp/delta/": today - timedelta(days=2)}
+        restarted.list_files()
+        assert len(uploads) == 1
@@ -0,0 +1,66 @@
+import os
+import tempfile
+
+import pyarrow.parquet as pq
+
+from lamp_py.benchmarks.ingestion_throughput import STAGES, run_converter
+from lamp_py.benchmarks.synthetic_feeds import (
+    FEED_FILENAMES,
+    FeedSettings,
+    write_synthetic_feeds,
+)
+from lamp_py.ingestion.converter import ConfigType
+
+
+def test_synthetic_feeds() -> None:
+    """
+    test that synthetic feeds of every GTFS-RT config type are named like
+    their incoming files
+    """
+    settings = FeedSettings(vehicles=4, alerts=2, snapshots=2)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for config_type in FEED_FILENAMES:
+            files = write_synthetic_feeds(config_type, temp_dir, settings)
+            assert len(files) == 2
+            for filename in files:
+                assert ConfigType.from_filename(filename) == config_type
+                assert os.path.relpath(filename, temp_dir).startswith(
+                    "lamp/delta/2024/01/01/2024-01-01T11"
+                )
+
+
+def test_ingestion_throughput() -> None:
+    """
+    test that synthetic feeds are converted end to end into local springboard
+    and archive folders, reporting results for every stage
+    """
+    settings = FeedSettings(
+        vehicles=10, stop_time_updates=3, snapshots=4, change_pct=50
+    )
+    with tempfile.TemporaryDirectory() as temp_dir:
+        results = run_converter(ConfigType.RT_TRIP_UPDATES, settings, temp_dir)
+
+        assert list(results) == STAGES
+        assert results["decode"]["rows"] == 10 * 3 * 4
+        assert 30 <= results["decode"]["kept_rows"] < 120
+        assert results["compact"]["rows"] == results["decode"]["kept_rows"]
+        for result in results.values():
+            assert result["files"] == 4
+            assert result["peak_rss_mb"] > 0
+
+        # incoming files are archived and delta parts compacted
+        assert not os.listdir(
+            os.path.join(temp_dir, "incoming/lamp/delta/2024/01/01")
+        )
+        assert len(os.listdir(os.path.join(temp_dir, "archive/lamp"))) > 0
+        day_folder = os.path.join(
+            temp_dir,
+            "springboard/lamp/RT_TRIP_UPDATES/year=2024/month=1/day=1",
+        )
+        assert os.listdir(day_folder) == ["2024-01-01T00:00:00.parquet"]
+        assert (
+            pq.read_metadata(
+                os.path.join(day_folder, "2024-01-01T00:00:00.parquet")
+            ).num_rows
+            == results["compact"]["rows"]
+        )
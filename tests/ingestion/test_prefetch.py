@@ -0,0 +1,83 @@
+import gzip
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from lamp_py.ingestion.prefetch import (
+    FilePrefetcher,
+    PrefetchSettings,
+    ordered_map,
+)
+
+from ..test_resources import incoming_dir
+
+
+def test_ordered_map() -> None:
+    """
+    test that ordered_map yields results in input order when later items
+    finish first, and never has more than window items in flight
+    """
+    lock = threading.Lock()
+    in_flight = [0, 0]
+
+    def slow_square(value: int) -> int:
+        with lock:
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight[1], in_flight[0])
+        time.sleep(0.05 if value % 3 == 0 else 0.001)
+        with lock:
+            in_flight[0] -= 1
+        return value * value
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(ordered_map(pool, slow_square, range(20), window=4))
+
+    assert results == [value * value for value in range(20)]
+    assert in_flight[1] <= 4
+
+
+def test_ordered_map_stops_early() -> None:
+    """
+    test that items are only submitted within the window, and that items
+    that have not started are cancelled when the consumer stops early
+    """
+    started = []
+
+    def record_start(value: int) -> int:
+        started.append(value)
+        time.sleep(0.01)
+        return value
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        results = ordered_map(pool, record_start, range(100), window=4)
+        assert next(results) == 0
+        results.close()
+
+    assert len(started) <= 4
+
+
+def test_file_prefetcher() -> None:
+    """
+    test that prefetched files are raw file contents, in file order, and that
+    unreadable files are returned without a buffer
+    """
+    gtfs_rt_file = os.path.join(
+        incoming_dir,
+        "2022-05-05T16_00_15Z_https_mbta_busloc_s3.s3.amazonaws.com_prod_VehiclePositions_enhanced.json.gz",
+    )
+    files = [gtfs_rt_file, "badfile", gtfs_rt_file]
+
+    prefetcher = FilePrefetcher(
+        files, PrefetchSettings(io_workers=2, prefetch_files=2)
+    )
+    fetched = list(prefetcher)
+
+    assert [filename for filename, _ in fetched] == files
+    assert fetched[1][1] is None
+
+    with open(gtfs_rt_file, "rb") as file:
+        raw = file.read()
+    assert fetched[0][1] is not None
+    assert fetched[0][1].to_pybytes() == raw
+    assert gzip.decompress(raw)
@@ -0,0 +1,159 @@
+import os
+import tempfile
+
+import pyarrow
+import pyarrow.parquet as pq
+
+from lamp_py.ingestion.record_hash import (
+    RECORD_HASH_TYPE,
+    RECORD_HASH_VERSION_KEY,
+    hash_arrow_array,
+)
+from lamp_py.ingestion.utils import (
+    GTFS_RT_HASH_COL,
+    has_current_hash_column,
+    hash_gtfs_rt_parquet,
+    hash_gtfs_rt_table,
+)
+
+
+def make_table() -> pyarrow.Table:
+    """create a small flattened gtfs-rt like table with nested and null data"""
+    consist_type = pyarrow.list_(pyarrow.struct([("label", pyarrow.string())]))
+    return pyarrow.table(
+        {
+            "id": ["a", "a", "b", "", None, "a"],
+            "vehicle.trip.direction_id": pyarrow.array(
+                [0, 0, 1, None, 1, 0], pyarrow.uint8()
+            ),
+            "vehicle.position.latitude": [42.1, 42.1, 42.2, 42.3, None, 42.1],
+            "vehicle.vehicle.consist": pyarrow.array(
+                [
+                    [{"label": "1"}, {"label": "2"}],
+                    [{"label": "1"}, {"label": "2"}],
+                    [{"label": "2"}, {"label": "1"}],
+                    [],
+                    None,
+                    [{"label": "1"}, {"label": "2"}],
+                ],
+                consist_type,
+            ),
+            "feed_timestamp": pyarrow.array(
+                [1, 2, 3, 4, 5, 6], pyarrow.uint64()
+            ),
+        }
+    )
+
+
+def test_hash_gtfs_rt_table() -> None:
+    """
+    test that record hashes ignore feed_timestamp, are null and nested value
+    aware, and do not depend on the chunking of the table
+    """
+    table = hash_gtfs_rt_table(make_table())
+
+    assert table.schema.field(GTFS_RT_HASH_COL).type == RECORD_HASH_TYPE
+    hashes = table[GTFS_RT_HASH_COL].to_pylist()
+
+    # same record with a different feed_timestamp
+    assert hashes[0] == hashes[1] == hashes[5]
+    # list element order, empty strings and nulls are all significant
+    assert len(set(hashes[1:5])) == 4
+
+    chunked = pyarrow.concat_tables(
+        [make_table().slice(0, 3), make_table().slice(3)]
+    )
+    assert hash_gtfs_rt_table(chunked)[GTFS_RT_HASH_COL].to_pylist() == hashes
+
+    # null and empty lists hash differently
+    list_hashes = hash_arrow_array(pyarrow.array([None, [], [None], [""]]))
+    assert len(set(list_hashes.tolist())) == 4
+
+
+def test_hash_temporal_arrays() -> None:
+    """
+    test that 32 and 64 bit date and time arrays hash by value, as gtfs
+    schedule tables with date columns are hashed
+    """
+    days = pyarrow.array([19800, 19800, 19801, None], pyarrow.int32())
+    date_hashes = hash_arrow_array(days.cast(pyarrow.date32())).tolist()
+
+    assert date_hashes[0] == date_hashes[1]
+    assert len(set(date_hashes[1:])) == 3
+    # a date hashes the same as its day count
+    assert hash_arrow_array(days).tolist() == date_hashes
+
+    seconds = pyarrow.array([3600, 3600, 7200, None], pyarrow.int32())
+    time_hashes = hash_arrow_array(seconds.cast(pyarrow.time32("s"))).tolist()
+
+    assert time_hashes[0] == time_hashes[1]
+    assert len(set(time_hashes[1:])) == 3
+    assert hash_arrow_array(seconds).tolist() == time_hashes
+
+    values = pyarrow.array([1, 1, 2, None], pyarrow.int64())
+    for temporal_type in (
+        pyarrow.date64(),
+        pyarrow.time64("us"),
+        pyarrow.timestamp("ms"),
+    ):
+        hashes = hash_arrow_array(values.cast(temporal_type)).tolist()
+        assert hashes == hash_arrow_array(values).tolist()
+
+
+def test_hash_gtfs_rt_parquet_migration() -> None:
+    """
+    test that local parquet files with legacy binary hash columns are
+    migrated to the current record hash
+    """
+    table = make_table()
+    legacy = table.append_column(
+        pyarrow.field(GTFS_RT_HASH_COL, pyarrow.large_binary()),
+        pyarrow.array([b"legacy"] * table.num_rows, pyarrow.large_binary()),
+    )
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "day.parquet")
+        pq.write_table(legacy, path)
+
+        hash_gtfs_rt_parquet(path)
+        migrated = pq.read_table(path)
+
+        assert migrated.schema.field(GTFS_RT_HASH_COL).type == RECORD_HASH_TYPE
+        assert (
+            migrated[GTFS_RT_HASH_COL].to_pylist()
+            == hash_gtfs_rt_table(table)[GTFS_RT_HASH_COL].to_pylist()
+        )
+
+
+def test_hash_gtfs_rt_parquet_version() -> None:
+    """
+    test that local parquet files with hash columns of another
+    RECORD_HASH_VERSION are re-hashed, and current files are left as is
+    """
+    table = make_table()
+    stale = table.append_column(
+        pyarrow.field(
+            GTFS_RT_HASH_COL,
+            RECORD_HASH_TYPE,
+            metadata={RECORD_HASH_VERSION_KEY: b"0"},
+        ),
+        pyarrow.array([0] * table.num_rows, RECORD_HASH_TYPE),
+    )
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "day.parquet")
+        pq.write_table(stale, path)
+        assert not has_current_hash_column(pq.read_schema(path))
+
+        hash_gtfs_rt_parquet(path)
+        migrated = pq.read_table(path)
+
+        assert has_current_hash_column(migrated.schema)
+        assert (
+            migrated[GTFS_RT_HASH_COL].to_pylist()
+            == hash_gtfs_rt_table(table)[GTFS_RT_HASH_COL].to_pylist()
+        )
+
+        modified = os.path.getmtime(path)
+        hash_gtfs_rt_parquet(path)
+        assert os.path.getmtime(path) == modified
@@ -0,0 +1,37 @@
+from lamp_py.benchmarks.startup_time import (
+    ENTRY_POINTS,
+    import_entry_point,
+    top_level_imports,
+)
+
+PROFILE = """import time: self [us] | cumulative | imported package
+import time:       100 |        100 | encodings
+import time:        50 |         50 |   lamp_py.aws
+import time:        10 |         10 |     lamp_py.runtime_utils
+import time:       200 |        210 |   lamp_py.aws.s3
+import time:        20 |         20 |   logging
+import time:        30 |        330 | lamp_py.ingestion.pipeline
+"""
+
+
+def test_top_level_imports() -> None:
+    """test reading the slowest direct imports of a module from a profile"""
+    assert top_level_imports(PROFILE, "lamp_py.ingestion.pipeline", 2) == {
+        "lamp_py.aws.s3": 210e-6,
+        "lamp_py.aws": 50e-6,
+    }
+
+
+def test_worker_imports() -> None:
+    """
+    test that spawned ingestion and backfill workers, which import the module
+    of their entry point, do not import the rds writer and migration
+    dependencies used only by the main process
+    """
+    for entry_point in ("ingestion", "backfill"):
+        result = import_entry_point(ENTRY_POINTS[entry_point])
+
+        assert "import_error" not in result
+        assert "pyarrow" in result["modules"]
+        assert "sqlalchemy" not in result["modules"]
+        assert "alembic" not in result["modules"]
@@ -0,0 +1,100 @@
+import os
+from datetime import datetime
+from unittest.mock import Mock, patch
+
+import pyarrow
+
+from lamp_py.ingestion.table_accumulator import DayAccumulators
+
+
+def make_table(start: int, rows: int = 1_000) -> pyarrow.Table:
+    """create a small table of sequential values"""
+    return pyarrow.table(
+        {
+            "value": pyarrow.array(range(start, start + rows), pyarrow.int64()),
+            "label": [f"label_{i % 7}" for i in range(rows)],
+        }
+    )
+
+
+@patch.dict(
+    os.environ, {"GTFS_RT_MEMORY_BUDGET_MB": "10", "GTFS_RT_FLUSH_MB": "1"}
+)
+def test_day_accumulators() -> None:
+    """
+    test that day partitions are spilled to disk once over the memory budget,
+    without changing their tables, and are flushed based on their bytes
+    """
+    accumulators = DayAccumulators(max_memory_pct=100.0)
+    assert accumulators.flush_bytes == 1024 * 1024
+
+    accumulators.share_budget(2)
+    assert accumulators.memory_budget == 5 * 1024 * 1024
+
+    day_one = datetime(2024, 1, 1)
+    day_two = datetime(2024, 1, 2)
+    table_bytes = make_table(0).nbytes
+    accumulators.memory_budget = table_bytes * 3
+
+    for start in range(0, 5_000, 1_000):
+        accumulators.append(day_one, make_table(start), f"file_{start}")
+    accumulators.append(day_two, make_table(0), "file_day_two")
+
+    # day one was spilled once its in memory tables went over budget
+    assert accumulators.memory_bytes <= accumulators.memory_budget
+    assert accumulators.days[day_one].spilled_bytes == table_bytes * 4
+    assert accumulators.days[day_one].nbytes == table_bytes * 5
+
+    accumulators.flush_bytes = table_bytes * 5
+    assert list(accumulators.ready()) == [day_one]
+    assert list(accumulators.ready(flush_all=True)) == [day_one, day_two]
+
+    day = accumulators.pop(day_one)
+    assert day.files == [f"file_{start}" for start in range(0, 5_000, 1_000)]
+    assert day.num_rows == 5_000
+    assert day.to_table().equals(
+        pyarrow.concat_tables(
+            [make_table(start) for start in range(0, 5_000, 1_000)]
+        )
+    )
+    assert list(accumulators.days) == [day_two]
+
+
+@patch.dict(os.environ, {"GTFS_RT_MEMORY_BUDGET_MB": "1024"})
+@patch("lamp_py.ingestion.table_accumulator.psutil")
+def test_day_accumulators_memory_pressure(psutil_mock: Mock) -> None:
+    """
+    test that system memory pressure spills a single day partition each time
+    it rises over max_memory_pct, instead of one on every append
+    """
+    accumulators = DayAccumulators(
+        max_memory_pct=80.0, memory_pct_hysteresis=5.0
+    )
+    table_bytes = make_table(0).nbytes
+    days = [datetime(2024, 1, day) for day in range(1, 6)]
+
+    def append_days(used_pct: float) -> None:
+        psutil_mock.virtual_memory.return_value.percent = used_pct
+        for day in days:
+            accumulators.append(day, make_table(0), "file")
+
+    def spilled_days() -> int:
+        return sum(day.spilled_bytes > 0 for day in accumulators.days.values())
+
+    append_days(50.0)
+    assert spilled_days() == 0
+
+    # only the first append over max_memory_pct spills
+    append_days(90.0)
+    assert spilled_days() == 1
+    assert accumulators.memory_bytes == table_bytes * 8
+
+    # dropping within the hysteresis does not allow another spill
+    append_days(78.0)
+    append_days(90.0)
+    assert spilled_days() == 1
+
+    # dropping below it does
+    append_days(70.0)
+    append_days(90.0)
+    assert spilled_days() == 2
@@ -0,0 +1,37 @@
+import pyarrow
+import pyarrow.compute as pc
+
+from lamp_py.ingestion.utils import partition_groups
+
+
+def test_partition_groups() -> None:
+    """
+    test that partition_groups matches filtering and sorting a table once
+    for each partition value, including dropping null partition values and
+    keeping the original order of records with equal sort keys
+    """
+    table = pyarrow.table(
+        {
+            "route": ["b", "a", None, "b", "c", "a", "b", None],
+            "vehicle": [2, 1, 1, 1, 5, 1, 2, 3],
+            "order": [0, 1, 2, 3, 4, 5, 6, 7],
+        }
+    )
+    sort_order = [("vehicle", "ascending")]
+
+    expected = [
+        table.filter(pc.equal(table.column("route"), part)).sort_by(sort_order)
+        for part in pc.unique(table.column("route"))
+    ]
+    groups = list(partition_groups(table, "route", sort_order))
+
+    # the null partition filter matches no records
+    assert expected[2].num_rows == 0
+    expected = [group for group in expected if group.num_rows > 0]
+
+    assert len(groups) == len(expected) == 3
+    for group, expected_group in zip(groups, expected):
+        assert group.equals(expected_group)
+
+    assert groups[0].column("order").to_pylist() == [3, 0, 6]
+    assert not list(partition_groups(table.slice(2, 1), "route", None))
@@ -0,0 +1,55 @@
+import os
+
+import pyarrow
+import pyarrow.parquet as pq
+
+from lamp_py.ingestion.convert_gtfs_rt import GTFS_RT_DETAILS
+from lamp_py.ingestion.gtfs_rt_detail import WriteProfile
+from lamp_py.benchmarks.write_profiles import write_day_file
+
+
+def test_write_profiles(tmp_path: str) -> None:
+    """
+    test that every GTFS-RT config writes with pyarrow's writer defaults,
+    sorted by its table sort order, and that day files are written with a
+    profile's codec and dictionary columns
+    """
+    for detail_class in GTFS_RT_DETAILS.values():
+        detail = detail_class()
+        assert detail.write_profile == WriteProfile(
+            sort_order=detail.table_sort_order
+        )
+
+    table = pyarrow.table(
+        {
+            "route_id": ["Red", "Blue", "Red", "Red"],
+            "vehicle_id": ["b", "a", "c", "a"],
+            "timestamp": pyarrow.array([4, 3, 2, 1], pyarrow.uint64()),
+        }
+    )
+    profile = WriteProfile(
+        compression="zstd",
+        compression_level=9,
+        use_dictionary=("route_id", "vehicle_id"),
+        row_group_size=2,
+        write_page_index=True,
+        sort_order=[("vehicle_id", "ascending")],
+    )
+    path = os.path.join(tmp_path, "day.parquet")
+    write_day_file(table, path, "route_id", profile)
+
+    metadata = pq.read_metadata(path)
+    assert metadata.num_row_groups == 3
+    columns = metadata.row_group(0).to_dict()["columns"]
+    assert {column["compression"] for column in columns} == {"ZSTD"}
+    assert ["RLE_DICTIONARY" in column["encodings"] for column in columns] == [
+        True,
+        True,
+        False,
+    ]
+
+    assert pq.read_table(path).to_pydict() == {
+        "route_id": ["Red", "Red", "Red", "Blue"],
+        "vehicle_id": ["a", "b", "c", "a"],
+        "timestamp": [1, 4, 2, 3],
+    }